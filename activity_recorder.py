@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from db_manager import DBManager
+from throttling import command_of
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+
+class ActivityRecorder:
+    """Журнал действий пользователей с отложенной записью в БД (write-behind)
+
+    Middleware aiogram: каждое сообщение и нажатие кнопки добавляет запись
+    (пользователь, команда, время) в буфер в памяти, не обращаясь к БД.
+    Буфер записывается одной транзакцией через executemany раз в
+    flush_interval секунд или сразу, когда накопилось batch_size записей;
+    заодно обновляется users.last_seen. Если буфер заполнен до max_pending
+    (БД не успевает), новые запросы ждут записи пачки, а не растят память.
+    """
+
+    def __init__(self, db_manager: DBManager, flush_interval: float = 1.0, batch_size: int = 500,
+                 max_pending: int = 10_000, clock: Callable[[], float] = time.time):
+        self.db_manager = db_manager
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.clock = clock
+        self._pending: List[Tuple[int, Optional[str], float]] = []
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._batch_flush: Optional[asyncio.Task] = None
+        # Статистика для диагностики
+        self.written = 0
+        self.waits = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def record(self, user_id: int, command: Optional[str] = None, timestamp: Optional[float] = None) -> None:
+        """Добавляет действие пользователя в буфер; при заполненном буфере ждет записи пачки"""
+        if len(self._pending) >= self.max_pending:
+            self.waits += 1
+            await self.flush()
+            if len(self._pending) >= self.max_pending:
+                # БД недоступна: запись не удалась, буфер остался полным
+                self.dropped += 1
+                logger.error(f"Буфер журнала активности заполнен, действие пользователя {user_id} не записано")
+                return
+        self._pending.append((user_id, command, timestamp if timestamp is not None else self.clock()))
+        if len(self._pending) >= self.batch_size and (self._batch_flush is None or self._batch_flush.done()):
+            self._batch_flush = asyncio.get_running_loop().create_task(self.flush())
+
+    async def __call__(self, handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]], event: Any,
+                       data: Dict[str, Any]) -> Any:
+        user = getattr(event, "from_user", None)
+        if user is not None:
+            await self.record(user.id, command_of(event))
+        return await handler(event, data)
+
+    async def flush(self) -> bool:
+        """Записывает накопленные действия в БД"""
+        async with self._flush_lock:
+            if not self._pending:
+                return True
+            events, self._pending = self._pending, []
+            success = await asyncio.to_thread(self.db_manager.record_activity, events)
+            if success:
+                self.written += len(events)
+            else:
+                # Возвращаем записи в буфер, чтобы записать их в следующий раз
+                self._pending[:0] = events
+            return success
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка при записи журнала активности: {e}", exc_info=True)
+
+    def start(self) -> asyncio.Task:
+        """Запускает периодическую запись фоновой задачей"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def stop(self) -> None:
+        """Останавливает периодическую запись и записывает остаток"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if not await self.flush():
+            logger.error(f"Остановка: не записано действий пользователей: {len(self._pending)}")
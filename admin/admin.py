@@ -0,0 +1,200 @@
+import asyncio
+import cProfile
+import logging
+import os
+import pstats
+import signal
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+# Диагностика ограничена по времени: команда не может оставить профилировщик включенным надолго
+MAX_SECONDS = 60.0
+# Ответ должен уместиться в одно сообщение Telegram
+MAX_REPORT_LENGTH = 4000
+
+# Одновременно идет не больше одного замера: профилировщики и tracemalloc глобальны для процесса
+_busy = asyncio.Lock()
+
+
+class DiagnosticsBusy(Exception):
+    """Другой замер еще не закончился"""
+
+
+def clamp_seconds(value: Optional[str], default: float) -> float:
+    """Длительность замера из аргумента команды, ограниченная MAX_SECONDS"""
+    try:
+        seconds = float(value) if value else default
+    except ValueError:
+        seconds = default
+    return min(max(seconds, 0.1), MAX_SECONDS)
+
+
+def _truncate(text: str) -> str:
+    if len(text) <= MAX_REPORT_LENGTH:
+        return text
+    return text[:MAX_REPORT_LENGTH - 1] + "…"
+
+
+def _short_path(filename: str) -> str:
+    """Путь к файлу относительно проекта или site-packages"""
+    for marker in ("site-packages" + os.sep, os.getcwd() + os.sep):
+        position = filename.find(marker)
+        if position >= 0:
+            return filename[position + len(marker):]
+    return filename
+
+
+async def _exclusive(coro):
+    if _busy.locked():
+        coro.close()
+        raise DiagnosticsBusy()
+    async with _busy:
+        return await coro
+
+
+async def _cprofile(seconds: float, top: int) -> str:
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        # Профилируется поток событийного цикла: все обработчики и фоновые задачи бота
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+    stats = pstats.Stats(profiler)
+    lines = [f"cProfile, {seconds:g} с, топ {top} функций по собственному времени:",
+             "вызовов  собств.,с  всего,с  функция"]
+    entries = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+    for (filename, line, name), (_, calls, own, total, _) in entries:
+        lines.append(f"{calls:>7}  {own:>8.3f}  {total:>7.3f}  {name} ({_short_path(filename)}:{line})")
+    return "\n".join(lines)
+
+
+async def _sample(seconds: float, top: int, interval: float = 0.005) -> str:
+    """Выборочный профиль: таймер SIGPROF раз в interval секунд процессорного времени снимает стек
+
+    Обработчик сигнала выполняется в главном потоке между инструкциями
+    прерванного кода, поэтому отсчеты честно показывают, где тратится время
+    процессора. Простаивающий цикл отсчетов не дает.
+    """
+    if not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+        return "Выборочный профиль недоступен (нужен таймер SIGPROF в главном потоке), используйте cprofile"
+    own: Counter = Counter()
+    inclusive: Counter = Counter()
+    samples = 0
+
+    def on_sample(signum, frame):
+        nonlocal samples
+        if frame is None:
+            return
+        samples += 1
+        own[_frame_label(frame)] += 1
+        seen = set()
+        while frame is not None:
+            label = _frame_label(frame)
+            if label not in seen:
+                seen.add(label)
+                inclusive[label] += 1
+            frame = frame.f_back
+
+    previous = signal.signal(signal.SIGPROF, on_sample)
+    signal.setitimer(signal.ITIMER_PROF, interval, interval)
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, previous)
+    if not samples:
+        return f"Выборочный профиль, {seconds:g} с: нет отсчетов, событийный цикл простаивал"
+    lines = [f"Выборочный профиль, {seconds:g} с, {samples} отсчетов по {interval * 1000:g} мс процессорного "
+             f"времени (доля в функции / со вложенными):"]
+    for label, count in own.most_common(top):
+        lines.append(f"{count * 100 / samples:5.1f}% / {inclusive[label] * 100 / samples:5.1f}%  {label}")
+    return "\n".join(lines)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+
+async def profile_loop(seconds: float, mode: str = "sample", top: int = 15) -> str:
+    """Профиль потока событийного цикла за seconds секунд
+
+    mode="sample" - выборочный профиль с почти нулевыми накладными
+    расходами, mode="cprofile" - точные счетчики вызовов (замедляет бота на
+    время замера).
+    """
+    logger.info(f"Профилирование событийного цикла ({mode}) на {seconds} с")
+    if mode == "cprofile":
+        report = await _exclusive(_cprofile(seconds, top))
+    else:
+        report = await _exclusive(_sample(seconds, top))
+    return _truncate(report)
+
+
+async def _memory_top(seconds: float, top: int) -> str:
+    if tracemalloc.is_tracing():
+        # Трассировку включили снаружи (PYTHONTRACEMALLOC): показываем все живые выделения
+        lines = [f"tracemalloc, топ {top} мест по занятой памяти:"]
+        for stat in tracemalloc.take_snapshot().statistics("lineno")[:top]:
+            frame = stat.traceback[0]
+            lines.append(f"{stat.size / 1024:>9.1f} КиБ {stat.count:>7}  {_short_path(frame.filename)}:{frame.lineno}")
+        return "\n".join(lines)
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        await asyncio.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    lines = [f"tracemalloc, {seconds:g} с, топ {top} мест по приросту памяти:"]
+    for stat in after.compare_to(before, "lineno")[:top]:
+        frame = stat.traceback[0]
+        lines.append(f"{stat.size_diff / 1024:>+9.1f} КиБ {stat.count_diff:>+7}  "
+                     f"{_short_path(frame.filename)}:{frame.lineno}")
+    return "\n".join(lines)
+
+
+async def memory_top(seconds: float, top: int = 15) -> str:
+    """Места в коде, выделившие больше всего памяти за seconds секунд (tracemalloc)"""
+    logger.info(f"Трассировка выделений памяти на {seconds} с")
+    return _truncate(await _exclusive(_memory_top(seconds, top)))
+
+
+async def measure_loop_lag(seconds: float, interval: float = 0.05) -> Dict[str, float]:
+    """Задержка событийного цикла за seconds секунд: насколько позже срока просыпается sleep(interval), мс"""
+    lags: List[float] = []
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.monotonic() - started - interval) * 1000)
+    lags.sort()
+    return {
+        "samples": len(lags),
+        "p50": lags[len(lags) // 2],
+        "p99": lags[min(len(lags) - 1, int(len(lags) * 0.99))],
+        "max": lags[-1],
+        "tasks": len(asyncio.all_tasks()),
+    }
+
+
+def format_loop_lag(seconds: float, stats: Dict[str, float]) -> str:
+    return (f"Задержка событийного цикла за {seconds:g} с ({stats['samples']} замеров):\n"
+            f"p50 {stats['p50']:.1f} мс · p99 {stats['p99']:.1f} мс · макс {stats['max']:.1f} мс\n"
+            f"Задач asyncio: {stats['tasks']}")
+
+
+def format_sizes(sizes: Iterable[Tuple[str, object]]) -> str:
+    """Размеры кешей и очередей: [(название, значение или None, если компонент не создан)]"""
+    lines = ["Размеры кешей и очередей:"]
+    for name, value in sizes:
+        lines.append(f"{name}: {'не создан' if value is None else value}")
+    return _truncate("\n".join(lines))
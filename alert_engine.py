@@ -0,0 +1,215 @@
+import logging
+from dataclasses import dataclass
+from enum import Enum
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from kuma_models import Heartbeat, MonitorKey, MonitorStatus
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+
+class AlertKind(Enum):
+    """Типы оповещений"""
+    DOWN = "down"                    # Монитор подтвержденно упал
+    UP = "up"                        # Монитор подтвержденно восстановился
+    FLAPPING = "flapping"            # Монитор начал «мигать»
+    FLAP_RESOLVED = "flap_resolved"  # Монитор перестал «мигать»
+
+
+class FlapMode(Enum):
+    """Что делать с переходами, пока монитор «мигает»"""
+    SUPPRESS = "suppress"  # Отбрасывать
+    DIGEST = "digest"      # Считать и сообщить итог при окончании мигания
+
+
+@dataclass(slots=True)
+class AlertConfig:
+    """Настройки движка оповещений"""
+    # Сколько неудачных проверок подряд нужно, чтобы считать монитор упавшим
+    fail_threshold: int = 3
+    # Сколько успешных проверок подряд нужно для восстановления (гистерезис)
+    recover_threshold: int = 2
+    # Размер скользящего окна проверок для обнаружения мигания
+    flap_window: int = 20
+    # Мигание начинается при таком числе смен статуса в окне...
+    flap_start_changes: int = 6
+    # ...и заканчивается, когда смен становится не больше этого числа
+    flap_stop_changes: int = 2
+    flap_mode: FlapMode = FlapMode.DIGEST
+
+    def __post_init__(self):
+        if self.fail_threshold < 1 or self.recover_threshold < 1:
+            raise ValueError("Пороги fail_threshold и recover_threshold должны быть не меньше 1")
+        if self.flap_window < 2:
+            raise ValueError("Окно flap_window должно содержать хотя бы 2 проверки")
+        if not 0 <= self.flap_stop_changes < self.flap_start_changes < self.flap_window:
+            raise ValueError("Должно выполняться 0 <= flap_stop_changes < flap_start_changes < flap_window")
+
+
+@dataclass(slots=True)
+class AlertEvent:
+    """Оповещение о смене состояния монитора"""
+    kind: AlertKind
+    monitor_id: MonitorKey
+    time: float
+    # Итоговое подтвержденное состояние монитора на момент события
+    status: Optional[MonitorStatus] = None
+    # Для FLAP_RESOLVED в режиме DIGEST: сколько переходов было подавлено
+    suppressed: int = 0
+
+
+class _MonitorState:
+    """Состояние конечного автомата одного монитора
+
+    Память ограничена: окно мигания — bytearray фиксированного размера,
+    остальное — несколько чисел.
+    """
+    __slots__ = ("confirmed", "streak_ok", "streak_len", "last_ok", "window", "window_pos",
+                 "window_changes", "flapping", "suppressed")
+
+    def __init__(self, window: int):
+        self.confirmed: Optional[bool] = None  # True — работает, False — упал, None — еще неизвестно
+        self.streak_ok: Optional[bool] = None
+        self.streak_len = 0
+        self.last_ok: Optional[bool] = None
+        self.window = bytearray(window)        # 1 — на этой проверке статус сменился
+        self.window_pos = 0
+        self.window_changes = 0
+        self.flapping = False
+        self.suppressed = 0
+
+
+_NO_EVENTS: Sequence[AlertEvent] = ()
+
+
+class AlertEngine:
+    """Движок оповещений: подтверждение падений, гистерезис, мигание и дедупликация
+
+    Обрабатывает проверки (heartbeats) по одной за O(1). Оповещение о падении
+    отправляется только после fail_threshold неудачных проверок подряд, о
+    восстановлении — после recover_threshold успешных. Повторных оповещений о
+    том же состоянии не бывает. Если статус монитора часто меняется в
+    скользящем окне, монитор считается «мигающим»: отправляется одно
+    оповещение FLAPPING, а переходы подавляются до окончания мигания.
+    """
+
+    def __init__(self, config: Optional[AlertConfig] = None):
+        self.config = config or AlertConfig()
+        self._states: Dict[MonitorKey, _MonitorState] = {}
+        self._subscribers: List[Callable[[List[AlertEvent]], object]] = []
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def subscribe(self, callback: Callable[[List[AlertEvent]], object]) -> None:
+        """Подписывает обработчик на оповещения (получает список событий)"""
+        self._subscribers.append(callback)
+
+    def is_flapping(self, monitor_id: MonitorKey) -> bool:
+        state = self._states.get(monitor_id)
+        return state is not None and state.flapping
+
+    def forget(self, monitor_id: MonitorKey) -> None:
+        """Удаляет состояние монитора (например, если монитор удален в Kuma)"""
+        self._states.pop(monitor_id, None)
+
+    def assume_down(self, monitor_ids: Iterable[MonitorKey]) -> None:
+        """Считает мониторы упавшими: их первое подтвержденное «работает» оповещается
+
+        Вызывается после перезапуска для мониторов с открытыми инцидентами в
+        БД: иначе восстановление было бы первым подтвержденным состоянием, о
+        котором не оповещают, и инцидент остался бы открытым.
+        """
+        for monitor_id in monitor_ids:
+            state = self._states.get(monitor_id)
+            if state is None:
+                state = self._states[monitor_id] = _MonitorState(self.config.flap_window)
+            state.confirmed = False
+
+    def reset(self) -> None:
+        """Сбрасывает состояние всех мониторов (перед повторным проигрыванием проверок)"""
+        self._states.clear()
+
+    def handle_diff(self, diff, snapshot) -> None:
+        """Подписчик на изменения снапшота: забывает состояние удаленных мониторов"""
+        for monitor in diff.removed:
+            self.forget(monitor.key)
+
+    def process(self, heartbeat: Heartbeat) -> Sequence[AlertEvent]:
+        """Обрабатывает одну проверку и возвращает возникшие оповещения"""
+        status = heartbeat.status
+        if status == MonitorStatus.MAINTENANCE:
+            # Проверки во время обслуживания не влияют на состояние
+            return _NO_EVENTS
+        ok = status == MonitorStatus.UP
+
+        config = self.config
+        state = self._states.get(heartbeat.monitor_id)
+        if state is None:
+            state = self._states[heartbeat.monitor_id] = _MonitorState(config.flap_window)
+
+        # Скользящее окно смен статуса: O(1) на проверку
+        changed = 1 if state.last_ok is not None and state.last_ok != ok else 0
+        state.last_ok = ok
+        window = state.window
+        state.window_changes += changed - window[state.window_pos]
+        window[state.window_pos] = changed
+        state.window_pos = (state.window_pos + 1) % config.flap_window
+
+        if state.streak_ok == ok:
+            state.streak_len += 1
+        else:
+            state.streak_ok = ok
+            state.streak_len = 1
+
+        events: Optional[List[AlertEvent]] = None
+        if not state.flapping and state.window_changes >= config.flap_start_changes:
+            state.flapping = True
+            state.suppressed = 0
+            events = [AlertEvent(AlertKind.FLAPPING, heartbeat.monitor_id, heartbeat.time, self._status(state.confirmed))]
+        elif state.flapping and state.window_changes <= config.flap_stop_changes:
+            state.flapping = False
+            events = [AlertEvent(AlertKind.FLAP_RESOLVED, heartbeat.monitor_id, heartbeat.time,
+                                 self._status(state.confirmed),
+                                 state.suppressed if config.flap_mode == FlapMode.DIGEST else 0)]
+            state.suppressed = 0
+
+        threshold = config.recover_threshold if ok else config.fail_threshold
+        if state.streak_len >= threshold and state.confirmed != ok:
+            initial = state.confirmed is None
+            state.confirmed = ok
+            if state.flapping:
+                state.suppressed += 1
+            elif not (initial and ok):
+                # Первое подтвержденное «работает» после запуска не оповещаем
+                event = AlertEvent(AlertKind.UP if ok else AlertKind.DOWN, heartbeat.monitor_id, heartbeat.time,
+                                   self._status(ok))
+                if events is None:
+                    events = [event]
+                else:
+                    events.append(event)
+        return events if events is not None else _NO_EVENTS
+
+    @staticmethod
+    def _status(ok: Optional[bool]) -> Optional[MonitorStatus]:
+        if ok is None:
+            return None
+        return MonitorStatus.UP if ok else MonitorStatus.DOWN
+
+    def process_many(self, heartbeats: Iterable[Heartbeat]) -> List[AlertEvent]:
+        """Обрабатывает проверки по порядку и рассылает оповещения подписчикам"""
+        events: List[AlertEvent] = []
+        for heartbeat in heartbeats:
+            produced = self.process(heartbeat)
+            if produced:
+                events.extend(produced)
+        if events:
+            for event in events:
+                logger.info(f"Оповещение {event.kind.value} по монитору {event.monitor_id}")
+            for callback in list(self._subscribers):
+                try:
+                    callback(events)
+                except Exception as e:
+                    logger.error(f"Ошибка в подписчике на оповещения {callback!r}: {e}", exc_info=True)
+        return events
@@ -0,0 +1,104 @@
+"""Бенчмарк журнала активности пользователей.
+
+Сравнивает запись каждого действия отдельной транзакцией (подключение,
+INSERT, UPDATE last_seen и commit на каждое сообщение) с отложенной
+записью ActivityRecorder: действия копятся в памяти и пишутся пачками
+через executemany. Меряет пропускную способность (действий в секунду)
+и задержку добавления действия для обработчика.
+
+Запуск:
+    python -m benchmarks.bench_activity
+    python -m benchmarks.bench_activity --events 100000 --users 10000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Any, Dict
+
+from activity_recorder import ActivityRecorder
+from benchmarks.common import save_results
+from db_manager import DBManager, UserRole
+
+COMMANDS = ("/status", "/monitors", "/find", "/monitor", None)
+
+
+def make_db(directory: str, name: str, user_count: int) -> DBManager:
+    db = DBManager(db_path=os.path.join(directory, name))
+    for user_id in range(user_count):
+        db.add_or_update_user(user_id, UserRole.USER)
+    return db
+
+
+def per_message(db: DBManager, event_count: int, user_count: int) -> Dict[str, Any]:
+    started = time.perf_counter()
+    for i in range(event_count):
+        db.record_activity([(i % user_count, COMMANDS[i % len(COMMANDS)], time.time())])
+    seconds = time.perf_counter() - started
+    return {"events_per_s": round(event_count / seconds), "us_per_event": round(seconds / event_count * 1e6, 1)}
+
+
+async def write_behind(db: DBManager, event_count: int, user_count: int, flush_interval: float,
+                       batch_size: int) -> Dict[str, Any]:
+    recorder = ActivityRecorder(db, flush_interval=flush_interval, batch_size=batch_size,
+                                max_pending=batch_size * 4)
+    recorder.start()
+    started = time.perf_counter()
+    worst = 0.0
+    for i in range(event_count):
+        before = time.perf_counter()
+        await recorder.record(i % user_count, COMMANDS[i % len(COMMANDS)])
+        worst = max(worst, time.perf_counter() - before)
+        if i % 100 == 0:
+            # Уступаем циклу, как между апдейтами Telegram: фоновая запись идет параллельно
+            await asyncio.sleep(0)
+    enqueued = time.perf_counter() - started
+    await recorder.stop()
+    seconds = time.perf_counter() - started
+    return {
+        "events_per_s": round(event_count / seconds),
+        "us_per_event": round(enqueued / event_count * 1e6, 1),
+        "worst_record_ms": round(worst * 1000, 2),
+        "backpressure_waits": recorder.waits,
+    }
+
+
+def run(event_count: int, user_count: int, flush_interval: float, batch_size: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as directory:
+        # Построчные коммиты медленные: меряем их на меньшем числе действий
+        direct_count = min(event_count, 5_000)
+        direct = per_message(make_db(directory, "direct.db", user_count), direct_count, user_count)
+        buffered_db = make_db(directory, "buffered.db", user_count)
+        buffered = asyncio.run(write_behind(buffered_db, event_count, user_count, flush_interval, batch_size))
+    return {
+        "events": event_count,
+        "users": user_count,
+        "per_message": dict(direct, events=direct_count),
+        "write_behind": buffered,
+        "speedup": round(buffered["events_per_s"] / direct["events_per_s"], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк журнала активности пользователей")
+    parser.add_argument("--events", type=int, default=50_000, help="Число действий")
+    parser.add_argument("--users", type=int, default=1_000, help="Число разных пользователей")
+    parser.add_argument("--flush-interval", type=float, default=0.5, help="Интервал записи пачки, с")
+    parser.add_argument("--batch-size", type=int, default=500, help="Размер пачки")
+    parser.add_argument("--output", default=None, help="Путь к JSON с результатами")
+    args = parser.parse_args()
+
+    results = run(args.events, args.users, args.flush_interval, args.batch_size)
+    direct, buffered = results["per_message"], results["write_behind"]
+    print(f"Построчные коммиты: {direct['events_per_s']} действий/с ({direct['us_per_event']} мкс на действие)")
+    print(f"Отложенная запись:  {buffered['events_per_s']} действий/с ({buffered['us_per_event']} мкс на действие "
+          f"для обработчика, худшее ожидание {buffered['worst_record_ms']} мс, "
+          f"ожиданий при полном буфере: {buffered['backpressure_waits']})")
+    print(f"Ускорение: x{results['speedup']}")
+    path = save_results("activity", results, args.output)
+    print(f"Результаты сохранены в {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Бенчмарк сводок по мониторам.
+
+Сравнивает два способа подготовить утреннюю сводку для всех пользователей:
+  - naive: для каждого пользователя пересчитать показатели его мониторов
+    по сырым проверкам за сутки и сформировать текст;
+  - incremental: показатели копятся DigestAggregator по мере поступления
+    проверок, а текст формируется один раз на уникальный набор мониторов.
+Отдельно меряется стоимость учета одной проверки в DigestAggregator.
+
+Запуск:
+    python -m benchmarks.bench_digest
+    python -m benchmarks.bench_digest --monitors 1000 --users 10000 --teams 200
+"""
+import argparse
+import datetime
+import random
+import time
+from typing import Any, Dict, List
+
+from benchmarks.common import save_results
+from digest import DigestAggregator, DigestPeriod, DigestScheduler, MonitorAggregate, format_digest_line
+from kuma_models import Heartbeat, MonitorStatus
+
+
+def make_heartbeats(monitor_count: int, per_monitor: int, start: float) -> List[Heartbeat]:
+    rng = random.Random(1)
+    step = 86400 / per_monitor
+    heartbeats = []
+    for i in range(per_monitor):
+        for monitor_id in range(1, monitor_count + 1):
+            status = MonitorStatus.UP if rng.random() > 0.01 else MonitorStatus.DOWN
+            heartbeats.append(Heartbeat(len(heartbeats) + 1, monitor_id, status, start + i * step, rng.uniform(5, 500)))
+    return heartbeats
+
+
+def make_subscriptions(monitor_count: int, user_count: int, team_count: int):
+    """Пользователи состоят в командах, у каждой команды свой набор мониторов"""
+    rng = random.Random(2)
+    teams = [rng.sample(range(1, monitor_count + 1), min(monitor_count, rng.randint(5, 30)))
+             for _ in range(team_count)]
+    return [(user_id, monitor_id) for user_id in range(1, user_count + 1)
+            for monitor_id in teams[user_id % team_count]]
+
+
+def naive_digests(heartbeats: List[Heartbeat], subscriptions) -> int:
+    by_user: Dict[int, List[int]] = {}
+    for user_id, monitor_id in subscriptions:
+        by_user.setdefault(user_id, []).append(monitor_id)
+    messages = 0
+    for monitors in by_user.values():
+        wanted = set(monitors)
+        totals: Dict[int, MonitorAggregate] = {}
+        for heartbeat in heartbeats:
+            if heartbeat.monitor_id in wanted:
+                aggregate = totals.setdefault(heartbeat.monitor_id, MonitorAggregate())
+                aggregate.checks += 1
+                aggregate.up += heartbeat.status == MonitorStatus.UP
+                aggregate.worst_ping = max(aggregate.worst_ping, heartbeat.ping)
+        "\n".join(format_digest_line(f"Монитор {monitor_id}", totals.get(monitor_id)) for monitor_id in sorted(wanted))
+        messages += 1
+    return messages
+
+
+def run(monitor_count: int, user_count: int, team_count: int, per_monitor: int, naive_users: int) -> Dict[str, Any]:
+    today = datetime.datetime.combine(datetime.date.today(), datetime.time()).timestamp()
+    heartbeats = make_heartbeats(monitor_count, per_monitor, today - 86400)
+    subscriptions = make_subscriptions(monitor_count, user_count, team_count)
+
+    aggregator = DigestAggregator()
+    started = time.perf_counter()
+    aggregator.add_many(heartbeats)
+    add_seconds = time.perf_counter() - started
+
+    scheduler = DigestScheduler(aggregator, None, lambda user_id, text: None)
+    started = time.perf_counter()
+    groups = scheduler.group_subscriptions(subscriptions)
+    rendered = scheduler.render(DigestPeriod.DAILY, groups, today + 9 * 3600)
+    incremental_seconds = time.perf_counter() - started
+
+    # Наивный способ квадратичен: меряем на части пользователей и пересчитываем на всех
+    sample = [row for row in subscriptions if row[0] <= naive_users]
+    started = time.perf_counter()
+    naive_digests(heartbeats, sample)
+    naive_seconds = (time.perf_counter() - started) * user_count / naive_users
+    return {
+        "monitors": monitor_count,
+        "users": user_count,
+        "unique_sets": len(rendered),
+        "heartbeats": len(heartbeats),
+        "aggregate_ns_per_heartbeat": round(add_seconds / len(heartbeats) * 1e9, 1),
+        "incremental_ms": round(incremental_seconds * 1000, 3),
+        "naive_estimated_ms": round(naive_seconds * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк сводок по мониторам")
+    parser.add_argument("--monitors", type=int, default=1_000, help="Число мониторов")
+    parser.add_argument("--users", type=int, default=10_000, help="Число пользователей")
+    parser.add_argument("--teams", type=int, default=200, help="Число уникальных наборов мониторов")
+    parser.add_argument("--heartbeats", type=int, default=288, help="Проверок на монитор за сутки")
+    parser.add_argument("--naive-users", type=int, default=20, help="Пользователей в выборке наивного способа")
+    parser.add_argument("--output", default=None, help="Путь к JSON с результатами")
+    args = parser.parse_args()
+
+    results = run(args.monitors, args.users, args.teams, args.heartbeats, args.naive_users)
+    print(f"Мониторов: {results['monitors']}, пользователей: {results['users']}, "
+          f"уникальных наборов: {results['unique_sets']}, проверок за сутки: {results['heartbeats']}")
+    print(f"Учет проверки:              {results['aggregate_ns_per_heartbeat']} нс")
+    print(f"Сводки (инкрементально):    {results['incremental_ms']} мс")
+    print(f"Сводки (наивно, оценка):    {results['naive_estimated_ms']} мс")
+    path = save_results("digest", results, args.output)
+    print(f"Результаты сохранены в {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Бенчмарк проверки доступа на каждое сообщение.
+
+Заполняет временную БД N пользователями с подписками и сравнивает
+стоимость одной проверки доступа:
+  - role_db: прежняя проверка роли запросом get_user;
+  - role_and_subscription_db: наивная проверка роли и подписки
+    (get_user + check_subscription_status: два запроса и разбор даты);
+  - index: EntitlementIndex.check - поиск в словаре и сравнение времени.
+Отдельно меряется загрузка индекса при старте.
+
+Запуск:
+    python -m benchmarks.bench_entitlements
+    python -m benchmarks.bench_entitlements --users 100000 --checks 20000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from typing import Any, Callable, Dict
+
+from benchmarks.common import save_results
+from db_manager import DBManager, UserRole, to_db_time
+from entitlements import EntitlementIndex
+
+YEAR = 365 * 86400
+
+
+def fill_database(db: DBManager, user_count: int, now: float) -> None:
+    """Пользователи с окончанием подписки от полугода назад до полугода вперед"""
+    step = YEAR / user_count
+    conn = sqlite3.connect(db.db_path)
+    try:
+        conn.executemany(
+            "INSERT INTO users (user_id, role, subscription_expires_at) VALUES (?, ?, ?)",
+            ((user_id, UserRole.USER.value, to_db_time(now - YEAR / 2 + user_id * step))
+             for user_id in range(1, user_count + 1)))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def per_check_us(check: Callable[[int], Any], user_ids) -> float:
+    started = time.perf_counter()
+    for user_id in user_ids:
+        check(user_id)
+    return (time.perf_counter() - started) / len(user_ids) * 1_000_000
+
+
+def run(user_count: int, check_count: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as directory:
+        db = DBManager(db_path=os.path.join(directory, "bench.db"))
+        fill_database(db, user_count, time.time())
+        rng = random.Random(1)
+        user_ids = [rng.randint(1, user_count) for _ in range(check_count)]
+
+        def role_db(user_id: int) -> bool:
+            user = db.get_user(user_id)
+            return bool(user) and user['role'] != UserRole.BLOCKED.value
+
+        def role_and_subscription_db(user_id: int) -> bool:
+            return role_db(user_id) and db.check_subscription_status(user_id)
+
+        index = EntitlementIndex(db, require_subscription=True)
+        started = time.perf_counter()
+        index.load()
+        load_seconds = time.perf_counter() - started
+
+        # Проверки через БД медленные: для них хватает меньшей выборки
+        db_ids = user_ids[:max(1, check_count // 10)]
+        return {
+            "users": user_count,
+            "checks": check_count,
+            "index_load_ms": round(load_seconds * 1000, 3),
+            "role_db_us": round(per_check_us(role_db, db_ids), 3),
+            "role_and_subscription_db_us": round(per_check_us(role_and_subscription_db, db_ids), 3),
+            "index_us": round(per_check_us(index.check, user_ids), 3),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк проверки доступа пользователя")
+    parser.add_argument("--users", type=int, default=100_000, help="Число пользователей в БД")
+    parser.add_argument("--checks", type=int, default=100_000, help="Число проверок доступа")
+    parser.add_argument("--output", default=None, help="Путь к JSON с результатами")
+    args = parser.parse_args()
+
+    results = run(args.users, args.checks)
+    print(f"Пользователей: {results['users']}, загрузка индекса {results['index_load_ms']} мс")
+    print(f"Роль из БД:                 {results['role_db_us']} мкс на проверку")
+    print(f"Роль и подписка из БД:      {results['role_and_subscription_db_us']} мкс на проверку")
+    print(f"Индекс в памяти:            {results['index_us']} мкс на проверку")
+    path = save_results("entitlements", results, args.output)
+    print(f"Результаты сохранены в {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Бенчмарк выгрузки истории инцидентов.
+
+Сравнивает потоковую выгрузку (курсор БД пачками -> генератор строк ->
+временный файл) с наивной: все строки читаются в список, документ
+собирается одной строкой в памяти. Меряет время и пик памяти Python
+(tracemalloc) для CSV и JSON.
+
+Запуск:
+    python -m benchmarks.bench_export
+    python -m benchmarks.bench_export --incidents 1000000
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict
+
+from benchmarks.common import save_results
+from db_manager import DBManager
+from export import INCIDENT_COLUMNS, ExportFormat, export_to_file, incident_rows
+
+
+def fill(db: DBManager, count: int) -> None:
+    started = time.time() - count * 60
+    opened = [(i % 500, f"Монитор {i % 500}", started + i * 60) for i in range(count)]
+    db.record_incident_transitions(opened, [])
+
+
+def naive(db: DBManager, fmt: ExportFormat) -> int:
+    rows = list(incident_rows(db))
+    if fmt is ExportFormat.CSV:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(INCIDENT_COLUMNS)
+        writer.writerows(rows)
+        document = buffer.getvalue()
+    else:
+        document = json.dumps([dict(zip(INCIDENT_COLUMNS, row)) for row in rows], ensure_ascii=False)
+    return len(document.encode("utf-8"))
+
+
+def streaming(db: DBManager, fmt: ExportFormat) -> int:
+    path, _ = export_to_file(INCIDENT_COLUMNS, incident_rows(db), fmt)
+    try:
+        return os.path.getsize(path)
+    finally:
+        os.remove(path)
+
+
+def measure(function, db: DBManager, fmt: ExportFormat) -> Dict[str, Any]:
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = function(db, fmt)
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": round(seconds, 3), "peak_mib": round(peak / 1024 / 1024, 2),
+            "file_mib": round(size / 1024 / 1024, 2)}
+
+
+def run(count: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as directory:
+        db = DBManager(db_path=os.path.join(directory, "bench.db"))
+        fill(db, count)
+        results: Dict[str, Any] = {"incidents": count}
+        for fmt in ExportFormat:
+            results[fmt.value] = {
+                "naive": measure(naive, db, fmt),
+                "streaming": measure(streaming, db, fmt),
+            }
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк выгрузки истории инцидентов")
+    parser.add_argument("--incidents", type=int, default=200_000, help="Число инцидентов в БД")
+    parser.add_argument("--output", default=None, help="Путь к JSON с результатами")
+    args = parser.parse_args()
+
+    results = run(args.incidents)
+    print(f"Инцидентов: {results['incidents']}")
+    for fmt in ExportFormat:
+        for name in ("naive", "streaming"):
+            r = results[fmt.value][name]
+            print(f"{fmt.value:>4} {name:>9}: {r['seconds']} с, пик памяти {r['peak_mib']} МиБ, файл {r['file_mib']} МиБ")
+    path = save_results("export", results, args.output)
+    print(f"Результаты сохранены в {path}")
+
+
+if __name__ == "__main__":
+    main()
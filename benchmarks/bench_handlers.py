@@ -0,0 +1,118 @@
+"""Сквозной бенчмарк обработчиков команд.
+
+Прогоняет синтетические апдейты через Dispatcher бота для команд
+/start, /status, /monitors и /incidents при разном числе мониторов в
+заглушке Uptime Kuma. Для каждой команды считает пропускную способность,
+задержки p50/p99 и объем выделенной памяти на один вызов.
+
+Запуск:
+    python -m benchmarks.bench_handlers
+    python -m benchmarks.bench_handlers --sizes 10 1000 --iterations 50
+"""
+import argparse
+import asyncio
+import dataclasses
+import logging
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+from benchmarks.common import (
+    install_kuma_stub,
+    make_command_update,
+    make_stub_bot,
+    make_synthetic_db,
+    percentile,
+    save_results,
+)
+
+import bot as bot_module
+
+COMMANDS = {
+    "send_welcome": "/start",
+    "get_status": "/status",
+    "list_monitors": "/monitors",
+    "list_incidents": "/incidents",
+}
+DEFAULT_SIZES = [10, 1_000, 10_000]
+USER_ID = 100_001
+
+
+async def _run_command(dp, bot, text: str, iterations: int) -> Dict[str, Any]:
+    """Измеряет задержки и аллокации одной команды"""
+    # Прогрев: импорт ленивых модулей, кеши aiogram
+    for _ in range(min(3, iterations)):
+        await dp.feed_update(bot, make_command_update(USER_ID, text))
+
+    latencies: List[float] = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        update = make_command_update(USER_ID, text)
+        t0 = time.perf_counter()
+        await dp.feed_update(bot, update)
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    # Аллокации меряем отдельным проходом, чтобы tracemalloc не искажал тайминги
+    alloc_iterations = max(1, min(iterations, 20))
+    tracemalloc.start()
+    allocated = 0
+    for _ in range(alloc_iterations):
+        update = make_command_update(USER_ID, text)
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        await dp.feed_update(bot, update)
+        _, peak = tracemalloc.get_traced_memory()
+        allocated += peak - base
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "throughput_per_s": round(iterations / elapsed, 2) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+        "peak_alloc_kib_per_call": round(allocated / alloc_iterations / 1024, 2),
+    }
+
+
+async def run(sizes: List[int], iterations: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    bot_module.db_manager = make_synthetic_db([USER_ID])
+    # Один пользователь повторяет одну команду сотни раз: ограничитель частоты
+    # пропустил бы к обработчику только первые вызовы, поэтому он отключен
+    bot_module.config = dataclasses.replace(bot_module.get_config(), throttle_rate=0)
+    bot_module.command_throttle = None
+    dp = bot_module.get_dispatcher()
+
+    for size in sizes:
+        install_kuma_stub(size)
+        bot = make_stub_bot()
+        size_results = {}
+        for handler_name, text in COMMANDS.items():
+            size_results[handler_name] = await _run_command(dp, bot, text, iterations)
+            stats = size_results[handler_name]
+            print(f"[{size:>6} мониторов] {handler_name:<15} "
+                  f"{stats['throughput_per_s']:>9} rps  p50 {stats['p50_ms']:>8} мс  "
+                  f"p99 {stats['p99_ms']:>8} мс  alloc {stats['peak_alloc_kib_per_call']:>9} КиБ")
+        results[str(size)] = size_results
+        await bot.session.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк обработчиков команд бота")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Число мониторов в заглушке Kuma")
+    parser.add_argument("--iterations", type=int, default=100, help="Число вызовов каждой команды")
+    parser.add_argument("--output", default=None, help="Путь к JSON с результатами")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    results = asyncio.run(run(args.sizes, args.iterations))
+    path = save_results("handlers", {"iterations": args.iterations, "sizes": results}, args.output)
+    print(f"Результаты сохранены в {path}")
+
+
+if __name__ == "__main__":
+    main()
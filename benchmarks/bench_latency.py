@@ -0,0 +1,92 @@
+"""Бенчмарк карточки монитора (/monitor).
+
+Меряет подготовку блока времени ответа (перцентили и текстовый график) по
+кольцевому буферу проверок разного размера и сравнивает с наивным способом:
+список Heartbeat из буфера, отдельная сортировка на каждый перцентиль.
+Если установлен matplotlib, меряет также отрисовку PNG-графика и повторный
+просмотр из кеша.
+
+Запуск:
+    python -m benchmarks.bench_latency
+    python -m benchmarks.bench_latency --sizes 120 1000 10000
+"""
+import argparse
+import random
+import time
+from typing import Any, Dict, List
+
+from benchmarks.common import save_results
+from heartbeat_store import HeartbeatRing
+from kuma_models import Heartbeat, MonitorStatus
+from latency import ChartCache, charts_available, format_latency, latency_samples, render_chart
+
+
+def make_ring(size: int) -> HeartbeatRing:
+    rng = random.Random(1)
+    ring = HeartbeatRing(size)
+    # Буфер заполнен с переполнением, как у долго работающего бота
+    for i in range(size + size // 3):
+        status = MonitorStatus.UP if rng.random() > 0.02 else MonitorStatus.DOWN
+        ping = rng.lognormvariate(4, 0.5) if status == MonitorStatus.UP else None
+        ring.append(Heartbeat(i + 1, 1, status, 1000.0 + 60 * i, ping))
+    return ring
+
+
+def naive_latency(ring: HeartbeatRing) -> Dict[str, float]:
+    pings = [heartbeat.ping for heartbeat in ring.heartbeats(1) if heartbeat.ping is not None]
+    result = {}
+    for q in (50, 90, 95, 99):
+        ordered = sorted(pings)
+        result[f"p{q}"] = ordered[int((len(ordered) - 1) * q / 100)]
+    result["min"], result["max"] = min(pings), max(pings)
+    return result
+
+
+def _per_call_us(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1_000_000
+
+
+def run(sizes: List[int], repeat: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {"sizes": {}}
+    for size in sizes:
+        ring = make_ring(size)
+        results["sizes"][size] = {
+            "card_us": round(_per_call_us(lambda: format_latency(ring), repeat), 2),
+            "naive_us": round(_per_call_us(lambda: naive_latency(ring), repeat), 2),
+        }
+
+    results["charts"] = charts_available()
+    if results["charts"]:
+        ring = make_ring(max(sizes))
+        times, pings = latency_samples(ring)
+        cache = ChartCache()
+        started = time.perf_counter()
+        cache.get_or_render(1, lambda: render_chart(times, pings, "bench"))
+        results["render_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        results["cached_us"] = round(_per_call_us(lambda: cache.get_or_render(1, lambda: b""), repeat), 3)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк карточки монитора")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[120, 1000, 10000], help="Размеры буфера проверок")
+    parser.add_argument("--repeat", type=int, default=1000, help="Повторов каждого замера")
+    parser.add_argument("--output", default=None, help="Путь к JSON с результатами")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat)
+    for size, timings in results["sizes"].items():
+        print(f"Буфер {size}: карточка {timings['card_us']} мкс, наивно {timings['naive_us']} мкс")
+    if results["charts"]:
+        print(f"PNG-график: отрисовка {results['render_ms']} мс, из кеша {results['cached_us']} мкс")
+    else:
+        print("matplotlib не установлен: замер PNG-графика пропущен")
+    path = save_results("latency", results, args.output)
+    print(f"Результаты сохранены в {path}")
+
+
+if __name__ == "__main__":
+    main()
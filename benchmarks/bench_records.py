@@ -0,0 +1,148 @@
+"""Бенчмарк представления мониторов: словари против записей Monitor.
+
+Сравнивает прежнее представление (новый список словарей из 7 ключей с
+`str(id)` на каждую загрузку) с записями `Monitor` и кешем
+`MonitorRecordCache`, который переиспользует неизменившиеся записи.
+
+Для каждого варианта меряется время CPU на одну загрузку и память,
+удерживаемая снапшотом. Сценарии: первая загрузка (кеш пуст) и повторная
+загрузка, в которой изменилась малая доля мониторов.
+
+Запуск:
+    python -m benchmarks.bench_records
+    python -m benchmarks.bench_records --monitors 10000 --changed-share 0.01
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from benchmarks.common import make_monitors, save_results
+from kuma_models import MonitorRecordCache
+
+
+def build_dicts(monitors_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Прежнее представление из UptimeKumaClient.get_monitors"""
+    result = []
+    for monitor in monitors_data:
+        status = 1
+        if not monitor.get("active", True) or monitor.get("status", 1) == 0:
+            status = 0
+        if monitor.get("maintenance", False):
+            status = 0
+
+        result.append({
+            "id": str(monitor.get("id")),
+            "name": monitor.get("name", "Unknown"),
+            "status": status,
+            "active": monitor.get("active", True),
+            "url": monitor.get("url", ""),
+            "type": monitor.get("type", "unknown"),
+            "maintenance": monitor.get("maintenance", False)
+        })
+    return result
+
+
+def _fresh_payload(template: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Как и настоящий API, каждая загрузка приходит новыми объектами"""
+    return [{**m, "name": "".join(m["name"]), "url": "".join(m["url"])} for m in template]
+
+
+def _changed(template: List[Dict[str, Any]], share: float) -> List[Dict[str, Any]]:
+    """Копия данных, в которой у доли мониторов сменился статус"""
+    step = max(1, int(1 / share)) if share > 0 else len(template) + 1
+    result = []
+    for i, m in enumerate(template):
+        if i % step == 0:
+            m = {**m, "status": 0 if m["status"] else 1}
+        result.append(m)
+    return result
+
+
+def _time_per_call(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.process_time()
+        fn()
+        best = min(best, time.process_time() - started)
+    return best
+
+
+def _retained_bytes(fn: Callable[[], Any]) -> int:
+    """Память, удерживаемая результатом fn() (входные данные не учитываются)"""
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    result = fn()
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return after - before
+
+
+def run(monitor_count: int, changed_share: float, repeat: int) -> Dict[str, Any]:
+    template = make_monitors(monitor_count)
+    first = _fresh_payload(template)
+    second = _fresh_payload(_changed(template, changed_share))
+
+    # Кеш прогрет первой загрузкой: для повторной загрузки переиспользуются записи
+    def records_refresh():
+        cache = MonitorRecordCache()
+        cache.build(first)
+        started = time.process_time()
+        cache.build(second)
+        return time.process_time() - started
+
+    def records_cold():
+        return MonitorRecordCache().build(first)
+
+    dict_cpu = _time_per_call(lambda: build_dicts(second), repeat)
+    records_cold_cpu = _time_per_call(records_cold, repeat)
+    records_refresh_cpu = min(records_refresh() for _ in range(repeat))
+
+    warm_cache = MonitorRecordCache()
+    warm_cache.build(first)
+    dict_bytes = _retained_bytes(lambda: build_dicts(second))
+    records_cold_bytes = _retained_bytes(records_cold)
+    records_refresh_bytes = _retained_bytes(lambda: warm_cache.build(second))
+
+    return {
+        "monitors": monitor_count,
+        "changed_share": changed_share,
+        "dicts": {
+            "cpu_ms_per_refresh": round(dict_cpu * 1000, 3),
+            "retained_kib": round(dict_bytes / 1024, 1),
+        },
+        "records_cold": {
+            "cpu_ms_per_refresh": round(records_cold_cpu * 1000, 3),
+            "retained_kib": round(records_cold_bytes / 1024, 1),
+        },
+        "records_refresh": {
+            "cpu_ms_per_refresh": round(records_refresh_cpu * 1000, 3),
+            "retained_kib": round(records_refresh_bytes / 1024, 1),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк записей мониторов против словарей")
+    parser.add_argument("--monitors", type=int, default=10_000, help="Число мониторов")
+    parser.add_argument("--changed-share", type=float, default=0.01,
+                        help="Доля мониторов, изменившихся между загрузками")
+    parser.add_argument("--repeat", type=int, default=5, help="Число повторов (берется лучший)")
+    parser.add_argument("--output", default=None, help="Путь к JSON с результатами")
+    args = parser.parse_args()
+
+    results = run(args.monitors, args.changed_share, args.repeat)
+    for variant in ("dicts", "records_cold", "records_refresh"):
+        stats = results[variant]
+        print(f"{variant:<16} CPU {stats['cpu_ms_per_refresh']:>9} мс/загрузка  "
+              f"память {stats['retained_kib']:>9} КиБ")
+    path = save_results("records", results, args.output)
+    print(f"Результаты сохранены в {path}")
+
+
+if __name__ == "__main__":
+    main()
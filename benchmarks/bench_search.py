@@ -0,0 +1,94 @@
+"""Бенчмарк поиска мониторов (/find).
+
+Строит поисковый индекс по N мониторам и сравнивает задержку запросов с
+линейным перебором (подстрока в имени или URL без учета регистра), а также
+меряет построение индекса и его обновление по разнице снапшотов. Запрос по
+индексу должен укладываться в BUDGET_US; превышение помечается в выводе и
+в JSON (within_budget).
+
+Запуск:
+    python -m benchmarks.bench_search
+    python -m benchmarks.bench_search --monitors 10000
+"""
+import argparse
+import time
+from typing import Any, Dict
+
+from benchmarks.common import make_monitors, save_results
+from kuma_models import MonitorRecordCache
+from monitor_search import MonitorSearchIndex
+from snapshot_diff import MonitorSnapshot, diff_snapshots
+
+QUERIES = ("service", "example", "05001", "health", "se", "srvice-0500")
+# Бюджет одного запроса /find на 10k мониторов
+BUDGET_US = 1000
+
+
+def linear_search(monitors, text: str, limit: int = 10):
+    query = text.casefold()
+    return [m.key for m in monitors if query in m.name.casefold() or query in m.url.casefold()][:limit]
+
+
+def _per_call_us(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1_000_000
+
+
+def run(monitor_count: int, repeat: int) -> Dict[str, Any]:
+    cache = MonitorRecordCache()
+    raw = make_monitors(monitor_count)
+    monitors = cache.build(raw)
+    started = time.perf_counter()
+    index = MonitorSearchIndex(monitors)
+    build_seconds = time.perf_counter() - started
+
+    queries = {}
+    for query in QUERIES:
+        index_us = _per_call_us(lambda: index.search(query), repeat)
+        queries[query] = {
+            "index_us": round(index_us, 2),
+            "linear_us": round(_per_call_us(lambda: linear_search(monitors, query), max(1, repeat // 20)), 2),
+            "within_budget": index_us < BUDGET_US,
+        }
+
+    # Обновление по разнице: переименован 1% мониторов
+    changed = [dict(item) for item in raw]
+    for item in changed[::100]:
+        item["name"] = item["name"] + "-renamed"
+    previous = MonitorSnapshot(monitors)
+    current = MonitorSnapshot(cache.build(changed))
+    diff = diff_snapshots(previous.by_key, current.by_key)
+    started = time.perf_counter()
+    index.handle_diff(diff, current)
+    update_seconds = time.perf_counter() - started
+    return {
+        "monitors": monitor_count,
+        "build_ms": round(build_seconds * 1000, 3),
+        "diff_update_ms": round(update_seconds * 1000, 3),
+        "diff_updated": len(diff.updated),
+        "budget_us": BUDGET_US,
+        "queries": queries,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк поиска мониторов")
+    parser.add_argument("--monitors", type=int, default=10_000, help="Число мониторов")
+    parser.add_argument("--repeat", type=int, default=1000, help="Повторов каждого запроса")
+    parser.add_argument("--output", default=None, help="Путь к JSON с результатами")
+    args = parser.parse_args()
+
+    results = run(args.monitors, args.repeat)
+    print(f"Мониторов: {results['monitors']}, построение индекса {results['build_ms']} мс, "
+          f"обновление по разнице ({results['diff_updated']} переименований) {results['diff_update_ms']} мс")
+    for query, timings in results["queries"].items():
+        mark = "" if timings["within_budget"] else f"  ПРЕВЫШЕН бюджет {BUDGET_US} мкс"
+        print(f"  «{query}»: индекс {timings['index_us']} мкс, перебор {timings['linear_us']} мкс{mark}")
+    path = save_results("search", results, args.output)
+    print(f"Результаты сохранены в {path}")
+
+
+if __name__ == "__main__":
+    main()
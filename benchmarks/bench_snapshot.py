@@ -0,0 +1,87 @@
+"""Бенчмарк теплого старта: сохранение и загрузка снапшота мониторов.
+
+Строит снапшот из N мониторов и буферы проверок (по --heartbeats проверок
+на монитор), затем меряет время упаковки, загрузки с диска и размер файла.
+Загрузка 10k мониторов должна занимать миллисекунды.
+
+Запуск:
+    python -m benchmarks.bench_snapshot
+    python -m benchmarks.bench_snapshot --monitors 10000 --heartbeats 120
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import Any, Dict
+
+from benchmarks.common import make_monitors, save_results
+from heartbeat_store import HeartbeatStore
+from kuma_models import Heartbeat, MonitorRecordCache, MonitorStatus
+from snapshot_diff import MonitorSnapshot
+from snapshot_store import SnapshotStore, dump_snapshot, load_snapshot
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def make_state(monitor_count: int, heartbeats_per_monitor: int):
+    snapshot = MonitorSnapshot(MonitorRecordCache().build(make_monitors(monitor_count)))
+    heartbeats = HeartbeatStore(capacity=heartbeats_per_monitor)
+    now = time.time()
+    beats = []
+    for monitor in snapshot.monitors:
+        for i in range(heartbeats_per_monitor):
+            beats.append(Heartbeat(monitor.id * 1_000 + i, monitor.id, MonitorStatus.UP,
+                                   now - (heartbeats_per_monitor - i) * 60, 10.0 + i % 7))
+    heartbeats.add_many(beats)
+    return snapshot, heartbeats
+
+
+def run(monitor_count: int, heartbeats_per_monitor: int, repeat: int) -> Dict[str, Any]:
+    snapshot, heartbeats = make_state(monitor_count, heartbeats_per_monitor)
+    data = dump_snapshot(snapshot, heartbeats)
+    with tempfile.TemporaryDirectory() as directory:
+        store = SnapshotStore(os.path.join(directory, "snapshot.bin"))
+        save_seconds = _best(lambda: store.save(snapshot, heartbeats), repeat)
+        load_seconds = _best(store.load, repeat)
+        monitors_only = SnapshotStore(os.path.join(directory, "monitors.bin"))
+        monitors_only.save(snapshot)
+        load_monitors_seconds = _best(monitors_only.load, repeat)
+    return {
+        "monitors": monitor_count,
+        "heartbeats_per_monitor": heartbeats_per_monitor,
+        "file_kib": round(len(data) / 1024, 1),
+        "dump_ms": round(_best(lambda: dump_snapshot(snapshot, heartbeats), repeat) * 1000, 3),
+        "parse_ms": round(_best(lambda: load_snapshot(data), repeat) * 1000, 3),
+        "save_ms": round(save_seconds * 1000, 3),
+        "load_ms": round(load_seconds * 1000, 3),
+        "load_monitors_only_ms": round(load_monitors_seconds * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк сохранения и загрузки снапшота")
+    parser.add_argument("--monitors", type=int, default=10_000, help="Число мониторов")
+    parser.add_argument("--heartbeats", type=int, default=120, help="Проверок в буфере каждого монитора")
+    parser.add_argument("--repeat", type=int, default=5, help="Число повторов (берется лучший)")
+    parser.add_argument("--output", default=None, help="Путь к JSON с результатами")
+    args = parser.parse_args()
+
+    results = run(args.monitors, args.heartbeats, args.repeat)
+    print(f"Мониторов: {results['monitors']}, проверок на монитор: {results['heartbeats_per_monitor']}")
+    print(f"Размер файла:               {results['file_kib']} КиБ")
+    print(f"Упаковка / запись:          {results['dump_ms']} мс / {results['save_ms']} мс")
+    print(f"Разбор / загрузка с диска:  {results['parse_ms']} мс / {results['load_ms']} мс")
+    print(f"Загрузка без проверок:      {results['load_monitors_only_ms']} мс")
+    path = save_results("snapshot", results, args.output)
+    print(f"Результаты сохранены в {path}")
+
+
+if __name__ == "__main__":
+    main()
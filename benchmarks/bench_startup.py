@@ -0,0 +1,107 @@
+"""Бенчмарк холодного старта бота.
+
+Меряет в отдельных процессах (чтобы кеш модулей не влиял на результат):
+- время импорта модуля `bot`;
+- время от запуска до первого обработанного апдейта: импорт, создание
+  диспетчера, бота и БД, обработка команды /start.
+
+Цель для перезапуска контейнера — первый апдейт обработан не позже чем
+через `--target` секунд (по умолчанию 3 с).
+
+Запуск:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 10 --target 2
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_TARGET_S = 3.0
+
+IMPORT_SNIPPET = (
+    "import time; t = time.perf_counter(); import bot; "
+    "print(time.perf_counter() - t)"
+)
+
+
+def _child_first_update() -> None:
+    """Выполняется в дочернем процессе: время до первого обработанного апдейта"""
+    started = time.perf_counter()
+    import asyncio
+    import logging
+
+    logging.disable(logging.WARNING)
+    import bot as bot_module
+    from benchmarks.common import make_command_update, make_stub_bot, make_synthetic_db
+
+    user_id = 100_001
+    bot_module.db_manager = make_synthetic_db([user_id])
+
+    async def first_update():
+        dp = bot_module.get_dispatcher()
+        bot = make_stub_bot()
+        await dp.feed_update(bot, make_command_update(user_id, "/start"))
+        return bot.session.requests
+
+    replies = asyncio.run(first_update())
+    elapsed = time.perf_counter() - started
+    print(json.dumps({"first_update_s": elapsed, "replies": replies}))
+
+
+def _run_python(args) -> str:
+    env = dict(os.environ, PYTHONPATH=ROOT_DIR)
+    return subprocess.check_output([sys.executable, *args], cwd=ROOT_DIR, env=env).decode().strip().splitlines()[-1]
+
+
+def run(runs: int, target: float):
+    import_times = [float(_run_python(["-c", IMPORT_SNIPPET])) for _ in range(runs)]
+    first_update_times = []
+    for _ in range(runs):
+        result = json.loads(_run_python(["-m", "benchmarks.bench_startup", "--child"]))
+        if result["replies"] < 1:
+            raise RuntimeError("Первый апдейт не был обработан")
+        first_update_times.append(result["first_update_s"])
+
+    median_first_update = statistics.median(first_update_times)
+    return {
+        "runs": runs,
+        "import_bot_median_ms": round(statistics.median(import_times) * 1000, 2),
+        "import_bot_max_ms": round(max(import_times) * 1000, 2),
+        "first_update_median_ms": round(median_first_update * 1000, 2),
+        "first_update_max_ms": round(max(first_update_times) * 1000, 2),
+        "target_first_update_ms": round(target * 1000, 2),
+        "meets_target": median_first_update <= target,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк холодного старта бота")
+    parser.add_argument("--runs", type=int, default=5, help="Число запусков каждого замера")
+    parser.add_argument("--target", type=float, default=DEFAULT_TARGET_S,
+                        help="Цель по времени до первого обработанного апдейта, с")
+    parser.add_argument("--output", default=None, help="Путь к JSON с результатами")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child_first_update()
+        return
+
+    from benchmarks.common import save_results
+
+    results = run(args.runs, args.target)
+    print(f"import bot: медиана {results['import_bot_median_ms']} мс, макс {results['import_bot_max_ms']} мс")
+    print(f"первый апдейт: медиана {results['first_update_median_ms']} мс, "
+          f"макс {results['first_update_max_ms']} мс (цель {results['target_first_update_ms']} мс) -> "
+          f"{'OK' if results['meets_target'] else 'ЦЕЛЬ НЕ ДОСТИГНУТА'}")
+    path = save_results("startup", results, args.output)
+    print(f"Результаты сохранены в {path}")
+
+
+if __name__ == "__main__":
+    main()
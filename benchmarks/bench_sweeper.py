@@ -0,0 +1,130 @@
+"""Бенчмарк планировщика окончаний подписок.
+
+Заполняет временную БД N пользователями с подписками (и платежами),
+окончания которых равномерно разбросаны по году, и сравнивает:
+  - наивный обход: полный просмотр таблицы users с разбором даты
+    (datetime.fromisoformat) каждой строки, как при проверке всех подписок
+    по таймеру;
+  - SubscriptionSweeper: загрузка окна окончаний по индексу, обработка
+    одного интервала (sweep) и размер кучи в памяти.
+
+Запуск:
+    python -m benchmarks.bench_sweeper
+    python -m benchmarks.bench_sweeper --users 1000000 --window-hours 24
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import Any, Dict
+
+from benchmarks.common import save_results
+from db_manager import DBManager, to_db_time
+from subscription_sweeper import SubscriptionSweeper
+
+YEAR = 365 * 86400
+
+
+def fill_database(db: DBManager, user_count: int, now: float) -> None:
+    """Пользователи и оплаченные платежи с окончанием подписки в течение года"""
+    step = YEAR / user_count
+    conn = sqlite3.connect(db.db_path)
+    try:
+        conn.executemany(
+            "INSERT INTO users (user_id, role, subscription_expires_at) VALUES (?, 'user', ?)",
+            ((user_id, to_db_time(now + user_id * step)) for user_id in range(1, user_count + 1)))
+        conn.executemany(
+            "INSERT INTO payments (user_id, amount, status, expires_at) VALUES (?, 100.0, 'paid', ?)",
+            ((user_id, to_db_time(now + user_id * step)) for user_id in range(1, user_count + 1)))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def naive_scan(db: DBManager, now: float, remind_before: float):
+    """Полный просмотр таблицы с разбором даты каждой строки"""
+    conn = sqlite3.connect(db.db_path)
+    try:
+        due = []
+        for user_id, value in conn.execute("SELECT user_id, subscription_expires_at FROM users"):
+            if value is None:
+                continue
+            expires_at = datetime.datetime.fromisoformat(value).timestamp()
+            if expires_at <= now + remind_before:
+                due.append((user_id, expires_at))
+        return due
+    finally:
+        conn.close()
+
+
+async def measure_sweeper(db: DBManager, now: float, window: float, remind_before: float) -> Dict[str, Any]:
+    clock = lambda: now
+    sweeper = SubscriptionSweeper(db, remind_before=remind_before, window=window, clock=clock)
+    started = time.perf_counter()
+    await sweeper.load()
+    load_seconds = time.perf_counter() - started
+    heap_entries = len(sweeper)
+    heap_bytes = sys.getsizeof(sweeper._heap) + heap_entries * sys.getsizeof(0.0)
+
+    # Одна обработка покрывает час: столько событий накапливается между пробуждениями в худшем случае
+    started = time.perf_counter()
+    notices = await sweeper.sweep(now + 3600)
+    sweep_seconds = time.perf_counter() - started
+    return {
+        "window_load_ms": round(load_seconds * 1000, 3),
+        "heap_entries": heap_entries,
+        "heap_kib": round(heap_bytes / 1024, 1),
+        "sweep_hour_ms": round(sweep_seconds * 1000, 3),
+        "sweep_hour_notices": len(notices),
+    }
+
+
+def run(user_count: int, window_hours: float, remind_days: float) -> Dict[str, Any]:
+    remind_before = remind_days * 86400
+    with tempfile.TemporaryDirectory() as directory:
+        db = DBManager(db_path=os.path.join(directory, "bench.db"))
+        now = float(int(time.time()))
+        started = time.perf_counter()
+        fill_database(db, user_count, now)
+        fill_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        naive_scan(db, now, remind_before)
+        naive_seconds = time.perf_counter() - started
+
+        results = asyncio.run(measure_sweeper(db, now, window_hours * 3600, remind_before))
+    return {
+        "users": user_count,
+        "window_hours": window_hours,
+        "remind_days": remind_days,
+        "fill_s": round(fill_seconds, 2),
+        "naive_scan_ms": round(naive_seconds * 1000, 3),
+        **results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк планировщика окончаний подписок")
+    parser.add_argument("--users", type=int, default=1_000_000, help="Число пользователей с подпиской")
+    parser.add_argument("--window-hours", type=float, default=24, help="Окно загрузки окончаний, часов")
+    parser.add_argument("--remind-days", type=float, default=3, help="За сколько дней напоминать")
+    parser.add_argument("--output", default=None, help="Путь к JSON с результатами")
+    args = parser.parse_args()
+
+    results = run(args.users, args.window_hours, args.remind_days)
+    print(f"Пользователей: {results['users']} (заполнение БД {results['fill_s']} с)")
+    print(f"Наивный полный обход:       {results['naive_scan_ms']} мс на каждую проверку")
+    print(f"Загрузка окна ({results['window_hours']} ч):     {results['window_load_ms']} мс, "
+          f"в куче {results['heap_entries']} моментов ({results['heap_kib']} КиБ)")
+    print(f"Обработка часа событий:     {results['sweep_hour_ms']} мс, "
+          f"уведомлений {results['sweep_hour_notices']}")
+    path = save_results("sweeper", results, args.output)
+    print(f"Результаты сохранены в {path}")
+
+
+if __name__ == "__main__":
+    main()
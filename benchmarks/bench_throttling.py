@@ -0,0 +1,90 @@
+"""Бенчмарк ограничения частоты команд.
+
+Меряет стоимость проверки ограничителя на одно сообщение и объем памяти
+таблицы ведер, когда команды присылают N разных пользователей подряд,
+а также число записей после простоя (вытеснение неактивных пользователей).
+
+Запуск:
+    python -m benchmarks.bench_throttling
+    python -m benchmarks.bench_throttling --users 1000000
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Any, Dict
+
+from benchmarks.common import save_results
+from throttling import CommandThrottle, TokenBuckets
+
+COMMANDS = ("/status", "/monitors", "/find api", "/history 1 7d")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+async def _answer(text: str) -> None:
+    pass
+
+
+async def _handler(event, data) -> None:
+    pass
+
+
+async def run(user_count: int, max_entries: int) -> Dict[str, Any]:
+    clock = Clock()
+    throttle = CommandThrottle(
+        TokenBuckets(rate=1, burst=5, max_entries=max_entries, clock=clock),
+        TokenBuckets(rate=0.2, burst=2, max_entries=max_entries, clock=clock),
+        clock=clock,
+    )
+    events = [SimpleNamespace(from_user=SimpleNamespace(id=user_id), text=COMMANDS[user_id % len(COMMANDS)],
+                              answer=_answer)
+              for user_id in range(user_count)]
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    for i, event in enumerate(events):
+        # 1000 сообщений в секунду
+        clock.now = i / 1000
+        await throttle(_handler, event, {})
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    entries = len(throttle)
+
+    # Пользователь, написавший после минуты тишины, вытесняет все простаивающие записи
+    clock.now += 60
+    await throttle(_handler, events[0], {})
+    return {
+        "users": user_count,
+        "us_per_message": round(seconds / user_count * 1_000_000, 3),
+        "entries": entries,
+        "peak_mib": round(peak / 1024 / 1024, 2),
+        "entries_after_idle": len(throttle),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк ограничения частоты команд")
+    parser.add_argument("--users", type=int, default=100_000, help="Число разных пользователей")
+    parser.add_argument("--max-entries", type=int, default=100_000, help="Предел записей в таблице ведер")
+    parser.add_argument("--output", default=None, help="Путь к JSON с результатами")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.users, args.max_entries))
+    print(f"Пользователей: {results['users']}, проверка {results['us_per_message']} мкс на сообщение")
+    print(f"Записей в таблице: {results['entries']}, пик памяти {results['peak_mib']} МиБ, "
+          f"после простоя: {results['entries_after_idle']}")
+    path = save_results("throttling", results, args.output)
+    print(f"Результаты сохранены в {path}")
+
+
+if __name__ == "__main__":
+    main()
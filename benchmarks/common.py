@@ -0,0 +1,194 @@
+"""Общие заглушки и утилиты для бенчмарков.
+
+Содержит заглушку сессии Telegram (ответы бота никуда не отправляются),
+заглушку Uptime Kuma API с синтетическими мониторами, генератор апдейтов
+и синтетическую базу данных.
+"""
+import asyncio
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from itertools import count
+from typing import Any, Dict, List, Optional
+
+# Добавляем корневую директорию проекта в PYTHONPATH для импорта
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+# Бот требует синтаксически корректный токен уже при создании
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:BENCHMARK-TOKEN")
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import SendMessage
+from aiogram.types import Chat, Message, Update, User
+
+from db_manager import DBManager, UserRole
+
+RESULTS_DIR = os.path.join(ROOT_DIR, "benchmarks", "results")
+BOT_USER = User(id=42, is_bot=True, first_name="UptimeBot")
+
+
+class StubSession(BaseSession):
+    """Сессия aiogram, которая не ходит в сеть, а только считает запросы"""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.requests = 0
+        self.errors = 0
+        self._message_ids = count(1)
+
+    async def make_request(self, bot: Bot, method, timeout: Optional[int] = None):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if isinstance(method, SendMessage):
+            return Message(
+                message_id=next(self._message_ids),
+                date=datetime.datetime.now(),
+                chat=Chat(id=method.chat_id, type="private"),
+                from_user=BOT_USER,
+                text=method.text,
+            )
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+def make_monitors(count_: int) -> List[Dict[str, Any]]:
+    """Генерирует сырые мониторы в формате uptime_kuma_api.get_monitors()"""
+    monitors = []
+    for i in range(1, count_ + 1):
+        monitors.append({
+            "id": i,
+            "name": f"service-{i:05d}",
+            "url": f"https://service-{i:05d}.example.com/health",
+            "type": "http",
+            "active": i % 50 != 0,
+            "maintenance": i % 97 == 0,
+            "status": 0 if i % 13 == 0 else 1,
+        })
+    return monitors
+
+
+def make_fake_kuma_api(monitor_count: int, latency: float = 0.0):
+    """Создает класс-заглушку UptimeKumaApi с заданным числом мониторов"""
+    monitors = make_monitors(monitor_count)
+
+    class FakeUptimeKumaApi:
+        logins = 0
+
+        def __init__(self, url, *args, **kwargs):
+            self.url = url
+
+        def login(self, username=None, password=None):
+            FakeUptimeKumaApi.logins += 1
+            if latency:
+                time.sleep(latency)
+            return {"token": "fake"}
+
+        def disconnect(self):
+            pass
+
+        def get_monitors(self):
+            if latency:
+                time.sleep(latency)
+            # Как и настоящий API, каждый вызов отдает новые словари
+            return [dict(m) for m in monitors]
+
+        def get_heartbeats(self):
+            return {}
+
+    return FakeUptimeKumaApi
+
+
+def make_synthetic_db(user_ids, blocked_ids=()) -> DBManager:
+    """Создает временную БД с пользователями для бенчмарков"""
+    tmp_dir = tempfile.mkdtemp(prefix="uptime_bot_bench_")
+    db = DBManager(db_path=os.path.join(tmp_dir, "bench.db"))
+    conn = db._get_connection()
+    try:
+        rows = [(uid, UserRole.USER.value, f"User {uid}", None) for uid in user_ids]
+        rows += [(uid, UserRole.BLOCKED.value, f"User {uid}", None) for uid in blocked_ids]
+        conn.executemany("INSERT OR REPLACE INTO users (user_id, role, name, username) VALUES (?, ?, ?, ?)", rows)
+        conn.commit()
+    finally:
+        conn.close()
+    return db
+
+
+_update_ids = count(1)
+
+
+def make_command_update(user_id: int, text: str) -> Update:
+    """Создает синтетический апдейт с командой от пользователя"""
+    user = User(id=user_id, is_bot=False, first_name=f"User {user_id}")
+    message = Message(
+        message_id=next(_update_ids),
+        date=datetime.datetime.now(),
+        chat=Chat(id=user_id, type="private"),
+        from_user=user,
+        text=text,
+    )
+    return Update(update_id=message.message_id, message=message)
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Перцентиль по отсортированному списку (ближайший ранг)"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def git_revision() -> str:
+    """Текущий коммит репозитория (или 'unknown')"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def save_results(name: str, results: Dict[str, Any], path: Optional[str] = None) -> str:
+    """Сохраняет результаты бенчмарка в JSON вместе с метаданными окружения"""
+    revision = git_revision()
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{name}-{revision}.json")
+    payload = {
+        "benchmark": name,
+        "commit": revision,
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def install_kuma_stub(monitor_count: int, latency: float = 0.0):
+    """Подменяет UptimeKumaApi в клиенте на заглушку и возвращает ее класс"""
+    import uptime_kuma_client
+
+    fake_api = make_fake_kuma_api(monitor_count, latency=latency)
+    uptime_kuma_client.UptimeKumaApi = fake_api
+    return fake_api
+
+
+def make_stub_bot(latency: float = 0.0) -> Bot:
+    """Создает бота с сессией-заглушкой"""
+    return Bot(token=os.environ["TELEGRAM_BOT_TOKEN"], session=StubSession(latency=latency))
@@ -0,0 +1,56 @@
+"""Сравнение двух JSON-файлов с результатами бенчмарков.
+
+Запуск:
+    python -m benchmarks.compare benchmarks/results/handlers-abc123.json benchmarks/results/handlers-def456.json
+
+Печатает все числовые метрики, изменившиеся больше порога (по умолчанию 10%).
+"""
+import argparse
+import json
+from typing import Any, Dict, Iterator, Tuple
+
+
+def _flatten(data: Any, prefix: str = "") -> Iterator[Tuple[str, float]]:
+    """Разворачивает вложенный словарь в пары (путь, числовое значение)"""
+    if isinstance(data, dict):
+        for key, value in data.items():
+            yield from _flatten(value, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        yield prefix, float(data)
+
+
+def compare(baseline: Dict[str, Any], candidate: Dict[str, Any], threshold: float) -> int:
+    """Печатает изменившиеся метрики и возвращает их количество"""
+    base_metrics = dict(_flatten(baseline["results"]))
+    changed = 0
+    for path, value in _flatten(candidate["results"]):
+        base_value = base_metrics.get(path)
+        if base_value is None or base_value == 0:
+            continue
+        delta = (value - base_value) / base_value
+        if abs(delta) >= threshold:
+            changed += 1
+            print(f"{path:<70} {base_value:>12.3f} -> {value:>12.3f}  ({delta:+.1%})")
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение результатов бенчмарков")
+    parser.add_argument("baseline", help="JSON с базовыми результатами")
+    parser.add_argument("candidate", help="JSON с новыми результатами")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Порог изменения (доля)")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    print(f"{baseline['benchmark']}: {baseline['commit']} -> {candidate['commit']}")
+    changed = compare(baseline, candidate, args.threshold)
+    if not changed:
+        print("Существенных изменений нет.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""Симулятор нагрузки: тысячи чатов одновременно шлют команды боту.
+
+Моделирует ситуацию «случился сбой, и все побежали смотреть /status»:
+апдейты от множества пользователей подаются в `dp.feed_update` с заданной
+интенсивностью, каждый в отдельной задаче (как при polling). Используются
+настоящие `is_authorized` и `DBManager` (на временной БД), а Telegram и
+Uptime Kuma заменены заглушками с настраиваемой задержкой.
+
+Для каждой ступени нагрузки записываются:
+- задержка событийного цикла (lag) — насколько позже срабатывает таймер;
+- глубина очередей — число обрабатываемых апдейтов и задач в пуле потоков;
+- доля ошибок — исключения обработчиков и ответы бота с ошибкой/таймаутом
+  или отказом ограничителя частоты;
+- число запросов, отклоненных ограничителем частоты;
+- число логинов в Kuma.
+
+Запуск:
+    python -m benchmarks.load_sim
+    python -m benchmarks.load_sim --users 5000 --rates 10 50 100 200 --stage-seconds 10
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict, List
+
+from aiogram.methods import SendMessage
+
+from benchmarks.common import (
+    StubSession,
+    install_kuma_stub,
+    make_command_update,
+    make_stub_bot,
+    make_synthetic_db,
+    percentile,
+    save_results,
+)
+
+import bot as bot_module
+
+LAG_SAMPLE_INTERVAL = 0.01
+# "⏳" - запрос отклонен ограничителем частоты или слит с уже выполняющимся
+ERROR_PREFIXES = ("❌", "🕒", "⏳", "У вас нет доступа")
+
+
+class RecordingSession(StubSession):
+    """Заглушка сессии, которая считает ответы бота с ошибками"""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(latency=latency)
+        self.error_replies = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        if isinstance(method, SendMessage) and method.text.startswith(ERROR_PREFIXES):
+            self.error_replies += 1
+        return await super().make_request(bot, method, timeout)
+
+
+class LoadStats:
+    """Метрики одной ступени нагрузки"""
+
+    def __init__(self):
+        self.sent = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.exceptions = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.latencies: List[float] = []
+        self.loop_lags: List[float] = []
+        self.executor_queue: List[int] = []
+
+    def summary(self, duration: float, session: RecordingSession, replies_before: int, errors_before: int,
+                logins: int) -> Dict[str, Any]:
+        self.latencies.sort()
+        self.loop_lags.sort()
+        replies = session.requests - replies_before
+        error_replies = session.error_replies - errors_before
+        return {
+            "sent": self.sent,
+            "completed": self.completed,
+            "achieved_rps": round(self.completed / duration, 2) if duration else None,
+            "cancelled": self.cancelled,
+            "exceptions": self.exceptions,
+            "error_replies": error_replies,
+            "error_rate": round((self.cancelled + self.exceptions + error_replies) / self.sent, 4)
+            if self.sent else 0.0,
+            "replies": replies,
+            "kuma_logins": logins,
+            "latency_p50_ms": round(percentile(self.latencies, 50) * 1000, 2),
+            "latency_p99_ms": round(percentile(self.latencies, 99) * 1000, 2),
+            "loop_lag_p50_ms": round(percentile(self.loop_lags, 50) * 1000, 2),
+            "loop_lag_p99_ms": round(percentile(self.loop_lags, 99) * 1000, 2),
+            "loop_lag_max_ms": round(self.loop_lags[-1] * 1000, 2) if self.loop_lags else 0.0,
+            "max_in_flight": self.max_in_flight,
+            "max_executor_queue": max(self.executor_queue, default=0),
+        }
+
+
+def _executor_queue_size(loop: asyncio.AbstractEventLoop) -> int:
+    """Число задач, ожидающих свободный поток в пуле по умолчанию (asyncio.to_thread)"""
+    executor = getattr(loop, "_default_executor", None)
+    work_queue = getattr(executor, "_work_queue", None)
+    return work_queue.qsize() if work_queue is not None else 0
+
+
+async def _sample_loop(stats: LoadStats, stop: asyncio.Event):
+    """Меряет задержку событийного цикла и глубину очередей"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + LAG_SAMPLE_INTERVAL
+        await asyncio.sleep(LAG_SAMPLE_INTERVAL)
+        stats.loop_lags.append(max(0.0, loop.time() - expected))
+        stats.executor_queue.append(_executor_queue_size(loop))
+
+
+async def _handle(dp, bot, update, stats: LoadStats):
+    stats.in_flight += 1
+    stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+    started = time.perf_counter()
+    try:
+        await dp.feed_update(bot, update)
+    except asyncio.CancelledError:
+        # Не дождались за drain_timeout: в задержки и завершенные не попадает
+        stats.cancelled += 1
+        raise
+    except Exception:
+        stats.exceptions += 1
+    finally:
+        stats.in_flight -= 1
+    stats.completed += 1
+    stats.latencies.append(time.perf_counter() - started)
+
+
+async def run_stage(dp, bot, rate: float, duration: float, user_ids: List[int], commands: List[str],
+                    drain_timeout: float) -> LoadStats:
+    """Подает апдейты с постоянной интенсивностью `rate` в течение `duration` секунд"""
+    stats = LoadStats()
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(_sample_loop(stats, stop))
+    tasks = set()
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    total = int(rate * duration)
+
+    for i in range(total):
+        # Расписание отправки считаем от начала ступени, чтобы не накапливать дрейф
+        delay = started + i / rate - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        update = make_command_update(random.choice(user_ids), random.choice(commands))
+        task = asyncio.create_task(_handle(dp, bot, update, stats))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        stats.sent += 1
+
+    if tasks:
+        await asyncio.wait(tasks, timeout=drain_timeout)
+    pending = list(tasks)
+    for task in pending:
+        task.cancel()
+    # Дожидаемся отмены, чтобы зависшие обработчики не досчитались в следующую ступень
+    await asyncio.gather(*pending, return_exceptions=True)
+    stop.set()
+    await sampler
+    return stats
+
+
+async def run(args) -> Dict[str, Any]:
+    user_ids = list(range(1_000_000, 1_000_000 + args.users))
+    blocked_count = int(args.users * args.blocked_share)
+    bot_module.db_manager = make_synthetic_db(user_ids[blocked_count:], blocked_ids=user_ids[:blocked_count])
+    fake_api = install_kuma_stub(args.monitors, latency=args.kuma_latency)
+
+    bot = make_stub_bot()
+    session = RecordingSession(latency=args.telegram_latency)
+    bot.session = session
+    dp = bot_module.get_dispatcher()
+    commands = [f"/{name}" for name in args.commands]
+    throttle = bot_module.command_throttle
+
+    stages = []
+    for rate in args.rates:
+        replies_before, errors_before, logins_before = session.requests, session.error_replies, fake_api.logins
+        throttled_before = throttle.throttled + throttle.coalesced if throttle else 0
+        stage_started = time.perf_counter()
+        stats = await run_stage(dp, bot, rate, args.stage_seconds, user_ids, commands, args.drain_timeout)
+        duration = time.perf_counter() - stage_started
+        summary = stats.summary(duration, session, replies_before, errors_before, fake_api.logins - logins_before)
+        summary["target_rps"] = rate
+        # Включая запросы, отброшенные ограничителем молча, без ответа «⏳»
+        summary["throttled"] = (throttle.throttled + throttle.coalesced if throttle else 0) - throttled_before
+        stages.append(summary)
+        print(f"{rate:>7} rps -> {summary['achieved_rps']:>8} rps  "
+              f"p99 {summary['latency_p99_ms']:>9} мс  lag p99 {summary['loop_lag_p99_ms']:>7} мс  "
+              f"in-flight {summary['max_in_flight']:>5}  executor {summary['max_executor_queue']:>5}  "
+              f"ошибки {summary['error_rate']:.2%}  отменено {summary['cancelled']}  логины {summary['kuma_logins']}")
+
+    await bot.session.close()
+    return {
+        "users": args.users,
+        "monitors": args.monitors,
+        "commands": commands,
+        "kuma_latency_s": args.kuma_latency,
+        "telegram_latency_s": args.telegram_latency,
+        "stage_seconds": args.stage_seconds,
+        "stages": stages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Симулятор нагрузки на Dispatcher бота")
+    parser.add_argument("--users", type=int, default=5000, help="Число различных пользователей")
+    parser.add_argument("--blocked-share", type=float, default=0.01, help="Доля заблокированных пользователей")
+    parser.add_argument("--monitors", type=int, default=100, help="Число мониторов в заглушке Kuma")
+    parser.add_argument("--commands", nargs="+", default=["status"], help="Команды без слеша")
+    parser.add_argument("--rates", type=float, nargs="+", default=[10, 50, 100, 200],
+                        help="Ступени интенсивности, апдейтов в секунду")
+    parser.add_argument("--stage-seconds", type=float, default=10.0, help="Длительность ступени")
+    parser.add_argument("--kuma-latency", type=float, default=0.05,
+                        help="Задержка логина и запросов к Kuma, с")
+    parser.add_argument("--telegram-latency", type=float, default=0.02, help="Задержка ответа Telegram API, с")
+    parser.add_argument("--drain-timeout", type=float, default=60.0,
+                        help="Сколько ждать завершения обработчиков после ступени, с")
+    parser.add_argument("--output", default=None, help="Путь к JSON с результатами")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    results = asyncio.run(run(args))
+    path = save_results("load_sim", results, args.output)
+    print(f"Результаты сохранены в {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,42 @@
-from aiogram import Bot, Dispatcher
-from aiogram.types import Message
-from aiogram.filters import Command
+from __future__ import annotations
+
 import asyncio
-from dotenv import load_dotenv
+import datetime
 import os
 import logging
-from uptime_kuma_client import UptimeKumaClient
+import re
+import signal
+import time
+from typing import Optional, Set, TYPE_CHECKING
+from uptime_kuma_client import UptimeKumaClient, summarize_monitors
+from kuma_federation import FederatedKumaClient, KumaInstance, summarize_by_instance
+from kuma_models import MonitorKey, parse_monitor_key
+from kuma_pool import KumaSessionPool, TenantCredentials, TenantDirectory
+from outbox import Outbox
+from subscription_sweeper import NoticeKind, SubscriptionNotice, SubscriptionSweeper
 from db_manager import DBManager, UserRole
-from typing import Optional
+from entitlements import Access, EntitlementIndex
+from monitor_watcher import MonitorWatcher
+from alert_engine import AlertConfig, AlertEngine
+from incident_recorder import IncidentRecorder
+from digest import DigestAggregator, DigestScheduler, local_day
+from heartbeat_store import HeartbeatRing, HeartbeatStore
+from snapshot_diff import MonitorSnapshot
+from monitor_search import MonitorSearchIndex
+from latency import ChartCache, charts_available, format_latency, latency_samples, render_chart
+from snapshot_store import SnapshotStore
+from leader import LeaderElection
+from throttling import CommandThrottle, TokenBuckets
+from activity_recorder import ActivityRecorder
+from admin import admin as diagnostics
+from config import Config, changed_fields, load_config
+import export
+
+if TYPE_CHECKING:
+    # aiogram импортируется лениво в фабрике приложения: импорт aiogram.types
+    # занимает секунды и не нужен, например, тестам обработчиков
+    from aiogram import Bot, Dispatcher
+    from aiogram.types import CallbackQuery, Message
 
 # Настройка логирования
 logging.basicConfig(
@@ -16,31 +45,308 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-load_dotenv(override=True)  # Загрузка переменных окружения из .env с перезаписью
+# Компоненты приложения создаются лениво, при первом обращении
+bot: Optional[Bot] = None
+dp: Optional[Dispatcher] = None
+db_manager: Optional[DBManager] = None
+watcher: Optional[MonitorWatcher] = None
+alert_engine: Optional[AlertEngine] = None
+incident_recorder: Optional[IncidentRecorder] = None
+heartbeat_store: Optional[HeartbeatStore] = None
+snapshot_store: Optional[SnapshotStore] = None
+kuma_pool: Optional[KumaSessionPool] = None
+tenant_directory: Optional[TenantDirectory] = None
+outbox: Optional[Outbox] = None
+subscription_sweeper: Optional[SubscriptionSweeper] = None
+entitlements: Optional[EntitlementIndex] = None
+digest_aggregator: Optional[DigestAggregator] = None
+digest_scheduler: Optional[DigestScheduler] = None
+search_index: Optional[MonitorSearchIndex] = None
+chart_cache: Optional[ChartCache] = None
+command_throttle: Optional[CommandThrottle] = None
+activity_recorder: Optional[ActivityRecorder] = None
+leader_election: Optional[LeaderElection] = None
+config: Optional[Config] = None
+_background_tasks: Set[asyncio.Task] = set()
+# Задачи, в которых сейчас обрабатываются апдейты: их дожидается остановка
+_handler_tasks: Set[asyncio.Task] = set()
+# Бот останавливается: смена роли реплики больше не запускает новые задачи
+_shutting_down = False
+
+def get_config() -> Config:
+    """Возвращает настройки из окружения и .env, читая их при первом обращении"""
+    global config
+    if config is None:
+        config = load_config()
+    return config
+
+def get_db_manager() -> DBManager:
+    """Возвращает менеджер БД, создавая его (и таблицы) при первом обращении"""
+    global db_manager
+    if db_manager is None:
+        db_manager = DBManager()
+    return db_manager
+
+def get_watcher() -> MonitorWatcher:
+    """Возвращает наблюдатель за мониторами, создавая его при первом обращении"""
+    global watcher
+    if watcher is None:
+        watcher = MonitorWatcher(client_factory=create_kuma_client, interval=get_config().kuma_poll_interval)
+        engine = get_alert_engine()
+        watcher.subscribe_heartbeats(engine.process_many)
+        watcher.subscribe(engine.handle_diff)
+        recorder = get_incident_recorder()
+        engine.subscribe(recorder.handle_events)
+        watcher.subscribe(recorder.handle_diff)
+        heartbeats = get_heartbeat_store()
+        watcher.subscribe_heartbeats(heartbeats.add_many)
+        watcher.subscribe(heartbeats.handle_diff)
+        aggregator = get_digest_aggregator()
+        watcher.subscribe_heartbeats(aggregator.add_many)
+        watcher.subscribe(aggregator.handle_diff)
+        engine.subscribe(aggregator.handle_events)
+        watcher.subscribe(get_search_index().handle_diff)
+    return watcher
+
+def get_kuma_instances() -> list[KumaInstance]:
+    """Возвращает список экземпляров Uptime Kuma из настроек"""
+    return list(get_config().kuma_instances)
+
+def create_kuma_client():
+    """Создает клиент Kuma: обычный для одного экземпляра, федеративный для нескольких"""
+    instances = get_kuma_instances()
+    if len(instances) == 1 and not instances[0].name:
+        instance = instances[0]
+        return UptimeKumaClient(url=instance.url, username=instance.username, password=instance.password)
+    return FederatedKumaClient(instances)
+
+def get_kuma_pool() -> KumaSessionPool:
+    """Возвращает пул сессий Kuma арендаторов, создавая его при первом обращении"""
+    global kuma_pool
+    if kuma_pool is None:
+        settings = get_config()
+        kuma_pool = KumaSessionPool(
+            max_sessions=settings.kuma_pool_size,
+            idle_timeout=settings.kuma_pool_idle_timeout,
+            max_concurrent_logins=settings.kuma_max_concurrent_logins,
+        )
+    return kuma_pool
+
+def get_tenant_directory() -> TenantDirectory:
+    """Возвращает кеш настроек арендаторов, создавая его при первом обращении"""
+    global tenant_directory
+    if tenant_directory is None:
+        tenant_directory = TenantDirectory(get_db_manager(), ttl=get_config().tenant_cache_ttl)
+    return tenant_directory
+
+async def _user_tenant(message: Message) -> Optional[TenantCredentials]:
+    """Настройки Kuma арендатора пользователя; None - пользователь работает с общим экземпляром из .env"""
+    if tenant_directory is None:
+        # Кеш арендаторов создается при запуске бота
+        return None
+    return await tenant_directory.lookup(message.from_user.id)
+
+def kuma_session(tenant: Optional[TenantCredentials]):
+    """Сессия с Kuma для обработчика: общая сессия арендатора из пула или клиент общего экземпляра"""
+    if tenant is not None:
+        return get_kuma_pool().session(tenant)
+    return create_kuma_client()
+
+def get_outbox() -> Outbox:
+    """Возвращает очередь исходящих сообщений фоновых рассылок, создавая ее при первом обращении"""
+    global outbox
+    if outbox is None:
+        rate = get_config().outbox_rate
+        outbox = Outbox(get_bot().send_message, rate=rate, burst=max(1, int(rate)))
+    return outbox
+
+def get_subscription_sweeper() -> SubscriptionSweeper:
+    """Возвращает планировщик окончаний подписок, создавая его при первом обращении"""
+    global subscription_sweeper
+    if subscription_sweeper is None:
+        subscription_sweeper = SubscriptionSweeper(
+            get_db_manager(),
+            remind_before=get_config().subscription_remind_days * 86400,
+        )
+        subscription_sweeper.subscribe(get_entitlements().handle_notices)
+        subscription_sweeper.subscribe(notify_subscriptions)
+    return subscription_sweeper
+
+def get_entitlements() -> EntitlementIndex:
+    """Возвращает индекс прав доступа пользователей, создавая его при первом обращении"""
+    global entitlements
+    if entitlements is None:
+        entitlements = EntitlementIndex(get_db_manager(), require_subscription=get_config().require_subscription)
+    return entitlements
+
+def notify_subscriptions(notices: list[SubscriptionNotice]) -> None:
+    """Подписчик планировщика подписок: ставит уведомления пользователям в очередь отправки"""
+    queue = get_outbox()
+    for notice in notices:
+        expires = format_timestamp(notice.expires_at)
+        if notice.kind == NoticeKind.REMINDER:
+            text = f"⏳ Ваша подписка заканчивается {expires}. Продлите ее, чтобы не потерять доступ к боту."
+        else:
+            text = f"❌ Ваша подписка закончилась {expires}. Продлите ее, чтобы продолжить пользоваться ботом."
+        queue.put_nowait(notice.user_id, text)
+
+def get_search_index() -> MonitorSearchIndex:
+    """Возвращает поисковый индекс мониторов фонового опроса, создавая его при первом обращении"""
+    global search_index
+    if search_index is None:
+        search_index = MonitorSearchIndex()
+    return search_index
+
+def get_chart_cache() -> ChartCache:
+    """Возвращает кеш графиков времени ответа, создавая его при первом обращении"""
+    global chart_cache
+    if chart_cache is None:
+        chart_cache = ChartCache(bucket=get_config().chart_cache_seconds)
+    return chart_cache
+
+def get_command_throttle() -> Optional[CommandThrottle]:
+    """Возвращает ограничитель частоты команд (None, если THROTTLE_RATE равен 0), создавая его при первом обращении"""
+    global command_throttle
+    if command_throttle is None:
+        settings = get_config()
+        if settings.throttle_rate <= 0:
+            return None
+        interval = settings.throttle_command_interval
+        command_throttle = CommandThrottle(
+            TokenBuckets(rate=settings.throttle_rate, burst=settings.throttle_burst),
+            # Одну и ту же команду можно повторить дважды подряд, дальше - раз в interval секунд
+            TokenBuckets(rate=1 / interval, burst=2),
+        )
+    return command_throttle
+
+def get_activity_recorder() -> Optional[ActivityRecorder]:
+    """Возвращает журнал активности пользователей (None, если ACTIVITY_FLUSH_INTERVAL равен 0), создавая его при первом обращении"""
+    global activity_recorder
+    if activity_recorder is None:
+        settings = get_config()
+        if settings.activity_flush_interval <= 0:
+            return None
+        activity_recorder = ActivityRecorder(
+            get_db_manager(),
+            flush_interval=settings.activity_flush_interval,
+            batch_size=settings.activity_batch_size,
+            max_pending=settings.activity_max_pending,
+        )
+    return activity_recorder
+
+def get_leader_election() -> Optional[LeaderElection]:
+    """Возвращает выбор ведущей реплики (None, если LEADER_ELECTION выключен), создавая его при первом обращении"""
+    global leader_election
+    if leader_election is None:
+        settings = get_config()
+        if not settings.leader_election:
+            return None
+        leader_election = LeaderElection(get_db_manager(), ttl=settings.leader_lease_ttl)
+    return leader_election
+
+def get_digest_aggregator() -> DigestAggregator:
+    """Возвращает накопитель показателей мониторов для сводок, создавая его при первом обращении"""
+    global digest_aggregator
+    if digest_aggregator is None:
+        digest_aggregator = DigestAggregator()
+    return digest_aggregator
+
+def get_digest_scheduler() -> Optional[DigestScheduler]:
+    """Возвращает рассылку сводок (None, если DIGEST_HOUR не задан), создавая ее при первом обращении"""
+    global digest_scheduler
+    if digest_scheduler is None:
+        settings = get_config()
+        if settings.digest_hour is None:
+            return None
+        digest_scheduler = DigestScheduler(
+            get_digest_aggregator(), get_db_manager(), send_digest, name_lookup=_monitor_name,
+            hour=settings.digest_hour, weekday=settings.digest_weekday,
+        )
+    return digest_scheduler
+
+def send_digest(user_id: int, text: str) -> None:
+    """Ставит сводку в очередь отправки, если у пользователя есть доступ к боту"""
+    if get_entitlements().check(user_id) is Access.ALLOWED:
+        get_outbox().put_nowait(user_id, text)
+
+def get_heartbeat_store() -> HeartbeatStore:
+    """Возвращает буферы последних проверок мониторов, создавая их при первом обращении"""
+    global heartbeat_store
+    if heartbeat_store is None:
+        heartbeat_store = HeartbeatStore(capacity=get_config().heartbeat_buffer_size)
+    return heartbeat_store
+
+def get_snapshot_store() -> SnapshotStore:
+    """Возвращает хранилище снапшота для теплого старта, создавая его при первом обращении"""
+    global snapshot_store
+    if snapshot_store is None:
+        settings = get_config()
+        snapshot_store = SnapshotStore(path=settings.snapshot_path, interval=settings.snapshot_interval)
+    return snapshot_store
+
+def _snapshot_source():
+    """Текущее состояние для сохранения на диск: снапшот наблюдателя и буферы проверок"""
+    return get_watcher().snapshot, get_heartbeat_store()
+
+def _monitor_name(monitor_id: int) -> Optional[str]:
+    """Имя монитора из последнего снапшота наблюдателя"""
+    monitor = watcher.snapshot.get(monitor_id) if watcher is not None else None
+    return monitor.name if monitor is not None else None
+
+def get_incident_recorder() -> IncidentRecorder:
+    """Возвращает регистратор инцидентов, создавая его при первом обращении"""
+    global incident_recorder
+    if incident_recorder is None:
+        incident_recorder = IncidentRecorder(get_db_manager(), name_lookup=_monitor_name)
+    return incident_recorder
+
+def get_alert_engine() -> AlertEngine:
+    """Возвращает движок оповещений, создавая его при первом обращении"""
+    global alert_engine
+    if alert_engine is None:
+        settings = get_config()
+        alert_engine = AlertEngine(AlertConfig(
+            fail_threshold=settings.alert_fail_threshold,
+            recover_threshold=settings.alert_recover_threshold,
+            flap_mode=settings.alert_flap_mode,
+        ))
+    return alert_engine
 
-# Получение настроек из переменных окружения
-API_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+def get_bot() -> Bot:
+    """Возвращает экземпляр бота, создавая его при первом обращении"""
+    global bot
+    if bot is None:
+        from aiogram import Bot
+        bot = Bot(token=get_config().telegram_bot_token)
+    return bot
 
-# Инициализация бота и диспетчера
-bot = Bot(token=API_TOKEN)
-dp = Dispatcher()
-db_manager = DBManager()
+def get_dispatcher() -> Dispatcher:
+    """Возвращает диспетчер с зарегистрированными обработчиками, создавая его при первом обращении"""
+    global dp
+    if dp is None:
+        dp = create_dispatcher()
+    return dp
 
 # Проверка доступа
 async def is_authorized(message: Message) -> bool:
-    """Проверяет, авторизован ли пользователь для использования бота (не заблокирован ли он)"""
-    user_id = message.from_user.id
-    user_info = db_manager.get_user(user_id)
+    """Проверяет, авторизован ли пользователь для использования бота
 
-    if user_info and user_info['role'] != UserRole.BLOCKED:
-        # Пользователь найден в БД и не заблокирован
+    Доступ решается по индексу прав в памяти: пользователь есть в БД, не
+    заблокирован и, если включен REQUIRE_SUBSCRIPTION, имеет активную подписку.
+    """
+    index = get_entitlements()
+    await index.fetch(message.from_user.id)
+    access = index.check(message.from_user.id)
+    if access is Access.ALLOWED:
         return True
     
-    # Пользователь не найден или заблокирован
-    await message.answer("У вас нет доступа к этому боту.")
+    if access is Access.EXPIRED:
+        await message.answer("⏳ Ваша подписка не активна. Продлите ее, чтобы пользоваться ботом.")
+    else:
+        # Пользователь не найден или заблокирован
+        await message.answer("У вас нет доступа к этому боту.")
     return False
 
-@dp.message(Command(commands=['start', 'help']))
 async def send_welcome(message: Message):
     """Обработчик команд /start и /help"""
     if not await is_authorized(message):
@@ -51,43 +357,112 @@ async def send_welcome(message: Message):
         "Доступные команды:\n"
         "/status - Получить общий статус всех сервисов\n"
         "/monitors - Показать список всех мониторов\n"
-        "/incidents - Показать список инцидентов"
+        "/incidents - Показать список инцидентов\n"
+        "/history [монитор] [период] - История инцидентов (например: /history api 7d)\n"
+        "/find <текст> - Найти монитор по имени или URL\n"
+        "/monitor <ID или имя> - Карточка монитора с временем ответа"
     )
 
-@dp.message(Command(commands=['status']))
+def format_status(summary: dict, monitors) -> str:
+    """Текст ответа на /status по сводке и списку мониторов"""
+    response = f"📊 Статус сервисов:\n\n"
+    response += f"Всего: {summary['total']}\n"
+    response += f"✅ Работают: {summary['up']}\n"
+    response += f"❌ Не работают: {summary['down']}\n"
+    response += f"🔧 На обслуживании: {summary['maintenance']}\n"
+    response += f"📈 Uptime: {summary['uptime']}%\n"
+    
+    instances = summary.get('instances')
+    if instances and (len(instances) > 1 or '' not in instances):
+        response += "\n🌍 По экземплярам Kuma:\n"
+        for name, instance in instances.items():
+            response += _format_instance_line(name, instance)
+    
+    # Если есть неработающие сервисы, покажем их
+    if summary['down'] > 0:
+        response += "\n⚠️ Сервисы с проблемами:\n"
+        for monitor in monitors:
+            if monitor['status'] == 0 and monitor['active'] and not monitor['maintenance']:
+                response += f"- {monitor['name']}\n"
+    return response
+
+def _format_instance_line(name: str, instance: dict) -> str:
+    """Строка сводки по одному экземпляру Kuma"""
+    counts = f"работают {instance['up']} из {instance['total']}, uptime {instance['uptime']}%"
+    if instance.get('ok', True):
+        latency = f" ({instance['latency'] * 1000:.0f} мс)" if instance.get('latency') else ""
+        return f"✅ {name}: {counts}{latency}\n"
+    line = f"⚠️ {name}: недоступен ({instance['error']})"
+    if instance.get('fetched_at'):
+        line += f", данные на {datetime.datetime.fromtimestamp(instance['fetched_at']).strftime('%H:%M')}: {counts}"
+    return line + "\n"
+
+def _status_emoji(monitor) -> str:
+    if monitor.get('maintenance', False):
+        return "🔧"
+    return "✅" if monitor['status'] == 1 else "❌"
+
+def format_monitor_list(monitors) -> str:
+    """Текст ответа на /monitors по списку мониторов"""
+    response = "📋 Список мониторов:\n\n"
+    
+    for monitor in monitors:
+        response += f"{_status_emoji(monitor)} {monitor['name']}"
+        if monitor.get('instance'):
+            response += f" [{monitor['instance']}]"
+        if monitor.get('url'):
+            response += f" ({monitor['url']})"
+        response += "\n"
+    return response
+
+def _following() -> bool:
+    """Реплика ведомая: мониторы знает только из снапшота, который сохраняет ведущая"""
+    return snapshot_store is not None and snapshot_store.following
+
+def _stale_snapshot() -> Optional[MonitorSnapshot]:
+    """Снапшот, которым отвечаем без обращения к Kuma
+
+    Восстановленный с диска после перезапуска, пока его не обновил опрос, или
+    (на ведомой реплике) последний снапшот ведущей.
+    """
+    if watcher is not None and (watcher.stale or _following()) and len(watcher.snapshot):
+        return watcher.snapshot
+    return None
+
+def _stale_label(snapshot: MonitorSnapshot) -> str:
+    saved_at = datetime.datetime.fromtimestamp(snapshot.taken_at).strftime('%H:%M')
+    if watcher is not None and not watcher.stale:
+        return f"ℹ️ Данные ведущей реплики на {saved_at}\n\n"
+    return f"⏳ Данные на {saved_at} (сохранены до перезапуска), обновляются...\n\n"
+
 async def get_status(message: Message):
     """Получение общего статуса всех сервисов"""
     if not await is_authorized(message):
         return
     
+    tenant = await _user_tenant(message)
+    snapshot = _stale_snapshot() if tenant is None else None
+    if snapshot is not None:
+        # Теплый старт или ведомая реплика: сразу отвечаем сохраненным состоянием
+        monitors = snapshot.monitors
+        summary = summarize_monitors(monitors)
+        summary['instances'] = summarize_by_instance(monitors)
+        await message.answer(_stale_label(snapshot) + format_status(summary, monitors))
+        return
+    
     await message.answer("🔍 Получаю статус сервисов...")
     
     try:
         async with asyncio.timeout(30):
             logger.info("Создание экземпляра UptimeKumaClient...")
-            async with UptimeKumaClient() as client:
+            async with kuma_session(tenant) as client:
                 logger.info("Экземпляр UptimeKumaClient создан. Вызов get_status_summary...")
                 summary = await client.get_status_summary()
                 logger.info("Получен ответ от get_status_summary.")
                 
-                response = f"📊 Статус сервисов:\n\n"
-                response += f"Всего: {summary['total']}\n"
-                response += f"✅ Работают: {summary['up']}\n"
-                response += f"❌ Не работают: {summary['down']}\n"
-                response += f"🔧 На обслуживании: {summary['maintenance']}\n"
-                response += f"📈 Uptime: {summary['uptime']}%\n"
-                
-                # Если есть неработающие сервисы, покажем их
-                if summary['down'] > 0:
-                    response += "\n⚠️ Сервисы с проблемами:\n"
-                    
-                    # Получаем список всех мониторов
-                    monitors = await client.get_monitors()
-                    for monitor in monitors:
-                        if monitor['status'] == 0 and monitor['active'] and not monitor['maintenance']:
-                            response += f"- {monitor['name']}\n"
-                
-                await message.answer(response)
+                # Список мониторов нужен, только если есть неработающие сервисы
+                monitors = await client.get_monitors() if summary['down'] > 0 else []
+                await message.answer(format_status(summary, monitors))
     except asyncio.TimeoutError:
         logger.error("Таймаут при обращении к Uptime Kuma")
         await message.answer("🕒 Не удалось получить ответ от Uptime Kuma вовремя. Попробуйте позже.")
@@ -95,18 +470,23 @@ async def get_status(message: Message):
         logger.error(f"Ошибка при работе с Uptime Kuma: {e}")
         await message.answer(f"❌ Произошла ошибка при связи с Uptime Kuma: {str(e)}")
 
-@dp.message(Command(commands=['monitors']))
 async def list_monitors(message: Message):
     """Получение списка всех мониторов"""
     if not await is_authorized(message):
         return
     
+    tenant = await _user_tenant(message)
+    snapshot = _stale_snapshot() if tenant is None else None
+    if snapshot is not None:
+        await message.answer(_stale_label(snapshot) + format_monitor_list(snapshot.monitors))
+        return
+    
     await message.answer("🔍 Получаю список мониторов...")
     
     try:
         async with asyncio.timeout(30):
             logger.info("Создание экземпляра UptimeKumaClient...")
-            async with UptimeKumaClient() as client:
+            async with kuma_session(tenant) as client:
                 logger.info("Экземпляр UptimeKumaClient создан. Вызов get_monitors...")
                 monitors = await client.get_monitors()
                 logger.info("Получен ответ от get_monitors.")
@@ -115,19 +495,7 @@ async def list_monitors(message: Message):
                     await message.answer("❗ Мониторы не найдены.")
                     return
                 
-                response = "📋 Список мониторов:\n\n"
-                
-                for monitor in monitors:
-                    status_emoji = "✅" if monitor['status'] == 1 else "❌"
-                    if monitor.get('maintenance', False):
-                        status_emoji = "🔧"
-                    
-                    response += f"{status_emoji} {monitor['name']}"
-                    if monitor.get('url'):
-                        response += f" ({monitor['url']})"
-                    response += "\n"
-                
-                await message.answer(response)
+                await message.answer(format_monitor_list(monitors))
     except asyncio.TimeoutError:
         logger.error("Таймаут при получении списка мониторов от Uptime Kuma")
         await message.answer("🕒 Не удалось получить список мониторов от Uptime Kuma вовремя. Попробуйте позже.")
@@ -135,18 +503,33 @@ async def list_monitors(message: Message):
         logger.error(f"Ошибка при получении списка мониторов: {e}")
         await message.answer(f"❌ Произошла ошибка: {str(e)}")
 
-@dp.message(Command(commands=['incidents']))
 async def list_incidents(message: Message):
     """Получение списка инцидентов"""
     if not await is_authorized(message):
         return
     
+    tenant = await _user_tenant(message)
     await message.answer("🔍 Получаю список инцидентов...")
     
+    if tenant is None and watcher is not None and watcher.running:
+        # Инциденты записываются наблюдателем: показываем настоящие время начала из БД
+        incidents = await asyncio.to_thread(get_db_manager().get_open_incidents)
+        if not incidents:
+            await message.answer("✅ Активных инцидентов нет.")
+            return
+        
+        response = "🚨 Список инцидентов:\n\n"
+        for incident in incidents:
+            response += f"⚠️ Проблема с {incident['monitor_name'] or incident['monitor_id']}\n"
+            response += f"Начало: {format_timestamp(incident['started_at'])}\n"
+            response += f"Длительность: {format_duration(time.time() - incident['started_at'])}\n\n"
+        await message.answer(response)
+        return
+    
     try:
         async with asyncio.timeout(30):
             logger.info("Создание экземпляра UptimeKumaClient...")
-            async with UptimeKumaClient() as client:
+            async with kuma_session(tenant) as client:
                 logger.info("Экземпляр UptimeKumaClient создан. Вызов get_incidents...")
                 incidents = await client.get_incidents()
                 logger.info("Получен ответ от get_incidents.")
@@ -174,12 +557,873 @@ async def list_incidents(message: Message):
         logger.error(f"Ошибка при получении списка инцидентов: {e}")
         await message.answer(f"❌ Произошла ошибка: {str(e)}")
 
+# --- История инцидентов ---
+HISTORY_PAGE_SIZE = 10
+# Ограничение Telegram на callback_data кнопки
+CALLBACK_DATA_LIMIT = 64
+_PERIOD_UNITS = {'m': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+_PERIOD_RE = re.compile(r'^(\d+)([mhdw])$')
+
+def parse_period(text: str) -> Optional[int]:
+    """Переводит период вида 30m, 24h, 7d, 2w в секунды (None, если это не период)"""
+    match = _PERIOD_RE.match(text.lower())
+    if not match:
+        return None
+    return int(match.group(1)) * _PERIOD_UNITS[match.group(2)]
+
+def format_timestamp(timestamp: float) -> str:
+    """Форматирует Unix-время для сообщений"""
+    return datetime.datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M')
+
+def format_duration(seconds: float) -> str:
+    """Форматирует длительность: 45с, 12м, 3ч 5м, 2д 4ч"""
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}с"
+    if seconds < 3600:
+        return f"{seconds // 60}м"
+    if seconds < 86400:
+        return f"{seconds // 3600}ч {seconds % 3600 // 60}м"
+    return f"{seconds // 86400}д {seconds % 86400 // 3600}ч"
+
+def _resolve_monitor_id(query: str) -> Optional[MonitorKey]:
+    """Находит ключ монитора по ключу ("12", "eu:12") или имени (без учета регистра) в последнем снапшоте"""
+    key = parse_monitor_key(query)
+    if key is not None:
+        return key
+    if watcher is None:
+        return None
+    query = query.casefold()
+    for monitor in watcher.snapshot:
+        if monitor.name.casefold() == query:
+            return monitor.key
+    return None
+
+def _history_callback_data(monitor_id: Optional[MonitorKey], since: Optional[int], incident_id: int) -> Optional[str]:
+    """callback_data кнопки следующей страницы истории (None, если не помещается в 64 байта)
+
+    Курсор - только ID последнего инцидента страницы: его время начала
+    берется из БД, поэтому длина данных не зависит от представления времени.
+    """
+    data = f"hist:{monitor_id if monitor_id is not None else ''}:{since if since is not None else ''}:{incident_id}"
+    if len(data.encode()) > CALLBACK_DATA_LIMIT:
+        return None
+    return data
+
+async def _send_history_page(message: Message, monitor_id: Optional[MonitorKey], since: Optional[int],
+                             before_id: Optional[int] = None):
+    """Отправляет страницу истории инцидентов с кнопкой перехода к следующей"""
+    from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+    # Запрашиваем на одну запись больше, чтобы узнать, есть ли следующая страница
+    rows = await asyncio.to_thread(get_db_manager().get_incident_history, monitor_id, since,
+                                   HISTORY_PAGE_SIZE + 1, before_id)
+    has_more = len(rows) > HISTORY_PAGE_SIZE
+    rows = rows[:HISTORY_PAGE_SIZE]
+    
+    if not rows:
+        await message.answer("✅ Инцидентов за этот период нет." if before_id is None else "Больше инцидентов нет.")
+        return
+    
+    response = "📜 История инцидентов:\n\n"
+    for row in rows:
+        response += f"⚠️ {row['monitor_name'] or row['monitor_id']}\n"
+        response += f"Начало: {format_timestamp(row['started_at'])}\n"
+        if row['resolved_at'] is not None:
+            response += f"Разрешено: {format_timestamp(row['resolved_at'])} ({format_duration(row['duration'])})\n"
+        else:
+            response += f"Продолжается: {format_duration(time.time() - row['started_at'])}\n"
+        response += "\n"
+    
+    reply_markup = None
+    callback_data = _history_callback_data(monitor_id, since, rows[-1]['incident_id']) if has_more else None
+    if callback_data is not None:
+        # Курсор следующей страницы: фильтры и ID последнего инцидента
+        builder = InlineKeyboardBuilder()
+        builder.button(text="Дальше ▶", callback_data=callback_data)
+        reply_markup = builder.as_markup()
+    elif has_more:
+        logger.warning(f"Ключ монитора {monitor_id} слишком длинный для кнопки следующей страницы истории")
+    await message.answer(response, reply_markup=reply_markup)
+
+async def show_history(message: Message):
+    """Обработчик команды /history [монитор] [период]"""
+    if not await is_authorized(message):
+        return
+    
+    if await _user_tenant(message) is not None:
+        await message.answer("ℹ️ История инцидентов ведется только для общего экземпляра Uptime Kuma.")
+        return
+    
+    args = (message.text or "").split()[1:]
+    period = None
+    if args and parse_period(args[-1]) is not None:
+        period = parse_period(args.pop())
+    
+    monitor_id = None
+    if args:
+        query = " ".join(args)
+        monitor_id = _resolve_monitor_id(query)
+        if monitor_id is None:
+            await message.answer(f"❗ Монитор «{query}» не найден.")
+            return
+    
+    # Целые секунды: то же значение попадает в кнопку следующей страницы
+    since = int(time.time() - period) if period else None
+    await _send_history_page(message, monitor_id, since)
+
+async def history_next_page(callback: CallbackQuery):
+    """Обработчик кнопки перехода к следующей странице истории"""
+    if not await is_authorized(callback):
+        return
+    
+    try:
+        # Ключ монитора может сам содержать двоеточие ("eu:12"), поэтому поля курсора берем с конца
+        parts = callback.data.split(":")
+        since, incident_id = parts[-2:]
+        monitor_id = ":".join(parts[1:-2])
+        since = int(since) if since else None
+        incident_id = int(incident_id)
+    except ValueError:
+        await callback.answer("Некорректный запрос")
+        return
+    
+    await callback.answer()
+    await _send_history_page(
+        callback.message,
+        parse_monitor_key(monitor_id) if monitor_id else None,
+        since,
+        incident_id,
+    )
+
+FIND_RESULTS_LIMIT = 10
+
+async def _fetch_monitors(tenant: Optional[TenantCredentials]) -> list:
+    """Мониторы из Kuma пользователя (для случаев, когда фоновый опрос их не знает)"""
+    async with asyncio.timeout(30):
+        async with kuma_session(tenant) as client:
+            return await client.get_monitors()
+
+def _shared_snapshot(tenant: Optional[TenantCredentials]) -> Optional[MonitorSnapshot]:
+    """Снапшот фонового опроса, если пользователь работает с общим экземпляром Kuma и опрос идет"""
+    if tenant is None and watcher is not None and (watcher.running or watcher.stale or _following()) and len(watcher.snapshot):
+        return watcher.snapshot
+    return None
+
+async def find_monitors(message: Message):
+    """Обработчик команды /find <текст>: поиск мониторов по имени и URL"""
+    from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+    if not await is_authorized(message):
+        return
+    
+    query = (message.text or "").partition(" ")[2].strip()
+    if not query:
+        await message.answer("Укажите, что искать: /find <часть имени или URL>")
+        return
+    
+    tenant = await _user_tenant(message)
+    snapshot = _shared_snapshot(tenant)
+    try:
+        if snapshot is not None:
+            index, by_key = get_search_index(), snapshot.by_key
+        else:
+            monitors = await _fetch_monitors(tenant)
+            index, by_key = MonitorSearchIndex(monitors), {monitor.key: monitor for monitor in monitors}
+    except Exception as e:
+        logger.error(f"Ошибка при получении мониторов для поиска: {e}")
+        await message.answer(f"❌ Произошла ошибка при связи с Uptime Kuma: {str(e)}")
+        return
+    
+    keys = [key for key in index.search(query, FIND_RESULTS_LIMIT) if key in by_key]
+    if not keys:
+        await message.answer(f"❗ Мониторы по запросу «{query}» не найдены.")
+        return
+    
+    builder = InlineKeyboardBuilder()
+    for key in keys:
+        monitor = by_key[key]
+        label = f"{_status_emoji(monitor)} {monitor.name}"
+        if monitor.instance:
+            label += f" [{monitor.instance}]"
+        builder.button(text=label, callback_data=f"mon:{key}")
+    builder.adjust(1)
+    await message.answer(f"🔎 Найдено по запросу «{query}»: {len(keys)}", reply_markup=builder.as_markup())
+
+def format_monitor_detail(monitor, ring: Optional[HeartbeatRing] = None) -> str:
+    """Карточка монитора"""
+    response = f"{_status_emoji(monitor)} {monitor.name}\n\n"
+    response += f"ID: {monitor.key}\n"
+    if monitor.instance:
+        response += f"Экземпляр Kuma: {monitor.instance}\n"
+    response += f"Тип: {monitor.type}\n"
+    if monitor.url:
+        response += f"URL: {monitor.url}\n"
+    if not monitor.active:
+        response += "⏸ Мониторинг приостановлен\n"
+    last = ring.latest(monitor.key) if ring is not None else None
+    if last is not None:
+        response += f"Последняя проверка: {format_timestamp(last.time)}"
+        if last.ping is not None:
+            response += f", {last.ping:.0f} мс"
+        response += "\n"
+    latency = format_latency(ring) if ring is not None else None
+    if latency is not None:
+        response += f"\n{latency}\n"
+    response += f"\nИстория инцидентов: /history {monitor.key}"
+    return response
+
+async def _load_monitor(tenant: Optional[TenantCredentials], query: str):
+    """Монитор по ключу или имени и буфер его последних проверок: (монитор, буфер) или (None, None)
+
+    Для общего экземпляра Kuma данные берутся из фонового опроса, иначе
+    мониторы и проверки запрашиваются у Kuma пользователя.
+    """
+    snapshot = _shared_snapshot(tenant)
+    if snapshot is not None:
+        monitor = snapshot.get(_resolve_monitor_id(query))
+        if monitor is None:
+            found = get_search_index().search(query, 1)
+            monitor = snapshot.get(found[0]) if found else None
+        if monitor is None:
+            return None, None
+        return monitor, get_heartbeat_store().get(monitor.key)
+    
+    async with asyncio.timeout(30):
+        async with kuma_session(tenant) as client:
+            monitors = await client.get_monitors()
+            key = parse_monitor_key(query)
+            name = query.casefold()
+            monitor = next((m for m in monitors if m.key == key or m.name.casefold() == name), None)
+            if monitor is None:
+                found = MonitorSearchIndex(monitors).search(query, 1)
+                monitor = next((m for m in monitors if found and m.key == found[0]), None)
+            if monitor is None:
+                return None, None
+            heartbeats = (await client.get_heartbeats()).get(monitor.key, [])
+    ring = HeartbeatRing(max(1, len(heartbeats)))
+    for heartbeat in sorted(heartbeats, key=lambda heartbeat: heartbeat.time):
+        ring.append(heartbeat)
+    return monitor, ring
+
+def _chart_keyboard(monitor, ring: Optional[HeartbeatRing]):
+    """Кнопка PNG-графика времени ответа (None, если график построить не из чего)"""
+    from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+    if ring is None or not len(latency_samples(ring)[1]) or not charts_available():
+        return None
+    builder = InlineKeyboardBuilder()
+    builder.button(text="📈 График времени ответа", callback_data=f"chart:{monitor.key}")
+    return builder.as_markup()
+
+async def show_monitor(message: Message):
+    """Обработчик команды /monitor <ID или имя>: карточка монитора с временем ответа"""
+    if not await is_authorized(message):
+        return
+    
+    query = (message.text or "").partition(" ")[2].strip()
+    if not query:
+        await message.answer("Укажите монитор: /monitor <ID или имя>")
+        return
+    
+    tenant = await _user_tenant(message)
+    try:
+        monitor, ring = await _load_monitor(tenant, query)
+    except Exception as e:
+        logger.error(f"Ошибка при получении монитора {query}: {e}")
+        await message.answer(f"❌ Произошла ошибка при связи с Uptime Kuma: {str(e)}")
+        return
+    if monitor is None:
+        await message.answer(f"❗ Монитор «{query}» не найден. Найти его можно командой /find")
+        return
+    
+    await message.answer(format_monitor_detail(monitor, ring), reply_markup=_chart_keyboard(monitor, ring))
+
+async def monitor_detail(callback: CallbackQuery):
+    """Обработчик кнопки монитора из результатов поиска: показывает карточку монитора"""
+    if not await is_authorized(callback):
+        return
+    
+    key = parse_monitor_key(callback.data.partition(":")[2])
+    if key is None:
+        await callback.answer("Некорректный запрос")
+        return
+    
+    tenant = await _user_tenant(callback)
+    try:
+        monitor, ring = await _load_monitor(tenant, str(key))
+    except Exception as e:
+        logger.error(f"Ошибка при получении монитора {key}: {e}")
+        await callback.answer("Uptime Kuma недоступна, попробуйте позже")
+        return
+    if monitor is None:
+        await callback.answer("Монитор не найден")
+        return
+    
+    await callback.answer()
+    await callback.message.answer(format_monitor_detail(monitor, ring), reply_markup=_chart_keyboard(monitor, ring))
+
+async def monitor_chart(callback: CallbackQuery):
+    """Обработчик кнопки графика: PNG с временем ответа монитора
+
+    График рисуется в отдельном потоке и кешируется на CHART_CACHE_SECONDS:
+    повторные запросы в этом интервале отправляют готовую картинку.
+    """
+    from aiogram.types import BufferedInputFile
+
+    if not await is_authorized(callback):
+        return
+    
+    key = parse_monitor_key(callback.data.partition(":")[2])
+    if key is None:
+        await callback.answer("Некорректный запрос")
+        return
+    
+    tenant = await _user_tenant(callback)
+    # Графики арендаторов кешируются отдельно от графиков общего экземпляра
+    cache_key = (tenant.tenant_id if tenant is not None else None, key)
+    cache = get_chart_cache()
+    image = cache.get(cache_key)
+    if image is None:
+        try:
+            monitor, ring = await _load_monitor(tenant, str(key))
+        except Exception as e:
+            logger.error(f"Ошибка при получении монитора {key}: {e}")
+            await callback.answer("Uptime Kuma недоступна, попробуйте позже")
+            return
+        times, pings = latency_samples(ring) if ring is not None else ((), ())
+        if monitor is None or not len(pings):
+            await callback.answer("Нет данных о времени ответа")
+            return
+        try:
+            image = await asyncio.to_thread(render_chart, times, pings, monitor.name)
+        except ImportError:
+            await callback.answer("Графики недоступны: не установлен matplotlib")
+            return
+        cache.put(cache_key, image)
+    
+    await callback.answer()
+    await callback.message.answer_photo(BufferedInputFile(image, filename=f"latency-{key}.png"))
+
+# --- Диагностика для администратора ---
+async def is_admin(message: Message) -> bool:
+    """Проверяет, что команду вызвал администратор"""
+    index = get_entitlements()
+    await index.fetch(message.from_user.id)
+    if index.role(message.from_user.id) is UserRole.ADMIN:
+        return True
+    await message.answer("У вас нет доступа к этой команде.")
+    return False
+
+def _command_args(message: Message) -> list[str]:
+    return (message.text or "").split()[1:]
+
+async def admin_profile(message: Message):
+    """Обработчик команды /profile [секунд] [cprofile]: профиль событийного цикла"""
+    if not await is_admin(message):
+        return
+    
+    args = _command_args(message)
+    seconds = diagnostics.clamp_seconds(args[0] if args else None, 10)
+    mode = "cprofile" if "cprofile" in args else "sample"
+    await message.answer(f"⏱ Профилирую событийный цикл {seconds:.0f} с...")
+    try:
+        report = await diagnostics.profile_loop(seconds, mode)
+    except diagnostics.DiagnosticsBusy:
+        await message.answer("Другой замер еще не закончился, попробуйте позже.")
+        return
+    await message.answer(report)
+
+async def admin_memory(message: Message):
+    """Обработчик команды /memory [секунд]: места в коде, больше всего выделяющие память"""
+    if not await is_admin(message):
+        return
+    
+    args = _command_args(message)
+    seconds = diagnostics.clamp_seconds(args[0] if args else None, 10)
+    await message.answer(f"⏱ Отслеживаю выделения памяти {seconds:.0f} с...")
+    try:
+        report = await diagnostics.memory_top(seconds)
+    except diagnostics.DiagnosticsBusy:
+        await message.answer("Другой замер еще не закончился, попробуйте позже.")
+        return
+    await message.answer(report)
+
+async def admin_loop_lag(message: Message):
+    """Обработчик команды /lag [секунд]: задержка событийного цикла"""
+    if not await is_admin(message):
+        return
+    
+    args = _command_args(message)
+    seconds = diagnostics.clamp_seconds(args[0] if args else None, 5)
+    stats = await diagnostics.measure_loop_lag(seconds)
+    await message.answer(diagnostics.format_loop_lag(seconds, stats))
+
+def _component_sizes() -> list[tuple[str, object]]:
+    """Размеры кешей и очередей уже созданных компонентов (без создания новых)"""
+    def size(component, value=len):
+        return value(component) if component is not None else None
+    
+    return [
+        ("Мониторов в снапшоте", size(watcher, lambda w: len(w.snapshot))),
+        ("Буферов проверок", size(heartbeat_store)),
+        ("Проверок в буферах", size(heartbeat_store, lambda s: sum(len(ring) for ring in s.rings.values()))),
+        ("Поисковый индекс", size(search_index)),
+        ("Состояний оповещений", size(alert_engine)),
+        ("Инцидентов в очереди записи", size(incident_recorder, lambda r: r.pending)),
+        ("Сессий Kuma в пуле", size(kuma_pool, lambda p: f"{len(p)} (занято {p.in_use}, логинов {p.logins}, вытеснено {p.evictions})")),
+        ("Кеш арендаторов", size(tenant_directory)),
+        ("Очередь исходящих", size(outbox, lambda o: f"{len(o)} (отправлено {o.sent}, ошибок {o.failed})")),
+        ("Окончаний подписок в куче", size(subscription_sweeper)),
+        ("Индекс прав доступа", size(entitlements)),
+        ("Суток в сводках", size(digest_aggregator, lambda a: len(a.days))),
+        ("Графиков в кеше", size(chart_cache)),
+        ("Записей ограничителя команд", size(command_throttle)),
+        ("Журнал активности в очереди", size(activity_recorder, lambda r: f"{len(r)} (записано {r.written}, ожиданий {r.waits}, потеряно {r.dropped})")),
+        ("Фоновых задач", len(_background_tasks)),
+    ]
+
+async def admin_stats(message: Message):
+    """Обработчик команды /stats: размеры кешей и очередей"""
+    if not await is_admin(message):
+        return
+    
+    await message.answer(diagnostics.format_sizes(_component_sizes()))
+
+EXPORT_KINDS = ("monitors", "incidents", "uptime")
+
+def _export_rows(kind: str, since: Optional[float], snapshot: Optional[MonitorSnapshot]):
+    """Колонки и генератор строк выгрузки; строки читаются уже в потоке записи файла"""
+    if kind == "monitors":
+        return export.MONITOR_COLUMNS, export.monitor_rows(snapshot, heartbeat_store)
+    if kind == "incidents":
+        return export.INCIDENT_COLUMNS, export.incident_rows(get_db_manager(), since)
+    first_day = local_day(since) if since else None
+    rows = export.uptime_rows(get_digest_aggregator(), _monitor_name, first_day)
+    return export.UPTIME_COLUMNS, rows
+
+async def export_data(message: Message):
+    """Обработчик команды /export <monitors|incidents|uptime> [csv|json] [период]
+
+    Строки выгрузки не собираются в памяти: генератор читает их из снапшота,
+    БД или сводок и сразу пишет во временный файл в отдельном потоке, а файл
+    отправляется документом и удаляется.
+    """
+    from aiogram.types import FSInputFile
+
+    if not await is_admin(message):
+        return
+    
+    args = [arg.lower() for arg in _command_args(message)]
+    kind = args.pop(0) if args else None
+    if kind not in EXPORT_KINDS:
+        await message.answer("Использование: /export monitors|incidents|uptime [csv|json] [период, например 7d]")
+        return
+    fmt = export.ExportFormat.CSV
+    period = None
+    for arg in args:
+        if arg in ("csv", "json"):
+            fmt = export.ExportFormat(arg)
+        elif parse_period(arg) is not None:
+            period = parse_period(arg)
+        else:
+            await message.answer(f"❗ Непонятный параметр «{arg}».")
+            return
+    since = time.time() - period if period else None
+    
+    snapshot = None
+    if kind == "monitors":
+        snapshot = _shared_snapshot(None)
+        if snapshot is None:
+            try:
+                snapshot = MonitorSnapshot(await _fetch_monitors(None))
+            except Exception as e:
+                logger.error(f"Ошибка при получении мониторов для выгрузки: {e}")
+                await message.answer("🕒 Uptime Kuma недоступна, попробуйте позже.")
+                return
+    
+    await message.answer(f"📦 Готовлю выгрузку {kind} ({fmt.value})...")
+    columns, rows = _export_rows(kind, since, snapshot)
+    try:
+        path, count = await asyncio.to_thread(export.export_to_file, columns, rows, fmt)
+    except Exception as e:
+        logger.error(f"Ошибка при выгрузке {kind}: {e}", exc_info=True)
+        await message.answer(f"❌ Не удалось подготовить выгрузку: {e}")
+        return
+    try:
+        filename = f"{kind}-{datetime.datetime.now():%Y%m%d-%H%M}.{fmt.value}"
+        await message.answer_document(FSInputFile(path, filename=filename), caption=f"Строк: {count}")
+    finally:
+        os.remove(path)
+
+async def admin_reload(message: Message):
+    """Обработчик команды /reload: перечитывает .env и применяет изменившиеся настройки"""
+    if not await is_admin(message):
+        return
+    
+    try:
+        applied, restart = await reload_config()
+    except ValueError as e:
+        await message.answer(f"❌ Настройки не перечитаны, бот работает с прежними: {e}")
+        return
+    if not applied and not restart:
+        await message.answer("Настройки не изменились.")
+        return
+    text = "✅ Настройки перечитаны."
+    if applied:
+        text += "\nПрименены: " + ", ".join(name.upper() for name in applied)
+    if restart:
+        text += "\nВступят в силу после перезапуска: " + ", ".join(name.upper() for name in restart)
+    await message.answer(text)
+
 # --- Инициализация приложения ---
-async def initialize_app():
+async def track_handler_task(handler, event, data):
+    """Внешняя middleware апдейтов: запоминает задачу обработчика, чтобы остановка ее дождалась"""
+    task = asyncio.current_task()
+    _handler_tasks.add(task)
+    try:
+        return await handler(event, data)
+    finally:
+        _handler_tasks.discard(task)
+
+def create_dispatcher() -> Dispatcher:
+    """Создает диспетчер и регистрирует обработчики команд"""
+    from aiogram import Dispatcher, F
+    from aiogram.filters import Command
+
+    dispatcher = Dispatcher()
+    dispatcher.message.register(send_welcome, Command(commands=['start', 'help']))
+    dispatcher.message.register(get_status, Command(commands=['status']))
+    dispatcher.message.register(list_monitors, Command(commands=['monitors']))
+    dispatcher.message.register(list_incidents, Command(commands=['incidents']))
+    dispatcher.message.register(show_history, Command(commands=['history']))
+    dispatcher.message.register(find_monitors, Command(commands=['find']))
+    dispatcher.message.register(show_monitor, Command(commands=['monitor']))
+    dispatcher.message.register(admin_profile, Command(commands=['profile']))
+    dispatcher.message.register(admin_memory, Command(commands=['memory']))
+    dispatcher.message.register(admin_loop_lag, Command(commands=['lag']))
+    dispatcher.message.register(admin_stats, Command(commands=['stats']))
+    dispatcher.message.register(export_data, Command(commands=['export']))
+    dispatcher.message.register(admin_reload, Command(commands=['reload']))
+    dispatcher.callback_query.register(history_next_page, F.data.startswith("hist:"))
+    dispatcher.callback_query.register(monitor_detail, F.data.startswith("mon:"))
+    dispatcher.callback_query.register(monitor_chart, F.data.startswith("chart:"))
+    dispatcher.update.outer_middleware(track_handler_task)
+    # Журнал активности - первым: в него попадают и запросы, отклоненные ограничителем
+    recorder = get_activity_recorder()
+    if recorder is not None:
+        dispatcher.message.middleware(recorder)
+        dispatcher.callback_query.middleware(recorder)
+    throttle = get_command_throttle()
+    if throttle is not None:
+        dispatcher.message.middleware(throttle)
+        dispatcher.callback_query.middleware(throttle)
+    dispatcher.startup.register(on_startup)
+    dispatcher.shutdown.register(on_shutdown)
+    return dispatcher
+
+def create_app() -> tuple[Bot, Dispatcher]:
+    """Фабрика приложения: загружает настройки и возвращает бота и диспетчер"""
+    get_config()
+    return get_bot(), get_dispatcher()
+
+def run_in_background(coro) -> asyncio.Task:
+    """Запускает корутину фоном, сохраняя ссылку на задачу до ее завершения"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+async def on_startup(bot: Bot):
+    """Запускает фоновые задачи, не задерживая начало обработки апдейтов"""
+    _install_reload_signal()
+    run_in_background(initialize_app(bot))
+    # Права доступа загружаются один раз (с повторами, пока БД недоступна);
+    # до окончания загрузки проверка читает пользователя из БД в отдельном потоке
+    run_in_background(get_entitlements().load_until_ready())
+    # Настройки Kuma арендаторов читаются из БД по мере обращения пользователей
+    get_tenant_directory()
+    get_kuma_pool().start()
+    get_outbox().start()
+    if get_activity_recorder() is not None:
+        activity_recorder.start()
+    # Опрос Kuma настраивается переменной KUMA_POLL_INTERVAL (в секундах, 0 - выключен)
+    if get_watcher().interval > 0:
+        await restore_snapshot()
+    election = get_leader_election()
+    if election is None:
+        await start_leader_tasks()
+        return
+    # Несколько реплик: опрос и рассылки ведет только ведущая, остальные читают ее снапшот
+    if get_watcher().interval > 0:
+        get_snapshot_store().follow(apply_leader_snapshot)
+    election.subscribe(on_leadership_change)
+    election.start()
+
+async def start_leader_tasks():
+    """Запускает задачи, которые должны работать в одной реплике: опрос Kuma, оповещения и рассылки"""
+    get_subscription_sweeper().start()
+    monitor_watcher = get_watcher()
+    if monitor_watcher.interval > 0:
+        recorder = get_incident_recorder()
+        open_incidents = await asyncio.to_thread(recorder.load_open_incidents)
+        # Восстановление монитора с открытым инцидентом должно его закрыть, даже если это первая проверка после запуска
+        get_alert_engine().assume_down(open_incidents)
+        recorder.start()
+        monitor_watcher.start()
+        get_snapshot_store().start(_snapshot_source)
+        # Сводки строятся из показателей фонового опроса
+        scheduler = get_digest_scheduler()
+        if scheduler is not None:
+            scheduler.start()
+
+async def stop_leader_tasks(save_snapshot: bool = True):
+    """Останавливает задачи ведущей реплики, дописывая инциденты и (если save_snapshot) снапшот
+
+    Реплика, потерявшая аренду, снапшот не пишет: его уже может писать новая ведущая.
+    """
+    if watcher is not None:
+        # Закрывает и общую сессию с Kuma фонового опроса
+        await watcher.stop()
+    if incident_recorder is not None:
+        await incident_recorder.stop()
+    if digest_scheduler is not None:
+        await digest_scheduler.stop()
+    if subscription_sweeper is not None:
+        await subscription_sweeper.stop()
+    if save_snapshot and watcher is not None and watcher.interval > 0 and snapshot_store is not None:
+        await snapshot_store.stop(_snapshot_source)
+
+async def on_leadership_change(is_leader: bool):
+    """Подписчик на смену роли реплики"""
+    store = get_snapshot_store()
+    await store.stop()
+    if is_leader:
+        # Продолжаем с последнего снапшота прежней ведущей реплики
+        if get_watcher().interval > 0:
+            await restore_snapshot()
+        await start_leader_tasks()
+    else:
+        # Последний снапшот пишется, только если реплика сама отдает аренду: она еще за ней
+        await stop_leader_tasks(save_snapshot=leader_election is not None and leader_election.stopping)
+        if get_watcher().interval > 0 and not _shutting_down:
+            store.follow(apply_leader_snapshot)
+
+async def _wait_tasks(tasks, timeout: float) -> set:
+    """Ждет завершения задач не дольше timeout секунд; возвращает незавершенные"""
+    tasks = {task for task in tasks if task is not asyncio.current_task()}
+    if not tasks:
+        return set()
+    _, pending = await asyncio.wait(tasks, timeout=max(0.0, timeout))
+    return pending
+
+async def _bounded_step(step, name: str, timeout: float) -> bool:
+    """Выполняет шаг остановки не дольше timeout секунд; не успевший к сроку шаг отменяется"""
+    try:
+        await asyncio.wait_for(step, timeout=max(0.0, timeout))
+        return True
+    except asyncio.TimeoutError:
+        logger.warning(f"Остановка: шаг «{name}» не завершился к сроку и прерван")
+    except Exception as e:
+        logger.error(f"Остановка: ошибка на шаге «{name}»: {e}", exc_info=True)
+    return False
+
+async def on_shutdown(dispatcher: Dispatcher):
+    """Упорядоченная остановка после прекращения приема апдейтов (SIGTERM/SIGINT)
+
+    За SHUTDOWN_TIMEOUT секунд: дожидается обработчиков, которые еще
+    выполняются (не больше половины срока), дописывает журнал активности
+    пользователей, останавливает опрос Kuma с записью инцидентов и снапшота
+    (и освобождает аренду ведущей реплики), отправляет очередь исходящих
+    сообщений и закрывает сессии Kuma. Каждый шаг ограничен оставшимся
+    сроком; что не успело завершиться, прерывается с записью в лог, а
+    обработчики отменяются и при отмене закрывают свои сессии с Kuma.
+    Сессию бота aiogram закрывает после этого обработчика.
+    """
+    global _shutting_down
+    _shutting_down = True
+    _remove_reload_signal()
+    started = time.monotonic()
+    deadline = started + get_config().shutdown_timeout
+
+    def left() -> float:
+        return max(0.0, deadline - time.monotonic())
+
+    # 1. Обработчики апдейтов, начатые до остановки приема
+    handlers = set(_handler_tasks)
+    if handlers:
+        logger.info(f"Остановка: ожидание {len(handlers)} обработчиков")
+    # Обработчикам - не больше половины срока: остальное нужно, чтобы дописать состояние на диск
+    unfinished = await _wait_tasks(handlers, left() / 2)
+    if activity_recorder is not None:
+        # Действия пользователей, накопленные в буфере, дописываются в БД
+        await _bounded_step(activity_recorder.stop(), "запись журнала активности", left())
+
+    # 2. Фоновый опрос, оповещения и рассылки: инциденты и снапшот дописываются на диск
+    if leader_election is not None:
+        # Аренда освобождается после записи снапшота: новая ведущая реплика продолжит с него.
+        # Если не успели, аренда истечет сама через LEADER_LEASE_TTL
+        await _bounded_step(leader_election.stop(), "передача роли ведущей реплики", left())
+    # С выбором ведущей снапшот уже записан до освобождения аренды (или его пишет другая реплика)
+    await _bounded_step(stop_leader_tasks(save_snapshot=leader_election is None),
+                        "остановка опроса Kuma и запись снапшота", left())
+    if snapshot_store is not None:
+        await _bounded_step(snapshot_store.stop(), "остановка чтения снапшота", left())
+
+    # 3. Очередь исходящих сообщений
+    if outbox is not None:
+        if not await outbox.drain(left()):
+            logger.warning(f"Остановка: не отправлено {len(outbox)} сообщений из очереди")
+        await outbox.stop()
+
+    # 4. Все, что не успело завершиться, отменяется
+    unfinished |= {task for task in _background_tasks if not task.done()}
+    for task in unfinished:
+        task.cancel()
+    if unfinished:
+        logger.warning(f"Остановка: отменено {len(unfinished)} незавершенных задач")
+        await _wait_tasks(unfinished, 1.0)
+    if kuma_pool is not None:
+        await kuma_pool.stop()
+    logger.info(f"Бот остановлен за {time.monotonic() - started:.2f} с")
+
+# --- Перезагрузка настроек ---
+# Одновременно идет одна перезагрузка: SIGHUP и /reload могут прийти вместе
+_reload_lock = asyncio.Lock()
+
+async def reload_config() -> tuple[list[str], list[str]]:
+    """Перечитывает окружение и .env и применяет изменившиеся настройки
+
+    Возвращает (примененные, требующие перезапуска) имена настроек. Если в
+    настройках ошибка или компонент их не принял, бросает ValueError, и бот
+    работает с прежними. Идущие запросы дорабатывают со старыми значениями:
+    сессии с Kuma не разрываются, фоновый опрос переподключается перед
+    следующим циклом.
+    """
+    global config
+    async with _reload_lock:
+        new = await asyncio.to_thread(load_config)
+        old = get_config()
+        changed = changed_fields(old, new)
+        try:
+            applied = await _apply_config(old, new, changed)
+        except Exception as e:
+            logger.error(f"Настройки не применены, возвращаются прежние: {e}", exc_info=True)
+            try:
+                await _apply_config(new, old, changed)
+            except Exception as rollback_error:
+                logger.error(f"Не удалось вернуть прежние настройки компонентам: {rollback_error}", exc_info=True)
+            raise ValueError(f"Настройки не применены: {e}") from e
+        # Текущими настройки становятся, только когда компоненты их приняли
+        config = new
+    restart = [name for name in changed if name not in applied]
+    logger.info(f"Настройки перечитаны: применено {applied or 'ничего'}, после перезапуска {restart or 'ничего'}")
+    return applied, restart
+
+async def _apply_config(old: Config, new: Config, changed: list[str]) -> list[str]:
+    """Передает новые значения уже созданным компонентам; возвращает примененные настройки"""
+    applied = []
+    if {'kuma_pool_size', 'kuma_pool_idle_timeout', 'kuma_max_concurrent_logins'} & set(changed):
+        if kuma_pool is not None:
+            await kuma_pool.configure(new.kuma_pool_size, new.kuma_pool_idle_timeout, new.kuma_max_concurrent_logins)
+        applied += [name for name in changed if name.startswith(('kuma_pool_', 'kuma_max_'))]
+    if 'tenant_cache_ttl' in changed:
+        if tenant_directory is not None:
+            tenant_directory.ttl = new.tenant_cache_ttl
+        applied.append('tenant_cache_ttl')
+    if 'chart_cache_seconds' in changed:
+        if chart_cache is not None:
+            chart_cache.set_bucket(new.chart_cache_seconds)
+        applied.append('chart_cache_seconds')
+    if 'kuma_instances' in changed:
+        # Новые клиенты создаются с новыми настройками, сессия фонового опроса - перед следующим опросом
+        if watcher is not None:
+            watcher.reconnect()
+        applied.append('kuma_instances')
+    # Включить или выключить опрос можно только перезапуском, поменять интервал - сразу
+    if 'kuma_poll_interval' in changed and old.kuma_poll_interval > 0 and new.kuma_poll_interval > 0:
+        if watcher is not None:
+            watcher.interval = new.kuma_poll_interval
+        applied.append('kuma_poll_interval')
+    if 'admin_chat_id' in changed:
+        run_in_background(initialize_app())
+        applied.append('admin_chat_id')
+    return applied
+
+async def _reload_on_signal():
+    try:
+        await reload_config()
+    except ValueError as e:
+        logger.error(f"SIGHUP: настройки не перечитаны, остаются прежние: {e}")
+
+def _install_reload_signal() -> None:
+    """SIGHUP перечитывает настройки без перезапуска бота"""
+    if not hasattr(signal, 'SIGHUP'):
+        return
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, lambda: run_in_background(_reload_on_signal()))
+    except (NotImplementedError, RuntimeError) as e:
+        logger.warning(f"Перезагрузка настроек по SIGHUP недоступна: {e}")
+
+def _remove_reload_signal() -> None:
+    if hasattr(signal, 'SIGHUP'):
+        try:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+def apply_snapshot(snapshot: MonitorSnapshot, restored: HeartbeatStore, stale: bool = True) -> None:
+    """Подменяет снапшот мониторов и буферы проверок сохраненными на диске (без проигрывания проверок)
+
+    stale=True - данные сохранены до перезапуска и ждут первого опроса Kuma.
+    """
+    store = get_heartbeat_store()
+    # Подменяем содержимое, а не объект: он уже подписан на наблюдатель
+    store.rings = restored.rings if restored.capacity == store.capacity else {
+        monitor_id: HeartbeatRing.from_arrays(store.capacity, *ring.ordered_arrays())
+        for monitor_id, ring in restored.rings.items()
+    }
+    get_watcher().restore(snapshot, store.last_ids(), stale=stale)
+    get_search_index().rebuild(snapshot.monitors)
+
+def apply_leader_snapshot(snapshot: MonitorSnapshot, restored: HeartbeatStore) -> None:
+    """Ведомая реплика: снапшот ведущей актуален, а не ждет обновления опросом"""
+    apply_snapshot(snapshot, restored, stale=False)
+
+async def restore_snapshot() -> bool:
+    """Теплый старт: восстанавливает сохраненный снапшот и буферы проверок
+
+    Пока первый опрос Kuma не завершился, /status и /monitors отвечают
+    восстановленными данными с пометкой о времени их сохранения.
+    """
+    loaded = await asyncio.to_thread(get_snapshot_store().load)
+    if loaded is None:
+        return False
+    snapshot, restored = loaded
+    apply_snapshot(snapshot, restored)
+    store = get_heartbeat_store()
+    # Восстанавливаем состояние движка оповещений без рассылки: эти переходы уже были оповещены до перезапуска
+    engine = get_alert_engine()
+    engine.reset()
+    aggregator = get_digest_aggregator()
+    # Реплика могла уже учесть часть проверок, пока была ведущей: их не считаем повторно
+    since = aggregator.last_time
+    for monitor_id, ring in store.rings.items():
+        heartbeats = list(ring.heartbeats(monitor_id))
+        for heartbeat in heartbeats:
+            engine.process(heartbeat)
+        # Показатели для сводок хранятся только в памяти: восстанавливаем хотя бы последние проверки
+        aggregator.add_many([heartbeat for heartbeat in heartbeats if heartbeat.time > since])
+    logger.info(f"Теплый старт: восстановлено {len(snapshot)} мониторов и {len(store)} буферов проверок")
+    return True
+
+async def initialize_app(bot: Optional[Bot] = None):
     """Инициализирует приложение, синхронизирует админа из .env с БД."""
     logger.info("Инициализация приложения и синхронизация администратора...")
+    bot = bot or get_bot()
+    db_manager = get_db_manager()
     
-    new_admin_id_str = os.getenv('ADMIN_CHAT_ID')
+    new_admin_id_str = get_config().admin_chat_id
     new_admin_id: Optional[int] = None
 
     if new_admin_id_str:
@@ -235,7 +1479,7 @@ async def initialize_app():
 # --- Конец инициализации ---
 
 async def main():
-    await initialize_app()
+    bot, dp = create_app()
     await dp.start_polling(bot)
 
 if __name__ == '__main__':
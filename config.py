@@ -0,0 +1,129 @@
+import dataclasses
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from alert_engine import FlapMode
+from kuma_federation import KumaInstance, load_instances
+
+
+@dataclass(frozen=True, slots=True)
+class Config:
+    """Настройки бота из переменных окружения и .env
+
+    Загружаются один раз при старте и заменяются целиком при перезагрузке
+    настроек: компоненты читают поля готового объекта и не разбирают
+    окружение на каждый запрос. Объект неизменяемый, поэтому обработчик,
+    начавший работу со старыми настройками, доработает с ними.
+    """
+    telegram_bot_token: Optional[str] = None
+    # Строка как есть: формат проверяется при синхронизации администратора
+    admin_chat_id: Optional[str] = None
+    kuma_instances: Tuple[KumaInstance, ...] = (KumaInstance("", None),)
+    kuma_poll_interval: float = 60.0
+    kuma_pool_size: int = 100
+    kuma_pool_idle_timeout: float = 300.0
+    kuma_max_concurrent_logins: int = 4
+    tenant_cache_ttl: float = 60.0
+    alert_fail_threshold: int = 3
+    alert_recover_threshold: int = 2
+    alert_flap_mode: FlapMode = FlapMode.DIGEST
+    snapshot_path: str = "data/snapshot.bin"
+    snapshot_interval: float = 60.0
+    heartbeat_buffer_size: int = 120
+    subscription_remind_days: float = 3.0
+    require_subscription: bool = False
+    digest_hour: Optional[int] = 9
+    digest_weekday: Optional[int] = 0
+    chart_cache_seconds: float = 60.0
+    throttle_rate: float = 1.0
+    throttle_burst: float = 5.0
+    throttle_command_interval: float = 5.0
+    leader_election: bool = False
+    leader_lease_ttl: float = 15.0
+    shutdown_timeout: float = 8.0
+    outbox_rate: float = 25.0
+    activity_flush_interval: float = 1.0
+    activity_batch_size: int = 500
+    activity_max_pending: int = 10_000
+
+
+def _flag(value: str) -> bool:
+    return value.lower() in ('1', 'true', 'yes')
+
+
+def _optional_int(value: str) -> Optional[int]:
+    return int(value) if value else None
+
+
+def _float_or_zero(value: str) -> float:
+    return float(value or 0)
+
+
+# Переменная окружения -> (поле Config, разбор значения)
+_FIELDS = {
+    'TELEGRAM_BOT_TOKEN': ('telegram_bot_token', str),
+    'ADMIN_CHAT_ID': ('admin_chat_id', str),
+    'KUMA_POLL_INTERVAL': ('kuma_poll_interval', _float_or_zero),
+    'KUMA_POOL_SIZE': ('kuma_pool_size', int),
+    'KUMA_POOL_IDLE_TIMEOUT': ('kuma_pool_idle_timeout', float),
+    'KUMA_MAX_CONCURRENT_LOGINS': ('kuma_max_concurrent_logins', int),
+    'TENANT_CACHE_TTL': ('tenant_cache_ttl', float),
+    'ALERT_FAIL_THRESHOLD': ('alert_fail_threshold', int),
+    'ALERT_RECOVER_THRESHOLD': ('alert_recover_threshold', int),
+    'ALERT_FLAP_MODE': ('alert_flap_mode', FlapMode),
+    'SNAPSHOT_PATH': ('snapshot_path', str),
+    'SNAPSHOT_INTERVAL': ('snapshot_interval', float),
+    'HEARTBEAT_BUFFER_SIZE': ('heartbeat_buffer_size', int),
+    'SUBSCRIPTION_REMIND_DAYS': ('subscription_remind_days', float),
+    'REQUIRE_SUBSCRIPTION': ('require_subscription', _flag),
+    'DIGEST_HOUR': ('digest_hour', _optional_int),
+    'DIGEST_WEEKDAY': ('digest_weekday', _optional_int),
+    'CHART_CACHE_SECONDS': ('chart_cache_seconds', float),
+    'THROTTLE_RATE': ('throttle_rate', _float_or_zero),
+    'THROTTLE_BURST': ('throttle_burst', float),
+    'THROTTLE_COMMAND_INTERVAL': ('throttle_command_interval', float),
+    'LEADER_ELECTION': ('leader_election', _flag),
+    'LEADER_LEASE_TTL': ('leader_lease_ttl', float),
+    'SHUTDOWN_TIMEOUT': ('shutdown_timeout', float),
+    'OUTBOX_RATE': ('outbox_rate', float),
+    'ACTIVITY_FLUSH_INTERVAL': ('activity_flush_interval', _float_or_zero),
+    'ACTIVITY_BATCH_SIZE': ('activity_batch_size', int),
+    'ACTIVITY_MAX_PENDING': ('activity_max_pending', int),
+}
+
+
+def read_env(path: Optional[str] = None, environ: Mapping[str, str] = os.environ) -> Dict[str, str]:
+    """Переменные окружения процесса, поверх которых наложен файл .env
+
+    Окружение процесса не изменяется: при повторном чтении переменная,
+    удаленная из .env, действительно пропадает из настроек.
+    """
+    from dotenv import dotenv_values
+
+    env = dict(environ)
+    # Значения из .env перекрывают окружение процесса, как и раньше при load_dotenv(override=True)
+    env.update((name, value) for name, value in dotenv_values(path).items() if value is not None)
+    return env
+
+
+def load_config(path: Optional[str] = None, environ: Mapping[str, str] = os.environ) -> Config:
+    """Читает настройки; при неверном значении бросает ValueError с именем переменной"""
+    env = read_env(path, environ)
+    values = {}
+    for name, (field, parse) in _FIELDS.items():
+        raw = env.get(name)
+        if raw is None:
+            continue
+        try:
+            values[field] = parse(raw)
+        except ValueError:
+            raise ValueError(f"Неверное значение {name}={raw!r}") from None
+    values['kuma_instances'] = tuple(load_instances(env))
+    return Config(**values)
+
+
+def changed_fields(old: Config, new: Config) -> List[str]:
+    """Поля, значения которых различаются в двух версиях настроек"""
+    return [field.name for field in dataclasses.fields(Config)
+            if getattr(old, field.name) != getattr(new, field.name)]
@@ -1,10 +1,14 @@
 import sqlite3
 import logging
 import os
+import time
+from dataclasses import dataclass
 from enum import Enum
-from typing import List, Dict, Optional, Any, Tuple
+from typing import Callable, Iterator, List, Dict, Optional, Any, Tuple, Union
 import datetime
 
+from kuma_models import parse_monitor_key
+
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
@@ -21,6 +25,24 @@ class PaymentStatus(Enum):
     EXPIRED = "expired"  # Просрочено
     CANCELLED = "cancelled" # Отменено
 
+@dataclass(slots=True)
+class UserChange:
+    """Изменение пользователя, влияющее на доступ к боту"""
+    user_id: int
+    role: Optional[UserRole] = None     # Новая роль (None - не менялась)
+    expires_at: Optional[float] = None  # Новое окончание подписки в Unix-времени (None - не менялось)
+    deleted: bool = False
+
+def to_db_time(timestamp: float) -> str:
+    """Unix-время в формате, в котором sqlite3 хранит datetime (локальное время, 'YYYY-MM-DD HH:MM:SS')"""
+    return datetime.datetime.fromtimestamp(timestamp).isoformat(sep=' ')
+
+def from_db_time(value: Any) -> float:
+    """Время из БД (datetime или его строковое представление) в Unix-время"""
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    return datetime.datetime.fromisoformat(value).timestamp()
+
 class DBManager:
     """Класс для управления базой данных SQLite"""
     
@@ -31,10 +53,27 @@ class DBManager:
             db_path: Путь к файлу базы данных SQLite
         """
         self.db_path = db_path
+        # Подписчики на изменения ролей и подписок пользователей
+        self._user_listeners: List[Callable[[UserChange], None]] = []
         # Создаем директорию, если её нет
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
         self._create_tables()
         
+    def subscribe_user_changes(self, callback: Callable[[UserChange], None]) -> None:
+        """Подписывает обработчик на изменения ролей и подписок пользователей
+        
+        Обработчик вызывается после фиксации изменения в БД, в том потоке,
+        где было сделано изменение.
+        """
+        self._user_listeners.append(callback)
+        
+    def _notify_user_change(self, change: UserChange) -> None:
+        for callback in self._user_listeners:
+            try:
+                callback(change)
+            except Exception as e:
+                logger.error(f"Ошибка в подписчике на изменения пользователя {change.user_id}: {e}", exc_info=True)
+        
     def _get_connection(self) -> sqlite3.Connection:
         """Устанавливает соединение с базой данных"""
         conn = sqlite3.connect(self.db_path)
@@ -97,6 +136,104 @@ class DBManager:
             )
             """)
             
+            # Окончания подписок выбираются диапазонами по времени: индексы вместо просмотра всей таблицы
+            cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_users_subscription_expires
+            ON users (subscription_expires_at) WHERE subscription_expires_at IS NOT NULL
+            """)
+            cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_payments_status_expires
+            ON payments (status, expires_at)
+            """)
+            
+            # Состояние фоновых планировщиков (например, до какого момента обработаны окончания подписок)
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS scheduler_state (
+                name TEXT PRIMARY KEY,
+                value REAL NOT NULL
+            )
+            """)
+            
+            # Аренды (leases) для выбора ведущей реплики: запись принадлежит holder до expires_at
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                holder TEXT NOT NULL,
+                expires_at REAL NOT NULL                -- Unix-время окончания аренды
+            )
+            """)
+            
+            # Таблица инцидентов: время хранится как Unix-время (REAL),
+            # чтобы диапазонные запросы и пагинация шли по индексу
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS incidents (
+                incident_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                monitor_id TEXT NOT NULL,               -- Ключ мониторинга: ID в Uptime Kuma или "<экземпляр>:<ID>"
+                monitor_name TEXT,                      -- Имя мониторинга на момент инцидента
+                started_at REAL NOT NULL,               -- Начало инцидента (Unix-время)
+                resolved_at REAL NULL,                  -- Окончание инцидента (Unix-время)
+                duration REAL NULL                      -- Длительность, секунды
+            )
+            """)
+            self._migrate_incident_monitor_keys(cursor)
+            cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_incidents_monitor_started
+            ON incidents (monitor_id, started_at, incident_id)
+            """)
+            cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_incidents_started
+            ON incidents (started_at, incident_id)
+            """)
+            # Открытые инциденты ищутся при каждом закрытии: частичный индекс остается маленьким
+            cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_incidents_open
+            ON incidents (monitor_id) WHERE resolved_at IS NULL
+            """)
+            
+            # Арендаторы (тенанты): собственные настройки подключения к Uptime Kuma
+            # для пользователя или группы пользователей
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS tenants (
+                tenant_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,                     -- Название арендатора (пользователь или группа)
+                kuma_url TEXT NOT NULL,                 -- URL экземпляра Uptime Kuma
+                kuma_username TEXT,                     -- Логин в Uptime Kuma
+                kuma_password TEXT,                     -- Пароль в Uptime Kuma
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """)
+            
+            # Принадлежность пользователей арендаторам: у пользователя не больше одного арендатора
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS tenant_members (
+                user_id INTEGER PRIMARY KEY,
+                tenant_id INTEGER NOT NULL,
+                FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE,
+                FOREIGN KEY (tenant_id) REFERENCES tenants (tenant_id) ON DELETE CASCADE
+            )
+            """)
+            cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_tenant_members_tenant
+            ON tenant_members (tenant_id)
+            """)
+            
+            # Журнал действий пользователей (команды и кнопки) для разбора спорных списаний
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS user_activity (
+                activity_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                command TEXT,                           -- Команда или префикс кнопки (NULL - обычное сообщение)
+                created_at REAL NOT NULL                -- Время действия (Unix-время)
+            )
+            """)
+            cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_user_activity_user_created
+            ON user_activity (user_id, created_at)
+            """)
+            
+            # Колонки, добавленные после создания таблиц: в существующих БД их еще нет
+            self._add_column_if_missing(cursor, "users", "last_seen", "REAL NULL")  # Последнее действие (Unix-время)
+            
             conn.commit()
             logger.info("Таблицы в базе данных успешно созданы или уже существуют.")
             
@@ -106,6 +243,49 @@ class DBManager:
         finally:
             conn.close()
             
+    @staticmethod
+    def _add_column_if_missing(cursor: sqlite3.Cursor, table: str, column: str, definition: str) -> None:
+        """Добавляет колонку в существующую таблицу, если ее там нет (миграция старых БД)"""
+        columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            logger.info(f"В таблицу {table} добавлена колонка {column}")
+            
+    @staticmethod
+    def _migrate_incident_monitor_keys(cursor: sqlite3.Cursor) -> None:
+        """Пересоздает таблицу инцидентов старых БД с колонкой monitor_id типа TEXT
+        
+        SQLite не умеет менять тип колонки, поэтому данные копируются в новую
+        таблицу; индексы создаются заново после миграции.
+        """
+        columns = {row[1]: row[2] for row in cursor.execute("PRAGMA table_info(incidents)")}
+        if columns.get("monitor_id", "TEXT").upper() == "TEXT":
+            return
+        cursor.execute("""
+        CREATE TABLE incidents_new (
+            incident_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            monitor_id TEXT NOT NULL,
+            monitor_name TEXT,
+            started_at REAL NOT NULL,
+            resolved_at REAL NULL,
+            duration REAL NULL
+        )
+        """)
+        cursor.execute("""
+        INSERT INTO incidents_new (incident_id, monitor_id, monitor_name, started_at, resolved_at, duration)
+        SELECT incident_id, CAST(monitor_id AS TEXT), monitor_name, started_at, resolved_at, duration FROM incidents
+        """)
+        cursor.execute("DROP TABLE incidents")
+        cursor.execute("ALTER TABLE incidents_new RENAME TO incidents")
+        logger.info("Колонка incidents.monitor_id переведена в TEXT")
+            
+    @staticmethod
+    def _incident_row(row: sqlite3.Row) -> Dict[str, Any]:
+        """Строка инцидента с ключом монитора в исходном виде (int или "<экземпляр>:<ID>")"""
+        incident = dict(row)
+        incident['monitor_id'] = parse_monitor_key(incident['monitor_id'])
+        return incident
+            
     # --- Методы для управления пользователями ---
     
     def add_or_update_user(self, user_id: int, role: UserRole, name: Optional[str] = None, username: Optional[str] = None) -> bool:
@@ -121,6 +301,7 @@ class DBManager:
             """, (user_id, role.value, name, username))
             conn.commit()
             logger.info(f"Пользователь {user_id} добавлен/обновлен с ролью {role.value}")
+            self._notify_user_change(UserChange(user_id, role=role))
             return True
         except sqlite3.Error as e:
             logger.error(f"Ошибка при добавлении/обновлении пользователя {user_id}: {e}", exc_info=True)
@@ -167,6 +348,7 @@ class DBManager:
             # Проверяем, была ли действительно удалена строка
             if cursor.rowcount > 0:
                 logger.info(f"Пользователь {user_id} удален")
+                self._notify_user_change(UserChange(user_id, deleted=True))
                 return True
             else:
                 logger.warning(f"Попытка удаления несуществующего пользователя: {user_id}")
@@ -290,6 +472,20 @@ class DBManager:
         finally:
             conn.close()
             
+    def get_monitor_subscriptions(self) -> List[Tuple[int, int]]:
+        """Все подписки пользователей на мониторы: список (user_id, monitor_id)"""
+        conn = self._get_connection()
+        conn.row_factory = None
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT user_id, monitor_id FROM user_monitors")
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при получении подписок пользователей на мониторы: {e}", exc_info=True)
+            return []
+        finally:
+            conn.close()
+            
     # --- Методы для управления платежами/подписками ---
     
     def create_payment(self, user_id: int, amount: float, status: PaymentStatus, expires_at: datetime.datetime, 
@@ -378,6 +574,8 @@ class DBManager:
             cursor.execute("UPDATE users SET subscription_expires_at = ? WHERE user_id = ?", (expires_at, user_id))
             conn.commit()
             logger.info(f"Дата окончания подписки для пользователя {user_id} обновлена на {expires_at}")
+            if cursor.rowcount > 0:
+                self._notify_user_change(UserChange(user_id, expires_at=from_db_time(expires_at)))
             return True
         except sqlite3.Error as e:
             logger.error(f"Ошибка при обновлении даты подписки пользователя {user_id}: {e}", exc_info=True)
@@ -399,6 +597,451 @@ class DBManager:
             logger.error(f"Неверный формат даты подписки для пользователя {user_id}: {user_info['subscription_expires_at']}")
             return False
 
+    def get_entitlements(self) -> Optional[List[Tuple[int, str, float]]]:
+        """Роли и окончания подписок всех пользователей для индекса доступа
+        
+        Returns:
+            Список (user_id, роль, окончание подписки в Unix-времени или 0.0, если подписки нет)
+            или None при ошибке
+        """
+        conn = self._get_connection()
+        # Кортежи вместо sqlite3.Row: строк много, а нужны только три столбца по позиции
+        conn.row_factory = None
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT user_id, role, subscription_expires_at FROM users")
+            return [(row[0], row[1], from_db_time(row[2]) if row[2] else 0.0) for row in cursor.fetchall()]
+        except (sqlite3.Error, ValueError) as e:
+            logger.error(f"Ошибка при загрузке прав доступа пользователей: {e}", exc_info=True)
+            return None
+        finally:
+            conn.close()
+            
+    def get_subscription_expiries(self, start: float, end: float, limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Пользователи, чья подписка заканчивается в интервале (start, end], по возрастанию времени
+        
+        Запрос идет по индексу idx_users_subscription_expires и читает только
+        строки из интервала, а не всю таблицу.
+        
+        Returns:
+            Список (user_id, окончание подписки в Unix-времени)
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"""
+            SELECT user_id, subscription_expires_at FROM users
+            WHERE subscription_expires_at > ? AND subscription_expires_at <= ?
+            ORDER BY subscription_expires_at
+            {'LIMIT ?' if limit is not None else ''}
+            """, (to_db_time(start), to_db_time(end)) + ((limit,) if limit is not None else ()))
+            return [(row[0], from_db_time(row[1])) for row in cursor.fetchall()]
+        except (sqlite3.Error, ValueError) as e:
+            logger.error(f"Ошибка при получении окончаний подписок: {e}", exc_info=True)
+            return []
+        finally:
+            conn.close()
+            
+    def sweep_subscriptions(self, start: float, end: float, remind_before: float,
+                            state_name: str = "subscription_sweeper") -> Optional[Tuple[List[Tuple[int, float]], List[Tuple[int, float]], int]]:
+        """Обрабатывает окончания подписок за интервал (start, end] одной транзакцией
+        
+        Помечает истекшими (EXPIRED) оплаченные и неоплаченные платежи, срок
+        которых закончился в интервале, выбирает пользователей, чья подписка
+        закончилась, и тех, кому пора напомнить (подписка заканчивается через
+        remind_before секунд), и запоминает end как обработанную границу.
+        
+        Returns:
+            (напоминания, окончания, число истекших платежей) или None при ошибке;
+            напоминания и окончания - списки (user_id, окончание подписки в Unix-времени)
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            start_text, end_text = to_db_time(start), to_db_time(end)
+            cursor.execute("""
+            UPDATE payments SET status = ?
+            WHERE status IN (?, ?) AND expires_at > ? AND expires_at <= ?
+            """, (PaymentStatus.EXPIRED.value, PaymentStatus.PAID.value, PaymentStatus.PENDING.value,
+                  start_text, end_text))
+            payments_expired = cursor.rowcount
+            
+            query = """
+            SELECT user_id, subscription_expires_at FROM users
+            WHERE subscription_expires_at > ? AND subscription_expires_at <= ?
+            ORDER BY subscription_expires_at
+            """
+            cursor.execute(query, (start_text, end_text))
+            expired = [(row[0], from_db_time(row[1])) for row in cursor.fetchall()]
+            cursor.execute(query, (to_db_time(start + remind_before), to_db_time(end + remind_before)))
+            reminders = [(row[0], from_db_time(row[1])) for row in cursor.fetchall()]
+            
+            cursor.execute("""
+            INSERT INTO scheduler_state (name, value) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET value=excluded.value
+            """, (state_name, end))
+            conn.commit()
+            if expired or reminders or payments_expired:
+                logger.info(f"Подписки: напоминаний {len(reminders)}, окончаний {len(expired)}, "
+                            f"истекших платежей {payments_expired}")
+            return reminders, expired, payments_expired
+        except (sqlite3.Error, ValueError) as e:
+            logger.error(f"Ошибка при обработке окончаний подписок: {e}", exc_info=True)
+            conn.rollback()
+            return None
+        finally:
+            conn.close()
+            
+    def get_scheduler_state(self, name: str) -> Optional[float]:
+        """Сохраненное состояние планировщика (например, обработанная граница времени)"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT value FROM scheduler_state WHERE name = ?", (name,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при чтении состояния планировщика {name}: {e}", exc_info=True)
+            return None
+        finally:
+            conn.close()
+
+    # --- Аренды для выбора ведущей реплики ---
+    
+    def try_acquire_lease(self, name: str, holder: str, ttl: float, now: Optional[float] = None) -> bool:
+        """Захватывает или продлевает аренду name на ttl секунд
+        
+        Аренда достается holder, если она свободна, истекла или уже принадлежит
+        ему. Проверка и запись - один оператор UPSERT, поэтому две реплики не
+        могут захватить аренду одновременно.
+        """
+        now = now if now is not None else time.time()
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+            INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET holder=excluded.holder, expires_at=excluded.expires_at
+            WHERE leases.holder = excluded.holder OR leases.expires_at <= ?
+            """, (name, holder, now + ttl, now))
+            acquired = cursor.rowcount > 0
+            conn.commit()
+            return acquired
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при захвате аренды {name}: {e}")
+            conn.rollback()
+            return False
+        finally:
+            conn.close()
+    
+    def release_lease(self, name: str, holder: str) -> bool:
+        """Освобождает аренду, если она принадлежит holder"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+            conn.commit()
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при освобождении аренды {name}: {e}")
+            conn.rollback()
+            return False
+        finally:
+            conn.close()
+    
+    def get_lease(self, name: str) -> Optional[Tuple[str, float]]:
+        """Текущий владелец аренды и время ее окончания (None, если аренды нет)"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT holder, expires_at FROM leases WHERE name = ?", (name,))
+            row = cursor.fetchone()
+            return (row[0], row[1]) if row else None
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при чтении аренды {name}: {e}")
+            return None
+        finally:
+            conn.close()
+
+    # --- Методы для управления арендаторами (настройками Uptime Kuma) ---
+    
+    def add_or_update_tenant(self, name: str, kuma_url: str, kuma_username: Optional[str] = None,
+                             kuma_password: Optional[str] = None, tenant_id: Optional[int] = None) -> Optional[int]:
+        """Добавляет арендатора или обновляет настройки существующего, возвращает его ID"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            if tenant_id is None:
+                cursor.execute("""
+                INSERT INTO tenants (name, kuma_url, kuma_username, kuma_password) VALUES (?, ?, ?, ?)
+                """, (name, kuma_url, kuma_username, kuma_password))
+                tenant_id = cursor.lastrowid
+            else:
+                cursor.execute("""
+                INSERT INTO tenants (tenant_id, name, kuma_url, kuma_username, kuma_password)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(tenant_id) DO UPDATE SET
+                name=excluded.name, kuma_url=excluded.kuma_url,
+                kuma_username=excluded.kuma_username, kuma_password=excluded.kuma_password
+                """, (tenant_id, name, kuma_url, kuma_username, kuma_password))
+            conn.commit()
+            logger.info(f"Арендатор {tenant_id} добавлен/обновлен: {name}")
+            return tenant_id
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при добавлении/обновлении арендатора {name}: {e}", exc_info=True)
+            conn.rollback()
+            return None
+        finally:
+            conn.close()
+            
+    def get_tenant(self, tenant_id: int) -> Optional[Dict[str, Any]]:
+        """Получает настройки арендатора по ID"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT * FROM tenants WHERE tenant_id = ?", (tenant_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при получении арендатора {tenant_id}: {e}", exc_info=True)
+            return None
+        finally:
+            conn.close()
+            
+    def delete_tenant(self, tenant_id: int) -> bool:
+        """Удаляет арендатора и привязки пользователей к нему"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("DELETE FROM tenant_members WHERE tenant_id = ?", (tenant_id,))
+            cursor.execute("DELETE FROM tenants WHERE tenant_id = ?", (tenant_id,))
+            conn.commit()
+            if cursor.rowcount > 0:
+                logger.info(f"Арендатор {tenant_id} удален")
+                return True
+            logger.warning(f"Попытка удаления несуществующего арендатора: {tenant_id}")
+            return False
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при удалении арендатора {tenant_id}: {e}", exc_info=True)
+            conn.rollback()
+            return False
+        finally:
+            conn.close()
+            
+    def assign_user_to_tenant(self, user_id: int, tenant_id: Optional[int]) -> bool:
+        """Привязывает пользователя к арендатору (None - вернуть к общему экземпляру Kuma из .env)"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            if tenant_id is None:
+                cursor.execute("DELETE FROM tenant_members WHERE user_id = ?", (user_id,))
+            else:
+                cursor.execute("""
+                INSERT INTO tenant_members (user_id, tenant_id) VALUES (?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET tenant_id=excluded.tenant_id
+                """, (user_id, tenant_id))
+            conn.commit()
+            logger.info(f"Пользователь {user_id} привязан к арендатору {tenant_id}")
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при привязке пользователя {user_id} к арендатору {tenant_id}: {e}", exc_info=True)
+            conn.rollback()
+            return False
+        finally:
+            conn.close()
+            
+    def get_user_tenant(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Получает настройки арендатора, к которому привязан пользователь"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+            SELECT t.*
+            FROM tenants t
+            JOIN tenant_members tm ON t.tenant_id = tm.tenant_id
+            WHERE tm.user_id = ?
+            """, (user_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при получении арендатора пользователя {user_id}: {e}", exc_info=True)
+            return None
+        finally:
+            conn.close()
+            
+    def count_tenants(self) -> int:
+        """Число арендаторов с собственными настройками Kuma"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT COUNT(*) FROM tenants")
+            return cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при подсчете арендаторов: {e}", exc_info=True)
+            return 0
+        finally:
+            conn.close()
+
+    # --- Методы для журнала активности пользователей ---
+    
+    def record_activity(self, events: List[Tuple[int, Optional[str], float]]) -> bool:
+        """Записывает пачку действий пользователей одной транзакцией и обновляет last_seen
+        
+        Args:
+            events: Список (user_id, command, created_at)
+        """
+        # last_seen обновляется один раз на пользователя в пачке - по последнему действию
+        last_seen: Dict[int, float] = {}
+        for user_id, _, created_at in events:
+            if created_at > last_seen.get(user_id, 0.0):
+                last_seen[user_id] = created_at
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.executemany("""
+            INSERT INTO user_activity (user_id, command, created_at) VALUES (?, ?, ?)
+            """, events)
+            cursor.executemany("""
+            UPDATE users SET last_seen = ?1 WHERE user_id = ?2 AND (last_seen IS NULL OR last_seen < ?1)
+            """, [(created_at, user_id) for user_id, created_at in last_seen.items()])
+            conn.commit()
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при записи журнала активности: {e}", exc_info=True)
+            conn.rollback()
+            return False
+        finally:
+            conn.close()
+            
+    def get_user_activity(self, user_id: int, since: Optional[float] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Последние действия пользователя (новые первыми), начиная с since"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+            SELECT * FROM user_activity WHERE user_id = ? AND created_at >= ?
+            ORDER BY created_at DESC, activity_id DESC LIMIT ?
+            """, (user_id, since if since is not None else float("-inf"), limit))
+            return [dict(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при получении журнала активности пользователя {user_id}: {e}", exc_info=True)
+            return []
+        finally:
+            conn.close()
+            
+    # --- Методы для управления инцидентами ---
+    
+    def record_incident_transitions(self, opened: List[Tuple[int, Optional[str], float]],
+                                    resolved: List[Tuple[int, float]]) -> bool:
+        """Записывает пачку открытий и закрытий инцидентов одной транзакцией
+        
+        Args:
+            opened: Список (monitor_id, monitor_name, started_at) для новых инцидентов
+            resolved: Список (monitor_id, resolved_at) для закрытия открытых инцидентов
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            if opened:
+                cursor.executemany("""
+                INSERT INTO incidents (monitor_id, monitor_name, started_at) VALUES (?, ?, ?)
+                """, opened)
+            if resolved:
+                cursor.executemany("""
+                UPDATE incidents SET resolved_at = ?1, duration = ?1 - started_at
+                WHERE monitor_id = ?2 AND resolved_at IS NULL AND started_at <= ?1
+                """, [(resolved_at, monitor_id) for monitor_id, resolved_at in resolved])
+            conn.commit()
+            logger.info(f"Записано инцидентов: открыто {len(opened)}, закрыто {len(resolved)}")
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при записи инцидентов: {e}", exc_info=True)
+            conn.rollback()
+            return False
+        finally:
+            conn.close()
+            
+    def get_open_incidents(self) -> List[Dict[str, Any]]:
+        """Получает список незакрытых инцидентов"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT * FROM incidents WHERE resolved_at IS NULL ORDER BY started_at DESC")
+            return [self._incident_row(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при получении открытых инцидентов: {e}", exc_info=True)
+            return []
+        finally:
+            conn.close()
+            
+    def get_incident_history(self, monitor_id: Optional[Union[int, str]] = None, since: Optional[float] = None,
+                             limit: int = 10, before_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Получает страницу истории инцидентов, от новых к старым
+        
+        Пагинация по ключу (keyset): для следующей страницы передайте в before_id
+        ID последнего инцидента текущей страницы. Так каждая страница читается
+        по индексу, без OFFSET.
+        
+        Args:
+            monitor_id: Только инциденты этого мониторинга
+            since: Только инциденты, начавшиеся не раньше этого Unix-времени
+            limit: Размер страницы
+            before_id: Курсор - вернуть инциденты строго старше инцидента с этим ID
+        """
+        conditions = []
+        params: List[Any] = []
+        if monitor_id is not None:
+            conditions.append("monitor_id = ?")
+            params.append(monitor_id)
+        if since is not None:
+            conditions.append("started_at >= ?")
+            params.append(since)
+        if before_id is not None:
+            conditions.append("(started_at, incident_id) < (SELECT started_at, incident_id FROM incidents WHERE incident_id = ?)")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        params.append(limit)
+        
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"""
+            SELECT * FROM incidents {where}
+            ORDER BY started_at DESC, incident_id DESC
+            LIMIT ?
+            """, params)
+            return [self._incident_row(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при получении истории инцидентов: {e}", exc_info=True)
+            return []
+        finally:
+            conn.close()
+
+    def iter_incidents(self, since: Optional[float] = None, batch_size: int = 1000) -> Iterator[Tuple]:
+        """Инциденты от старых к новым кортежами (incident_id, monitor_id, monitor_name, started_at, resolved_at, duration)
+        
+        Строки читаются пачками по batch_size через fetchmany: в памяти не
+        больше одной пачки, сколько бы инцидентов ни было в истории. Соединение
+        закрывается, когда генератор исчерпан или закрыт.
+        """
+        conn = self._get_connection()
+        conn.row_factory = None
+        try:
+            cursor = conn.execute(
+                """
+                SELECT incident_id, monitor_id, monitor_name, started_at, resolved_at, duration
+                FROM incidents WHERE started_at >= ?
+                ORDER BY started_at, incident_id
+                """, (since if since is not None else float("-inf"),))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                for incident_id, monitor_id, *rest in rows:
+                    yield (incident_id, parse_monitor_key(monitor_id), *rest)
+        finally:
+            conn.close()
+
 # Пример использования:
 if __name__ == '__main__':
     # Настройка базового логирования для примера
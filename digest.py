@@ -0,0 +1,267 @@
+import asyncio
+import datetime
+import logging
+import time
+from enum import Enum
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from alert_engine import AlertEvent, AlertKind
+from db_manager import DBManager
+from kuma_models import Heartbeat, MonitorKey, MonitorStatus
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+
+class DigestPeriod(Enum):
+    """Период сводки: число полных суток, которые она покрывает"""
+    DAILY = 1
+    WEEKLY = 7
+
+
+_PERIOD_TITLES = {
+    DigestPeriod.DAILY: "📊 Сводка за сутки",
+    DigestPeriod.WEEKLY: "📊 Сводка за неделю",
+}
+
+
+class MonitorAggregate:
+    """Накопленные показатели монитора за сутки: проверки, аптайм, инциденты, худший отклик"""
+    __slots__ = ("checks", "up", "incidents", "worst_ping")
+
+    def __init__(self):
+        self.checks = 0
+        self.up = 0
+        self.incidents = 0
+        self.worst_ping = 0.0
+
+    def merge(self, other: "MonitorAggregate") -> None:
+        self.checks += other.checks
+        self.up += other.up
+        self.incidents += other.incidents
+        if other.worst_ping > self.worst_ping:
+            self.worst_ping = other.worst_ping
+
+    @property
+    def uptime(self) -> Optional[float]:
+        """Доля успешных проверок в процентах (None, если проверок не было)"""
+        return self.up * 100.0 / self.checks if self.checks else None
+
+
+def local_day(timestamp: float) -> int:
+    """Номер локальных суток (proleptic ordinal) для Unix-времени"""
+    return datetime.date.fromtimestamp(timestamp).toordinal()
+
+
+class DigestAggregator:
+    """Показатели мониторов для сводок, накапливаемые по мере поступления проверок
+
+    Проверки и оповещения раскладываются по локальным суткам: по каждому
+    монитору хранится несколько счетчиков на сутки, а не сырые проверки.
+    Сводка за сутки или неделю складывает готовые суточные показатели, не
+    перечитывая историю. Хранятся последние keep_days суток.
+    """
+
+    def __init__(self, keep_days: int = 8):
+        self.keep_days = keep_days
+        self.days: Dict[int, Dict[MonitorKey, MonitorAggregate]] = {}
+        # Границы последних использованных суток: локальная дата не вычисляется на каждую проверку
+        self._day = 0
+        self._day_start = 0.0
+        self._day_end = 0.0
+        # Время самой поздней учтенной проверки: при повторном проигрывании буферов более ранние пропускаются
+        self.last_time = 0.0
+
+    def _bucket(self, timestamp: float) -> Dict[MonitorKey, MonitorAggregate]:
+        if not self._day_start <= timestamp < self._day_end:
+            day = local_day(timestamp)
+            start = datetime.datetime.combine(datetime.date.fromordinal(day), datetime.time()).timestamp()
+            end = datetime.datetime.combine(datetime.date.fromordinal(day + 1), datetime.time()).timestamp()
+            self._day, self._day_start, self._day_end = day, start, end
+        bucket = self.days.get(self._day)
+        if bucket is None:
+            bucket = self.days[self._day] = {}
+            self._prune()
+        return bucket
+
+    def _prune(self) -> None:
+        newest = max(self.days)
+        for day in [day for day in self.days if day <= newest - self.keep_days]:
+            del self.days[day]
+
+    def _aggregate(self, monitor_id: MonitorKey, timestamp: float) -> MonitorAggregate:
+        bucket = self._bucket(timestamp)
+        aggregate = bucket.get(monitor_id)
+        if aggregate is None:
+            aggregate = bucket[monitor_id] = MonitorAggregate()
+        return aggregate
+
+    def add_many(self, heartbeats: Iterable[Heartbeat]) -> None:
+        """Подписчик на новые проверки MonitorWatcher"""
+        last_time = self.last_time
+        for heartbeat in heartbeats:
+            if heartbeat.time > last_time:
+                last_time = heartbeat.time
+            if heartbeat.status == MonitorStatus.MAINTENANCE:
+                # Обслуживание не считается ни работой, ни простоем
+                continue
+            aggregate = self._aggregate(heartbeat.monitor_id, heartbeat.time)
+            aggregate.checks += 1
+            if heartbeat.status == MonitorStatus.UP:
+                aggregate.up += 1
+            if heartbeat.ping is not None and heartbeat.ping > aggregate.worst_ping:
+                aggregate.worst_ping = heartbeat.ping
+        self.last_time = last_time
+
+    def handle_events(self, events: List[AlertEvent]) -> None:
+        """Подписчик на оповещения AlertEngine: считает подтвержденные падения"""
+        for event in events:
+            if event.kind == AlertKind.DOWN or (event.kind == AlertKind.FLAP_RESOLVED
+                                                and event.status == MonitorStatus.DOWN):
+                self._aggregate(event.monitor_id, event.time).incidents += 1
+
+    def handle_diff(self, diff, snapshot) -> None:
+        """Подписчик на изменения снапшота: удаляет показатели удаленных мониторов"""
+        for monitor in diff.removed:
+            for bucket in self.days.values():
+                bucket.pop(monitor.key, None)
+
+    def totals(self, first_day: int, last_day: int) -> Dict[MonitorKey, MonitorAggregate]:
+        """Показатели мониторов, сложенные за сутки с first_day по last_day включительно"""
+        result: Dict[MonitorKey, MonitorAggregate] = {}
+        for day in range(first_day, last_day + 1):
+            for monitor_id, aggregate in self.days.get(day, {}).items():
+                total = result.get(monitor_id)
+                if total is None:
+                    total = result[monitor_id] = MonitorAggregate()
+                total.merge(aggregate)
+        return result
+
+
+def format_digest_line(name: str, aggregate: Optional[MonitorAggregate]) -> str:
+    """Строка сводки по одному монитору"""
+    if aggregate is None or aggregate.uptime is None:
+        return f"⚪ {name} - нет данных"
+    uptime = aggregate.uptime
+    icon = "🟢" if aggregate.incidents == 0 and uptime >= 99.0 else "🔴" if uptime < 95.0 else "🟡"
+    line = f"{icon} {name} - {uptime:.2f}%, инцидентов: {aggregate.incidents}"
+    if aggregate.worst_ping:
+        line += f", худший отклик: {aggregate.worst_ping:.0f} мс"
+    return line
+
+
+class DigestScheduler:
+    """Рассылка ежедневных и еженедельных сводок по мониторам пользователей
+
+    В заданный час берет подписки пользователей на мониторы (user_monitors),
+    группирует пользователей по одинаковым наборам мониторов и формирует
+    текст один раз на каждый уникальный набор из готовых показателей
+    DigestAggregator. Сообщения ставятся в очередь отправки (Outbox), которая
+    растягивает рассылку во времени в пределах лимитов Telegram.
+    """
+
+    def __init__(self, aggregator: DigestAggregator, db_manager: DBManager, send: Callable[[int, str], object],
+                 name_lookup: Callable[[MonitorKey], Optional[str]] = lambda monitor_id: None,
+                 hour: int = 9, weekday: Optional[int] = 0, clock: Callable[[], float] = time.time):
+        self.aggregator = aggregator
+        self.db_manager = db_manager
+        self.send = send
+        self.name_lookup = name_lookup
+        self.hour = hour
+        # День недели еженедельной сводки (0 - понедельник, None - не отправлять)
+        self.weekday = weekday
+        self.clock = clock
+        self._task: Optional[asyncio.Task] = None
+
+    def next_run(self, now: float) -> float:
+        """Ближайший момент отправки сводок после now"""
+        current = datetime.datetime.fromtimestamp(now)
+        moment = current.replace(hour=self.hour, minute=0, second=0, microsecond=0)
+        if moment <= current:
+            moment += datetime.timedelta(days=1)
+        return moment.timestamp()
+
+    def periods(self, now: float) -> List[DigestPeriod]:
+        """Какие сводки отправлять в момент now"""
+        periods = [DigestPeriod.DAILY]
+        if self.weekday is not None and datetime.date.fromtimestamp(now).weekday() == self.weekday:
+            periods.append(DigestPeriod.WEEKLY)
+        return periods
+
+    @staticmethod
+    def group_subscriptions(rows: Iterable[Tuple[int, MonitorKey]]) -> Dict[FrozenSet[MonitorKey], List[int]]:
+        """Группирует пользователей по одинаковым наборам мониторов"""
+        by_user: Dict[int, set] = {}
+        for user_id, monitor_id in rows:
+            by_user.setdefault(user_id, set()).add(monitor_id)
+        groups: Dict[FrozenSet[MonitorKey], List[int]] = {}
+        for user_id, monitors in by_user.items():
+            groups.setdefault(frozenset(monitors), []).append(user_id)
+        return groups
+
+    def render(self, period: DigestPeriod, groups: Dict[FrozenSet[MonitorKey], List[int]],
+               now: float) -> List[Tuple[List[int], str]]:
+        """Тексты сводки по уникальным наборам мониторов: [(пользователи, текст)]"""
+        last_day = local_day(now) - 1
+        first_day = last_day - period.value + 1
+        totals = self.aggregator.totals(first_day, last_day)
+        first = datetime.date.fromordinal(first_day).strftime("%d.%m")
+        last = datetime.date.fromordinal(last_day).strftime("%d.%m")
+        dates = first if first_day == last_day else f"{first} - {last}"
+        header = f"{_PERIOD_TITLES[period]} ({dates})"
+        # Строка монитора одинакова во всех наборах: формируем ее один раз
+        lines: Dict[MonitorKey, str] = {}
+        result = []
+        for monitors, user_ids in groups.items():
+            body = []
+            for monitor_id in sorted(monitors, key=str):
+                line = lines.get(monitor_id)
+                if line is None:
+                    name = self.name_lookup(monitor_id) or f"Монитор {monitor_id}"
+                    line = lines[monitor_id] = format_digest_line(name, totals.get(monitor_id))
+                body.append(line)
+            result.append((user_ids, header + "\n\n" + "\n".join(body)))
+        return result
+
+    async def deliver(self, now: Optional[float] = None) -> int:
+        """Формирует сводки и ставит их в очередь отправки; возвращает число сообщений"""
+        now = now if now is not None else self.clock()
+        rows = await asyncio.to_thread(self.db_manager.get_monitor_subscriptions)
+        groups = self.group_subscriptions(rows)
+        total = 0
+        for period in self.periods(now):
+            digests = self.render(period, groups, now)
+            sent = 0
+            for user_ids, text in digests:
+                for user_id in user_ids:
+                    self.send(user_id, text)
+                    sent += 1
+            logger.info(f"Сводка {period.name}: {sent} сообщений, уникальных наборов мониторов {len(digests)}")
+            total += sent
+        return total
+
+    async def run(self) -> None:
+        """Цикл рассылки: спит до часа отправки и ставит сводки в очередь"""
+        while True:
+            moment = self.next_run(self.clock())
+            await asyncio.sleep(max(0.0, moment - self.clock()))
+            try:
+                await self.deliver(moment)
+            except Exception as e:
+                logger.error(f"Ошибка при рассылке сводок: {e}", exc_info=True)
+
+    def start(self) -> asyncio.Task:
+        """Запускает рассылку сводок фоновой задачей"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self) -> None:
+        """Останавливает рассылку сводок"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
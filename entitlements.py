@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import threading
+import time
+from enum import Enum
+from typing import Callable, Dict, List, Optional, Tuple
+
+from db_manager import DBManager, UserChange, UserRole, from_db_time
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+
+class Access(Enum):
+    """Результат проверки доступа пользователя к боту"""
+    ALLOWED = "allowed"
+    UNKNOWN = "unknown"   # Пользователя нет в БД
+    BLOCKED = "blocked"   # Пользователь заблокирован
+    EXPIRED = "expired"   # Подписка не оплачена или закончилась
+
+
+# Роли по значению из БД: без создания UserRole на каждую строку
+_ROLES = {role.value: role for role in UserRole}
+
+
+class EntitlementIndex:
+    """Индекс прав доступа в памяти: user_id -> (роль, окончание подписки)
+
+    Загружается из БД один раз при старте и дальше обновляется событиями
+    DBManager (смена роли, оплата и продление подписки, удаление
+    пользователя), поэтому проверка доступа на каждое сообщение - это
+    поиск в словаре и сравнение с текущим временем, без запросов к БД.
+    Пока индекс не загружен, fetch подгружает пользователя из БД в
+    отдельном потоке, не блокируя событийный цикл.
+
+    Если require_subscription включен, пользователям (кроме администраторов)
+    нужна активная подписка.
+    """
+
+    def __init__(self, db_manager: DBManager, require_subscription: bool = False,
+                 clock: Callable[[], float] = time.time):
+        self.db_manager = db_manager
+        self.require_subscription = require_subscription
+        self.clock = clock
+        self._entries: Dict[int, Tuple[UserRole, float]] = {}
+        self.loaded = False
+        # Изменения, пришедшие во время загрузки: применяются поверх загруженных данных
+        self._pending: Optional[List[UserChange]] = None
+        # Загрузка и изменения из БД приходят из разных потоков
+        self._lock = threading.Lock()
+        db_manager.subscribe_user_changes(self.apply)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self) -> bool:
+        """Загружает права всех пользователей из БД (синхронно, вызывайте в отдельном потоке)"""
+        with self._lock:
+            self._pending = []
+        try:
+            rows = self.db_manager.get_entitlements()
+            if rows is None:
+                return False
+            entries = {}
+            roles = _ROLES
+            for user_id, role, expires_at in rows:
+                entries[user_id] = (roles.get(role, UserRole.BLOCKED), expires_at)
+            with self._lock:
+                # Изменения, пришедшие во время чтения, применяются до публикации словаря:
+                # более поздние изменения уже не смогут быть перезаписаны ими
+                for change in self._pending:
+                    self._apply_to(entries, change)
+                self._entries = entries
+                self.loaded = True
+            logger.info(f"Индекс прав доступа загружен: {len(entries)} пользователей")
+            return True
+        finally:
+            with self._lock:
+                self._pending = None
+
+    async def load_until_ready(self, retry_delay: float = 1.0, max_delay: float = 60.0) -> None:
+        """Загружает индекс, повторяя попытки с растущей паузой, пока БД недоступна"""
+        delay = retry_delay
+        while True:
+            try:
+                if await asyncio.to_thread(self.load):
+                    return
+            except Exception as e:
+                logger.error(f"Ошибка при загрузке индекса прав доступа: {e}", exc_info=True)
+            logger.warning(f"Индекс прав доступа не загружен, повтор через {delay:.0f} с")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_delay)
+
+    def apply(self, change: UserChange) -> None:
+        """Подписчик на изменения пользователей в БД"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(change)
+            self._apply_to(self._entries, change)
+
+    @staticmethod
+    def _apply_to(entries: Dict[int, Tuple[UserRole, float]], change: UserChange) -> None:
+        if change.deleted:
+            entries.pop(change.user_id, None)
+            return
+        role, expires_at = entries.get(change.user_id, (UserRole.USER, 0.0))
+        if change.role is not None:
+            role = change.role
+        if change.expires_at is not None:
+            expires_at = change.expires_at
+        entries[change.user_id] = (role, expires_at)
+
+    def handle_notices(self, notices) -> None:
+        """Подписчик планировщика подписок: сверяет окончания подписок с индексом"""
+        entries = self._entries
+        for notice in notices:
+            entry = entries.get(notice.user_id)
+            if entry is not None and entry[1] != notice.expires_at:
+                entries[notice.user_id] = (entry[0], notice.expires_at)
+
+    def _lookup_db(self, user_id: int) -> None:
+        user = self.db_manager.get_user(user_id)
+        if user is None:
+            return
+        expires_at = 0.0
+        if user['subscription_expires_at']:
+            try:
+                expires_at = from_db_time(user['subscription_expires_at'])
+            except ValueError:
+                logger.error(f"Неверный формат даты подписки для пользователя {user_id}: "
+                             f"{user['subscription_expires_at']}")
+        with self._lock:
+            # Изменение, пришедшее после чтения, новее прочитанного: его не перезаписываем
+            self._entries.setdefault(user_id, (_ROLES.get(user['role'], UserRole.BLOCKED), expires_at))
+
+    async def fetch(self, user_id: int) -> None:
+        """Пока индекс не загружен, подгружает пользователя из БД в отдельном потоке"""
+        if not self.loaded and user_id not in self._entries:
+            await asyncio.to_thread(self._lookup_db, user_id)
+
+    def role(self, user_id: int) -> Optional[UserRole]:
+        """Роль пользователя (None, если его нет в индексе)"""
+        entry = self._entries.get(user_id)
+        return entry[0] if entry is not None else None
+
+    def check(self, user_id: int, now: Optional[float] = None) -> Access:
+        """Проверяет доступ пользователя к боту по индексу (до загрузки сначала вызовите fetch)"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return Access.UNKNOWN
+        role, expires_at = entry
+        if role is UserRole.BLOCKED:
+            return Access.BLOCKED
+        if self.require_subscription and role is not UserRole.ADMIN:
+            if expires_at <= (now if now is not None else self.clock()):
+                return Access.EXPIRED
+        return Access.ALLOWED
@@ -0,0 +1,127 @@
+import csv
+import datetime
+import json
+import os
+import tempfile
+from enum import Enum
+from typing import Callable, Iterable, Iterator, Optional, Sequence, Tuple
+
+from db_manager import DBManager
+from digest import DigestAggregator
+from heartbeat_store import HeartbeatStore
+from kuma_models import MonitorKey
+from snapshot_diff import MonitorSnapshot
+
+# Буфер записи во временный файл: строки уходят на диск пачками такого размера
+CHUNK_SIZE = 64 * 1024
+
+
+class ExportFormat(Enum):
+    CSV = "csv"
+    JSON = "json"
+
+
+def _time(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.datetime.fromtimestamp(timestamp).isoformat(sep=" ", timespec="seconds") if timestamp else None
+
+
+MONITOR_COLUMNS = ("key", "name", "instance", "type", "url", "status", "active", "maintenance",
+                   "last_check", "last_ping_ms")
+
+
+def monitor_rows(snapshot: MonitorSnapshot, heartbeats: Optional[HeartbeatStore] = None) -> Iterator[Tuple]:
+    """Мониторы снапшота с последней проверкой из буферов"""
+    for monitor in snapshot:
+        ring = heartbeats.get(monitor.key) if heartbeats is not None else None
+        last = ring.latest(monitor.key) if ring is not None else None
+        yield (str(monitor.key), monitor.name, monitor.instance, monitor.type, monitor.url,
+               monitor.status.name.lower(), monitor.active, monitor.maintenance,
+               _time(last.time) if last else None, round(last.ping, 1) if last and last.ping is not None else None)
+
+
+INCIDENT_COLUMNS = ("incident_id", "monitor_key", "monitor_name", "started_at", "resolved_at", "duration_s")
+
+
+def incident_rows(db_manager: DBManager, since: Optional[float] = None) -> Iterator[Tuple]:
+    """История инцидентов из БД, читаемая курсором пачками"""
+    for incident_id, monitor_id, name, started_at, resolved_at, duration in db_manager.iter_incidents(since):
+        yield (incident_id, str(monitor_id), name, _time(started_at), _time(resolved_at),
+               round(duration) if duration is not None else None)
+
+
+UPTIME_COLUMNS = ("date", "monitor_key", "monitor_name", "checks", "up", "uptime_percent", "incidents",
+                  "worst_ping_ms")
+
+
+def uptime_rows(aggregator: DigestAggregator,
+                name_lookup: Callable[[MonitorKey], Optional[str]] = lambda monitor_id: None,
+                first_day: Optional[int] = None) -> Iterator[Tuple]:
+    """Аптайм мониторов по суткам из показателей сводок, начиная с суток first_day (ordinal)"""
+    for day in sorted(aggregator.days):
+        if first_day is not None and day < first_day:
+            continue
+        # Копия суток целиком: показатели дополняются событийным циклом, пока идет выгрузка
+        bucket = list(aggregator.days.get(day, {}).items())
+        date = datetime.date.fromordinal(day).isoformat()
+        for monitor_id, aggregate in sorted(bucket, key=lambda item: str(item[0])):
+            uptime = aggregate.uptime
+            yield (date, str(monitor_id), name_lookup(monitor_id), aggregate.checks, aggregate.up,
+                   round(uptime, 3) if uptime is not None else None, aggregate.incidents,
+                   round(aggregate.worst_ping, 1))
+
+
+def _write_csv(file, columns: Sequence[str], rows: Iterable[Sequence]) -> int:
+    writer = csv.writer(file)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def _write_json(file, columns: Sequence[str], rows: Iterable[Sequence], batch_size: int = 1000) -> int:
+    """JSON-массив объектов, который пишется пачками по batch_size строк, а не собирается целиком"""
+    # Один вызов кодировщика на пачку: накладные расходы json.dumps на каждую строку заметны на больших выгрузках
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+    file.write("[")
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append(dict(zip(columns, row)))
+        if len(batch) == batch_size:
+            file.write(("," if count else "") + encode(batch)[1:-1])
+            count += len(batch)
+            batch.clear()
+    if batch:
+        file.write(("," if count else "") + encode(batch)[1:-1])
+        count += len(batch)
+    file.write("]\n")
+    return count
+
+
+def export_to_file(columns: Sequence[str], rows: Iterable[Sequence], fmt: ExportFormat,
+                   directory: Optional[str] = None) -> Tuple[str, int]:
+    """Пишет строки во временный файл и возвращает (путь, число строк); файл удаляет вызывающий
+
+    Строки берутся из генератора по одной и сбрасываются на диск пачками по
+    CHUNK_SIZE байт, поэтому память не зависит от объема выгрузки. Синхронно:
+    вызывайте в отдельном потоке.
+    """
+    fd, path = tempfile.mkstemp(prefix="export-", suffix=f".{fmt.value}", dir=directory)
+    try:
+        # newline="" - переводы строк в CSV расставляет модуль csv
+        with open(fd, "w", encoding="utf-8", newline="", buffering=CHUNK_SIZE) as file:
+            if fmt is ExportFormat.CSV:
+                count = _write_csv(file, columns, rows)
+            else:
+                count = _write_json(file, columns, rows)
+    except BaseException:
+        os.remove(path)
+        raise
+    finally:
+        # Генератор мог остаться недочитанным: закрываем его, чтобы освободить курсор БД
+        close = getattr(rows, "close", None)
+        if close is not None:
+            close()
+    return path, count
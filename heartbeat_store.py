@@ -0,0 +1,146 @@
+import math
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from kuma_models import Heartbeat, MonitorKey, MonitorStatus
+
+
+class HeartbeatRing:
+    """Кольцевой буфер последних проверок одного монитора
+
+    Хранит проверки в плоских массивах фиксированной емкости: память на
+    монитор ограничена и не зависит от времени работы бота. Отсутствующий
+    ping хранится как NaN.
+    """
+    __slots__ = ("capacity", "ids", "times", "pings", "statuses", "pos", "count")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.ids = array("q", bytes(8 * capacity))
+        self.times = array("d", bytes(8 * capacity))
+        self.pings = array("f", bytes(4 * capacity))
+        self.statuses = bytearray(capacity)
+        self.pos = 0      # Куда будет записана следующая проверка
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, heartbeat: Heartbeat) -> None:
+        pos = self.pos
+        self.ids[pos] = heartbeat.id
+        self.times[pos] = heartbeat.time
+        self.pings[pos] = heartbeat.ping if heartbeat.ping is not None else math.nan
+        self.statuses[pos] = int(heartbeat.status)
+        self.pos = (pos + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def _order(self) -> Iterable[int]:
+        """Индексы заполненных ячеек от старой проверки к новой"""
+        start = (self.pos - self.count) % self.capacity
+        return (i % self.capacity for i in range(start, start + self.count))
+
+    @property
+    def last_id(self) -> int:
+        return self.ids[(self.pos - 1) % self.capacity] if self.count else 0
+
+    def latest(self, monitor_id: MonitorKey) -> Optional[Heartbeat]:
+        """Последняя проверка (None, если проверок еще не было)"""
+        if not self.count:
+            return None
+        i = (self.pos - 1) % self.capacity
+        ping = self.pings[i]
+        return Heartbeat(self.ids[i], monitor_id, MonitorStatus(self.statuses[i]), self.times[i],
+                         None if math.isnan(ping) else ping)
+
+    def heartbeats(self, monitor_id: MonitorKey) -> Iterator[Heartbeat]:
+        """Проверки в хронологическом порядке"""
+        for i in self._order():
+            ping = self.pings[i]
+            yield Heartbeat(self.ids[i], monitor_id, MonitorStatus(self.statuses[i]), self.times[i],
+                            None if math.isnan(ping) else ping)
+
+    def ordered_arrays(self):
+        """Копии массивов (ids, times, pings, statuses) в хронологическом порядке"""
+        if self.count < self.capacity or self.pos == 0:
+            # Буфер еще не переполнялся (или ровно обернулся): данные лежат подряд
+            end = self.count
+            return self.ids[:end], self.times[:end], self.pings[:end], self.statuses[:end]
+        pos = self.pos
+        return (self.ids[pos:] + self.ids[:pos], self.times[pos:] + self.times[:pos],
+                self.pings[pos:] + self.pings[:pos], self.statuses[pos:] + self.statuses[:pos])
+
+    @classmethod
+    def from_arrays(cls, capacity: int, ids: array, times: array, pings: array, statuses: bytes) -> "HeartbeatRing":
+        """Восстанавливает буфер из массивов в хронологическом порядке
+
+        Переданные массивы используются без копирования, если их длина равна емкости.
+        """
+        count = min(len(ids), capacity)
+        skip = len(ids) - count
+        if skip:
+            ids, times, pings, statuses = ids[skip:], times[skip:], pings[skip:], statuses[skip:]
+        ring = cls.__new__(cls)
+        ring.capacity = capacity
+        free = capacity - count
+        if free:
+            ids = ids + array("q", bytes(8 * free))
+            times = times + array("d", bytes(8 * free))
+            pings = pings + array("f", bytes(4 * free))
+        ring.ids = ids
+        ring.times = times
+        ring.pings = pings
+        ring.statuses = bytearray(statuses) + bytearray(free)
+        ring.count = count
+        ring.pos = count % capacity
+        return ring
+
+
+# Емкость буфера хранится в заголовке снапшота как uint16
+MAX_CAPACITY = 65535
+
+
+class HeartbeatStore:
+    """Кольцевые буферы проверок по всем мониторам"""
+
+    def __init__(self, capacity: int = 120):
+        if not 1 <= capacity <= MAX_CAPACITY:
+            raise ValueError(f"Емкость буфера проверок должна быть от 1 до {MAX_CAPACITY}, получено {capacity}")
+        self.capacity = capacity
+        self.rings: Dict[MonitorKey, HeartbeatRing] = {}
+        # Растет при каждом добавлении проверок: по нему видно, нужно ли пересохранять буферы
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self.rings)
+
+    def get(self, monitor_id: MonitorKey) -> Optional[HeartbeatRing]:
+        return self.rings.get(monitor_id)
+
+    def add_many(self, heartbeats: List[Heartbeat]) -> None:
+        """Подписчик на новые проверки MonitorWatcher"""
+        rings = self.rings
+        for heartbeat in heartbeats:
+            ring = rings.get(heartbeat.monitor_id)
+            if ring is None:
+                ring = rings[heartbeat.monitor_id] = HeartbeatRing(self.capacity)
+            ring.append(heartbeat)
+        self.version += 1
+
+    def handle_diff(self, diff, snapshot) -> None:
+        """Подписчик на изменения снапшота: удаляет буферы удаленных мониторов"""
+        for monitor in diff.removed:
+            self.rings.pop(monitor.key, None)
+
+    def copy(self) -> "HeartbeatStore":
+        """Копия буферов, которую можно читать в другом потоке, пока оригинал пополняется"""
+        store = HeartbeatStore(self.capacity)
+        from_arrays = HeartbeatRing.from_arrays
+        store.rings = {key: from_arrays(self.capacity, *ring.ordered_arrays()) for key, ring in self.rings.items()}
+        store.version = self.version
+        return store
+
+    def last_ids(self) -> Dict[MonitorKey, int]:
+        """ID последней проверки по каждому монитору"""
+        return {monitor_id: ring.last_id for monitor_id, ring in self.rings.items() if ring.count}
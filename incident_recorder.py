@@ -0,0 +1,122 @@
+import asyncio
+import logging
+from typing import Callable, List, Optional, Set, Tuple
+
+from alert_engine import AlertEvent, AlertKind
+from db_manager import DBManager
+from kuma_models import MonitorKey, MonitorStatus
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+
+class IncidentRecorder:
+    """Записывает инциденты в БД по подтвержденным сменам состояния мониторов
+
+    Получает оповещения от AlertEngine, копит открытия и закрытия инцидентов
+    в памяти и записывает их пачками: раз в flush_interval секунд или сразу,
+    когда накопилось batch_size изменений. Запись идет одной транзакцией в
+    отдельном потоке, чтобы не блокировать событийный цикл.
+    """
+
+    def __init__(self, db_manager: DBManager, name_lookup: Callable[[MonitorKey], Optional[str]] = lambda monitor_id: None,
+                 flush_interval: float = 5.0, batch_size: int = 500):
+        self.db_manager = db_manager
+        self.name_lookup = name_lookup
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._open: Set[MonitorKey] = set()
+        self._pending_opened: List[Tuple[MonitorKey, Optional[str], float]] = []
+        self._pending_resolved: List[Tuple[MonitorKey, float]] = []
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._batch_flush: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending_opened) + len(self._pending_resolved)
+
+    def load_open_incidents(self) -> Set[MonitorKey]:
+        """Загружает из БД и возвращает мониторы с открытыми инцидентами (чтобы не открыть второй после перезапуска)"""
+        self._open = {row['monitor_id'] for row in self.db_manager.get_open_incidents()}
+        logger.info(f"Загружено открытых инцидентов: {len(self._open)}")
+        return set(self._open)
+
+    def handle_events(self, events: List[AlertEvent]) -> None:
+        """Подписчик на оповещения AlertEngine"""
+        for event in events:
+            if event.kind == AlertKind.DOWN:
+                self._open_incident(event.monitor_id, event.time)
+            elif event.kind == AlertKind.UP:
+                self._resolve_incident(event.monitor_id, event.time)
+            elif event.kind == AlertKind.FLAP_RESOLVED:
+                # Пока монитор мигал, переходы подавлялись: сверяемся с итоговым состоянием
+                if event.status == MonitorStatus.DOWN:
+                    self._open_incident(event.monitor_id, event.time)
+                elif event.status == MonitorStatus.UP:
+                    self._resolve_incident(event.monitor_id, event.time)
+        self._flush_if_full()
+
+    def handle_diff(self, diff, snapshot) -> None:
+        """Подписчик на изменения снапшота: закрывает инциденты удаленных мониторов"""
+        for monitor in diff.removed:
+            # Проверок удаленного монитора больше не будет: иначе инцидент остался бы открытым навсегда
+            self._resolve_incident(monitor.key, snapshot.taken_at)
+        self._flush_if_full()
+
+    def _flush_if_full(self) -> None:
+        if self.pending >= self.batch_size and (self._batch_flush is None or self._batch_flush.done()):
+            self._batch_flush = asyncio.get_running_loop().create_task(self.flush())
+
+    def _open_incident(self, monitor_id: MonitorKey, started_at: float) -> None:
+        if monitor_id in self._open:
+            return
+        self._open.add(monitor_id)
+        self._pending_opened.append((monitor_id, self.name_lookup(monitor_id), started_at))
+
+    def _resolve_incident(self, monitor_id: MonitorKey, resolved_at: float) -> None:
+        if monitor_id not in self._open:
+            return
+        self._open.discard(monitor_id)
+        self._pending_resolved.append((monitor_id, resolved_at))
+
+    async def flush(self) -> bool:
+        """Записывает накопленные изменения в БД"""
+        async with self._flush_lock:
+            if not self.pending:
+                return True
+            opened, self._pending_opened = self._pending_opened, []
+            resolved, self._pending_resolved = self._pending_resolved, []
+            # Закрытие затрагивает только инциденты, начавшиеся не позже него, поэтому
+            # повторное открытие в той же пачке не закроется вместе с предыдущим
+            success = await asyncio.to_thread(self.db_manager.record_incident_transitions, opened, resolved)
+            if not success:
+                # Возвращаем изменения в очередь, чтобы записать их в следующий раз
+                self._pending_opened[:0] = opened
+                self._pending_resolved[:0] = resolved
+            return success
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка при записи инцидентов: {e}", exc_info=True)
+
+    def start(self) -> asyncio.Task:
+        """Запускает периодическую запись фоновой задачей"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def stop(self) -> None:
+        """Останавливает периодическую запись и записывает остаток"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Tuple
+
+from kuma_models import Heartbeat, Incident, Monitor, MonitorKey
+from uptime_kuma_client import UptimeKumaClient, summarize_monitors
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class KumaInstance:
+    """Настройки одного экземпляра Uptime Kuma"""
+    name: str
+    url: Optional[str]
+    username: Optional[str] = None
+    password: Optional[str] = None
+    # Сколько ждать ответа этого экземпляра, секунд
+    timeout: float = 10.0
+
+
+@dataclass(slots=True)
+class InstanceState:
+    """Результат последнего обращения к экземпляру Kuma"""
+    ok: bool = False
+    error: Optional[str] = None
+    # Длительность последнего обращения, секунд
+    latency: float = 0.0
+    # Время последней успешной загрузки мониторов (Unix-время)
+    fetched_at: float = 0.0
+
+
+def load_instances(env: Mapping[str, str] = os.environ) -> List[KumaInstance]:
+    """Читает список экземпляров Kuma из переменных окружения (или другого словаря настроек env)
+
+    KUMA_INSTANCES=eu,us задает имена экземпляров, для каждого читаются
+    UPTIME_KUMA_<ИМЯ>_URL, UPTIME_KUMA_<ИМЯ>_USERNAME и UPTIME_KUMA_<ИМЯ>_PASSWORD
+    (если логин и пароль не заданы, берутся общие UPTIME_KUMA_USERNAME и
+    UPTIME_KUMA_PASSWORD). Без KUMA_INSTANCES используется один экземпляр
+    из UPTIME_KUMA_URL, и ключи мониторов остаются прежними числовыми ID.
+    """
+    timeout = float(env.get("KUMA_INSTANCE_TIMEOUT", "10"))
+    names = [name.strip() for name in env.get("KUMA_INSTANCES", "").split(",") if name.strip()]
+    if not names:
+        return [KumaInstance("", env.get("UPTIME_KUMA_URL"), env.get("UPTIME_KUMA_USERNAME"),
+                             env.get("UPTIME_KUMA_PASSWORD"), timeout)]
+    instances = []
+    for name in names:
+        if ":" in name:
+            raise ValueError(f"Имя экземпляра Kuma не может содержать двоеточие: {name}")
+        prefix = f"UPTIME_KUMA_{name.upper()}_"
+        instances.append(KumaInstance(
+            name,
+            env.get(prefix + "URL"),
+            env.get(prefix + "USERNAME") or env.get("UPTIME_KUMA_USERNAME"),
+            env.get(prefix + "PASSWORD") or env.get("UPTIME_KUMA_PASSWORD"),
+            float(env.get(prefix + "TIMEOUT") or timeout),
+        ))
+    return instances
+
+
+def summarize_by_instance(monitors: List[Monitor]) -> Dict[str, Dict[str, Any]]:
+    """Сводки о статусе мониторов отдельно по каждому экземпляру Kuma"""
+    groups: Dict[str, List[Monitor]] = {}
+    for monitor in monitors:
+        group = groups.get(monitor.instance)
+        if group is None:
+            group = groups[monitor.instance] = []
+        group.append(monitor)
+    return {instance: summarize_monitors(group) for instance, group in groups.items()}
+
+
+class FederatedKumaClient:
+    """Клиент для нескольких экземпляров Uptime Kuma с объединенными ответами
+
+    Держит по одной сессии на экземпляр и обращается ко всем экземплярам
+    параллельно, каждому со своим таймаутом, поэтому время ответа равно
+    времени самого медленного экземпляра, а не сумме. Мониторы разных
+    экземпляров различаются ключами вида "eu:12".
+
+    Недоступный экземпляр не ломает ответ: остальные данные возвращаются, а
+    мониторы недоступного экземпляра берутся из его последней успешной
+    загрузки (если она была). Ошибка поднимается, только если не ответил
+    ни один экземпляр. Состояние экземпляров — в self.states.
+    """
+
+    def __init__(self, instances: Optional[List[KumaInstance]] = None,
+                 client_factory: Callable[..., Any] = UptimeKumaClient):
+        self.instances = instances if instances is not None else load_instances()
+        self.client_factory = client_factory
+        self.states: Dict[str, InstanceState] = {instance.name: InstanceState() for instance in self.instances}
+        self._clients: Dict[str, Any] = {}
+        self._last_monitors: Dict[str, List[Monitor]] = {}
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.disconnect()
+
+    async def _get_client(self, instance: KumaInstance):
+        client = self._clients.get(instance.name)
+        if client is None:
+            client = self.client_factory(url=instance.url, username=instance.username,
+                                         password=instance.password, instance=instance.name)
+            await client.connect()
+            self._clients[instance.name] = client
+        return client
+
+    async def _drop_client(self, name: str) -> None:
+        client = self._clients.pop(name, None)
+        if client is not None:
+            try:
+                await client.disconnect()
+            except Exception as e:
+                logger.error(f"Ошибка при отключении от экземпляра Kuma {name}: {e}")
+
+    async def _call(self, instance: KumaInstance, method: Callable[[Any], Awaitable[Any]]) -> Tuple[bool, Any]:
+        """Вызывает метод клиента экземпляра с его таймаутом; ошибка не прерывает остальные вызовы"""
+        state = self.states[instance.name]
+        started = time.perf_counter()
+        try:
+            async with asyncio.timeout(instance.timeout):
+                result = await method(await self._get_client(instance))
+        except Exception as e:
+            error = "таймаут" if isinstance(e, TimeoutError) else str(e) or e.__class__.__name__
+            logger.warning(f"Экземпляр Kuma {instance.name or instance.url} недоступен: {error}")
+            state.ok, state.error = False, error
+            state.latency = time.perf_counter() - started
+            # Сессия могла оборваться: в следующий раз подключимся заново
+            await self._drop_client(instance.name)
+            return False, e
+        state.ok, state.error = True, None
+        state.latency = time.perf_counter() - started
+        return True, result
+
+    async def _gather(self, method: Callable[[Any], Awaitable[Any]]) -> Dict[str, Tuple[bool, Any]]:
+        results = await asyncio.gather(*(self._call(instance, method) for instance in self.instances))
+        if not any(ok for ok, _ in results):
+            errors = "; ".join(f"{instance.name or instance.url}: {self.states[instance.name].error}"
+                               for instance in self.instances)
+            raise ConnectionError(f"Ни один экземпляр Uptime Kuma не ответил ({errors})")
+        return {instance.name: result for instance, result in zip(self.instances, results)}
+
+    async def connect(self) -> None:
+        """Подключается ко всем экземплярам параллельно"""
+        async def noop(client):
+            return None
+        await self._gather(noop)
+
+    async def disconnect(self) -> None:
+        """Закрывает сессии со всеми экземплярами"""
+        await asyncio.gather(*(self._drop_client(name) for name in list(self._clients)))
+
+    async def get_monitors(self) -> List[Monitor]:
+        """Мониторы всех экземпляров; для недоступных — из последней успешной загрузки"""
+        results = await self._gather(lambda client: client.get_monitors())
+        monitors: List[Monitor] = []
+        now = time.time()
+        for instance in self.instances:
+            ok, result = results[instance.name]
+            if ok:
+                self._last_monitors[instance.name] = result
+                self.states[instance.name].fetched_at = now
+            monitors.extend(self._last_monitors.get(instance.name, ()))
+        return monitors
+
+    async def get_heartbeats(self) -> Dict[MonitorKey, List[Heartbeat]]:
+        """Последние проверки всех доступных экземпляров (ключи уже с пространством имен)"""
+        results = await self._gather(lambda client: client.get_heartbeats())
+        merged: Dict[MonitorKey, List[Heartbeat]] = {}
+        for ok, result in results.values():
+            if ok:
+                merged.update(result)
+        return merged
+
+    async def get_incidents(self) -> List[Incident]:
+        """Инциденты всех доступных экземпляров"""
+        results = await self._gather(lambda client: client.get_incidents())
+        incidents: List[Incident] = []
+        for instance in self.instances:
+            ok, result = results[instance.name]
+            if ok:
+                for incident in result:
+                    if instance.name:
+                        incident.monitor_name = f"{incident.monitor_name} [{instance.name}]"
+                    incidents.append(incident)
+        return incidents
+
+    async def get_status_summary(self) -> Dict[str, Any]:
+        """Общая сводка и сводки по экземплярам (с ошибками недоступных экземпляров)"""
+        monitors = await self.get_monitors()
+        summary = summarize_monitors(monitors)
+        summary["instances"] = self.instance_summaries(monitors)
+        return summary
+
+    def instance_summaries(self, monitors: List[Monitor]) -> Dict[str, Dict[str, Any]]:
+        """Сводки по экземплярам с их состоянием: доступен ли, задержка, время данных"""
+        by_instance = summarize_by_instance(monitors)
+        result = {}
+        for instance in self.instances:
+            state = self.states[instance.name]
+            summary = by_instance.get(instance.name) or summarize_monitors([])
+            summary.update(ok=state.ok, error=state.error, latency=round(state.latency, 3),
+                           fetched_at=state.fetched_at)
+            result[instance.name] = summary
+        return result
@@ -0,0 +1,190 @@
+import sys
+import datetime
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+# Ключ монитора: ID в Kuma или, при нескольких экземплярах Kuma, строка
+# "<экземпляр>:<ID>" (например, "eu:12"), уникальная во всей федерации
+MonitorKey = Union[int, str]
+
+
+class MonitorStatus(IntEnum):
+    """Статусы мониторов (совпадают с кодами Uptime Kuma)"""
+    DOWN = 0
+    UP = 1
+    PENDING = 2
+    MAINTENANCE = 3
+
+
+class _RecordAccessMixin:
+    """Доступ к полям записи в стиле словаря: record['name'], record.get('url')
+
+    Нужен для совместимости с кодом, который работал со словарями мониторов.
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__dataclass_fields__
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+    def keys(self):
+        return self.__dataclass_fields__.keys()
+
+
+# Записи не объявлены frozen: конструктор frozen-датакласса в несколько раз
+# медленнее, что заметно на 10k мониторов. Записи разделяются между снапшотами,
+# поэтому изменять их после создания нельзя.
+@dataclass(slots=True)
+class Monitor(_RecordAccessMixin):
+    """Монитор Uptime Kuma"""
+    id: int
+    name: str
+    status: MonitorStatus
+    active: bool
+    url: str
+    type: str
+    maintenance: bool
+    # Имя экземпляра Kuma; пустое, если экземпляр один
+    instance: str = ""
+
+    @property
+    def key(self) -> MonitorKey:
+        """Ключ монитора, уникальный среди всех экземпляров Kuma"""
+        return make_monitor_key(self.instance, self.id) if self.instance else self.id
+
+
+def make_monitor_key(instance: str, monitor_id: int) -> MonitorKey:
+    """Ключ монитора с пространством имен экземпляра Kuma"""
+    return f"{instance}:{monitor_id}" if instance else monitor_id
+
+
+def split_monitor_key(key: MonitorKey) -> Tuple[str, int]:
+    """Разбирает ключ монитора на имя экземпляра и ID в Kuma"""
+    if isinstance(key, int):
+        return "", key
+    instance, _, monitor_id = key.rpartition(":")
+    return instance, int(monitor_id)
+
+
+def parse_monitor_key(text: str) -> Optional[MonitorKey]:
+    """Ключ монитора из пользовательского ввода ("12" или "eu:12"), None, если это не ключ"""
+    instance, _, monitor_id = text.strip().rpartition(":")
+    if not (monitor_id.isascii() and monitor_id.isdecimal()):
+        return None
+    return make_monitor_key(instance, int(monitor_id))
+
+
+@dataclass(slots=True)
+class Incident(_RecordAccessMixin):
+    """Инцидент по монитору"""
+    id: int
+    title: str
+    monitor_name: str
+    status: str
+    started_at: str
+    resolved_at: str
+
+
+@dataclass(slots=True)
+class Heartbeat:
+    """Результат одной проверки монитора"""
+    id: int
+    monitor_id: MonitorKey
+    status: MonitorStatus
+    time: float                 # Unix-время проверки
+    ping: Optional[float] = None  # Время ответа, мс
+
+
+def parse_kuma_time(value: Any) -> float:
+    """Переводит время Kuma ('2023-05-01 17:22:20.289', UTC) в Unix-время"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        parsed = datetime.datetime.fromisoformat(str(value))
+    except ValueError:
+        return 0.0
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+def build_heartbeat(raw: Dict[str, Any], monitor_id: Optional[MonitorKey] = None) -> Heartbeat:
+    """Строит запись проверки из сырых данных uptime_kuma_api"""
+    ping = raw.get("ping")
+    return Heartbeat(
+        id=int(raw.get("id") or 0),
+        monitor_id=monitor_id if monitor_id is not None else int(raw.get("monitor_id")),
+        status=MonitorStatus(int(raw.get("status", MonitorStatus.DOWN))),
+        time=parse_kuma_time(raw.get("time")),
+        ping=float(ping) if ping is not None else None,
+    )
+
+
+def _plain_str(value: Any, default: str) -> str:
+    """Приводит значение (в т.ч. строковый Enum, например MonitorType) к обычной строке"""
+    value = getattr(value, "value", value)
+    return str(value) if value else default
+
+
+class MonitorRecordCache:
+    """Кеш записей мониторов между последовательными загрузками
+
+    Если монитор не изменился с прошлой загрузки, возвращается тот же объект
+    Monitor, а не новый. Это экономит память и время на больших списках и
+    позволяет сравнивать снапшоты по идентичности записей.
+    Кеш относится к одному экземпляру Kuma: его имя проставляется в записи.
+    """
+
+    def __init__(self, instance: str = ""):
+        self.instance = instance
+        self._records: Dict[int, Monitor] = {}
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def get(self, monitor_id: int) -> Optional[Monitor]:
+        return self._records.get(monitor_id)
+
+    def build(self, raw_monitors: Iterable[Dict[str, Any]]) -> List[Monitor]:
+        """Строит список записей, переиспользуя неизменившиеся записи прошлой загрузки"""
+        previous_get = self._records.get
+        records: Dict[int, Monitor] = {}
+        result = []
+        append = result.append
+        intern = sys.intern
+        DOWN, UP = MonitorStatus.DOWN, MonitorStatus.UP
+        instance = self.instance
+        for raw in raw_monitors:
+            get = raw.get
+            monitor_id = int(get("id"))
+            name = get("name") or "Unknown"
+            url = get("url") or ""
+            type_ = get("type") or "unknown"
+            active = bool(get("active", True))
+            maintenance = bool(get("maintenance", False))
+            # Неактивный монитор и монитор на обслуживании считаются неработающими
+            status = DOWN if (not active or get("status", 1) == 0 or maintenance) else UP
+
+            record = previous_get(monitor_id)
+            if (record is None or record.status is not status or record.active is not active
+                    or record.maintenance is not maintenance or record.name != name
+                    or record.url != url or record.type != type_):
+                if name.__class__ is not str:
+                    name = _plain_str(name, "Unknown")
+                if type_.__class__ is not str:
+                    type_ = _plain_str(type_, "unknown")
+                # Интернируем строки: одинаковые имена и типы хранятся в памяти один раз
+                record = Monitor(monitor_id, intern(name), status, active, url, intern(type_), maintenance, instance)
+            records[monitor_id] = record
+            append(record)
+        self._records = records
+        return result
@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
+from db_manager import DBManager
+from kuma_models import MonitorRecordCache
+from uptime_kuma_client import UptimeKumaClient
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True, frozen=True)
+class TenantCredentials:
+    """Настройки подключения арендатора к его экземпляру Uptime Kuma"""
+    tenant_id: int
+    url: str
+    username: Optional[str] = None
+    password: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "TenantCredentials":
+        return cls(row['tenant_id'], row['kuma_url'], row['kuma_username'], row['kuma_password'])
+
+
+class PooledSession:
+    """Сессия с Kuma в пуле: клиент и счетчик использующих его обработчиков"""
+    __slots__ = ("client", "credentials", "in_use", "last_used", "detached")
+
+    def __init__(self, client: Any, credentials: TenantCredentials):
+        self.client = client
+        self.credentials = credentials
+        self.in_use = 0
+        self.last_used = time.monotonic()
+        # Сессия убрана из пула (вытеснена, сломалась или сменились настройки)
+        # и будет закрыта, когда ее отпустит последний пользователь
+        self.detached = False
+
+
+class KumaSessionPool:
+    """Пул сессий UptimeKumaClient по арендаторам с вытеснением давно неиспользуемых (LRU)
+
+    Пользователи одного арендатора делят одну сессию. Число открытых сессий
+    ограничено max_sessions: при превышении закрываются сессии, которыми
+    дольше всех не пользовались (занятые не закрываются, пока их не отпустят).
+    Сессии, простаивающие дольше idle_timeout, закрываются фоновой задачей.
+    Одновременных логинов не больше max_concurrent_logins, а параллельные
+    запросы одного арендатора дожидаются одного общего логина.
+    """
+
+    def __init__(self, max_sessions: int = 100, idle_timeout: float = 300.0, max_concurrent_logins: int = 4,
+                 client_factory: Callable[..., Any] = UptimeKumaClient):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.client_factory = client_factory
+        self._sessions: "OrderedDict[int, PooledSession]" = OrderedDict()
+        self._connecting: Dict[int, asyncio.Task] = {}
+        # Сколько запросов ждут логина арендатора: его новая сессия еще не занята, но вытеснять ее нельзя
+        self._waiting: Dict[int, int] = {}
+        self._max_concurrent_logins = max_concurrent_logins
+        self._login_semaphore = asyncio.Semaphore(max_concurrent_logins)
+        self._task: Optional[asyncio.Task] = None
+        # Статистика для диагностики
+        self.logins = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    @property
+    def in_use(self) -> int:
+        return sum(1 for session in self._sessions.values() if session.in_use)
+
+    async def configure(self, max_sessions: int, idle_timeout: float, max_concurrent_logins: int) -> None:
+        """Применяет новые лимиты пула, не закрывая занятые сессии
+
+        Идущие логины доработают под старым лимитом одновременных логинов,
+        новые ждут уже нового. Если пул стал меньше, лишние свободные сессии
+        закрываются сразу, занятые - когда их отпустят.
+        """
+        if max_concurrent_logins != self._max_concurrent_logins:
+            self._max_concurrent_logins = max_concurrent_logins
+            self._login_semaphore = asyncio.Semaphore(max_concurrent_logins)
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        await self._trim()
+
+    async def acquire(self, credentials: TenantCredentials) -> PooledSession:
+        """Возвращает сессию арендатора, подключаясь при необходимости; после работы вызовите release"""
+        key = credentials.tenant_id
+        session = self._sessions.get(key)
+        if session is not None and session.credentials != credentials:
+            # Настройки арендатора изменились: старую сессию больше не выдаем,
+            # свободную закрываем сразу, занятую - когда ее отпустят
+            self._detach(key)
+            if session.in_use == 0:
+                await self._close(session)
+            session = None
+        if session is None:
+            task = self._connecting.get(key)
+            if task is None or task.done():
+                task = self._connecting[key] = asyncio.create_task(self._connect(credentials))
+            self._waiting[key] = self._waiting.get(key, 0) + 1
+            try:
+                # shield: отмена одного ожидающего не должна прерывать общий логин
+                session = await asyncio.shield(task)
+            finally:
+                waiting = self._waiting.pop(key) - 1
+                if waiting:
+                    self._waiting[key] = waiting
+        session.in_use += 1
+        session.last_used = time.monotonic()
+        if not session.detached:
+            self._sessions.move_to_end(key)
+        return session
+
+    async def release(self, session: PooledSession, broken: bool = False) -> None:
+        """Возвращает сессию в пул; сломанная сессия закрывается"""
+        session.in_use -= 1
+        session.last_used = time.monotonic()
+        if broken and not session.detached:
+            self._detach(session.credentials.tenant_id)
+        if session.detached and session.in_use == 0:
+            await self._close(session)
+        await self._trim()
+
+    @asynccontextmanager
+    async def session(self, credentials: TenantCredentials) -> AsyncIterator[Any]:
+        """Контекстный менеджер: выдает подключенный клиент арендатора"""
+        pooled = await self.acquire(credentials)
+        broken = False
+        try:
+            yield pooled.client
+        except ConnectionError:
+            # Ошибки клиента приходят как ConnectionError: сессию создадим заново
+            broken = True
+            raise
+        finally:
+            await self.release(pooled, broken)
+
+    async def _connect(self, credentials: TenantCredentials) -> PooledSession:
+        try:
+            async with self._login_semaphore:
+                # Кеш записей свой у каждой сессии и уходит вместе с ней: память ограничена размером пула
+                client = self.client_factory(record_cache=MonitorRecordCache(), url=credentials.url,
+                                             username=credentials.username, password=credentials.password)
+                await client.connect()
+                self.logins += 1
+        finally:
+            self._connecting.pop(credentials.tenant_id, None)
+        session = PooledSession(client, credentials)
+        # Лишние сессии вытесняются при возврате в пул: новую сессию сначала получит тот, кто ее ждет
+        self._sessions[credentials.tenant_id] = session
+        logger.info(f"Открыта сессия Kuma арендатора {credentials.tenant_id} (сессий в пуле: {len(self._sessions)})")
+        return session
+
+    def _detach(self, key: int) -> Optional[PooledSession]:
+        session = self._sessions.pop(key, None)
+        if session is not None:
+            session.detached = True
+        return session
+
+    async def _close(self, session: PooledSession) -> None:
+        try:
+            await session.client.disconnect()
+        except Exception as e:
+            logger.error(f"Ошибка при закрытии сессии арендатора {session.credentials.tenant_id}: {e}")
+
+    async def _close_many(self, sessions) -> None:
+        if sessions:
+            await asyncio.gather(*(self._close(session) for session in sessions))
+
+    async def _trim(self) -> None:
+        """Закрывает свободные сессии, которыми дольше всех не пользовались, сверх max_sessions"""
+        excess = len(self._sessions) - self.max_sessions
+        if excess <= 0:
+            return
+        victims = []
+        for key, session in self._sessions.items():
+            if len(victims) >= excess:
+                break
+            if session.in_use == 0 and key not in self._waiting:
+                victims.append(key)
+        closing = [self._detach(key) for key in victims]
+        self.evictions += len(closing)
+        await self._close_many(closing)
+
+    async def evict_idle(self, now: Optional[float] = None) -> int:
+        """Закрывает сессии, простаивающие дольше idle_timeout; возвращает их число"""
+        deadline = (now if now is not None else time.monotonic()) - self.idle_timeout
+        victims = [key for key, session in self._sessions.items()
+                   if session.in_use == 0 and key not in self._waiting and session.last_used <= deadline]
+        closing = [self._detach(key) for key in victims]
+        self.evictions += len(closing)
+        await self._close_many(closing)
+        if closing:
+            logger.info(f"Закрыто простаивающих сессий Kuma: {len(closing)}, осталось {len(self._sessions)}")
+        return len(closing)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(max(self.idle_timeout / 2, 1.0))
+            try:
+                await self.evict_idle()
+            except Exception as e:
+                logger.error(f"Ошибка при очистке пула сессий Kuma: {e}", exc_info=True)
+
+    def start(self) -> asyncio.Task:
+        """Запускает фоновое закрытие простаивающих сессий"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def stop(self) -> None:
+        """Останавливает фоновую очистку и закрывает все сессии"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        closing = [self._detach(key) for key in list(self._sessions)]
+        await self._close_many(closing)
+
+
+class TenantDirectory:
+    """Кеш настроек арендаторов по пользователям поверх БД
+
+    Настройки читаются из БД не чаще раза в ttl секунд на пользователя; кеш
+    ограничен max_entries записями и вытесняет давно не запрашивавшихся.
+    """
+
+    def __init__(self, db_manager: DBManager, ttl: float = 60.0, max_entries: int = 10_000):
+        self.db_manager = db_manager
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[int, Tuple[float, Optional[TenantCredentials]]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    async def lookup(self, user_id: int) -> Optional[TenantCredentials]:
+        """Настройки арендатора пользователя или None, если он работает с общим экземпляром Kuma"""
+        now = time.monotonic()
+        cached = self._cache.get(user_id)
+        if cached is not None and cached[0] > now:
+            self._cache.move_to_end(user_id)
+            return cached[1]
+        row = await asyncio.to_thread(self.db_manager.get_user_tenant, user_id)
+        credentials = TenantCredentials.from_row(row) if row else None
+        self._cache[user_id] = (now + self.ttl, credentials)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return credentials
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        """Сбрасывает кеш пользователя (или весь кеш) после изменения настроек в БД"""
+        if user_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(user_id, None)
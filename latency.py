@@ -0,0 +1,195 @@
+import importlib.util
+import io
+import math
+import time
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Hashable, List, Optional, Sequence, Tuple
+
+from heartbeat_store import HeartbeatRing
+from kuma_models import MonitorStatus
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+@dataclass(slots=True)
+class LatencyStats:
+    """Статистика времени ответа по проверкам из буфера монитора, мс"""
+    count: int
+    minimum: float
+    p50: float
+    p90: float
+    p95: float
+    p99: float
+    maximum: float
+    mean: float
+    # Доля успешных проверок среди всех проверок буфера, %
+    uptime: Optional[float]
+
+
+def latency_samples(ring: HeartbeatRing) -> Tuple[array, array]:
+    """Время проверок и ping в хронологическом порядке (проверки без ping пропускаются)"""
+    _, times, pings, _ = ring.ordered_arrays()
+    if all(ping == ping for ping in pings):
+        return times, pings
+    # NaN не равен сам себе: так отсеиваются проверки без ping
+    keep = [i for i, ping in enumerate(pings) if ping == ping]
+    return array("d", [times[i] for i in keep]), array("f", [pings[i] for i in keep])
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Перцентиль q (0-100) отсортированной выборки с линейной интерполяцией"""
+    if not sorted_values:
+        return math.nan
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def latency_stats(pings: Sequence[float], statuses: bytes) -> Optional[LatencyStats]:
+    """Статистика по ping и статусам проверок буфера (None, если ping нет)"""
+    # Одна сортировка на все перцентили; NaN (проверки без ping) отсеиваются
+    ordered = sorted(ping for ping in pings if ping == ping)
+    if not ordered:
+        return None
+    counted = len(statuses) - statuses.count(MonitorStatus.MAINTENANCE)
+    uptime = statuses.count(MonitorStatus.UP) * 100.0 / counted if counted else None
+    return LatencyStats(
+        count=len(ordered),
+        minimum=ordered[0],
+        p50=percentile(ordered, 50),
+        p90=percentile(ordered, 90),
+        p95=percentile(ordered, 95),
+        p99=percentile(ordered, 99),
+        maximum=ordered[-1],
+        mean=math.fsum(ordered) / len(ordered),
+        uptime=uptime,
+    )
+
+
+def downsample(values: Sequence[float], width: int) -> List[float]:
+    """Сжимает ряд до width точек: среднее по равным отрезкам"""
+    count = len(values)
+    if count <= width:
+        return list(values)
+    result = []
+    for i in range(width):
+        start = i * count // width
+        end = (i + 1) * count // width
+        result.append(math.fsum(values[start:end]) / (end - start))
+    return result
+
+
+def sparkline(values: Sequence[float], width: int = 30) -> str:
+    """Текстовый график ряда символами ▁▂▃▄▅▆▇█"""
+    points = downsample(values, width)
+    if not points:
+        return ""
+    low, high = min(points), max(points)
+    if high - low < 1e-9:
+        return SPARK_CHARS[0] * len(points)
+    scale = (len(SPARK_CHARS) - 1) / (high - low)
+    return "".join(SPARK_CHARS[int((point - low) * scale + 0.5)] for point in points)
+
+
+def format_latency(ring: HeartbeatRing, width: int = 30) -> Optional[str]:
+    """Блок карточки монитора: график времени ответа и перцентили (None, если ping нет)"""
+    _, _, pings, statuses = ring.ordered_arrays()
+    stats = latency_stats(pings, statuses)
+    if stats is None:
+        return None
+    pings = [ping for ping in pings if ping == ping]
+    text = f"⏱ Время ответа, последние {stats.count} проверок:\n{sparkline(pings, width)}\n"
+    text += (f"мин {stats.minimum:.0f} · p50 {stats.p50:.0f} · p95 {stats.p95:.0f} · "
+             f"p99 {stats.p99:.0f} · макс {stats.maximum:.0f} мс")
+    if stats.uptime is not None:
+        text += f"\nУспешных проверок: {stats.uptime:.1f}%"
+    return text
+
+
+def charts_available() -> bool:
+    """Установлен ли matplotlib для PNG-графиков (необязательная зависимость)"""
+    return importlib.util.find_spec("matplotlib") is not None
+
+
+def render_chart(times: Sequence[float], pings: Sequence[float], title: str, width: int = 600) -> bytes:
+    """PNG-график времени ответа с линиями p50 и p95 (требует matplotlib)"""
+    import datetime
+
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.figure import Figure
+
+    # Точек на графике не больше, чем пикселей по ширине
+    times = downsample(times, width)
+    pings = downsample(pings, width)
+    ordered = sorted(pings)
+    figure = Figure(figsize=(width / 100, 3), dpi=100)
+    axes = figure.subplots()
+    axes.plot([datetime.datetime.fromtimestamp(t) for t in times], pings, linewidth=1)
+    for q, style in ((50, "--"), (95, ":")):
+        axes.axhline(percentile(ordered, q), linestyle=style, linewidth=0.8, color="gray", label=f"p{q}")
+    axes.set_title(title)
+    axes.set_ylabel("мс")
+    axes.legend(loc="upper left")
+    figure.autofmt_xdate()
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+class ChartCache:
+    """Кеш отрисованных графиков по интервалам времени
+
+    График монитора рисуется не чаще раза в bucket секунд: повторные
+    просмотры в том же интервале получают готовую картинку. Кеш ограничен
+    max_entries графиками и вытесняет давно не запрашивавшиеся.
+    """
+
+    def __init__(self, bucket: float = 60.0, max_entries: int = 256, clock: Callable[[], float] = time.time):
+        self.bucket = bucket
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries: "OrderedDict[Tuple[Hashable, int], bytes]" = OrderedDict()
+        # Статистика для диагностики
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def set_bucket(self, bucket: float) -> None:
+        """Меняет интервал кеширования; графики, нарисованные по старым интервалам, сбрасываются"""
+        if bucket != self.bucket:
+            self.bucket = bucket
+            self._entries.clear()
+
+    def _cache_key(self, key: Hashable) -> Tuple[Hashable, int]:
+        return key, int(self.clock() // self.bucket)
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        """Готовый график монитора за текущий интервал (None, если его еще нет)"""
+        cache_key = self._cache_key(key)
+        image = self._entries.get(cache_key)
+        if image is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(cache_key)
+        self.hits += 1
+        return image
+
+    def put(self, key: Hashable, image: bytes) -> None:
+        """Сохраняет график монитора за текущий интервал"""
+        self._entries[self._cache_key(key)] = image
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_or_render(self, key: Hashable, render: Callable[[], bytes]) -> bytes:
+        """Готовый график текущего интервала или новый, отрисованный render()"""
+        image = self.get(key)
+        if image is None:
+            image = render()
+            self.put(key, image)
+        return image
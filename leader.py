@@ -0,0 +1,109 @@
+import asyncio
+import inspect
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Callable, List, Optional
+
+from db_manager import DBManager
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+# Обработчик смены роли: получает True, когда реплика стала ведущей, и False, когда перестала
+LeadershipSubscriber = Callable[[bool], object]
+
+
+class LeaderElection:
+    """Выбор ведущей реплики бота по аренде в общей БД SQLite
+
+    Каждая реплика раз в ttl/3 секунд пытается захватить или продлить
+    аренду name. Аренду держит одна реплика: остальные получают ее, только
+    когда она истечет (ведущая упала или зависла) или будет освобождена при
+    остановке. Ведущая реплика, не сумевшая продлить аренду (ошибка или
+    таймаут БД), сразу перестает считать себя ведущей, не дожидаясь, пока
+    аренду заберет другая. Подписчики узнают о смене роли.
+    """
+
+    def __init__(self, db_manager: DBManager, name: str = "kuma-watcher", holder: Optional[str] = None,
+                 ttl: float = 15.0, clock: Callable[[], float] = time.time):
+        self.db_manager = db_manager
+        self.name = name
+        # Имя реплики: узел и процесс для диагностики, случайный суффикс - на случай совпадения PID в контейнерах
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.ttl = ttl
+        self.renew_interval = ttl / 3
+        self.clock = clock
+        self.is_leader = False
+        # Реплика сама отдает аренду (stop): пока подписчики узнают об этом, аренда еще за ней
+        self.stopping = False
+        self._subscribers: List[LeadershipSubscriber] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, callback: LeadershipSubscriber) -> None:
+        """Подписывает обработчик на смену роли реплики"""
+        self._subscribers.append(callback)
+
+    async def step(self) -> bool:
+        """Одна попытка захватить или продлить аренду; возвращает, ведущая ли реплика"""
+        try:
+            acquired = await asyncio.wait_for(
+                asyncio.to_thread(self.db_manager.try_acquire_lease, self.name, self.holder, self.ttl, self.clock()),
+                timeout=self.renew_interval,
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"Аренда {self.name}: БД не ответила за {self.renew_interval:.1f} с")
+            acquired = False
+        except Exception as e:
+            # Например, БД не открылась: без продленной аренды реплика не может считать себя ведущей
+            logger.error(f"Аренда {self.name}: ошибка при продлении: {e}", exc_info=True)
+            acquired = False
+        await self._set_leader(acquired)
+        return acquired
+
+    async def _set_leader(self, leader: bool) -> None:
+        if leader == self.is_leader:
+            return
+        self.is_leader = leader
+        if leader:
+            logger.info(f"Реплика {self.holder} стала ведущей ({self.name})")
+        else:
+            logger.warning(f"Реплика {self.holder} больше не ведущая ({self.name})")
+        for callback in list(self._subscribers):
+            try:
+                result = callback(leader)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Ошибка в подписчике на смену ведущей реплики {callback!r}: {e}", exc_info=True)
+
+    async def run(self) -> None:
+        """Цикл продления аренды"""
+        while True:
+            await self.step()
+            await asyncio.sleep(self.renew_interval)
+
+    def start(self) -> asyncio.Task:
+        """Запускает выбор ведущей реплики фоновой задачей"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self) -> None:
+        """Останавливает продление и освобождает аренду, чтобы другая реплика не ждала ее истечения"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self.is_leader:
+            self.stopping = True
+            try:
+                await self._set_leader(False)
+            finally:
+                self.stopping = False
+            await asyncio.to_thread(self.db_manager.release_lease, self.name, self.holder)
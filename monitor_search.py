@@ -0,0 +1,245 @@
+import bisect
+import heapq
+import math
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+from kuma_models import Monitor, MonitorKey, parse_monitor_key
+
+# Слова имени индексируются префиксами до этой длины
+MAX_WORD_PREFIX = 16
+# Для нечеткого поиска должна совпасть хотя бы такая доля триграмм запроса
+FUZZY_MIN_SHARE = 0.5
+
+
+def normalize(text: str) -> str:
+    return text.casefold().strip()
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def words(text: str) -> List[str]:
+    """Слова имени: разделители - все, кроме букв и цифр"""
+    result = []
+    word = []
+    for char in text:
+        if char.isalnum():
+            word.append(char)
+        elif word:
+            result.append("".join(word))
+            word = []
+    if word:
+        result.append("".join(word))
+    return result
+
+
+def word_prefixes(name: str) -> Set[str]:
+    return {word[:n] for word in words(name) for n in range(1, min(len(word), MAX_WORD_PREFIX) + 1)}
+
+
+def _add(index: Dict[str, Set[MonitorKey]], items: Iterable[str], key: MonitorKey) -> None:
+    for item in items:
+        keys = index.get(item)
+        if keys is None:
+            keys = index[item] = set()
+        keys.add(key)
+
+
+def _discard(index: Dict[str, Set[MonitorKey]], items: Iterable[str], key: MonitorKey) -> None:
+    for item in items:
+        keys = index.get(item)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del index[item]
+
+
+class MonitorSearchIndex:
+    """Поисковый индекс мониторов по имени и URL
+
+    Совпадения ранжируются по группам, внутри группы - по имени:
+      1. ключ монитора ("12", "eu:12");
+      2. имя начинается с запроса (бинарный поиск по отсортированным именам);
+      3. слово имени начинается с запроса (индекс префиксов слов);
+      4. запрос - подстрока имени, 5. подстрока URL (индексы триграмм:
+         кандидаты из самого редкого множества по триграммам запроса и проверка подстроки);
+      6. если ничего не нашлось - имена, содержащие большую часть триграмм запроса
+         с учетом их редкости (опечатки).
+    Группы перебираются по порядку, пока не набрано limit результатов, поэтому
+    даже запрос, под который подходят все мониторы, не перебирает их целиком.
+    Индекс обновляется по разнице снапшотов: затрагиваются только добавленные,
+    удаленные и переименованные мониторы.
+    """
+
+    def __init__(self, monitors: Iterable[Monitor] = ()):
+        self._docs: Dict[MonitorKey, Tuple[str, str]] = {}
+        # (имя, ключ строкой, ключ) по возрастанию: порядок выдачи внутри группы
+        self._order: List[Tuple[str, str, MonitorKey]] = []
+        self._word_prefixes: Dict[str, Set[MonitorKey]] = {}
+        self._name_trigrams: Dict[str, Set[MonitorKey]] = {}
+        self._url_trigrams: Dict[str, Set[MonitorKey]] = {}
+        self.rebuild(monitors)
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, key: MonitorKey) -> bool:
+        return key in self._docs
+
+    def _index(self, key: MonitorKey, name: str, url: str) -> None:
+        self._docs[key] = (name, url)
+        _add(self._word_prefixes, word_prefixes(name), key)
+        _add(self._name_trigrams, trigrams(name), key)
+        _add(self._url_trigrams, trigrams(url), key)
+
+    def add(self, monitor: Monitor) -> None:
+        """Добавляет монитор в индекс (или обновляет, если он уже есть)"""
+        key = monitor.key
+        self.remove(key)
+        name, url = normalize(monitor.name), normalize(monitor.url)
+        self._index(key, name, url)
+        bisect.insort(self._order, (name, str(key), key))
+
+    def remove(self, key: MonitorKey) -> None:
+        """Удаляет монитор из индекса"""
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        name, url = doc
+        _discard(self._word_prefixes, word_prefixes(name), key)
+        _discard(self._name_trigrams, trigrams(name), key)
+        _discard(self._url_trigrams, trigrams(url), key)
+        position = bisect.bisect_left(self._order, (name, str(key)))
+        if position < len(self._order) and self._order[position][2] == key:
+            del self._order[position]
+
+    def rebuild(self, monitors: Iterable[Monitor]) -> None:
+        """Строит индекс заново"""
+        self._docs = {}
+        self._word_prefixes = {}
+        self._name_trigrams = {}
+        self._url_trigrams = {}
+        order = []
+        for monitor in monitors:
+            key = monitor.key
+            name, url = normalize(monitor.name), normalize(monitor.url)
+            if key not in self._docs:
+                order.append((name, str(key), key))
+            self._index(key, name, url)
+        order.sort()
+        self._order = order
+
+    def handle_diff(self, diff, snapshot) -> None:
+        """Подписчик на изменения снапшота: обновляет индекс по разнице"""
+        if diff.initial:
+            self.rebuild(snapshot.monitors)
+            return
+        for monitor in diff.removed:
+            self.remove(monitor.key)
+        for monitor in diff.added:
+            self.add(monitor)
+        for change in diff.updated:
+            self.add(change.current)
+
+    @staticmethod
+    def _narrowest(index: Dict[str, Set[MonitorKey]], query: str) -> Set[MonitorKey]:
+        """Самое маленькое из множеств мониторов по триграммам запроса
+
+        Все совпадения лежат в нем; остальные триграммы не пересекаются
+        множествами, а проверяются подстрокой у отобранных кандидатов.
+        """
+        narrowest = None
+        for gram in trigrams(query):
+            keys = index.get(gram)
+            if not keys:
+                return set()
+            if narrowest is None or len(keys) < len(narrowest):
+                narrowest = keys
+        return narrowest or set()
+
+    def _take(self, keys: Set[MonitorKey], accept: Callable[[MonitorKey], bool], result: List[MonitorKey],
+              seen: Set[MonitorKey], limit: int) -> None:
+        """Добавляет в result подходящие мониторы из keys в порядке имен"""
+        if not keys:
+            return
+        if len(keys) * 8 < len(self._order):
+            # Мало кандидатов: сортируем только их
+            docs = self._docs
+            ordered = sorted((docs[key][0], str(key), key) for key in keys)
+        else:
+            # Кандидатов много: идем по готовому порядку имен до первых limit совпадений
+            ordered = (item for item in self._order if item[2] in keys)
+        for _, _, key in ordered:
+            if len(result) >= limit:
+                return
+            if key not in seen and accept(key):
+                seen.add(key)
+                result.append(key)
+
+    def search(self, text: str, limit: int = 10) -> List[MonitorKey]:
+        """Ключи мониторов, подходящих под запрос, от лучшего совпадения к худшему"""
+        query = normalize(text)
+        if not query or limit <= 0:
+            return []
+        docs = self._docs
+        result: List[MonitorKey] = []
+        seen: Set[MonitorKey] = set()
+
+        key = parse_monitor_key(query)
+        if key is not None and key in docs:
+            result.append(key)
+            seen.add(key)
+
+        # Имя начинается с запроса: непрерывный отрезок отсортированного списка
+        order = self._order
+        position = bisect.bisect_left(order, (query,))
+        while position < len(order) and len(result) < limit:
+            name, _, key = order[position]
+            if not name.startswith(query):
+                break
+            if key not in seen:
+                seen.add(key)
+                result.append(key)
+            position += 1
+
+        if len(result) < limit:
+            self._take(self._word_prefixes.get(query, set()), lambda key: True, result, seen, limit)
+        if len(result) < limit and len(query) >= 3:
+            self._take(self._narrowest(self._name_trigrams, query), lambda key: query in docs[key][0],
+                       result, seen, limit)
+        if len(result) < limit and len(query) >= 3:
+            self._take(self._narrowest(self._url_trigrams, query), lambda key: query in docs[key][1],
+                       result, seen, limit)
+        if not result:
+            result = self._fuzzy(query, limit)
+        return result
+
+    def _fuzzy(self, query: str, limit: int) -> List[MonitorKey]:
+        """Мониторы, имена которых содержат достаточную долю триграмм запроса (опечатки)
+
+        Триграммы взвешиваются по редкости (IDF): общие для всех имен части
+        (например, «service») почти ничего не весят, поэтому их множества не
+        перебираются, а кандидаты берутся только из множеств редких триграмм.
+        """
+        grams = trigrams(query)
+        if not grams:
+            return []
+        total = len(self._docs)
+        index = self._name_trigrams
+        weights = {gram: math.log((total + 1) / (len(index.get(gram, ())) + 1)) for gram in grams}
+        full = sum(weights.values())
+        if full <= 0:
+            return []
+        candidates: Set[MonitorKey] = set()
+        for gram in grams:
+            keys = index.get(gram)
+            if keys and len(keys) * 4 <= total:
+                candidates |= keys
+        scored = []
+        docs = self._docs
+        for key in candidates:
+            score = sum(weight for gram, weight in weights.items() if key in index.get(gram, ()))
+            if score >= full * FUZZY_MIN_SHARE:
+                scored.append((-score, docs[key][0], str(key), key))
+        return [item[3] for item in heapq.nsmallest(limit, scored)]
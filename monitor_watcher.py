@@ -0,0 +1,174 @@
+import asyncio
+import inspect
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from kuma_models import Heartbeat, MonitorKey
+from snapshot_diff import EMPTY_SNAPSHOT, MonitorSnapshot, SnapshotDiff, diff_snapshots
+from uptime_kuma_client import UptimeKumaClient
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+# Подписчик получает разницу и новый снапшот; может быть обычной функцией или корутиной
+DiffSubscriber = Callable[[SnapshotDiff, MonitorSnapshot], Union[None, Awaitable[None]]]
+# Подписчик на новые проверки получает их в хронологическом порядке
+HeartbeatSubscriber = Callable[[List[Heartbeat]], Union[None, Awaitable[None]]]
+
+
+class MonitorWatcher:
+    """Периодически загружает мониторы из Uptime Kuma и рассылает изменения подписчикам
+
+    Держит одну долгоживущую сессию с Kuma (переподключается при ошибках),
+    сравнивает каждый новый снапшот с предыдущим и передает подписчикам
+    только разницу. Пустая разница подписчикам не отправляется.
+    
+    Если есть подписчики на проверки (heartbeats), вместе с мониторами
+    загружаются и проверки; подписчикам передаются только новые, еще не
+    отправленные проверки.
+    """
+
+    def __init__(self, client_factory: Callable[[], Any] = UptimeKumaClient, interval: float = 60.0):
+        self.client_factory = client_factory
+        self.interval = interval
+        self.snapshot: MonitorSnapshot = EMPTY_SNAPSHOT
+        self._client = None
+        # Настройки подключения изменились: следующий опрос откроет новую сессию
+        self._reconnect = False
+        self._subscribers: List[DiffSubscriber] = []
+        self._heartbeat_subscribers: List[HeartbeatSubscriber] = []
+        # ID последней отправленной проверки по каждому монитору
+        self._last_heartbeat_ids: Dict[MonitorKey, int] = {}
+        # True, пока снапшот восстановлен с диска и еще не подтвержден опросом Kuma
+        self.stale = False
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, callback: DiffSubscriber) -> None:
+        """Подписывает обработчик на поток изменений"""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: DiffSubscriber) -> None:
+        """Отписывает обработчик от потока изменений"""
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def subscribe_heartbeats(self, callback: HeartbeatSubscriber) -> None:
+        """Подписывает обработчик на поток новых проверок"""
+        self._heartbeat_subscribers.append(callback)
+
+    def restore(self, snapshot: MonitorSnapshot, last_heartbeat_ids: Optional[Dict[MonitorKey, int]] = None,
+                stale: bool = True) -> None:
+        """Восстанавливает сохраненный снапшот (теплый старт) до первого опроса Kuma
+
+        Первый опрос сравнит свежие данные с восстановленными, поэтому подписчики
+        получат только изменения, случившиеся за время перезапуска, а уже
+        обработанные проверки не будут отправлены повторно. stale=False - снапшот
+        актуален (его только что сохранила ведущая реплика), а не ждет опроса.
+        """
+        self.snapshot = snapshot
+        self._last_heartbeat_ids = dict(last_heartbeat_ids or {})
+        self.stale = stale
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def _get_client(self):
+        if self._client is None:
+            client = self.client_factory()
+            await client.connect()
+            self._client = client
+        return self._client
+
+    async def _drop_client(self) -> None:
+        client, self._client = self._client, None
+        if client is not None:
+            await client.disconnect()
+
+    def reconnect(self) -> None:
+        """Переподключиться к Kuma перед следующим опросом (идущий опрос доработает в старой сессии)"""
+        self._reconnect = True
+
+    async def poll_once(self) -> SnapshotDiff:
+        """Загружает мониторы, вычисляет разницу с прошлым снапшотом и рассылает ее"""
+        if self._reconnect:
+            self._reconnect = False
+            await self._drop_client()
+        client = await self._get_client()
+        try:
+            monitors = await client.get_monitors()
+            heartbeats = await client.get_heartbeats() if self._heartbeat_subscribers else None
+        except Exception:
+            # Соединение могло оборваться: в следующий раз подключимся заново
+            await self._drop_client()
+            raise
+
+        snapshot = MonitorSnapshot(monitors)
+        diff = diff_snapshots(self.snapshot.by_key, snapshot.by_key)
+        self.snapshot = snapshot
+        self.stale = False
+        for monitor in diff.removed:
+            self._last_heartbeat_ids.pop(monitor.key, None)
+        if diff:
+            logger.info(f"Изменения мониторов: добавлено {len(diff.added)}, удалено {len(diff.removed)}, "
+                        f"сменили статус {len(diff.status_changed)}")
+            await self._publish(self._subscribers, diff, snapshot)
+        if heartbeats:
+            new_heartbeats = self._take_new_heartbeats(heartbeats)
+            if new_heartbeats:
+                await self._publish(self._heartbeat_subscribers, new_heartbeats)
+        return diff
+
+    def _take_new_heartbeats(self, heartbeats: Dict[MonitorKey, List[Heartbeat]]) -> List[Heartbeat]:
+        """Отбирает проверки, которые еще не отправлялись подписчикам"""
+        result = []
+        last_ids = self._last_heartbeat_ids
+        for monitor_id, beats in heartbeats.items():
+            last_id = last_ids.get(monitor_id, 0)
+            newest = last_id
+            for heartbeat in beats:
+                if heartbeat.id > last_id:
+                    result.append(heartbeat)
+                    if heartbeat.id > newest:
+                        newest = heartbeat.id
+            last_ids[monitor_id] = newest
+        result.sort(key=lambda h: (h.time, h.id))
+        return result
+
+    async def _publish(self, subscribers: List[Callable], *args) -> None:
+        for callback in list(subscribers):
+            try:
+                result = callback(*args)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Ошибка в подписчике наблюдателя {callback!r}: {e}", exc_info=True)
+
+    async def run(self) -> None:
+        """Цикл опроса Kuma с интервалом self.interval"""
+        logger.info(f"Запуск наблюдения за мониторами с интервалом {self.interval} с")
+        while True:
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка при опросе Uptime Kuma: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> asyncio.Task:
+        """Запускает цикл опроса фоновой задачей"""
+        if not self.running:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self) -> None:
+        """Останавливает цикл опроса и закрывает сессию с Kuma"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self._drop_client()
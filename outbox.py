@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+# Отправитель сообщения: (chat_id, text, **kwargs) -> корутина
+Sender = Callable[..., Awaitable[Any]]
+
+
+class Outbox:
+    """Очередь исходящих сообщений с ограничением скорости отправки
+
+    Фоновые рассылки (напоминания о подписке, дайджесты, оповещения) кладут
+    сообщения в очередь, а один воркер отправляет их не быстрее rate сообщений
+    в секунду с допустимым всплеском burst (token bucket). Так рассылка на
+    тысячи пользователей не упирается в лимиты Telegram. Если Telegram все же
+    просит подождать (исключение с атрибутом retry_after), воркер ждет и
+    повторяет отправку.
+    """
+
+    def __init__(self, send: Sender, rate: float = 25.0, burst: int = 25, max_size: int = 100_000,
+                 max_attempts: int = 3):
+        self.send = send
+        self.rate = rate
+        self.burst = burst
+        self.max_attempts = max_attempts
+        self._queue: "asyncio.Queue[Tuple[int, str, dict]]" = asyncio.Queue(max_size)
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        # Статистика для диагностики
+        self.sent = 0
+        self.failed = 0
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    async def put(self, chat_id: int, text: str, **kwargs) -> None:
+        """Ставит сообщение в очередь (ждет, если очередь заполнена)"""
+        await self._queue.put((chat_id, text, kwargs))
+
+    def put_nowait(self, chat_id: int, text: str, **kwargs) -> bool:
+        """Ставит сообщение в очередь без ожидания; False, если очередь заполнена"""
+        try:
+            self._queue.put_nowait((chat_id, text, kwargs))
+            return True
+        except asyncio.QueueFull:
+            logger.warning(f"Очередь исходящих сообщений заполнена, сообщение для {chat_id} отброшено")
+            self.failed += 1
+            return False
+
+    async def _take_token(self) -> None:
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+            self._refilled_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def _deliver(self, chat_id: int, text: str, kwargs: dict) -> None:
+        for attempt in range(1, self.max_attempts + 1):
+            await self._take_token()
+            try:
+                await self.send(chat_id, text, **kwargs)
+                self.sent += 1
+                return
+            except Exception as e:
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after is None or attempt == self.max_attempts:
+                    logger.error(f"Не удалось отправить сообщение пользователю {chat_id}: {e}")
+                    self.failed += 1
+                    return
+                logger.warning(f"Telegram просит подождать {retry_after} с перед отправкой")
+                await asyncio.sleep(float(retry_after))
+
+    async def _run(self) -> None:
+        while True:
+            chat_id, text, kwargs = await self._queue.get()
+            try:
+                await self._deliver(chat_id, text, kwargs)
+            finally:
+                self._queue.task_done()
+
+    def start(self) -> asyncio.Task:
+        """Запускает воркер отправки фоновой задачей"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def drain(self, timeout: Optional[float] = None) -> bool:
+        """Ждет отправки всех сообщений в очереди; False, если не успели за timeout"""
+        try:
+            async with asyncio.timeout(timeout):
+                await self._queue.join()
+            return True
+        except TimeoutError:
+            return False
+
+    async def stop(self) -> None:
+        """Останавливает воркер; неотправленные сообщения остаются в очереди"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
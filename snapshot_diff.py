@@ -0,0 +1,109 @@
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, Iterable, List, Mapping, Optional
+
+from kuma_models import Monitor
+
+
+class MonitorSnapshot:
+    """Снапшот состояния мониторов на момент загрузки
+
+    Хранит записи в порядке, полученном от Kuma, и индекс по ключу монитора.
+    Ключ по умолчанию — Monitor.key: ID монитора в Kuma, а при нескольких
+    экземплярах Kuma — ID с именем экземпляра.
+    """
+    __slots__ = ("monitors", "by_key", "taken_at")
+
+    def __init__(self, monitors: Iterable[Monitor], taken_at: Optional[float] = None, by_key: Optional[Dict[Hashable, Monitor]] = None):
+        self.monitors: List[Monitor] = list(monitors)
+        self.by_key: Dict[Hashable, Monitor] = by_key if by_key is not None else {m.key: m for m in self.monitors}
+        self.taken_at = taken_at if taken_at is not None else time.time()
+
+    def __len__(self) -> int:
+        return len(self.monitors)
+
+    def __iter__(self):
+        return iter(self.monitors)
+
+    def get(self, key: Hashable) -> Optional[Monitor]:
+        return self.by_key.get(key)
+
+
+EMPTY_SNAPSHOT = MonitorSnapshot([], taken_at=0.0)
+
+
+@dataclass(slots=True)
+class MonitorChange:
+    """Изменение монитора между двумя снапшотами"""
+    key: Hashable
+    previous: Monitor
+    current: Monitor
+
+
+@dataclass(slots=True)
+class SnapshotDiff:
+    """Разница между двумя последовательными снапшотами мониторов
+
+    Один монитор может попасть сразу в несколько списков, например если
+    его поставили на обслуживание и из-за этого сменился статус.
+    """
+    added: List[Monitor] = field(default_factory=list)
+    removed: List[Monitor] = field(default_factory=list)
+    status_changed: List[MonitorChange] = field(default_factory=list)
+    maintenance_toggled: List[MonitorChange] = field(default_factory=list)
+    active_toggled: List[MonitorChange] = field(default_factory=list)
+    # Изменения имени, URL или типа: важны для поиска и синхронизации с БД
+    updated: List[MonitorChange] = field(default_factory=list)
+    # Первый снапшот: все мониторы попадают в added
+    initial: bool = False
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.status_changed or self.maintenance_toggled
+                    or self.active_toggled or self.updated)
+
+    def __len__(self) -> int:
+        return (len(self.added) + len(self.removed) + len(self.status_changed) + len(self.maintenance_toggled)
+                + len(self.active_toggled) + len(self.updated))
+
+
+def diff_snapshots(previous: Mapping[Hashable, Monitor], current: Mapping[Hashable, Monitor]) -> SnapshotDiff:
+    """Сравнивает два снапшота по ключу монитора за O(N)
+
+    Записи мониторов переиспользуются между загрузками (см. MonitorRecordCache),
+    поэтому неизменившийся монитор отсекается сравнением по идентичности,
+    без сравнения полей и без копирования.
+    """
+    diff = SnapshotDiff(initial=not previous)
+    previous_get = previous.get
+
+    for key, monitor in current.items():
+        old = previous_get(key)
+        if old is monitor:
+            continue
+        if old is None:
+            diff.added.append(monitor)
+            continue
+
+        changed = False
+        if old.status != monitor.status:
+            diff.status_changed.append(MonitorChange(key, old, monitor))
+            changed = True
+        if old.maintenance != monitor.maintenance:
+            diff.maintenance_toggled.append(MonitorChange(key, old, monitor))
+            changed = True
+        if old.active != monitor.active:
+            diff.active_toggled.append(MonitorChange(key, old, monitor))
+            changed = True
+        if old.name != monitor.name or old.url != monitor.url or old.type != monitor.type:
+            diff.updated.append(MonitorChange(key, old, monitor))
+        elif not changed and old != monitor:
+            # Прочие поля записи (например, добавленные позже) тоже считаем обновлением
+            diff.updated.append(MonitorChange(key, old, monitor))
+
+    if len(previous) > len(current) - len(diff.added):
+        # Удаленные есть только если не все прежние ключи нашлись в текущем снапшоте
+        for key, monitor in previous.items():
+            if key not in current:
+                diff.removed.append(monitor)
+
+    return diff
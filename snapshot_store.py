@@ -0,0 +1,295 @@
+import asyncio
+import logging
+import os
+import struct
+import sys
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from heartbeat_store import HeartbeatRing, HeartbeatStore
+from kuma_models import Monitor, MonitorStatus, make_monitor_key, split_monitor_key
+from snapshot_diff import MonitorSnapshot
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+# Формат файла (все числа little-endian):
+#   заголовок      HEADER
+#   типы           type_count x uint32 — длины названий типов мониторов (в символах)
+#   экземпляры     instance_count x uint32 — длины имен экземпляров Kuma (в символах)
+#   мониторы       monitor_count x MONITOR — записи фиксированного размера
+#   текст          uint32 длина в байтах + UTF-8: названия типов, имена экземпляров,
+#                  затем имя и URL каждого монитора
+#   проверки       ring_count x uint16 индекс экземпляра, ring_count x int64 ID мониторов,
+#                  ring_count x uint32 число проверок,
+#                  затем общие для всех буферов массивы ids q, times d, pings f, statuses B
+# Записи фиксированного размера разбираются одним struct.iter_unpack, весь текст
+# декодируется одним вызовом, а проверки читаются четырьмя сплошными массивами и
+# нарезаются по буферам, поэтому загрузка 10k мониторов занимает миллисекунды.
+MAGIC = b"UKSN"
+VERSION = 2
+# magic, version, taken_at, monitor_count, ring_count, ring_capacity, type_count, instance_count
+HEADER = struct.Struct("<4sHdIIHHH")
+MONITOR = struct.Struct("<qBBIIHH")  # id, status, flags, name_len, url_len, type_index, instance_index
+UINT32 = struct.Struct("<I")
+FLAG_ACTIVE = 1
+FLAG_MAINTENANCE = 2
+# Значения флагов по их битовой маске: без вызовов bool() на каждую запись
+_ACTIVE = (False, True, False, True)
+_MAINTENANCE = (False, False, True, True)
+_SWAP_BYTES = sys.byteorder != "little"
+
+
+def _le(values: array) -> bytes:
+    """Байты массива в порядке little-endian"""
+    if _SWAP_BYTES:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _read_array(typecode: str, data: memoryview, offset: int, count: int) -> Tuple[array, int]:
+    values = array(typecode)
+    size = values.itemsize * count
+    values.frombytes(data[offset:offset + size])
+    if _SWAP_BYTES:
+        values.byteswap()
+    return values, offset + size
+
+
+def dump_snapshot(snapshot: MonitorSnapshot, heartbeats: Optional[HeartbeatStore] = None) -> bytes:
+    """Упаковывает снапшот мониторов и буферы проверок в компактный бинарный формат"""
+    types: Dict[str, int] = {}
+    instances: Dict[str, int] = {"": 0}
+    records = bytearray()
+    texts: List[str] = []
+    for monitor in snapshot.monitors:
+        type_index = types.setdefault(monitor.type, len(types))
+        instance_index = instances.setdefault(monitor.instance, len(instances))
+        flags = (FLAG_ACTIVE if monitor.active else 0) | (FLAG_MAINTENANCE if monitor.maintenance else 0)
+        records += MONITOR.pack(monitor.id, int(monitor.status), flags, len(monitor.name), len(monitor.url),
+                                type_index, instance_index)
+        texts.append(monitor.name)
+        texts.append(monitor.url)
+
+    rings = heartbeats.rings if heartbeats is not None else {}
+    ring_instances = array("H")
+    ring_ids = array("q")
+    for key in rings:
+        instance, monitor_id = split_monitor_key(key)
+        ring_instances.append(instances.setdefault(instance, len(instances)))
+        ring_ids.append(monitor_id)
+    text_blob = "".join(list(types) + list(instances) + texts).encode("utf-8")
+
+    capacity = heartbeats.capacity if heartbeats is not None else 0
+    parts = [
+        HEADER.pack(MAGIC, VERSION, snapshot.taken_at, len(snapshot.monitors), len(rings), capacity,
+                    len(types), len(instances)),
+        _le(array("I", (len(name) for name in types))),
+        _le(array("I", (len(name) for name in instances))),
+        bytes(records),
+        UINT32.pack(len(text_blob)),
+        text_blob,
+    ]
+    counts = array("I")
+    all_ids, all_times, all_pings, all_statuses = array("q"), array("d"), array("f"), bytearray()
+    for ring in rings.values():
+        ids, times, pings, statuses = ring.ordered_arrays()
+        counts.append(len(ids))
+        all_ids += ids
+        all_times += times
+        all_pings += pings
+        all_statuses += statuses
+    parts.extend((_le(ring_instances), _le(ring_ids), _le(counts), _le(all_ids), _le(all_times), _le(all_pings),
+                  bytes(all_statuses)))
+    return b"".join(parts)
+
+
+def load_snapshot(data: bytes) -> Tuple[MonitorSnapshot, HeartbeatStore]:
+    """Распаковывает снапшот и буферы проверок, записанные dump_snapshot"""
+    view = memoryview(data)
+    magic, version = struct.unpack_from("<4sH", view, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Неподдерживаемый формат снапшота: {magic!r} v{version}")
+    _, _, taken_at, monitor_count, ring_count, capacity, type_count, instance_count = HEADER.unpack_from(view, 0)
+    offset = HEADER.size
+
+    type_lengths, offset = _read_array("I", view, offset, type_count)
+    instance_lengths, offset = _read_array("I", view, offset, instance_count)
+    records_end = offset + MONITOR.size * monitor_count
+    records = MONITOR.iter_unpack(view[offset:records_end])
+    (text_size,) = UINT32.unpack_from(view, records_end)
+    offset = records_end + UINT32.size
+    text = str(view[offset:offset + text_size], "utf-8")
+    offset += text_size
+
+    pos = 0
+    type_names = []
+    for length in type_lengths:
+        type_names.append(sys.intern(text[pos:pos + length]))
+        pos += length
+    instance_names = []
+    for length in instance_lengths:
+        instance_names.append(sys.intern(text[pos:pos + length]))
+        pos += length
+
+    statuses = list(MonitorStatus)
+    monitors = []
+    append = monitors.append
+    for monitor_id, status, flags, name_len, url_len, type_index, instance_index in records:
+        url_start = pos + name_len
+        end = url_start + url_len
+        append(Monitor(monitor_id, text[pos:url_start], statuses[status], _ACTIVE[flags], text[url_start:end],
+                       type_names[type_index], _MAINTENANCE[flags], instance_names[instance_index]))
+        pos = end
+
+    heartbeats = HeartbeatStore(capacity or 1)
+    ring_instances, offset = _read_array("H", view, offset, ring_count)
+    ring_ids, offset = _read_array("q", view, offset, ring_count)
+    counts, offset = _read_array("I", view, offset, ring_count)
+    total = sum(counts)
+    all_ids, offset = _read_array("q", view, offset, total)
+    all_times, offset = _read_array("d", view, offset, total)
+    all_pings, offset = _read_array("f", view, offset, total)
+    all_statuses = view[offset:offset + total]
+    if len(all_statuses) != total:
+        raise ValueError("Снапшот обрезан: не хватает данных проверок")
+
+    from_arrays = HeartbeatRing.from_arrays
+    rings = heartbeats.rings
+    capacity = heartbeats.capacity
+    start = 0
+    for instance_index, monitor_id, count in zip(ring_instances, ring_ids, counts):
+        end = start + count
+        rings[make_monitor_key(instance_names[instance_index], monitor_id)] = from_arrays(capacity, all_ids[start:end], all_times[start:end],
+                                        all_pings[start:end], all_statuses[start:end])
+        start = end
+
+    return MonitorSnapshot(monitors, taken_at=taken_at), heartbeats
+
+
+class SnapshotStore:
+    """Периодическое сохранение снапшота мониторов и буферов проверок на диск
+
+    Файл перезаписывается атомарно (запись во временный файл и переименование),
+    поэтому при падении во время записи остается предыдущая версия.
+    """
+
+    def __init__(self, path: str = "data/snapshot.bin", interval: float = 60.0):
+        self.path = path
+        self.interval = interval
+        self._saved_marker = None
+        # (mtime, размер) последнего прочитанного файла: ведомая реплика не перечитывает неизменившийся снапшот
+        self._loaded_marker = None
+        self._task: Optional[asyncio.Task] = None
+        # Реплика читает снапшот ведущей (follow), а не сохраняет свой
+        self.following = False
+
+    def save(self, snapshot: MonitorSnapshot, heartbeats: Optional[HeartbeatStore] = None) -> bool:
+        """Сохраняет снапшот на диск (синхронно)"""
+        try:
+            data = dump_snapshot(snapshot, heartbeats)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+            logger.info(f"Снапшот сохранен: {len(snapshot)} мониторов, {len(data)} байт")
+            return True
+        except (OSError, struct.error, ValueError) as e:
+            logger.error(f"Ошибка при сохранении снапшота в {self.path}: {e}")
+            return False
+
+    def load(self) -> Optional[Tuple[MonitorSnapshot, HeartbeatStore]]:
+        """Загружает снапшот с диска (None, если файла нет или он поврежден)"""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.error(f"Ошибка при чтении снапшота {self.path}: {e}")
+            return None
+        try:
+            snapshot, heartbeats = load_snapshot(data)
+        except (ValueError, struct.error, UnicodeDecodeError, IndexError) as e:
+            logger.error(f"Снапшот {self.path} поврежден и будет проигнорирован: {e}")
+            return None
+        logger.info(f"Загружен снапшот от {time.ctime(snapshot.taken_at)}: {len(snapshot)} мониторов")
+        return snapshot, heartbeats
+
+    def load_if_changed(self) -> Optional[Tuple[MonitorSnapshot, HeartbeatStore]]:
+        """Загружает снапшот, если файл изменился с прошлой загрузки (синхронно)"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        marker = (stat.st_mtime_ns, stat.st_size)
+        if marker == self._loaded_marker:
+            return None
+        loaded = self.load()
+        if loaded is not None:
+            self._loaded_marker = marker
+        return loaded
+
+    async def save_if_changed(self, snapshot: MonitorSnapshot, heartbeats: Optional[HeartbeatStore] = None) -> None:
+        """Сохраняет снапшот в отдельном потоке, если он изменился с прошлого сохранения"""
+        marker = (id(snapshot), heartbeats.version if heartbeats is not None else 0)
+        if marker == self._saved_marker or not len(snapshot):
+            return
+        # Буферы пополняются в цикле событий, пока поток пишет файл: копируем их здесь
+        if heartbeats is not None:
+            heartbeats = heartbeats.copy()
+        if await asyncio.to_thread(self.save, snapshot, heartbeats):
+            self._saved_marker = marker
+
+    async def _run(self, source) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.save_if_changed(*source())
+            except Exception as e:
+                logger.error(f"Ошибка при периодическом сохранении снапшота: {e}", exc_info=True)
+
+    async def _follow(self, apply) -> None:
+        while True:
+            try:
+                loaded = await asyncio.to_thread(self.load_if_changed)
+                if loaded is not None:
+                    apply(*loaded)
+            except Exception as e:
+                logger.error(f"Ошибка при чтении снапшота ведущей реплики: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    def follow(self, apply) -> asyncio.Task:
+        """Запускает чтение снапшота, который сохраняет ведущая реплика; apply(снапшот, буферы проверок)
+
+        Вызывается вместо start на ведомых репликах: они не опрашивают Kuma,
+        а отвечают пользователям по снапшоту ведущей.
+        """
+        if self._task is None or self._task.done():
+            self.following = True
+            self._task = asyncio.create_task(self._follow(apply))
+        return self._task
+
+    def start(self, source) -> asyncio.Task:
+        """Запускает периодическое сохранение; source() возвращает (снапшот, буферы проверок)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(source))
+        return self._task
+
+    async def stop(self, source=None) -> None:
+        """Останавливает сохранение (или чтение) снапшота и, если передан source, сохраняет последний снапшот"""
+        self.following = False
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if source is not None:
+            await self.save_if_changed(*source())
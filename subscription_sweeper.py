@@ -0,0 +1,203 @@
+import asyncio
+import heapq
+import inspect
+import logging
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Awaitable, Callable, List, Optional, Union
+
+from db_manager import DBManager, UserChange
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+
+class NoticeKind(Enum):
+    """Типы уведомлений о подписке"""
+    REMINDER = "reminder"  # Подписка скоро закончится
+    EXPIRED = "expired"    # Подписка закончилась
+
+
+@dataclass(slots=True)
+class SubscriptionNotice:
+    """Уведомление пользователю о подписке"""
+    kind: NoticeKind
+    user_id: int
+    expires_at: float  # Окончание подписки, Unix-время
+
+
+NoticeSubscriber = Callable[[List[SubscriptionNotice]], Union[None, Awaitable[None]]]
+
+
+class SubscriptionSweeper:
+    """Планировщик окончаний подписок на куче (min-heap) моментов срабатывания
+
+    Загружает из БД только окончания подписок ближайшего окна (window секунд)
+    запросом по индексу и кладет в кучу моменты срабатывания: напоминание за
+    remind_before до окончания и само окончание. Спит до ближайшего момента,
+    затем одной транзакцией помечает истекшие платежи и выбирает, кого
+    уведомить, за весь интервал с прошлой обработки. Граница обработанного
+    интервала хранится в БД, поэтому после перезапуска пропущенные за время
+    простоя события обрабатываются, а уже обработанные не повторяются.
+    Окончания подписок, измененные после загрузки окна (оплата), приходят
+    из уведомлений DBManager об изменениях пользователей.
+    """
+    STATE_NAME = "subscription_sweeper"
+
+    def __init__(self, db_manager: DBManager, remind_before: float = 3 * 86400, window: float = 86400,
+                 clock: Callable[[], float] = time.time):
+        self.db_manager = db_manager
+        self.remind_before = remind_before
+        self.window = window
+        self.clock = clock
+        self._heap: List[float] = []
+        # Моменты срабатывания до этой границы уже загружены в кучу
+        self._loaded_until = 0.0
+        # События до этой границы уже обработаны
+        self.watermark = 0.0
+        self._subscribers: List[NoticeSubscriber] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        # Цикл событий работающего планировщика: уведомления БД приходят из других потоков
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        db_manager.subscribe_user_changes(self.apply)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def subscribe(self, callback: NoticeSubscriber) -> None:
+        """Подписывает обработчик на уведомления о подписках"""
+        self._subscribers.append(callback)
+
+    @property
+    def next_fire_at(self) -> Optional[float]:
+        return self._heap[0] if self._heap else None
+
+    async def load(self) -> None:
+        """Загружает обработанную границу из БД и первое окно окончаний подписок"""
+        watermark = await asyncio.to_thread(self.db_manager.get_scheduler_state, self.STATE_NAME)
+        # При первом запуске прошлые окончания не обрабатываем: уведомлять о них поздно
+        self.watermark = watermark if watermark is not None else self.clock()
+        self._loaded_until = self.watermark
+        self._heap = []
+        await self.load_window()
+
+    async def load_window(self) -> int:
+        """Загружает в кучу моменты срабатывания следующего окна; возвращает их число"""
+        start = self._loaded_until
+        end = max(start, self.clock()) + self.window
+        expiries = await asyncio.to_thread(self.db_manager.get_subscription_expiries, start, end)
+        reminders = await asyncio.to_thread(self.db_manager.get_subscription_expiries,
+                                            start + self.remind_before, end + self.remind_before)
+        heap = self._heap
+        for _, expires_at in expiries:
+            heap.append(expires_at)
+        for _, expires_at in reminders:
+            heap.append(expires_at - self.remind_before)
+        heapq.heapify(heap)
+        self._loaded_until = end
+        logger.info(f"Загружено окончаний подписок: {len(expiries)}, напоминаний: {len(reminders)} "
+                    f"(в очереди {len(heap)})")
+        return len(expiries) + len(reminders)
+
+    def schedule(self, expires_at: float) -> None:
+        """Добавляет окончание подписки, изменившееся после загрузки окна (например, после оплаты)"""
+        for fire_at in (expires_at - self.remind_before, expires_at):
+            # Дальние моменты попадут в кучу при загрузке своего окна
+            if self.watermark < fire_at <= self._loaded_until:
+                heapq.heappush(self._heap, fire_at)
+        self._wakeup.set()
+
+    def apply(self, change: UserChange) -> None:
+        """Передает новое окончание подписки из уведомления БД в цикл событий планировщика
+
+        Вызывается в потоке, где изменили БД. Пока планировщик не запущен,
+        уведомления не нужны: окончание попадет в кучу при загрузке окна.
+        """
+        loop = self._loop
+        if change.expires_at is None or change.deleted or loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self.schedule, change.expires_at)
+
+    async def sweep(self, now: Optional[float] = None) -> List[SubscriptionNotice]:
+        """Обрабатывает все события до момента now одной транзакцией и рассылает уведомления"""
+        now = now if now is not None else self.clock()
+        if now <= self.watermark:
+            return []
+        result = await asyncio.to_thread(self.db_manager.sweep_subscriptions, self.watermark, now,
+                                         self.remind_before, self.STATE_NAME)
+        if result is None:
+            # Граница не сдвигается: события этого интервала обработаются при следующей попытке
+            raise RuntimeError("Не удалось обработать окончания подписок в БД")
+        reminders, expired, _ = result
+        self.watermark = now
+        heap = self._heap
+        while heap and heap[0] <= now:
+            heapq.heappop(heap)
+
+        notices = [SubscriptionNotice(NoticeKind.REMINDER, user_id, expires_at) for user_id, expires_at in reminders]
+        notices.extend(SubscriptionNotice(NoticeKind.EXPIRED, user_id, expires_at) for user_id, expires_at in expired)
+        if notices:
+            for callback in list(self._subscribers):
+                try:
+                    result = callback(notices)
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception as e:
+                    logger.error(f"Ошибка в подписчике на уведомления о подписках {callback!r}: {e}", exc_info=True)
+        return notices
+
+    async def _sleep_until(self, moment: float) -> None:
+        delay = moment - self.clock()
+        if delay <= 0:
+            return
+        self._wakeup.clear()
+        try:
+            async with asyncio.timeout(delay):
+                await self._wakeup.wait()
+        except TimeoutError:
+            pass
+
+    async def run(self) -> None:
+        """Цикл планировщика: спит до ближайшего события или до загрузки следующего окна"""
+        loaded = False
+        while True:
+            try:
+                if not loaded:
+                    await self.load()
+                    loaded = True
+                now = self.clock()
+                # Следующее окно подгружаем заранее, за половину окна до конца текущего
+                refill_at = self._loaded_until - self.window / 2
+                if now >= refill_at:
+                    await self.load_window()
+                    continue
+                fire_at = self.next_fire_at
+                if fire_at is not None and fire_at <= now:
+                    await self.sweep(now)
+                    continue
+                await self._sleep_until(min(fire_at, refill_at) if fire_at is not None else refill_at)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка в планировщике подписок: {e}", exc_info=True)
+                await asyncio.sleep(60)
+
+    def start(self) -> asyncio.Task:
+        """Запускает планировщик фоновой задачей"""
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self) -> None:
+        """Останавливает планировщик"""
+        self._loop = None
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
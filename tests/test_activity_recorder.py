@@ -0,0 +1,87 @@
+import pytest
+import asyncio
+import os
+import sqlite3
+import sys
+import threading
+from types import SimpleNamespace
+
+# Добавляем корневую директорию проекта в PYTHONPATH для импорта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from activity_recorder import ActivityRecorder
+from db_manager import DBManager, UserRole
+
+@pytest.fixture
+def db(tmp_path):
+    return DBManager(db_path=str(tmp_path / "test.db"))
+
+@pytest.mark.asyncio
+async def test_activity_batches(db):
+    """Действия копятся в памяти и пишутся пачкой по размеру или по таймеру, обновляя last_seen"""
+    db.add_or_update_user(1, UserRole.USER)
+    recorder = ActivityRecorder(db, flush_interval=0.05, batch_size=3)
+
+    async def handler(event, data):
+        return "ok"
+
+    for i, text in enumerate(["/status", "/find api", "привет"]):
+        event = SimpleNamespace(from_user=SimpleNamespace(id=1), text=text)
+        assert await recorder(handler, event, {}) == "ok", "Middleware должен вызывать обработчик"
+    for _ in range(100):
+        rows = db.get_user_activity(1)
+        if rows:
+            break
+        await asyncio.sleep(0.01)
+    assert [row['command'] for row in rows] == [None, "/find", "/status"], "Пачка пишется сразу по размеру"
+
+    recorder.start()
+    await recorder.record(1, "/monitor", timestamp=2e9)
+    await asyncio.sleep(0.15)
+    assert len(db.get_user_activity(1)) == 4, "Неполная пачка пишется по таймеру"
+    assert db.get_user(1)['last_seen'] == 2e9, "last_seen - время последнего действия"
+    await recorder.stop()
+    assert recorder.written == 4
+
+@pytest.mark.asyncio
+async def test_activity_backpressure(db):
+    """Заполненный буфер заставляет ждать записи, а при ошибке БД записи не теряются до перезапуска"""
+    release = threading.Event()
+    record_activity = db.record_activity
+
+    def slow_record(events):
+        release.wait(1)
+        return record_activity(events)
+
+    db.record_activity = slow_record
+    recorder = ActivityRecorder(db, batch_size=1000, max_pending=5)
+    for i in range(5):
+        await recorder.record(1, None, timestamp=float(i))
+    waiting = asyncio.create_task(recorder.record(1, None, timestamp=5.0))
+    await asyncio.sleep(0.05)
+    assert not waiting.done() and recorder.waits == 1, "При полном буфере запись должна ждать"
+    release.set()
+    await waiting
+    assert len(db.get_user_activity(1)) == 5 and len(recorder) == 1, "После записи пачки место освобождается"
+
+    db.record_activity = lambda events: False
+    assert not await recorder.flush()
+    assert len(recorder) == 1, "Неудачная пачка возвращается в буфер"
+    db.record_activity = record_activity
+    await recorder.stop()
+    assert len(db.get_user_activity(1)) == 6, "Остаток дописывается при остановке"
+
+def test_last_seen_migration(tmp_path):
+    """В БД, созданной до появления last_seen, колонка добавляется при запуске"""
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE users (user_id INTEGER PRIMARY KEY, role TEXT NOT NULL, name TEXT, username TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, subscription_expires_at TIMESTAMP NULL)""")
+    conn.execute("INSERT INTO users (user_id, role, name) VALUES (1, 'user', 'Старый')")
+    conn.commit()
+    conn.close()
+
+    db = DBManager(db_path=path)
+    assert db.record_activity([(1, "/start", 100.0), (1, "/status", 50.0)])
+    assert db.get_user(1)['last_seen'] == 100.0, "last_seen не должен уменьшаться из-за порядка в пачке"
+    DBManager(db_path=path)  # Повторный запуск не должен добавлять колонку заново
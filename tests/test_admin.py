@@ -0,0 +1,81 @@
+import pytest
+import asyncio
+import os
+import sys
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# Добавляем корневую директорию проекта в PYTHONPATH для импорта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot
+from admin import admin as diagnostics
+from db_manager import UserRole
+
+
+def busy_work(n):
+    return sum(i * i for i in range(n))
+
+
+async def load():
+    """Нагрузка на событийный цикл на время замера"""
+    while True:
+        busy_work(20_000)
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["sample", "cprofile"])
+async def test_profile_loop(mode):
+    """Профиль событийного цикла показывает функции, на которые уходит время"""
+    task = asyncio.create_task(load())
+    try:
+        report = await diagnostics.profile_loop(0.5, mode)
+    finally:
+        task.cancel()
+    assert "busy_work" in report or "<genexpr>" in report, "В профиле должна быть нагружающая функция"
+    assert len(report) <= diagnostics.MAX_REPORT_LENGTH, "Отчет должен помещаться в сообщение"
+
+
+@pytest.mark.asyncio
+async def test_memory_and_lag():
+    """tracemalloc показывает прирост памяти, второй замер одновременно не запускается"""
+    kept = []
+
+    async def allocate():
+        await asyncio.sleep(0.05)
+        kept.append([object() for _ in range(50_000)])
+
+    task = asyncio.create_task(allocate())
+    memory = asyncio.create_task(diagnostics.memory_top(0.3))
+    await asyncio.sleep(0.01)
+    with pytest.raises(diagnostics.DiagnosticsBusy):
+        await diagnostics.profile_loop(0.1)
+    report = await memory
+    await task
+    assert "test_admin.py" in report, "Выделения теста должны попасть в топ"
+
+    stats = await diagnostics.measure_loop_lag(0.2, interval=0.01)
+    assert stats["samples"] > 5 and stats["max"] >= stats["p50"] >= 0, "Задержка цикла должна измеряться"
+    assert diagnostics.clamp_seconds("100500", 10) == diagnostics.MAX_SECONDS, "Длительность замера ограничена"
+    assert diagnostics.clamp_seconds("abc", 10) == 10
+
+
+@pytest.mark.asyncio
+async def test_admin_commands_require_admin():
+    """Команды диагностики доступны только администратору"""
+    entitlements = MagicMock()
+    entitlements.fetch = AsyncMock()
+    message = MagicMock()
+    message.from_user.id = 1
+    message.answer = AsyncMock()
+
+    entitlements.role.return_value = UserRole.USER
+    with patch.object(bot, 'entitlements', entitlements):
+        await bot.admin_stats(message)
+    assert message.answer.call_args.args[0] == "У вас нет доступа к этой команде."
+
+    entitlements.role.return_value = UserRole.ADMIN
+    with patch.object(bot, 'entitlements', entitlements), patch.object(bot, 'outbox', None):
+        await bot.admin_stats(message)
+    text = message.answer.call_args.args[0]
+    assert "Очередь исходящих: не создан" in text, "Несозданные компоненты не должны создаваться ради отчета"
@@ -0,0 +1,87 @@
+import pytest
+import os
+import sys
+
+# Добавляем корневую директорию проекта в PYTHONPATH для импорта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alert_engine import AlertConfig, AlertEngine, AlertKind, FlapMode
+from kuma_models import Heartbeat, MonitorStatus
+
+STATUS_CODES = {"U": MonitorStatus.UP, "D": MonitorStatus.DOWN, "P": MonitorStatus.PENDING, "M": MonitorStatus.MAINTENANCE}
+
+def heartbeats(sequence, monitor_id=1):
+    """Записанная последовательность проверок: U - работает, D - упал, P - повтор, M - обслуживание"""
+    return [
+        Heartbeat(id=i + 1, monitor_id=monitor_id, status=STATUS_CODES[code], time=1_700_000_000 + i * 60, ping=10.0)
+        for i, code in enumerate(sequence.replace(" ", ""))
+    ]
+
+def kinds(events):
+    return [event.kind for event in events]
+
+def test_down_requires_consecutive_failures():
+    """Падение подтверждается только после fail_threshold неудачных проверок подряд"""
+    engine = AlertEngine(AlertConfig(fail_threshold=3, recover_threshold=2))
+    
+    assert engine.process_many(heartbeats("UUU DD U DD U")) == [], "Одиночные сбои не должны вызывать оповещение"
+    
+    events = engine.process_many(heartbeats("DDD"))
+    assert kinds(events) == [AlertKind.DOWN]
+    assert events[0].status == MonitorStatus.DOWN
+
+def test_recovery_hysteresis_and_deduplication():
+    """Восстановление требует recover_threshold успешных проверок, повторов оповещений нет"""
+    engine = AlertEngine(AlertConfig(fail_threshold=2, recover_threshold=3))
+    
+    events = engine.process_many(heartbeats("UUU DD DDDD U D UU U UUUU"))
+    
+    assert kinds(events) == [AlertKind.DOWN, AlertKind.UP], "Каждое состояние должно оповещаться один раз"
+    assert events[1].time == heartbeats("UUU DD DDDD U D UU U")[-1].time, "Восстановление - на третьей успешной проверке подряд"
+
+def test_initial_state():
+    """Первое подтвержденное 'работает' не оповещается, а 'упал' - оповещается"""
+    engine = AlertEngine(AlertConfig(fail_threshold=2))
+    
+    assert engine.process_many(heartbeats("UUUU", monitor_id=1)) == []
+    assert kinds(engine.process_many(heartbeats("DD", monitor_id=2))) == [AlertKind.DOWN]
+
+    # Монитор с открытым инцидентом после перезапуска: восстановление оповещается
+    engine.assume_down([3])
+    assert kinds(engine.process_many(heartbeats("UU", monitor_id=3))) == [AlertKind.UP]
+
+def test_pending_and_maintenance():
+    """Повторные проверки считаются сбоями, проверки на обслуживании игнорируются"""
+    engine = AlertEngine(AlertConfig(fail_threshold=3))
+    
+    assert kinds(engine.process_many(heartbeats("UU PP D"))) == [AlertKind.DOWN]
+    
+    engine = AlertEngine(AlertConfig(fail_threshold=3))
+    assert engine.process_many(heartbeats("UU DD MMMM")) == [], "Обслуживание не должно продлевать серию сбоев"
+
+@pytest.mark.parametrize("mode,expected_suppressed", [(FlapMode.DIGEST, 5), (FlapMode.SUPPRESS, 0)])
+def test_flapping(mode, expected_suppressed):
+    """Мигающий монитор дает одно оповещение о начале и одно об окончании мигания"""
+    engine = AlertEngine(AlertConfig(fail_threshold=1, recover_threshold=1, flap_window=10,
+                                     flap_start_changes=4, flap_stop_changes=1, flap_mode=mode))
+    
+    events = engine.process_many(heartbeats("UUUU DU DU DU DU UUUUUUUUUUUU"))
+    
+    assert kinds(events) == [AlertKind.DOWN, AlertKind.UP, AlertKind.DOWN, AlertKind.FLAPPING, AlertKind.FLAP_RESOLVED]
+    assert engine.is_flapping(1) is False
+    assert events[-1].status == MonitorStatus.UP, "По окончании мигания сообщается итоговое состояние"
+    assert events[-1].suppressed == expected_suppressed
+
+def test_bounded_state():
+    """Состояние монитора ограничено окном и удаляется вместе с монитором"""
+    engine = AlertEngine(AlertConfig(flap_window=8, flap_start_changes=4, flap_stop_changes=1))
+    engine.process_many(heartbeats("UD" * 5000))
+    
+    assert len(engine._states[1].window) == 8
+    engine.forget(1)
+    assert len(engine) == 0
+
+def test_invalid_config():
+    """Некорректные пороги мигания должны отклоняться"""
+    with pytest.raises(ValueError):
+        AlertConfig(flap_window=10, flap_start_changes=2, flap_stop_changes=3)
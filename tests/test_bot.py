@@ -1,4 +1,5 @@
 import pytest
+import asyncio
 from aiogram import Bot, Dispatcher
 from aiogram.types import Message, User, Chat
 from aiogram.filters import Command
@@ -12,7 +13,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Импортируем обработчики сообщений из бота
 import bot  # Сначала импортируем весь модуль
-from bot import send_welcome, get_status, list_monitors, list_incidents, is_authorized
+from bot import send_welcome, get_status, list_monitors, list_incidents, show_history, find_monitors, show_monitor, is_authorized
 
 # Создаем фикстуры для тестирования Telegram бота
 @pytest.fixture
@@ -229,4 +230,341 @@ async def test_list_incidents(mock_client_class, patch_is_authorized):
     assert "Проблема с сервисом 1" in call_args, "Сообщение должно содержать название инцидента"
     assert "Сервис 1" in call_args, "Сообщение должно содержать имя сервиса"
     assert "down" in call_args, "Сообщение должно содержать статус инцидента"
-    assert "2023-01-01 10:00" in call_args, "Сообщение должно содержать время начала инцидента" 
\ No newline at end of file
+    assert "2023-01-01 10:00" in call_args, "Сообщение должно содержать время начала инцидента" 
+
+# Тесты для фабрики приложения
+def test_import_is_lazy():
+    """Импорт модуля не должен создавать бота и подключаться к БД"""
+    import subprocess
+    # В отдельном процессе: в этом другие тесты уже могли создать бота и БД
+    code = ("import bot; "
+            "assert bot.bot is None, 'Бот должен создаваться лениво, в фабрике приложения'; "
+            "assert bot.db_manager is None, 'БД должна открываться лениво, при первом обращении'; "
+            "assert bot.config is None, 'Настройки должны читаться при первом обращении'")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+
+def test_create_dispatcher():
+    """Тест регистрации обработчиков в диспетчере"""
+    dispatcher = bot.create_dispatcher()
+
+    callbacks = [handler.callback for handler in dispatcher.message.handlers]
+    assert callbacks == [send_welcome, get_status, list_monitors, list_incidents, show_history, find_monitors, show_monitor,
+                         bot.admin_profile, bot.admin_memory, bot.admin_loop_lag, bot.admin_stats, bot.export_data, bot.admin_reload], "Все команды должны быть зарегистрированы"
+    assert dispatcher.startup.handlers, "Фоновая инициализация должна запускаться при старте"
+    assert bot.track_handler_task in dispatcher.update.outer_middleware, "Задачи обработчиков должны отслеживаться для остановки"
+
+@pytest.mark.asyncio
+async def test_show_history(patch_is_authorized, tmp_path):
+    """Тест команды /history с фильтром по монитору и периоду"""
+    from db_manager import DBManager
+    import time
+    
+    db = DBManager(db_path=str(tmp_path / "test.db"))
+    now = time.time()
+    db.record_incident_transitions(
+        [(1, "Сервис 1", now - 3600), (2, "Сервис 2", now - 1800), (1, "Сервис 1", now - 10 * 86400)],
+        [(1, now - 3000)],
+    )
+    
+    message = AsyncMock(spec=Message)
+    message.answer = AsyncMock()
+    message.text = "/history 1 7d"
+    
+    with patch.object(bot, 'db_manager', db):
+        await show_history(message)
+    
+    call_args = message.answer.call_args[0][0]
+    assert "История инцидентов" in call_args, "Сообщение должно содержать заголовок истории"
+    assert "Сервис 1" in call_args, "Сообщение должно содержать инцидент выбранного монитора"
+    assert "Сервис 2" not in call_args, "Инциденты других мониторов не должны показываться"
+    assert call_args.count("Начало") == 1, "Инциденты старше периода не должны показываться"
+    assert "10м" in call_args, "Должна показываться длительность разрешенного инцидента"
+
+@pytest.mark.asyncio
+async def test_history_pagination(patch_is_authorized, tmp_path):
+    """Кнопка следующей страницы истории помещается в 64 байта и продолжает с того же места"""
+    from db_manager import DBManager
+    import time
+    
+    db = DBManager(db_path=str(tmp_path / "test.db"))
+    now = time.time()
+    db.record_incident_transitions([("production-eu-west:1234567", "Сервис", now - 60 * i) for i in range(15)], [])
+    
+    message = AsyncMock(spec=Message)
+    message.answer = AsyncMock()
+    message.text = "/history production-eu-west:1234567 30d"
+    with patch.object(bot, 'db_manager', db):
+        await show_history(message)
+    
+    first_page = message.answer.call_args[0][0]
+    data = message.answer.call_args.kwargs['reply_markup'].inline_keyboard[0][0].callback_data
+    assert len(data.encode()) <= 64, "callback_data не должна превышать ограничение Telegram"
+    
+    callback = AsyncMock()
+    callback.data = data
+    callback.message = AsyncMock(spec=Message)
+    callback.message.answer = AsyncMock()
+    with patch.object(bot, 'db_manager', db):
+        await bot.history_next_page(callback)
+    
+    second_page = callback.message.answer.call_args[0][0]
+    assert first_page.count("Начало") == 10 and second_page.count("Начало") == 5, "Вторая страница продолжает первую"
+    assert callback.message.answer.call_args.kwargs['reply_markup'] is None, "Последняя страница без кнопки"
+
+@pytest.mark.asyncio
+@patch('bot.UptimeKumaClient')
+async def test_get_status_warm_start(mock_client_class, patch_is_authorized):
+    """Тест /status после перезапуска: ответ из сохраненного снапшота без обращения к Kuma"""
+    from kuma_models import MonitorRecordCache
+    from monitor_watcher import MonitorWatcher
+    from snapshot_diff import MonitorSnapshot
+    
+    watcher = MonitorWatcher()
+    watcher.restore(MonitorSnapshot(MonitorRecordCache().build([
+        {"id": 1, "name": "Сервис 1", "active": True, "maintenance": False},
+        {"id": 2, "name": "Сервис 2", "active": True, "maintenance": False, "status": 0},
+    ])))
+    message = AsyncMock(spec=Message)
+    message.answer = AsyncMock()
+    
+    with patch.object(bot, 'watcher', watcher):
+        await get_status(message)
+    
+    mock_client_class.assert_not_called()
+    assert message.answer.call_count == 1, "Должен быть отправлен сразу готовый ответ"
+    call_args = message.answer.call_args[0][0]
+    assert "сохранены до перезапуска" in call_args, "Ответ должен быть помечен как устаревший"
+    assert "Не работают: 1" in call_args, "Ответ должен строиться по сохраненному снапшоту"
+    assert "Сервис 2" in call_args, "В ответе должен быть указан проблемный сервис"
+
+@pytest.mark.asyncio
+@patch('bot.UptimeKumaClient')
+async def test_get_status_on_follower(mock_client_class, patch_is_authorized, tmp_path):
+    """Тест /status на ведомой реплике: ответ по снапшоту ведущей без пометки «обновляются»"""
+    from heartbeat_store import HeartbeatStore
+    from kuma_models import MonitorRecordCache
+    from monitor_search import MonitorSearchIndex
+    from monitor_watcher import MonitorWatcher
+    from snapshot_diff import MonitorSnapshot
+    from snapshot_store import SnapshotStore
+    
+    path = str(tmp_path / "snapshot.bin")
+    SnapshotStore(path).save(MonitorSnapshot(MonitorRecordCache().build([
+        {"id": 1, "name": "Сервис 1", "active": True, "maintenance": False},
+        {"id": 2, "name": "Сервис 2", "active": True, "maintenance": False, "status": 0},
+    ])))
+    watcher = MonitorWatcher()
+    store = SnapshotStore(path, interval=0.01)
+    message = AsyncMock(spec=Message)
+    message.answer = AsyncMock()
+    
+    with patch.multiple(bot, watcher=watcher, snapshot_store=store, heartbeat_store=HeartbeatStore(),
+                        search_index=MonitorSearchIndex(MonitorSnapshot([]))):
+        store.follow(bot.apply_leader_snapshot)
+        for _ in range(100):
+            if len(watcher.snapshot):
+                break
+            await asyncio.sleep(0.01)
+        await get_status(message)
+        await store.stop()
+    
+    mock_client_class.assert_not_called()
+    call_args = message.answer.call_args[0][0]
+    assert "Данные ведущей реплики" in call_args, "Ответ должен быть помечен как данные ведущей реплики"
+    assert "обновляются" not in call_args, "Ведомая реплика не должна обещать обновление данных"
+    assert "Не работают: 1" in call_args, "Ответ должен строиться по снапшоту ведущей"
+
+def test_format_status_instances():
+    """Тест разбивки /status по экземплярам Kuma"""
+    summary = {"total": 3, "up": 2, "down": 1, "maintenance": 0, "uptime": 66.67, "instances": {
+        "eu": {"total": 2, "up": 2, "down": 0, "maintenance": 0, "uptime": 100.0, "ok": True, "error": None,
+               "latency": 0.12, "fetched_at": 0.0},
+        "us": {"total": 1, "up": 0, "down": 1, "maintenance": 0, "uptime": 0.0, "ok": False, "error": "таймаут",
+               "latency": 10.0, "fetched_at": 0.0},
+    }}
+    
+    response = bot.format_status(summary, [])
+    
+    assert "eu: работают 2 из 2" in response, "Должна быть сводка по доступному экземпляру"
+    assert "us: недоступен (таймаут)" in response, "Должна быть видна ошибка недоступного экземпляра"
+
+@pytest.mark.asyncio
+@patch('bot.UptimeKumaClient')
+async def test_find_monitors(mock_client_class, patch_is_authorized):
+    """Тест команды /find: поиск по индексу и кнопки перехода к карточкам мониторов"""
+    from kuma_models import MonitorRecordCache
+    from monitor_search import MonitorSearchIndex
+    from monitor_watcher import MonitorWatcher
+    from snapshot_diff import MonitorSnapshot
+    
+    snapshot = MonitorSnapshot(MonitorRecordCache().build([
+        {"id": 1, "name": "API prod", "url": "https://api.example.com", "active": True, "maintenance": False},
+        {"id": 2, "name": "Сайт", "url": "https://www.example.com", "active": True, "maintenance": False},
+        {"id": 3, "name": "API staging", "url": "https://api-stage.example.com", "active": True, "maintenance": False, "status": 0},
+    ]))
+    watcher = MonitorWatcher()
+    watcher.restore(snapshot)
+    message = AsyncMock(spec=Message)
+    message.answer = AsyncMock()
+    message.text = "/find api"
+    
+    with patch.object(bot, 'watcher', watcher), patch.object(bot, 'search_index', MonitorSearchIndex(snapshot)):
+        await find_monitors(message)
+    
+    mock_client_class.assert_not_called()
+    keyboard = message.answer.call_args.kwargs['reply_markup'].inline_keyboard
+    buttons = [row[0] for row in keyboard]
+    assert [button.callback_data for button in buttons] == ["mon:1", "mon:3"], "Должны найтись оба API-монитора по порядку"
+    assert buttons[1].text.startswith("❌"), "На кнопке должен быть виден статус монитора"
+
+@pytest.mark.asyncio
+@patch('bot.UptimeKumaClient')
+async def test_show_monitor(mock_client_class, patch_is_authorized):
+    """Тест команды /monitor: карточка монитора с графиком и перцентилями времени ответа"""
+    from heartbeat_store import HeartbeatStore
+    from kuma_models import Heartbeat, MonitorRecordCache, MonitorStatus
+    from monitor_search import MonitorSearchIndex
+    from monitor_watcher import MonitorWatcher
+    from snapshot_diff import MonitorSnapshot
+    
+    snapshot = MonitorSnapshot(MonitorRecordCache().build([
+        {"id": 1, "name": "API prod", "url": "https://api.example.com", "active": True, "maintenance": False},
+    ]))
+    watcher = MonitorWatcher()
+    watcher.restore(snapshot)
+    store = HeartbeatStore(capacity=10)
+    store.add_many([Heartbeat(i, 1, MonitorStatus.UP, 1000.0 + i, float(10 * i)) for i in range(1, 11)])
+    message = AsyncMock(spec=Message)
+    message.answer = AsyncMock()
+    message.text = "/monitor api prod"
+    
+    with patch.object(bot, 'watcher', watcher), patch.object(bot, 'heartbeat_store', store), \
+            patch.object(bot, 'search_index', MonitorSearchIndex(snapshot)):
+        await show_monitor(message)
+    
+    mock_client_class.assert_not_called()
+    text = message.answer.call_args.args[0]
+    assert "API prod" in text, "Монитор должен находиться по имени"
+    assert "▁" in text and "█" in text, "В карточке должен быть текстовый график времени ответа"
+    assert "p50 55" in text and "макс 100" in text, "В карточке должны быть перцентили времени ответа"
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("handler_seconds, expect_cancelled", [(0.2, False), (100, True)])
+async def test_graceful_shutdown(tmp_path, handler_seconds, expect_cancelled):
+    """Остановка дожидается обработчиков и очереди отправки, но укладывается в SHUTDOWN_TIMEOUT"""
+    import time
+    from types import SimpleNamespace
+    from heartbeat_store import HeartbeatStore
+    from kuma_models import MonitorRecordCache
+    from monitor_watcher import MonitorWatcher
+    from outbox import Outbox
+    from snapshot_diff import MonitorSnapshot
+    from snapshot_store import SnapshotStore
+    from config import Config
+    from db_manager import DBManager
+    from activity_recorder import ActivityRecorder
+    
+    sent = []
+    
+    async def send(chat_id, text):
+        await asyncio.sleep(0.01)
+        sent.append(chat_id)
+    
+    async def handler():
+        await asyncio.sleep(handler_seconds)
+    
+    queue = Outbox(send, rate=1000, burst=100)
+    queue.start()
+    for chat_id in range(10):
+        queue.put_nowait(chat_id, "текст")
+    watcher = MonitorWatcher()
+    watcher.restore(MonitorSnapshot(MonitorRecordCache().build([{"id": 1, "name": "API", "active": True}])))
+    store = SnapshotStore(str(tmp_path / "snapshot.bin"))
+    db = DBManager(db_path=str(tmp_path / "test.db"))
+    activity = ActivityRecorder(db, flush_interval=60)
+    activity.start()
+    await activity.record(7, "/status")
+    in_flight = asyncio.create_task(handler())
+    
+    with patch.multiple(bot, watcher=watcher, outbox=queue, snapshot_store=store, heartbeat_store=HeartbeatStore(),
+                        incident_recorder=None, digest_scheduler=None, subscription_sweeper=None,
+                        leader_election=None, kuma_pool=None, _background_tasks=set(), _shutting_down=False,
+                        activity_recorder=activity, config=Config(shutdown_timeout=0.5),
+                        _handler_tasks={in_flight}):
+        started = time.monotonic()
+        await bot.on_shutdown(SimpleNamespace())
+        elapsed = time.monotonic() - started
+    
+    assert elapsed < 1.5, f"Остановка должна уложиться в срок, а заняла {elapsed:.2f} с"
+    assert in_flight.cancelled() == expect_cancelled, "Обработчик дожидается, а зависший - отменяется по сроку"
+    assert sorted(sent) == list(range(10)), "Очередь исходящих сообщений должна быть отправлена"
+    assert os.path.exists(store.path), "Снапшот должен быть сохранен при остановке"
+    assert [row['command'] for row in db.get_user_activity(7)] == ["/status"], "Журнал активности дописывается при остановке"
+
+@pytest.mark.asyncio
+async def test_handler_tasks_are_tracked():
+    """Задача обработчика апдейта видна остановке, пока он выполняется"""
+    seen = []
+
+    async def handler(event, data):
+        seen.append(asyncio.current_task() in bot._handler_tasks)
+
+    with patch.object(bot, '_handler_tasks', set()):
+        await asyncio.create_task(bot.track_handler_task(handler, None, {}))
+        assert seen == [True], "Выполняющийся обработчик должен быть в списке задач"
+        assert not bot._handler_tasks, "Завершенный обработчик должен убираться из списка"
+
+@pytest.mark.asyncio
+async def test_snapshot_not_saved_after_losing_lease(tmp_path):
+    """Реплика, потерявшая аренду, не пишет снапшот; при остановке он пишется до освобождения аренды"""
+    from db_manager import DBManager
+    from heartbeat_store import HeartbeatStore
+    from kuma_models import MonitorRecordCache
+    from leader import LeaderElection
+    from monitor_watcher import MonitorWatcher
+    from snapshot_diff import MonitorSnapshot
+    from snapshot_store import SnapshotStore
+    
+    db = DBManager(db_path=str(tmp_path / "test.db"))
+    election = LeaderElection(db, holder="a", ttl=15)
+    election.subscribe(bot.on_leadership_change)
+    watcher = MonitorWatcher()
+    watcher.restore(MonitorSnapshot(MonitorRecordCache().build([{"id": 1, "name": "API", "active": True}])))
+    store = SnapshotStore(str(tmp_path / "snapshot.bin"))
+    
+    with patch.multiple(bot, watcher=watcher, snapshot_store=store, heartbeat_store=HeartbeatStore(),
+                        incident_recorder=None, digest_scheduler=None, subscription_sweeper=None,
+                        leader_election=election, _shutting_down=True):
+        # Аренду продлить не удалось: роль снимается шагом продления
+        election.is_leader = True
+        await election._set_leader(False)
+        assert not os.path.exists(store.path), "После потери аренды снапшот пишет уже другая реплика"
+        
+        assert db.try_acquire_lease("kuma-watcher", "a", 15)
+        election.is_leader = True
+        await election.stop()
+        assert os.path.exists(store.path), "При остановке ведущая реплика сохраняет снапшот"
+        assert db.get_lease("kuma-watcher") is None, "Аренда освобождается после записи снапшота"
+
+@pytest.mark.asyncio
+async def test_shutdown_bounds_hung_steps():
+    """Зависший шаг остановки прерывается, и остановка все равно укладывается в SHUTDOWN_TIMEOUT"""
+    import time
+    from types import SimpleNamespace
+    from config import Config
+    
+    async def hang():
+        await asyncio.sleep(100)
+    
+    hung = SimpleNamespace(stop=hang)
+    with patch.multiple(bot, watcher=None, outbox=None, snapshot_store=None, incident_recorder=None,
+                        digest_scheduler=None, subscription_sweeper=None, leader_election=hung, kuma_pool=None,
+                        _background_tasks=set(), _shutting_down=False, activity_recorder=hung,
+                        _handler_tasks=set(), config=Config(shutdown_timeout=0.3)):
+        started = time.monotonic()
+        await bot.on_shutdown(SimpleNamespace())
+        elapsed = time.monotonic() - started
+    
+    assert elapsed < 1.0, f"Зависшие шаги должны прерываться по сроку, а остановка заняла {elapsed:.2f} с"
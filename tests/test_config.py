@@ -0,0 +1,105 @@
+import pytest
+import functools
+import os
+import sys
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# Добавляем корневую директорию проекта в PYTHONPATH для импорта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot
+from alert_engine import FlapMode
+from config import Config, changed_fields, load_config
+from db_manager import UserRole
+from kuma_pool import KumaSessionPool
+from latency import ChartCache
+
+
+def test_load_config(tmp_path):
+    """Значения из .env перекрывают окружение процесса, не изменяя его"""
+    env_file = tmp_path / ".env"
+    env_file.write_text("KUMA_POOL_SIZE=7\nALERT_FLAP_MODE=suppress\nDIGEST_HOUR=\nKUMA_INSTANCES=eu,us\n"
+                        "UPTIME_KUMA_EU_URL=http://eu\n")
+    environ = {'KUMA_POOL_SIZE': '100', 'UPTIME_KUMA_USERNAME': 'admin', 'KUMA_POLL_INTERVAL': ''}
+
+    settings = load_config(str(env_file), environ)
+    assert settings.kuma_pool_size == 7, ".env должен перекрывать окружение"
+    assert settings.alert_flap_mode is FlapMode.SUPPRESS
+    assert settings.digest_hour is None, "Пустой DIGEST_HOUR выключает сводки"
+    assert settings.kuma_poll_interval == 0, "Пустой KUMA_POLL_INTERVAL выключает опрос"
+    assert [i.name for i in settings.kuma_instances] == ["eu", "us"]
+    assert settings.kuma_instances[0].username == "admin", "Общий логин Kuma берется из окружения"
+    assert environ['KUMA_POOL_SIZE'] == '100', "Окружение процесса не должно меняться"
+    assert changed_fields(Config(), settings) == ['kuma_instances', 'kuma_poll_interval', 'kuma_pool_size',
+                                                  'alert_flap_mode', 'digest_hour']
+
+    env_file.write_text("KUMA_POOL_SIZE=много\n")
+    with pytest.raises(ValueError, match="KUMA_POOL_SIZE"):
+        load_config(str(env_file), {})
+
+
+@pytest.mark.asyncio
+async def test_reload_config(tmp_path):
+    """Перезагрузка применяет лимиты пула, TTL кешей и настройки Kuma без пересоздания компонентов"""
+    env_file = tmp_path / ".env"
+    env_file.write_text("KUMA_POOL_SIZE=1\nKUMA_MAX_CONCURRENT_LOGINS=1\nCHART_CACHE_SECONDS=30\n"
+                        "TENANT_CACHE_TTL=5\nUPTIME_KUMA_URL=http://new\nHEARTBEAT_BUFFER_SIZE=500\nADMIN_CHAT_ID=42\n")
+    pool = KumaSessionPool(max_sessions=10, max_concurrent_logins=4)
+    cache = ChartCache(bucket=60)
+    cache.put("api", b"png")
+    watcher = MagicMock(interval=60.0)
+    tenants = MagicMock(ttl=60.0)
+    initialize_app = AsyncMock()
+
+    with patch.multiple(bot, config=Config(admin_chat_id="1"), kuma_pool=pool, chart_cache=cache, watcher=watcher,
+                        tenant_directory=tenants, initialize_app=initialize_app), \
+            patch.object(bot, 'load_config', functools.partial(load_config, str(env_file), {})):
+        applied, restart = await bot.reload_config()
+        await bot._wait_tasks(set(bot._background_tasks), 1.0)
+
+        assert bot.get_config().kuma_pool_size == 1, "Новые настройки должны стать текущими"
+        assert set(applied) == {'kuma_pool_size', 'kuma_max_concurrent_logins', 'chart_cache_seconds',
+                                'tenant_cache_ttl', 'kuma_instances', 'admin_chat_id'}
+        assert restart == ['heartbeat_buffer_size'], "Размер буферов меняется только перезапуском"
+        assert pool.max_sessions == 1 and pool._login_semaphore._value == 1, "Лимиты пула должны обновиться"
+        assert cache.bucket == 30 and len(cache) == 0, "Кеш графиков сбрасывается при смене интервала"
+        assert tenants.ttl == 5
+        watcher.reconnect.assert_called_once()
+        initialize_app.assert_awaited_once()
+        assert bot.create_kuma_client().url == "http://new", "Новые клиенты Kuma получают новые настройки"
+
+        # Ошибка в .env: остаются прежние настройки
+        env_file.write_text("KUMA_POOL_SIZE=x\n")
+        with pytest.raises(ValueError):
+            await bot.reload_config()
+        assert bot.get_config().kuma_pool_size == 1, "При ошибке должны остаться прежние настройки"
+
+        # Компонент не принял новые значения: текущими остаются прежние настройки
+        env_file.write_text("KUMA_POOL_SIZE=3\n")
+        with patch.object(pool, 'configure', AsyncMock(side_effect=RuntimeError("сбой пула"))):
+            with pytest.raises(ValueError):
+                await bot.reload_config()
+        assert bot.get_config().kuma_pool_size == 1, "Непримененные настройки не должны становиться текущими"
+
+
+@pytest.mark.asyncio
+async def test_reload_command():
+    """/reload доступна администратору и сообщает, что применено"""
+    entitlements = MagicMock()
+    entitlements.fetch = AsyncMock()
+    entitlements.role.return_value = UserRole.ADMIN
+    message = MagicMock()
+    message.from_user.id = 1
+    message.answer = AsyncMock()
+    reload_config = AsyncMock(return_value=(['chart_cache_seconds'], ['snapshot_path']))
+
+    with patch.object(bot, 'entitlements', entitlements), patch.object(bot, 'reload_config', reload_config):
+        await bot.admin_reload(message)
+    text = message.answer.call_args.args[0]
+    assert "Применены: CHART_CACHE_SECONDS" in text
+    assert "после перезапуска: SNAPSHOT_PATH" in text
+
+    reload_config.side_effect = ValueError("Неверное значение KUMA_POOL_SIZE='x'")
+    with patch.object(bot, 'entitlements', entitlements), patch.object(bot, 'reload_config', reload_config):
+        await bot.admin_reload(message)
+    assert "прежними" in message.answer.call_args.args[0]
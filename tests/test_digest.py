@@ -0,0 +1,74 @@
+import pytest
+import datetime
+import os
+import sys
+
+# Добавляем корневую директорию проекта в PYTHONPATH для импорта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alert_engine import AlertEvent, AlertKind
+from db_manager import DBManager, UserRole
+from digest import DigestAggregator, DigestPeriod, DigestScheduler, local_day
+from kuma_models import Heartbeat, MonitorStatus
+
+# Понедельник, 09:00 по местному времени
+NOW = datetime.datetime(2026, 1, 5, 9, 0).timestamp()
+HOUR = 3600
+
+def beats(monitor_id, start, statuses, ping=10.0):
+    return [Heartbeat(i + 1, monitor_id, status, start + i * 60, ping + i) for i, status in enumerate(statuses)]
+
+def test_aggregator_counts_per_day():
+    """Тест накопления показателей: аптайм, инциденты и худший отклик по суткам"""
+    aggregator = DigestAggregator()
+    yesterday = NOW - 12 * HOUR
+    week_ago = NOW - 3 * 24 * HOUR
+    aggregator.add_many(beats(1, yesterday, [MonitorStatus.UP] * 3 + [MonitorStatus.DOWN]))
+    aggregator.add_many(beats(1, week_ago, [MonitorStatus.UP] * 4 + [MonitorStatus.MAINTENANCE]))
+    aggregator.handle_events([AlertEvent(AlertKind.DOWN, 1, yesterday), AlertEvent(AlertKind.UP, 1, yesterday)])
+    
+    day = local_day(NOW) - 1
+    daily = aggregator.totals(day, day)[1]
+    assert (daily.checks, daily.up, daily.incidents) == (4, 3, 1), "Суточные показатели посчитаны неверно"
+    assert daily.uptime == 75.0, "Аптайм - доля успешных проверок"
+    assert daily.worst_ping == 13.0, "Худший отклик - максимальный ping"
+    
+    weekly = aggregator.totals(day - 6, day)[1]
+    assert (weekly.checks, weekly.up, weekly.incidents) == (8, 7, 1), "Недельные показатели складываются из суточных"
+
+@pytest.mark.asyncio
+async def test_scheduler_renders_once_per_monitor_set(tmp_path):
+    """Тест рассылки: текст формируется один раз на уникальный набор мониторов"""
+    db = DBManager(db_path=str(tmp_path / "test.db"))
+    for monitor_id in (1, 2):
+        db.add_or_update_monitor(monitor_id, f"monitor {monitor_id}")
+    for user_id, monitors in ((10, (1, 2)), (11, (1, 2)), (12, (2,))):
+        db.add_or_update_user(user_id, UserRole.USER)
+        for monitor_id in monitors:
+            db.assign_monitor_to_user(user_id, monitor_id)
+    
+    aggregator = DigestAggregator()
+    aggregator.add_many(beats(1, NOW - 12 * HOUR, [MonitorStatus.UP] * 10))
+    sent = []
+    names = {1: "API", 2: "Сайт"}
+    scheduler = DigestScheduler(aggregator, db, lambda user_id, text: sent.append((user_id, text)),
+                                name_lookup=names.get, hour=9, weekday=0)
+    
+    groups = DigestScheduler.group_subscriptions(db.get_monitor_subscriptions())
+    rendered = scheduler.render(DigestPeriod.DAILY, groups, NOW)
+    assert len(rendered) == 2, "Текстов должно быть столько, сколько уникальных наборов мониторов"
+    
+    count = await scheduler.deliver(NOW)
+    assert scheduler.periods(NOW) == [DigestPeriod.DAILY, DigestPeriod.WEEKLY], "В понедельник уходит и недельная сводка"
+    assert count == 6, "Каждый пользователь должен получить суточную и недельную сводки"
+    texts = dict((user_id, text) for user_id, text in sent if "сутки" in text)
+    assert texts[10] == texts[11], "Пользователи с одинаковыми мониторами получают один и тот же текст"
+    assert "API - 100.00%" in texts[10], "В сводке должен быть аптайм монитора"
+    assert "Сайт - нет данных" in texts[12], "Монитор без проверок отмечается отдельно"
+    assert "API" not in texts[12], "В сводку попадают только мониторы пользователя"
+
+def test_next_run_is_next_digest_hour():
+    """Тест расписания: следующая отправка - ближайший час DIGEST_HOUR"""
+    scheduler = DigestScheduler(DigestAggregator(), None, lambda user_id, text: None, hour=9)
+    assert scheduler.next_run(NOW - HOUR) == NOW, "До 9:00 сводка уходит сегодня"
+    assert scheduler.next_run(NOW) == datetime.datetime(2026, 1, 6, 9, 0).timestamp(), "После 9:00 - завтра"
@@ -0,0 +1,99 @@
+import pytest
+import datetime
+import os
+import sys
+
+# Добавляем корневую директорию проекта в PYTHONPATH для импорта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_manager import DBManager, PaymentStatus, UserRole
+from entitlements import Access, EntitlementIndex
+
+NOW = datetime.datetime(2026, 1, 1, 12, 0).timestamp()
+
+class Clock:
+    """Управляемые часы для проверки окончания подписки"""
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def db(tmp_path):
+    return DBManager(db_path=str(tmp_path / "test.db"))
+
+def test_index_loads_roles_and_subscriptions(db):
+    """Тест загрузки индекса: роли и подписки решают доступ без запросов к БД"""
+    db.add_or_update_user(1, UserRole.ADMIN)
+    db.add_or_update_user(2, UserRole.USER)
+    db.add_or_update_user(3, UserRole.USER)
+    db.add_or_update_user(4, UserRole.BLOCKED)
+    db.update_user_subscription_expiry(3, datetime.datetime.fromtimestamp(NOW + 3600))
+    
+    index = EntitlementIndex(db, require_subscription=True, clock=Clock(NOW))
+    assert index.load(), "Индекс должен загрузиться"
+    assert len(index) == 4, "В индексе должны быть все пользователи"
+    
+    db.get_user = None  # После загрузки проверка не должна обращаться к БД
+    assert index.check(1) is Access.ALLOWED, "Администратору подписка не нужна"
+    assert index.check(2) is Access.EXPIRED, "Пользователь без подписки не должен получить доступ"
+    assert index.check(3) is Access.ALLOWED, "Пользователь с активной подпиской должен получить доступ"
+    assert index.check(3, now=NOW + 7200) is Access.EXPIRED, "После окончания подписки доступ закрывается"
+    assert index.check(4) is Access.BLOCKED, "Заблокированный пользователь не должен получить доступ"
+    assert index.check(5) is Access.UNKNOWN, "Неизвестный пользователь не должен получить доступ"
+
+def test_index_follows_db_changes(db):
+    """Тест обновления индекса событиями БД: оплата, смена роли и удаление"""
+    db.add_or_update_user(1, UserRole.USER)
+    index = EntitlementIndex(db, require_subscription=True, clock=Clock(NOW))
+    index.load()
+    assert index.check(1) is Access.EXPIRED, "До оплаты подписки доступа нет"
+    
+    payment_id = db.create_payment(1, 100.0, PaymentStatus.PENDING, datetime.datetime.fromtimestamp(NOW + 86400))
+    db.update_payment_status(payment_id, PaymentStatus.PAID)
+    assert index.check(1) is Access.ALLOWED, "После оплаты доступ должен открыться"
+    
+    db.add_or_update_user(1, UserRole.BLOCKED)
+    assert index.check(1) is Access.BLOCKED, "Блокировка должна действовать сразу"
+    db.add_or_update_user(1, UserRole.USER)
+    assert index.check(1) is Access.ALLOWED, "Смена роли не должна сбрасывать подписку"
+    
+    db.add_or_update_user(2, UserRole.ADMIN)
+    assert index.check(2) is Access.ALLOWED, "Новый администратор должен получить доступ"
+    db.delete_user(2)
+    assert index.check(2) is Access.UNKNOWN, "Удаленный пользователь должен потерять доступ"
+
+@pytest.mark.asyncio
+async def test_index_before_load_reads_db(db):
+    """Тест проверки до загрузки индекса: пользователь читается из БД в отдельном потоке"""
+    db.add_or_update_user(1, UserRole.USER)
+    db.add_or_update_user(2, UserRole.BLOCKED)
+    index = EntitlementIndex(db)
+    for user_id in (1, 2, 3):
+        await index.fetch(user_id)
+    assert index.check(1) is Access.ALLOWED, "Пользователь из БД должен получить доступ до загрузки индекса"
+    assert index.check(2) is Access.BLOCKED, "Заблокированный пользователь не должен получить доступ"
+    assert index.check(3) is Access.UNKNOWN, "Неизвестный пользователь не должен получить доступ"
+
+@pytest.mark.asyncio
+async def test_index_load_retries_and_keeps_concurrent_changes(db):
+    """Тест загрузки: повтор при недоступной БД, изменения во время чтения не теряются"""
+    db.add_or_update_user(1, UserRole.USER)
+    index = EntitlementIndex(db)
+    read = db.get_entitlements
+    attempts = []
+    
+    def flaky_read():
+        attempts.append(1)
+        if len(attempts) == 1:
+            return None  # БД заблокирована
+        rows = read()
+        # Пользователя заблокировали, пока читались права
+        db.add_or_update_user(1, UserRole.BLOCKED)
+        return rows
+    
+    db.get_entitlements = flaky_read
+    await index.load_until_ready(retry_delay=0.01)
+    assert index.loaded and len(attempts) == 2, "Загрузка должна повториться после ошибки БД"
+    assert index.check(1) is Access.BLOCKED, "Изменение во время загрузки должно примениться поверх прочитанного"
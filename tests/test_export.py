@@ -0,0 +1,118 @@
+import pytest
+import csv
+import json
+import os
+import sys
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# Добавляем корневую директорию проекта в PYTHONPATH для импорта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot
+import export
+from db_manager import DBManager, UserRole
+from digest import DigestAggregator, local_day
+from heartbeat_store import HeartbeatStore
+from kuma_models import Heartbeat, Monitor, MonitorStatus
+from snapshot_diff import MonitorSnapshot
+
+
+def read_export(path, fmt):
+    with open(path, encoding="utf-8", newline="") as file:
+        if fmt is export.ExportFormat.CSV:
+            return list(csv.reader(file))
+        return json.load(file)
+
+
+@pytest.mark.parametrize("fmt", list(export.ExportFormat))
+def test_export_monitors(tmp_path, fmt):
+    """Мониторы выгружаются с последней проверкой из буфера"""
+    snapshot = MonitorSnapshot([
+        Monitor(1, "API, основной", MonitorStatus.UP, True, "https://api", "http", False),
+        Monitor(2, "Сайт", MonitorStatus.DOWN, True, "https://site", "http", False),
+    ])
+    heartbeats = HeartbeatStore()
+    heartbeats.add_many([Heartbeat(10, 1, MonitorStatus.UP, 1_700_000_000.0, 42.0)])
+
+    path, count = export.export_to_file(export.MONITOR_COLUMNS, export.monitor_rows(snapshot, heartbeats), fmt,
+                                        directory=str(tmp_path))
+    assert count == 2, "Должны выгрузиться все мониторы"
+    data = read_export(path, fmt)
+    if fmt is export.ExportFormat.CSV:
+        assert data[0] == list(export.MONITOR_COLUMNS), "Первая строка CSV - заголовок"
+        assert data[1][1] == "API, основной", "Запятая в имени должна экранироваться"
+        assert data[1][-1] == "42.0" and data[2][-1] == "", "Последний ping берется из буфера проверок"
+    else:
+        assert data[1]["status"] == "down", "Статус выгружается по имени"
+        assert data[0]["last_ping_ms"] == 42.0 and data[1]["last_check"] is None, "Последний ping берется из буфера"
+
+
+def test_export_incidents_and_uptime(tmp_path):
+    """Инциденты читаются из БД курсором, аптайм - из показателей сводок"""
+    db = DBManager(db_path=str(tmp_path / "test.db"))
+    now = time.time()
+    db.record_incident_transitions([(1, "API", now - 3 * 86400), (2, "Сайт", now - 600)], [(1, now - 3 * 86400 + 60)])
+
+    path, count = export.export_to_file(export.INCIDENT_COLUMNS, export.incident_rows(db, now - 86400),
+                                        export.ExportFormat.JSON, directory=str(tmp_path))
+    data = read_export(path, export.ExportFormat.JSON)
+    assert count == 1 and data[0]["monitor_name"] == "Сайт", "Инциденты старше периода не выгружаются"
+    assert data[0]["resolved_at"] is None, "Незавершенный инцидент выгружается без времени окончания"
+    assert [row[-1] for row in export.incident_rows(db)] == [60, None], "Длительность округляется до секунд"
+
+    aggregator = DigestAggregator()
+    aggregator.add_many([Heartbeat(1, 1, MonitorStatus.UP, now - 86400, 10.0),
+                         Heartbeat(2, 1, MonitorStatus.UP, now, 30.0),
+                         Heartbeat(3, 1, MonitorStatus.DOWN, now + 1, None)])
+    rows = list(export.uptime_rows(aggregator, lambda monitor_id: "API", local_day(now)))
+    assert len(rows) == 1, "Сутки раньше first_day не выгружаются"
+    assert rows[0][1:] == ("1", "API", 2, 1, 50.0, 0, 30.0), "Аптайм считается по проверкам суток"
+
+    # Пустая выгрузка - корректный JSON
+    path, count = export.export_to_file(export.INCIDENT_COLUMNS, iter(()), export.ExportFormat.JSON,
+                                        directory=str(tmp_path))
+    assert count == 0 and read_export(path, export.ExportFormat.JSON) == [], "Пустая выгрузка - пустой массив"
+
+
+def test_export_failure_removes_file(tmp_path):
+    """При ошибке в середине выгрузки временный файл удаляется"""
+    def rows():
+        yield (1,)
+        raise RuntimeError("БД недоступна")
+
+    with pytest.raises(RuntimeError):
+        export.export_to_file(("id",), rows(), export.ExportFormat.CSV, directory=str(tmp_path))
+    assert not os.listdir(tmp_path), "Временный файл не должен оставаться"
+
+
+@pytest.mark.asyncio
+async def test_export_command(tmp_path):
+    """/export отправляет файл документом и удаляет его после отправки"""
+    entitlements = MagicMock()
+    entitlements.fetch = AsyncMock()
+    entitlements.role.return_value = UserRole.ADMIN
+    db = DBManager(db_path=str(tmp_path / "test.db"))
+    db.record_incident_transitions([(1, "API", time.time() - 60)], [])
+    message = MagicMock()
+    message.from_user.id = 1
+    message.text = "/export incidents json 7d"
+    message.answer = AsyncMock()
+    sent = {}
+
+    async def answer_document(document, caption=None):
+        sent["data"] = read_export(document.path, export.ExportFormat.JSON)
+        sent["path"] = document.path
+        sent["caption"] = caption
+
+    message.answer_document = answer_document
+    with patch.object(bot, 'entitlements', entitlements), patch.object(bot, 'db_manager', db):
+        await bot.export_data(message)
+    assert sent["data"][0]["monitor_name"] == "API", "Документ должен содержать выгрузку"
+    assert sent["caption"] == "Строк: 1"
+    assert not os.path.exists(sent["path"]), "Временный файл удаляется после отправки"
+
+    message.text = "/export users"
+    with patch.object(bot, 'entitlements', entitlements):
+        await bot.export_data(message)
+    assert message.answer.call_args.args[0].startswith("Использование: /export"), "Неизвестный вид выгрузки"
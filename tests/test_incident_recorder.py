@@ -0,0 +1,124 @@
+import pytest
+import os
+import sqlite3
+import sys
+from types import SimpleNamespace
+
+# Добавляем корневую директорию проекта в PYTHONPATH для импорта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alert_engine import AlertEvent, AlertKind
+from db_manager import DBManager
+from incident_recorder import IncidentRecorder
+from kuma_models import MonitorStatus
+
+@pytest.fixture
+def db(tmp_path):
+    return DBManager(db_path=str(tmp_path / "test.db"))
+
+@pytest.mark.asyncio
+async def test_recorder_batches_transitions(db):
+    """Открытия и закрытия инцидентов копятся в памяти и пишутся пачкой"""
+    recorder = IncidentRecorder(db, name_lookup=lambda monitor_id: f"Сервис {monitor_id}")
+    
+    recorder.handle_events([
+        AlertEvent(AlertKind.DOWN, 1, 1000.0),
+        AlertEvent(AlertKind.DOWN, 2, 1010.0),
+        AlertEvent(AlertKind.DOWN, 1, 1020.0),   # Повтор не должен открыть второй инцидент
+        AlertEvent(AlertKind.UP, 1, 1100.0),
+        AlertEvent(AlertKind.DOWN, 1, 1200.0),   # Повторное падение в той же пачке
+    ])
+    assert db.get_incident_history() == [], "До записи пачки в БД ничего не должно быть"
+    
+    assert await recorder.flush()
+    history = db.get_incident_history()
+    
+    assert [(row['monitor_id'], row['started_at']) for row in history] == [(1, 1200.0), (2, 1010.0), (1, 1000.0)]
+    assert history[2]['resolved_at'] == 1100.0 and history[2]['duration'] == 100.0
+    assert history[0]['resolved_at'] is None, "Повторно открытый инцидент должен остаться открытым"
+    assert history[1]['monitor_name'] == "Сервис 2"
+
+@pytest.mark.asyncio
+async def test_recorder_flap_resolution_and_restart(db):
+    """Итог мигания открывает/закрывает инцидент, открытые инциденты переживают перезапуск"""
+    recorder = IncidentRecorder(db)
+    recorder.handle_events([AlertEvent(AlertKind.FLAP_RESOLVED, 5, 500.0, MonitorStatus.DOWN)])
+    await recorder.stop()
+    
+    restarted = IncidentRecorder(db)
+    restarted.load_open_incidents()
+    restarted.handle_events([AlertEvent(AlertKind.DOWN, 5, 600.0), AlertEvent(AlertKind.UP, 5, 700.0)])
+    await restarted.flush()
+    
+    history = db.get_incident_history(monitor_id=5)
+    assert len(history) == 1, "После перезапуска не должен открываться второй инцидент"
+    assert history[0]['duration'] == 200.0
+
+@pytest.mark.asyncio
+async def test_recorder_resolves_removed_monitors(db):
+    """Инцидент монитора, удаленного в Kuma, закрывается: его проверок больше не будет"""
+    recorder = IncidentRecorder(db)
+    recorder.handle_events([AlertEvent(AlertKind.DOWN, 7, 100.0), AlertEvent(AlertKind.DOWN, 8, 100.0)])
+    recorder.handle_diff(SimpleNamespace(removed=[SimpleNamespace(key=7)]), SimpleNamespace(taken_at=160.0))
+    await recorder.flush()
+
+    assert [row['monitor_id'] for row in db.get_open_incidents()] == [8], "Инцидент удаленного монитора должен закрыться"
+    assert db.get_incident_history(monitor_id=7)[0]['resolved_at'] == 160.0
+
+def test_history_keyset_pagination(db):
+    """Пагинация по ключу должна обходить всю историю без пропусков и повторов"""
+    db.record_incident_transitions([(i % 3, None, float(1000 + i // 2)) for i in range(25)], [])
+    
+    seen = []
+    cursor = None
+    while True:
+        page = db.get_incident_history(before_id=cursor, limit=10)
+        if not page:
+            break
+        seen.extend(row['incident_id'] for row in page)
+        cursor = page[-1]['incident_id']
+    
+    assert len(seen) == 25 and len(set(seen)) == 25
+    assert db.get_incident_history(monitor_id=0, since=1010.0, limit=100) == [
+        row for row in db.get_incident_history(limit=100) if row['monitor_id'] == 0 and row['started_at'] >= 1010.0
+    ]
+
+def test_incidents_keep_namespaced_monitor_keys(db):
+    """Ключи "<экземпляр>:<ID>" и числовые ID читаются обратно в исходном виде"""
+    db.record_incident_transitions([("eu:12", None, 100.0), (12, None, 110.0)], [("eu:12", 150.0)])
+    
+    assert [row['monitor_id'] for row in db.get_incident_history()] == [12, "eu:12"]
+    assert [row['monitor_id'] for row in db.get_open_incidents()] == [12], "Закрыться должен только инцидент eu:12"
+    assert db.get_incident_history(monitor_id="eu:12")[0]['resolved_at'] == 150.0
+    assert [row[1] for row in db.iter_incidents()] == ["eu:12", 12]
+
+def test_old_incidents_table_is_migrated_to_text_keys(tmp_path):
+    """Таблица инцидентов старой БД с INTEGER-колонкой monitor_id переводится в TEXT без потери данных"""
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("""
+    CREATE TABLE incidents (
+        incident_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        monitor_id INTEGER NOT NULL,
+        monitor_name TEXT,
+        started_at REAL NOT NULL,
+        resolved_at REAL NULL,
+        duration REAL NULL
+    )
+    """)
+    conn.execute("INSERT INTO incidents (monitor_id, monitor_name, started_at) VALUES (5, 'API', 100.0)")
+    conn.commit()
+    conn.close()
+    
+    db = DBManager(db_path=path)
+    db.record_incident_transitions([("eu:5", None, 200.0)], [(5, 150.0)])
+    
+    history = db.get_incident_history()
+    assert [(row['incident_id'], row['monitor_id']) for row in history] == [(2, "eu:5"), (1, 5)]
+    assert history[1]['resolved_at'] == 150.0, "Старый инцидент должен закрываться по числовому ключу"
+    conn = sqlite3.connect(path)
+    column_type = {row[1]: row[2] for row in conn.execute("PRAGMA table_info(incidents)")}['monitor_id']
+    indexes = {row[1] for row in conn.execute("PRAGMA index_list(incidents)")}
+    conn.close()
+    assert column_type == "TEXT"
+    assert {"idx_incidents_monitor_started", "idx_incidents_started", "idx_incidents_open"} <= indexes
@@ -0,0 +1,97 @@
+import pytest
+import asyncio
+import os
+import sys
+import time
+
+# Добавляем корневую директорию проекта в PYTHONPATH для импорта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kuma_federation import FederatedKumaClient, KumaInstance
+from kuma_models import MonitorRecordCache, build_heartbeat, make_monitor_key, parse_monitor_key
+from snapshot_diff import MonitorSnapshot
+
+class FakeInstanceClient:
+    """Заглушка UptimeKumaClient одного экземпляра с задержкой ответа"""
+    delays = {}
+    failing = set()
+
+    def __init__(self, url=None, username=None, password=None, instance=""):
+        self.instance = instance
+        self.cache = MonitorRecordCache(instance)
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def get_monitors(self):
+        await asyncio.sleep(self.delays.get(self.instance, 0))
+        if self.instance in self.failing:
+            raise ConnectionError("нет связи")
+        return self.cache.build([{"id": 1, "name": f"API {self.instance}"},
+                                 {"id": 2, "name": f"Сайт {self.instance}", "status": 0}])
+
+    async def get_heartbeats(self):
+        key = make_monitor_key(self.instance, 1)
+        return {key: [build_heartbeat({"id": 7, "status": 1, "time": 100.0}, key)]}
+
+def make_client(*names, timeout=1.0):
+    return FederatedKumaClient([KumaInstance(name, f"http://{name}", timeout=timeout) for name in names],
+                               client_factory=FakeInstanceClient)
+
+@pytest.fixture(autouse=True)
+def reset_fake():
+    FakeInstanceClient.delays = {}
+    FakeInstanceClient.failing = set()
+
+@pytest.mark.asyncio
+async def test_parallel_fetch_with_namespaced_keys():
+    """Тест параллельной загрузки: время равно самому медленному экземпляру, ключи с пространством имен"""
+    FakeInstanceClient.delays = {"eu": 0.2, "us": 0.2, "asia": 0.2}
+    client = make_client("eu", "us", "asia")
+    
+    started = time.perf_counter()
+    monitors = await client.get_monitors()
+    elapsed = time.perf_counter() - started
+    
+    assert elapsed < 0.5, "Экземпляры должны опрашиваться параллельно, а не по очереди"
+    snapshot = MonitorSnapshot(monitors)
+    assert len(snapshot) == 6, "Должны вернуться мониторы всех экземпляров"
+    assert snapshot.get("eu:1").name == "API eu", "Мониторы должны различаться ключами вида 'eu:1'"
+    assert snapshot.get("us:1") is not snapshot.get("eu:1"), "Одинаковые ID разных экземпляров не должны смешиваться"
+    heartbeats = await client.get_heartbeats()
+    assert set(heartbeats) == {"eu:1", "us:1", "asia:1"}, "Проверки должны приходить с ключами экземпляров"
+
+@pytest.mark.asyncio
+async def test_partial_answer_when_instance_is_slow_or_down():
+    """Тест частичного ответа: медленный экземпляр отсекается таймаутом, упавший не ломает ответ"""
+    client = make_client("eu", "us", "asia", timeout=0.1)
+    await client.get_monitors()
+    
+    FakeInstanceClient.delays = {"us": 1.0}
+    FakeInstanceClient.failing = {"asia"}
+    started = time.perf_counter()
+    summary = await client.get_status_summary()
+    
+    assert time.perf_counter() - started < 0.5, "Медленный экземпляр не должен задерживать ответ"
+    instances = summary["instances"]
+    assert instances["eu"]["ok"], "Доступный экземпляр должен быть помечен доступным"
+    assert not instances["us"]["ok"] and instances["us"]["error"] == "таймаут", "Медленный экземпляр должен отсечься по таймауту"
+    assert instances["asia"]["error"] == "нет связи", "Должна сохраниться ошибка упавшего экземпляра"
+    assert summary["total"] == 6, "Мониторы недоступных экземпляров берутся из последней успешной загрузки"
+    assert instances["us"]["down"] == 1, "Сводка по экземпляру должна считаться по его мониторам"
+
+@pytest.mark.asyncio
+async def test_all_instances_down():
+    """Тест ошибки, если не ответил ни один экземпляр"""
+    FakeInstanceClient.failing = {"eu", "us"}
+    with pytest.raises(ConnectionError):
+        await make_client("eu", "us").get_monitors()
+
+def test_parse_monitor_key():
+    """Тест разбора ключа монитора из пользовательского ввода"""
+    assert parse_monitor_key("12") == 12, "Число должно остаться числовым ключом"
+    assert parse_monitor_key("eu:12") == "eu:12", "Ключ с экземпляром должен сохраниться"
+    assert parse_monitor_key("api") is None, "Имя монитора не является ключом"
@@ -0,0 +1,79 @@
+import pytest
+import os
+import sys
+
+# Добавляем корневую директорию проекта в PYTHONPATH для импорта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kuma_models import Monitor, MonitorStatus, MonitorRecordCache, parse_monitor_key
+
+def raw_monitor(monitor_id, **overrides):
+    """Сырые данные монитора в формате uptime_kuma_api"""
+    monitor = {
+        "id": monitor_id,
+        "name": f"Сервис {monitor_id}",
+        "url": f"https://service{monitor_id}.example.com",
+        "type": "http",
+        "active": True,
+        "maintenance": False,
+    }
+    monitor.update(overrides)
+    return monitor
+
+def test_build_records():
+    """Тест построения записей мониторов из сырых данных"""
+    cache = MonitorRecordCache()
+    monitors = cache.build([
+        raw_monitor(1),
+        raw_monitor(2, status=0),
+        raw_monitor(3, active=False),
+        raw_monitor(4, maintenance=True),
+    ])
+    
+    assert [m.id for m in monitors] == [1, 2, 3, 4], "ID мониторов должны быть целыми числами"
+    assert monitors[0].status == MonitorStatus.UP, "Работающий монитор должен иметь статус UP"
+    assert [m.status for m in monitors[1:]] == [MonitorStatus.DOWN] * 3, "Упавший, неактивный и обслуживаемый мониторы считаются неработающими"
+    assert monitors[0].status == 1, "Статус должен сравниваться с прежними числовыми значениями"
+
+def test_record_dict_access():
+    """Записи должны поддерживать доступ в стиле словаря"""
+    monitor = MonitorRecordCache().build([raw_monitor(1)])[0]
+    
+    assert monitor["name"] == "Сервис 1"
+    assert monitor.get("url") == "https://service1.example.com"
+    assert monitor.get("missing", "default") == "default"
+    assert "maintenance" in monitor
+    with pytest.raises(KeyError):
+        monitor["missing"]
+
+def test_unchanged_records_are_reused():
+    """Неизменившиеся мониторы должны переиспользоваться между загрузками"""
+    cache = MonitorRecordCache()
+    first = cache.build([raw_monitor(1), raw_monitor(2), raw_monitor(3)])
+    second = cache.build([raw_monitor(1), raw_monitor(2, status=0), raw_monitor(4)])
+    
+    assert second[0] is first[0], "Неизменившийся монитор должен быть тем же объектом"
+    assert second[1] is not first[1], "Изменившийся монитор должен быть новой записью"
+    assert second[1].status == MonitorStatus.DOWN
+    assert cache.get(3) is None, "Удаленный монитор не должен оставаться в кеше"
+    assert len(cache) == 3
+
+def test_names_are_interned():
+    """Одинаковые имена и типы должны храниться в памяти один раз"""
+    monitors = MonitorRecordCache().build([
+        raw_monitor(1, name="".join(["api-", "gateway"])),
+        raw_monitor(2, name="".join(["api-", "gateway"])),
+    ])
+    
+    assert monitors[0].name is monitors[1].name
+    assert monitors[0].type is monitors[1].type
+
+def test_parse_monitor_key():
+    """Тест разбора ключа монитора из пользовательского ввода"""
+    assert parse_monitor_key("12") == 12
+    assert parse_monitor_key(" eu:12 ") == "eu:12"
+    assert parse_monitor_key("eu:") is None
+    assert parse_monitor_key("api") is None
+    # str.isdigit() пропускает такие цифры, а int() на них падает или читает их как арабские
+    for text in ("²", "eu:²", "١٢", "eu:١٢", "１２"):
+        assert parse_monitor_key(text) is None, f"Не-ASCII цифры «{text}» не должны считаться ключом"
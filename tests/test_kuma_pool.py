@@ -0,0 +1,141 @@
+import pytest
+import asyncio
+import os
+import sys
+
+# Добавляем корневую директорию проекта в PYTHONPATH для импорта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_manager import DBManager, UserRole
+from kuma_pool import KumaSessionPool, TenantCredentials, TenantDirectory
+
+class FakeClient:
+    """Заглушка UptimeKumaClient, считающая логины и одновременные подключения"""
+    logins = 0
+    concurrent = 0
+    max_concurrent = 0
+    open_sessions = 0
+
+    def __init__(self, record_cache=None, url=None, username=None, password=None):
+        self.url = url
+        self.disconnected = False
+
+    async def connect(self):
+        FakeClient.concurrent += 1
+        FakeClient.max_concurrent = max(FakeClient.max_concurrent, FakeClient.concurrent)
+        await asyncio.sleep(0.001)
+        FakeClient.concurrent -= 1
+        FakeClient.logins += 1
+        FakeClient.open_sessions += 1
+
+    async def disconnect(self):
+        self.disconnected = True
+        FakeClient.open_sessions -= 1
+
+@pytest.fixture(autouse=True)
+def reset_fake():
+    FakeClient.logins = FakeClient.concurrent = FakeClient.max_concurrent = FakeClient.open_sessions = 0
+
+def tenant(tenant_id):
+    return TenantCredentials(tenant_id, f"http://kuma-{tenant_id}", "user", "password")
+
+@pytest.mark.asyncio
+async def test_shared_session_single_login():
+    """Тест общей сессии арендатора: параллельные запросы ждут одного логина"""
+    pool = KumaSessionPool(client_factory=FakeClient)
+    
+    async def use():
+        async with pool.session(tenant(1)) as client:
+            await asyncio.sleep(0)
+            return client
+    
+    clients = await asyncio.gather(*(use() for _ in range(20)))
+    
+    assert FakeClient.logins == 1, "Пользователи одного арендатора должны делить один логин"
+    assert len(set(map(id, clients))) == 1, "Пользователи одного арендатора должны делить одну сессию"
+
+@pytest.mark.asyncio
+async def test_pool_is_bounded_with_many_tenants():
+    """Тест ограничения пула при тысячах арендаторов: LRU-вытеснение и лимит одновременных логинов"""
+    pool = KumaSessionPool(max_sessions=50, max_concurrent_logins=3, client_factory=FakeClient)
+    
+    async def use(tenant_id):
+        async with pool.session(tenant(tenant_id)):
+            await asyncio.sleep(0)
+    
+    for start in range(0, 2000, 100):
+        await asyncio.gather(*(use(tenant_id) for tenant_id in range(start, start + 100)))
+    
+    assert len(pool) <= 50, "Число сессий в пуле не должно превышать max_sessions"
+    assert FakeClient.open_sessions == len(pool), "Вытесненные сессии должны закрываться"
+    assert FakeClient.max_concurrent <= 3, "Одновременных логинов не должно быть больше лимита"
+    assert pool.evictions == 2000 - len(pool), "Лишние сессии должны вытесняться"
+    
+    # Недавно использованный арендатор остается в пуле
+    await use(1999)
+    assert FakeClient.logins == 2000, "Сессия недавно использованного арендатора должна переиспользоваться"
+    
+    await pool.stop()
+    assert FakeClient.open_sessions == 0, "При остановке должны закрываться все сессии"
+
+@pytest.mark.asyncio
+async def test_idle_and_broken_sessions():
+    """Тест закрытия простаивающих и сломанных сессий"""
+    pool = KumaSessionPool(idle_timeout=60, client_factory=FakeClient)
+    async with pool.session(tenant(1)):
+        pass
+    async with pool.session(tenant(2)):
+        assert await pool.evict_idle(now=10**9) == 1, "Закрываться должны только свободные сессии"
+    assert len(pool) == 1 and FakeClient.open_sessions == 1, "Занятая сессия не должна закрываться"
+    
+    with pytest.raises(ConnectionError):
+        async with pool.session(tenant(2)):
+            raise ConnectionError("обрыв")
+    assert len(pool) == 0 and FakeClient.open_sessions == 0, "Сломанная сессия должна закрываться"
+
+@pytest.mark.asyncio
+async def test_changed_credentials_close_idle_session():
+    """Свободная сессия со старыми настройками арендатора закрывается, а не остается открытой"""
+    pool = KumaSessionPool(client_factory=FakeClient)
+    async with pool.session(tenant(1)) as old_client:
+        pass
+    changed = TenantCredentials(1, "http://kuma-new", "user", "password")
+    async with pool.session(changed) as client:
+        assert client.url == "http://kuma-new"
+    assert client is not old_client and old_client.disconnected, "Сессия со старыми настройками должна закрываться"
+    assert FakeClient.open_sessions == 1 and len(pool) == 1
+
+@pytest.mark.asyncio
+async def test_new_session_not_trimmed_before_waiter_resumes():
+    """Новая сессия не вытесняется, пока ожидавший логина запрос ее не получил"""
+    pool = KumaSessionPool(max_sessions=1, client_factory=FakeClient)
+    held = await pool.acquire(tenant(1))
+    # Сессией первого арендатора пользуются двое: после возврата она остается занятой
+    await pool.acquire(tenant(1))
+
+    class ReleasingClient(FakeClient):
+        async def connect(self):
+            await super().connect()
+            # Возврат другой сессии в пул попадает между логином и возобновлением ожидающего
+            asyncio.get_running_loop().call_soon(lambda: asyncio.ensure_future(pool.release(held)))
+
+    pool.client_factory = ReleasingClient
+    session = await pool.acquire(tenant(2))
+    assert not session.detached and not session.client.disconnected, "Ожидающий должен получить открытую сессию"
+    await pool.release(session)
+    assert not held.detached and len(pool) == 1, "После возврата лишняя свободная сессия вытесняется"
+
+@pytest.mark.asyncio
+async def test_tenant_directory(tmp_path):
+    """Тест настроек арендатора в БД и их кеша"""
+    db = DBManager(db_path=str(tmp_path / "test.db"))
+    db.add_or_update_user(1, UserRole.USER)
+    db.add_or_update_user(2, UserRole.USER)
+    tenant_id = db.add_or_update_tenant("Команда", "http://kuma-team", "team", "secret")
+    db.assign_user_to_tenant(1, tenant_id)
+    directory = TenantDirectory(db, max_entries=1)
+    
+    credentials = await directory.lookup(1)
+    assert credentials == TenantCredentials(tenant_id, "http://kuma-team", "team", "secret"), "Должны вернуться настройки арендатора"
+    assert await directory.lookup(2) is None, "Пользователь без арендатора работает с общим экземпляром"
+    assert len(directory) == 1, "Кеш должен быть ограничен max_entries"
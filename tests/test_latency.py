@@ -0,0 +1,71 @@
+import pytest
+import os
+import sys
+
+# Добавляем корневую директорию проекта в PYTHONPATH для импорта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from heartbeat_store import HeartbeatRing
+from kuma_models import Heartbeat, MonitorStatus
+from latency import ChartCache, downsample, latency_samples, latency_stats, percentile, sparkline
+
+
+def ring_stats(ring):
+    _, _, pings, statuses = ring.ordered_arrays()
+    return latency_stats(pings, statuses)
+
+
+def make_ring(pings, capacity=None, statuses=None):
+    ring = HeartbeatRing(capacity or len(pings))
+    for i, ping in enumerate(pings):
+        status = statuses[i] if statuses else MonitorStatus.UP
+        ring.append(Heartbeat(i + 1, 1, status, 1000.0 + i, ping))
+    return ring
+
+
+def test_latency_stats():
+    """Перцентили считаются по последним проверкам буфера, проверки без ping пропускаются"""
+    pings = list(range(1, 101)) + [None]
+    statuses = [MonitorStatus.UP] * 100 + [MonitorStatus.DOWN]
+    # Буфер на 101 проверку после 105 записей: первые 4 проверки вытеснены
+    ring = make_ring([500.0] * 4 + pings, capacity=101, statuses=[MonitorStatus.UP] * 4 + statuses)
+    stats = ring_stats(ring)
+    assert stats.count == 100, "Учитываются только проверки с ping из буфера"
+    assert (stats.minimum, stats.maximum) == (1, 100), "Вытесненные проверки не должны влиять на статистику"
+    assert stats.p50 == pytest.approx(50.5), "Медиана считается с интерполяцией"
+    assert stats.p99 == pytest.approx(99.01), "p99 считается с интерполяцией"
+    assert stats.uptime == pytest.approx(100 / 101 * 100), "Аптайм считается по всем проверкам буфера"
+    times, samples = latency_samples(ring)
+    assert len(times) == len(samples) == 100 and times[0] == 1004.0, "Время и ping идут в хронологическом порядке"
+    assert ring_stats(make_ring([None, None])) is None, "Без ping статистики нет"
+    assert percentile([7.0], 95) == 7.0, "Перцентиль одного значения - само значение"
+
+
+def test_sparkline_downsampling():
+    """Текстовый график сжимается до заданной ширины и отражает форму ряда"""
+    assert downsample([1, 2, 3, 4], 2) == [1.5, 3.5], "Сжатие усредняет равные отрезки"
+    assert downsample([1, 2], 10) == [1, 2], "Короткий ряд не растягивается"
+    line = sparkline([float(i) for i in range(1000)], width=8)
+    assert line == "▁▂▃▄▅▆▇█", "Возрастающий ряд рисуется возрастающими столбиками"
+    assert sparkline([5.0] * 3) == "▁▁▁", "Постоянный ряд рисуется ровной линией"
+    assert sparkline([]) == "", "Пустой ряд - пустой график"
+
+
+def test_chart_cache_buckets():
+    """График рисуется один раз за интервал и перерисовывается в следующем"""
+    now = [0.0]
+    cache = ChartCache(bucket=60, max_entries=2, clock=lambda: now[0])
+    renders = []
+
+    def render():
+        renders.append(now[0])
+        return b"png"
+
+    for _ in range(3):
+        cache.get_or_render(1, render)
+    assert len(renders) == 1 and cache.hits == 2, "Повторные просмотры в интервале не рисуют график заново"
+    now[0] = 61.0
+    cache.get_or_render(1, render)
+    assert len(renders) == 2, "В новом интервале график рисуется заново"
+    cache.get_or_render(2, render)
+    assert len(cache) == 2, "Кеш ограничен max_entries графиками"
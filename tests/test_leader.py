@@ -0,0 +1,104 @@
+import pytest
+import os
+import subprocess
+import sys
+import time
+
+# Добавляем корневую директорию проекта в PYTHONPATH для импорта
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from db_manager import DBManager
+from leader import LeaderElection
+
+# Реплика для проверки переключения: держит аренду, пока процесс жив
+REPLICA = """
+import asyncio, sys
+from db_manager import DBManager
+from leader import LeaderElection
+
+async def main():
+    election = LeaderElection(DBManager(db_path=sys.argv[1]), ttl=1.0)
+    election.start()
+    await asyncio.Event().wait()
+
+asyncio.run(main())
+"""
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_lease_handover(tmp_path):
+    """Аренду держит одна реплика; другая получает ее после истечения или освобождения"""
+    db = DBManager(db_path=str(tmp_path / "test.db"))
+    clock = Clock()
+    first = LeaderElection(db, holder="a", ttl=15, clock=clock)
+    second = LeaderElection(db, holder="b", ttl=15, clock=clock)
+    changes = []
+    first.subscribe(changes.append)
+
+    assert await first.step() is True and await second.step() is False, "Аренду получает только одна реплика"
+    clock.now += 10
+    assert await first.step() is True and await second.step() is False, "Ведущая продлевает аренду"
+    clock.now += 16
+    assert await second.step() is True, "Истекшую аренду забирает другая реплика"
+    assert await first.step() is False and changes == [True, False], "Прежняя ведущая узнает о потере аренды"
+
+    await second.stop()
+    assert db.get_lease("kuma-watcher") is None, "При остановке аренда освобождается"
+    assert await first.step() is True, "Освобожденная аренда достается сразу"
+
+
+@pytest.mark.asyncio
+async def test_step_down_on_db_error(tmp_path, monkeypatch):
+    """Ведущая реплика перестает быть ведущей, если БД не удалось даже открыть"""
+    db = DBManager(db_path=str(tmp_path / "test.db"))
+    election = LeaderElection(db, holder="a", ttl=15, clock=Clock())
+    changes = []
+    election.subscribe(changes.append)
+    assert await election.step() is True
+
+    def broken_connection():
+        raise OSError("диск недоступен")
+    monkeypatch.setattr(db, "_get_connection", broken_connection)
+    assert await election.step() is False, "Ошибка БД не должна прерывать цикл продления"
+    assert changes == [True, False], "Реплика должна сложить с себя роль ведущей"
+
+
+def test_failover_killed_process(tmp_path):
+    """При гибели ведущего процесса аренду за время порядка ttl забирает одна из оставшихся реплик"""
+    db_path = str(tmp_path / "replicas.db")
+    db = DBManager(db_path=db_path)
+    replicas = [subprocess.Popen([sys.executable, "-c", REPLICA, db_path], cwd=ROOT) for _ in range(3)]
+    try:
+        deadline = time.monotonic() + 15
+        lease = None
+        while lease is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+            lease = db.get_lease("kuma-watcher")
+        assert lease is not None, "Одна из реплик должна стать ведущей"
+        leader_pid = int(lease[0].split(":")[1])
+        leader = next(process for process in replicas if process.pid == leader_pid)
+
+        leader.kill()
+        leader.wait()
+        killed_at = time.monotonic()
+        holder = lease[0]
+        while holder == lease[0] and time.monotonic() - killed_at < 10:
+            time.sleep(0.05)
+            holder = db.get_lease("kuma-watcher")[0]
+        failover = time.monotonic() - killed_at
+        survivors = {process.pid for process in replicas if process is not leader}
+        assert int(holder.split(":")[1]) in survivors, "Ведущей должна стать живая реплика"
+        assert failover < 3, f"Переключение должно занимать порядка ttl, а заняло {failover:.1f} с"
+    finally:
+        for process in replicas:
+            process.kill()
+            process.wait()
@@ -0,0 +1,94 @@
+import pytest
+import math
+import os
+import sys
+
+# Добавляем корневую директорию проекта в PYTHONPATH для импорта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kuma_models import MonitorRecordCache
+from monitor_search import MonitorSearchIndex
+from snapshot_diff import MonitorSnapshot, diff_snapshots
+
+def build(raw):
+    return MonitorRecordCache().build(raw)
+
+MONITORS = [
+    {"id": 1, "name": "API", "url": "https://api.example.com"},
+    {"id": 2, "name": "API Gateway", "url": "https://gw.example.com"},
+    {"id": 3, "name": "Billing API", "url": "https://billing.example.com"},
+    {"id": 4, "name": "Rapid deploy", "url": "https://deploy.example.com"},
+    {"id": 5, "name": "Сайт", "url": "https://www.example.com/api/health"},
+    {"id": 6, "name": "Почта", "url": "smtp://mail.example.com"},
+]
+
+def test_search_ranking():
+    """Тест ранжирования: имя целиком, начало имени, начало слова, подстрока имени, URL"""
+    index = MonitorSearchIndex(build(MONITORS))
+    assert index.search("api") == [1, 2, 3, 4, 5], "Порядок: точное имя, префикс, слово, подстрока, URL"
+    assert index.search("ПОЧ") == [6], "Поиск не должен зависеть от регистра"
+    assert index.search("5") == [5], "Запрос-ключ должен находить монитор по ID"
+    assert index.search("biling") == [3], "Опечатка должна находиться нечетким поиском"
+    assert index.search("zzz") == [], "Несуществующий монитор не должен находиться"
+    assert len(index.search("a", limit=2)) == 2, "Число результатов ограничено limit"
+
+def test_index_follows_snapshot_diffs():
+    """Тест инкрементального обновления индекса по разнице снапшотов"""
+    cache = MonitorRecordCache()
+    first = MonitorSnapshot(cache.build(MONITORS))
+    index = MonitorSearchIndex()
+    index.handle_diff(diff_snapshots({}, first.by_key), first)
+    assert len(index) == len(MONITORS), "Первый снапшот должен попасть в индекс целиком"
+
+    changed = [dict(m) for m in MONITORS if m["id"] != 6]
+    changed[0]["name"] = "Public API"
+    changed.append({"id": 7, "name": "Очередь", "url": "amqp://mq.example.com"})
+    second = MonitorSnapshot(cache.build(changed))
+    index.handle_diff(diff_snapshots(first.by_key, second.by_key), second)
+
+    assert index.search("почта") == [], "Удаленный монитор должен пропасть из индекса"
+    assert index.search("очер") == [7], "Добавленный монитор должен находиться"
+    assert index.search("public") == [1], "Переименованный монитор должен находиться по новому имени"
+    assert index.search("api")[0] == 2, "Старое имя переименованного монитора не должно учитываться"
+
+class CountingList(list):
+    """Список, считающий обращения по индексу"""
+    reads = 0
+
+    def __getitem__(self, position):
+        CountingList.reads += 1
+        return super().__getitem__(position)
+
+class CountingDict(dict):
+    """Словарь, считающий чтения по ключу"""
+    reads = 0
+
+    def __getitem__(self, key):
+        CountingDict.reads += 1
+        return super().__getitem__(key)
+
+def test_search_touches_only_needed_monitors():
+    """Тест сложности: поиск среди 10k мониторов смотрит только нужные записи, а не все подряд"""
+    monitors = build([{"id": i, "name": f"service-{i:05d}", "url": f"https://service-{i:05d}.example.com/health"}
+                      for i in range(1, 10_001)])
+    index = MonitorSearchIndex(monitors)
+    index._order = CountingList(index._order)
+    index._docs = CountingDict(index._docs)
+
+    CountingList.reads = CountingDict.reads = 0
+    assert index.search("service-0500") == list(range(5000, 5010)), "Префикс имени должен находиться по порядку"
+    # Бинарный поиск читает log2(n) элементов, дальше идёт только отрезок с префиксом
+    budget = math.ceil(math.log2(len(index._order))) + 11
+    assert CountingList.reads <= budget, f"Префикс должен читать только найденный бинарным поиском отрезок, прочитано {CountingList.reads}"
+
+    CountingDict.reads = 0
+    assert len(index.search("example")) == 10
+    assert CountingDict.reads <= 10, f"Совпадения по URL проверяются до первых limit, проверено {CountingDict.reads}"
+
+    CountingDict.reads = 0
+    assert index.search("05001") == [5001], "Редкий запрос должен находиться"
+    # Каждый кандидат читается дважды: при сортировке и при проверке вхождения
+    candidates = (len(index._narrowest(index._name_trigrams, "05001"))
+                  + len(index._narrowest(index._url_trigrams, "05001")))
+    assert CountingDict.reads <= 2 * candidates < len(monitors) // 10, \
+        f"Кандидаты должны браться из самого редкого множества триграмм, проверено {CountingDict.reads}"
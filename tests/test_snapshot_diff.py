@@ -0,0 +1,93 @@
+import pytest
+import os
+import sys
+
+# Добавляем корневую директорию проекта в PYTHONPATH для импорта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kuma_models import MonitorRecordCache, MonitorStatus
+from snapshot_diff import MonitorSnapshot, diff_snapshots
+from monitor_watcher import MonitorWatcher
+
+def raw_monitor(monitor_id, **overrides):
+    """Сырые данные монитора в формате uptime_kuma_api"""
+    monitor = {"id": monitor_id, "name": f"Сервис {monitor_id}", "url": "", "type": "http", "active": True, "maintenance": False}
+    monitor.update(overrides)
+    return monitor
+
+class FakeClient:
+    """Заглушка UptimeKumaClient, отдающая заранее заданные загрузки"""
+    def __init__(self, loads):
+        self.loads = list(loads)
+        self.cache = MonitorRecordCache()
+        self.connected = False
+
+    async def connect(self):
+        self.connected = True
+
+    async def disconnect(self):
+        self.connected = False
+
+    async def get_monitors(self):
+        return self.cache.build(self.loads.pop(0))
+
+def test_diff_snapshots():
+    """Тест вычисления разницы между снапшотами"""
+    cache = MonitorRecordCache()
+    previous = MonitorSnapshot(cache.build([raw_monitor(1), raw_monitor(2), raw_monitor(3), raw_monitor(4)]))
+    current = MonitorSnapshot(cache.build([
+        raw_monitor(1),
+        raw_monitor(2, status=0),
+        raw_monitor(3, maintenance=True),
+        raw_monitor(5),
+    ]))
+    
+    diff = diff_snapshots(previous.by_key, current.by_key)
+    
+    assert not diff.initial
+    assert [m.id for m in diff.added] == [5]
+    assert [m.id for m in diff.removed] == [4]
+    assert [c.key for c in diff.status_changed] == [2, 3], "Обслуживание тоже меняет итоговый статус"
+    assert [c.key for c in diff.maintenance_toggled] == [3]
+    assert diff.active_toggled == []
+    assert diff.status_changed[0].current.status == MonitorStatus.DOWN
+    assert len(diff) == 5
+
+def test_diff_unchanged_and_renamed():
+    """Неизменившиеся мониторы не попадают в разницу, переименованные попадают в updated"""
+    cache = MonitorRecordCache()
+    previous = MonitorSnapshot(cache.build([raw_monitor(1), raw_monitor(2)]))
+    same = MonitorSnapshot(cache.build([raw_monitor(1), raw_monitor(2)]))
+    
+    assert not diff_snapshots(previous.by_key, same.by_key), "Разница одинаковых снапшотов должна быть пустой"
+    
+    renamed = MonitorSnapshot(cache.build([raw_monitor(1, name="Новое имя"), raw_monitor(2, active=False)]))
+    diff = diff_snapshots(same.by_key, renamed.by_key)
+    assert [c.key for c in diff.updated] == [1]
+    assert [c.key for c in diff.active_toggled] == [2]
+
+@pytest.mark.asyncio
+async def test_watcher_publishes_changes():
+    """Наблюдатель должен рассылать подписчикам только непустые изменения"""
+    client = FakeClient([
+        [raw_monitor(1), raw_monitor(2)],
+        [raw_monitor(1), raw_monitor(2)],
+        [raw_monitor(1), raw_monitor(2, status=0)],
+    ])
+    watcher = MonitorWatcher(client_factory=lambda: client)
+    received = []
+    
+    async def subscriber(diff, snapshot):
+        received.append((diff, snapshot))
+    
+    watcher.subscribe(subscriber)
+    for _ in range(3):
+        await watcher.poll_once()
+    
+    assert len(received) == 2, "Загрузка без изменений не должна рассылаться"
+    assert received[0][0].initial and len(received[0][0].added) == 2
+    assert [c.key for c in received[1][0].status_changed] == [2]
+    assert watcher.snapshot is received[1][1]
+    
+    await watcher.stop()
+    assert not client.connected, "Сессия с Kuma должна закрываться при остановке"
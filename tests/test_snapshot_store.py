@@ -0,0 +1,137 @@
+import pytest
+import math
+import os
+import sys
+
+# Добавляем корневую директорию проекта в PYTHONPATH для импорта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from heartbeat_store import HeartbeatStore
+from kuma_models import Heartbeat, MonitorRecordCache, MonitorStatus
+from monitor_watcher import MonitorWatcher
+from snapshot_diff import MonitorSnapshot
+from snapshot_store import SnapshotStore, dump_snapshot, load_snapshot
+
+def make_snapshot():
+    return MonitorSnapshot(MonitorRecordCache().build([
+        {"id": 1, "name": "Сервис 1", "url": "https://example.com", "type": "http", "active": True, "maintenance": False},
+        {"id": 2, "name": "Сервис 2 ✨", "url": "", "type": "ping", "active": True, "maintenance": True, "status": 0},
+        {"id": 3, "name": "Сервис 3", "url": "", "type": "http", "active": False, "maintenance": False},
+    ]), taken_at=1_700_000_000.5)
+
+def test_snapshot_round_trip():
+    """Тест сохранения и загрузки мониторов и буферов проверок (с переполнением буфера)"""
+    snapshot = make_snapshot()
+    heartbeats = HeartbeatStore(capacity=3)
+    heartbeats.add_many([Heartbeat(i, 1, MonitorStatus(i % 2), 100.0 + i, float(i)) for i in range(1, 6)])
+    heartbeats.add_many([Heartbeat(10, 2, MonitorStatus.DOWN, 200.0, None)])
+
+    restored, restored_heartbeats = load_snapshot(dump_snapshot(snapshot, heartbeats))
+
+    assert restored.taken_at == snapshot.taken_at, "Время снапшота должно сохраниться"
+    assert restored.monitors == snapshot.monitors, "Мониторы должны восстановиться без изменений"
+    assert restored.get(2).name == "Сервис 2 ✨", "Имена не из ASCII должны восстановиться"
+    assert restored_heartbeats.capacity == 3, "Емкость буферов должна сохраниться"
+    beats = list(restored_heartbeats.get(1).heartbeats(1))
+    assert [h.id for h in beats] == [3, 4, 5], "После переполнения должны остаться последние проверки по порядку"
+    assert beats[-1].ping == 5.0 and beats[-1].status == MonitorStatus.UP, "Пинг и статус должны сохраниться"
+    assert list(restored_heartbeats.get(2).heartbeats(2))[0].ping is None, "Отсутствующий пинг должен остаться None"
+    assert restored_heartbeats.last_ids() == {1: 5, 2: 10}, "ID последних проверок должны восстановиться"
+
+    # Восстановленный буфер продолжает работать как кольцевой
+    restored_heartbeats.add_many([Heartbeat(6, 1, MonitorStatus.UP, 106.0, math.nan)])
+    assert [h.id for h in restored_heartbeats.get(1).heartbeats(1)] == [4, 5, 6], "Буфер должен вытеснять старые проверки"
+
+def test_snapshot_store_file(tmp_path):
+    """Тест атомарной записи на диск и обработки поврежденного файла"""
+    store = SnapshotStore(str(tmp_path / "data" / "snapshot.bin"))
+    assert store.load() is None, "Без файла снапшот не загружается"
+
+    assert store.save(make_snapshot()), "Снапшот должен сохраниться"
+    snapshot, heartbeats = store.load()
+    assert len(snapshot) == 3 and len(heartbeats) == 0, "Снапшот без проверок должен загрузиться"
+    assert not os.path.exists(store.path + ".tmp"), "Временный файл не должен оставаться"
+
+    with open(store.path, "wb") as f:
+        f.write(b"garbage")
+    assert store.load() is None, "Поврежденный снапшот должен игнорироваться"
+
+@pytest.mark.asyncio
+async def test_save_if_changed(tmp_path):
+    """Тест пропуска сохранения, если состояние не изменилось"""
+    store = SnapshotStore(str(tmp_path / "snapshot.bin"))
+    snapshot = make_snapshot()
+    heartbeats = HeartbeatStore(capacity=3)
+    await store.save_if_changed(snapshot, heartbeats)
+    assert os.path.exists(store.path), "Первое сохранение должно записать файл"
+
+    os.remove(store.path)
+    await store.save_if_changed(snapshot, heartbeats)
+    assert not os.path.exists(store.path), "Неизменившееся состояние не должно пересохраняться"
+
+    heartbeats.add_many([Heartbeat(1, 1, MonitorStatus.UP, 100.0, 1.0)])
+    await store.save_if_changed(snapshot, heartbeats)
+    assert os.path.exists(store.path), "Новые проверки должны пересохраняться"
+
+    # В поток записи уходит копия буферов, а не сами буферы, которые пополняет цикл событий
+    saved = []
+    store.save = lambda snapshot, heartbeats: saved.append(heartbeats) or True
+    heartbeats.add_many([Heartbeat(2, 1, MonitorStatus.DOWN, 101.0, None)])
+    await store.save_if_changed(snapshot, heartbeats)
+    heartbeats.add_many([Heartbeat(3, 1, MonitorStatus.UP, 102.0, 2.0)])
+    assert saved[0] is not heartbeats, "Буферы должны копироваться перед записью в другом потоке"
+    assert [h.id for h in saved[0].get(1).heartbeats(1)] == [1, 2], "Копия не должна меняться вместе с оригиналом"
+
+def test_heartbeat_capacity_fits_snapshot_header():
+    """Емкость буфера, не помещающаяся в заголовок снапшота (uint16), отклоняется сразу"""
+    with pytest.raises(ValueError):
+        HeartbeatStore(capacity=65536)
+    with pytest.raises(ValueError):
+        HeartbeatStore(capacity=0)
+
+@pytest.mark.asyncio
+async def test_watcher_restore_is_stale_until_poll():
+    """Тест теплого старта наблюдателя: данные помечены устаревшими до первого опроса"""
+    class Client:
+        async def connect(self):
+            pass
+
+        async def disconnect(self):
+            pass
+
+        async def get_monitors(self):
+            return list(make_snapshot().monitors)
+
+    watcher = MonitorWatcher(client_factory=Client)
+    diffs = []
+    watcher.subscribe(lambda diff, snapshot: diffs.append(diff))
+    watcher.restore(make_snapshot(), {1: 5})
+    assert watcher.stale and len(watcher.snapshot) == 3, "Восстановленный снапшот должен быть помечен устаревшим"
+
+    await watcher.poll_once()
+    assert not watcher.stale, "После опроса данные больше не устаревшие"
+    assert diffs == [], "Неизменившиеся за перезапуск мониторы не должны давать изменений"
+
+def test_snapshot_round_trip_with_instances():
+    """Тест сохранения мониторов нескольких экземпляров Kuma с ключами вида 'eu:1'"""
+    monitors = MonitorRecordCache("eu").build([{"id": 1, "name": "API"}]) + MonitorRecordCache("us").build([{"id": 1, "name": "API"}])
+    heartbeats = HeartbeatStore(capacity=2)
+    heartbeats.add_many([Heartbeat(5, "us:1", MonitorStatus.UP, 100.0, 3.0)])
+
+    restored, restored_heartbeats = load_snapshot(dump_snapshot(MonitorSnapshot(monitors), heartbeats))
+
+    assert set(restored.by_key) == {"eu:1", "us:1"}, "Ключи мониторов должны восстановиться с экземплярами"
+    assert restored.get("us:1").instance == "us", "Экземпляр монитора должен сохраниться"
+    assert restored_heartbeats.last_ids() == {"us:1": 5}, "Буферы проверок должны восстановиться по ключам"
+
+def test_load_if_changed(tmp_path):
+    """Ведомая реплика перечитывает снапшот, только когда ведущая его перезаписала"""
+    path = str(tmp_path / "snapshot.bin")
+    leader, follower = SnapshotStore(path), SnapshotStore(path)
+    assert follower.load_if_changed() is None, "Без файла снапшот не загружается"
+    leader.save(make_snapshot())
+    assert follower.load_if_changed() is not None, "Новый снапшот должен загрузиться"
+    assert follower.load_if_changed() is None, "Неизменившийся файл не перечитывается"
+    os.utime(path, ns=(0, 0))
+    snapshot, _ = follower.load_if_changed()
+    assert len(snapshot) == 3, "Перезаписанный снапшот должен загрузиться снова"
@@ -0,0 +1,105 @@
+import pytest
+import asyncio
+import datetime
+import os
+import sys
+import time
+
+# Добавляем корневую директорию проекта в PYTHONPATH для импорта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_manager import DBManager, PaymentStatus, UserRole
+from outbox import Outbox
+from subscription_sweeper import NoticeKind, SubscriptionSweeper
+
+DAY = 86400
+
+class Clock:
+    """Управляемые часы для планировщика"""
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def add_subscriber(db, user_id, expires_at):
+    db.add_or_update_user(user_id, UserRole.USER)
+    expires = datetime.datetime.fromtimestamp(expires_at)
+    payment_id = db.create_payment(user_id, 100.0, PaymentStatus.PENDING, expires)
+    db.update_payment_status(payment_id, PaymentStatus.PAID)
+    return payment_id
+
+@pytest.mark.asyncio
+async def test_sweeper_fires_reminders_and_expiries(tmp_path):
+    """Тест напоминаний и окончаний подписок: срабатывают вовремя и по одному разу"""
+    db = DBManager(db_path=str(tmp_path / "test.db"))
+    now = float(int(time.time()))
+    clock = Clock(now)
+    soon = add_subscriber(db, 1, now + DAY / 2)
+    add_subscriber(db, 2, now + 3 * DAY + DAY / 2)
+    add_subscriber(db, 3, now + 30 * DAY)
+    sweeper = SubscriptionSweeper(db, remind_before=3 * DAY, window=DAY, clock=clock)
+    notices = []
+    sweeper.subscribe(notices.extend)
+    
+    await sweeper.load()
+    assert len(sweeper) == 2, "В куче должны быть только окончание и напоминание из ближайшего окна"
+    
+    clock.now = now + DAY / 4
+    assert await sweeper.sweep() == [], "До срока уведомлений быть не должно"
+    
+    clock.now = now + DAY
+    await sweeper.sweep()
+    kinds = sorted((n.kind.value, n.user_id) for n in notices)
+    assert kinds == [("expired", 1), ("reminder", 2)], "Должны прийти окончание пользователю 1 и напоминание пользователю 2"
+    assert db.get_payment(soon)['status'] == PaymentStatus.EXPIRED.value, "Платеж должен стать истекшим"
+    assert len(sweeper) == 0, "Обработанные моменты должны уйти из кучи"
+    
+    # После перезапуска обработанные события не повторяются
+    notices.clear()
+    restarted = SubscriptionSweeper(db, remind_before=3 * DAY, window=DAY, clock=clock)
+    restarted.subscribe(notices.extend)
+    await restarted.load()
+    clock.now += 60
+    await restarted.sweep()
+    assert notices == [], "Уже обработанные события не должны повторяться после перезапуска"
+
+@pytest.mark.asyncio
+async def test_sweeper_run_wakes_up_on_schedule(tmp_path):
+    """Тест фонового цикла: добавленное после загрузки окончание срабатывает вовремя"""
+    db = DBManager(db_path=str(tmp_path / "test.db"))
+    sweeper = SubscriptionSweeper(db, remind_before=3 * DAY, window=DAY)
+    fired = asyncio.Event()
+    sweeper.subscribe(lambda notices: fired.set())
+    sweeper.start()
+    await asyncio.sleep(0.05)
+    
+    # Оплата в другом потоке: новое окончание приходит через уведомление БД, без вызова schedule
+    expires_at = time.time() + 0.2
+    await asyncio.to_thread(add_subscriber, db, 1, expires_at)
+    await asyncio.wait_for(fired.wait(), 2)
+    await sweeper.stop()
+
+@pytest.mark.asyncio
+async def test_outbox_rate_limit_and_retry():
+    """Тест очереди исходящих сообщений: ограничение скорости и повтор по retry_after"""
+    class RetryAfter(Exception):
+        retry_after = 0.01
+    
+    sent = []
+    failures = [RetryAfter()]
+    
+    async def send(chat_id, text):
+        if failures:
+            raise failures.pop()
+        sent.append((chat_id, text, time.monotonic()))
+    
+    outbox = Outbox(send, rate=100, burst=5)
+    outbox.start()
+    for i in range(15):
+        outbox.put_nowait(i, f"сообщение {i}")
+    assert await outbox.drain(timeout=2), "Очередь должна опустеть"
+    await outbox.stop()
+    
+    assert [chat_id for chat_id, _, _ in sent] == list(range(15)), "Сообщения должны отправляться по порядку, включая повтор"
+    assert sent[-1][2] - sent[0][2] >= 0.08, "Сверх всплеска сообщения должны отправляться не быстрее rate"
@@ -0,0 +1,106 @@
+import pytest
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+# Добавляем корневую директорию проекта в PYTHONPATH для импорта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from throttling import CommandThrottle, TokenBuckets, command_of
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_event(user_id, text):
+    return SimpleNamespace(from_user=SimpleNamespace(id=user_id), text=text, answer=AsyncMock())
+
+
+def test_token_buckets_eviction():
+    """Ведра пополняются со временем, простаивающие и лишние записи вытесняются"""
+    clock = Clock()
+    buckets = TokenBuckets(rate=1, burst=2, max_entries=1000, clock=clock)
+    assert buckets.acquire(1) == 0 and buckets.acquire(1) == 0, "Всплеск до burst запросов разрешен"
+    assert buckets.acquire(1) == pytest.approx(1.0), "Без токенов возвращается время ожидания"
+    clock.now += 1
+    assert buckets.acquire(1) == 0, "Через 1/rate секунд появляется токен"
+
+    for user_id in range(100_000):
+        buckets.acquire(user_id)
+    assert len(buckets) == 1000, "Число записей ограничено max_entries"
+    clock.now += 10
+    buckets.acquire("new")
+    assert len(buckets) == 1, "Простаивающие записи вытесняются"
+    assert command_of(SimpleNamespace(text="/status@uptime_bot now")) == "/status", "Имя бота отбрасывается из команды"
+    assert command_of(SimpleNamespace(text=None, data="mon:eu:12")) == "mon", "Кнопки ограничиваются по префиксу данных"
+
+
+@pytest.mark.asyncio
+async def test_throttle_coalesces_in_flight():
+    """Повторы выполняющейся команды не запускают обработчик, пользователь получает один ответ"""
+    clock = Clock()
+    throttle = CommandThrottle(TokenBuckets(10, 10, clock=clock), TokenBuckets(10, 10, clock=clock), clock=clock)
+    release = asyncio.Event()
+    calls = []
+
+    async def handler(event, data):
+        calls.append(event)
+        await release.wait()
+        return "ok"
+
+    first = asyncio.create_task(throttle(handler, make_event(1, "/monitors"), {}))
+    await asyncio.sleep(0)
+    repeats = [make_event(1, "/monitors") for _ in range(3)]
+    for event in repeats:
+        assert await throttle(handler, event, {}) is None, "Повтор не должен выполнять обработчик"
+    other = asyncio.create_task(throttle(handler, make_event(2, "/monitors"), {}))
+    await asyncio.sleep(0)
+    release.set()
+    assert await first == "ok" and await other == "ok"
+    assert len(calls) == 2, "Другой пользователь обрабатывается независимо"
+    assert sum(event.answer.await_count for event in repeats) == 1, "Ответ «еще обрабатываю» отправляется один раз"
+    assert throttle.coalesced == 3
+
+
+@pytest.mark.asyncio
+async def test_throttle_rate_limit_warns_once():
+    """При превышении частоты предупреждение отправляется один раз на интервал ожидания"""
+    clock = Clock()
+    throttle = CommandThrottle(TokenBuckets(1, 3, clock=clock), TokenBuckets(0.2, 2, clock=clock), clock=clock)
+    handler = AsyncMock(return_value="ok")
+    events = [make_event(1, "/status") for _ in range(5)]
+    for event in events:
+        await throttle(handler, event, {})
+    assert handler.await_count == 2, "Одна команда разрешена дважды подряд"
+    assert sum(event.answer.await_count for event in events) == 1, "Предупреждение не должно повторяться"
+    assert "Повторите через 5 с" in events[2].answer.call_args.args[0], "В предупреждении указано время ожидания"
+
+    await throttle(handler, make_event(1, "/find api"), {})
+    assert handler.await_count == 3, "Другая команда ограничивается своим ведром"
+    clock.now += 5
+    await throttle(handler, make_event(1, "/status"), {})
+    assert handler.await_count == 4, "После ожидания команда снова разрешена"
+
+
+@pytest.mark.asyncio
+async def test_throttle_user_limit_keeps_command_token():
+    """Запрос, отклоненный общим лимитом пользователя, не тратит токен команды"""
+    clock = Clock()
+    throttle = CommandThrottle(TokenBuckets(1, 1, clock=clock), TokenBuckets(0.2, 2, clock=clock), clock=clock)
+    handler = AsyncMock(return_value="ok")
+    await throttle(handler, make_event(1, "/find api"), {})
+    for _ in range(3):
+        await throttle(handler, make_event(1, "/status"), {})
+    assert handler.await_count == 1, "Общий лимит пользователя исчерпан"
+    clock.now += 1
+    await throttle(handler, make_event(1, "/status"), {})
+    clock.now += 1
+    await throttle(handler, make_event(1, "/status"), {})
+    assert handler.await_count == 3, "Отклоненные общим лимитом запросы не должны тратить токены команды"
@@ -1,7 +1,11 @@
 import pytest
 import asyncio
+from dotenv import load_dotenv
 from uptime_kuma_client import UptimeKumaClient
 
+# Клиент не читает .env сам: настройки тестового сервера берутся из окружения
+load_dotenv()
+
 # Тест для проверки подключения и получения списка мониторов
 @pytest.mark.asyncio
 @pytest.mark.uptime_kuma
@@ -0,0 +1,154 @@
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+
+class TokenBuckets:
+    """Token bucket на каждый ключ (пользователь, пользователь и команда)
+
+    Состояние ключа - пара (токены, время пополнения) в словаре, упорядоченном
+    по последнему обращению. Ключ, к которому не обращались дольше времени
+    полного пополнения, ничем не отличается от нового, поэтому такие записи
+    вытесняются с начала словаря при каждом обращении. Сверх этого число
+    записей ограничено max_entries: память не растет с числом пользователей.
+    """
+
+    def __init__(self, rate: float, burst: float, max_entries: int = 100_000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_entries = max_entries
+        self.clock = clock
+        # Через столько секунд простоя ведро снова полное
+        self.idle_after = burst / rate
+        self._state: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+    def acquire(self, key: Hashable) -> float:
+        """Берет токен; 0 - запрос разрешен, иначе через сколько секунд появится токен"""
+        now = self.clock()
+        state = self._state
+        entry = state.pop(key, None)
+        if entry is None:
+            tokens = self.burst
+        else:
+            tokens, updated = entry
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0.0
+        else:
+            wait = (1 - tokens) / self.rate
+        state[key] = (tokens, now)
+        self._evict(now)
+        return wait
+
+    def refund(self, key: Hashable) -> None:
+        """Возвращает токен, взятый acquire, если запрос все же не был выполнен"""
+        entry = self._state.get(key)
+        if entry is not None:
+            tokens, updated = entry
+            self._state[key] = (min(self.burst, tokens + 1), updated)
+
+    def _evict(self, now: float) -> None:
+        state = self._state
+        while state:
+            key, (tokens, updated) = next(iter(state.items()))
+            if now - updated < self.idle_after and len(state) <= self.max_entries:
+                return
+            del state[key]
+
+
+def command_of(event: Any) -> Optional[str]:
+    """Команда события: "/status" для сообщений, "mon" для кнопок с callback_data "mon:12" """
+    text = getattr(event, "text", None)
+    if text and text.startswith("/"):
+        # "/status@my_bot args" -> "/status"
+        return text.split(maxsplit=1)[0].partition("@")[0].lower()
+    data = getattr(event, "data", None)
+    if data:
+        return data.partition(":")[0]
+    return None
+
+
+class CommandThrottle:
+    """Middleware aiogram: ограничение частоты команд пользователя
+
+    Запрос пропускается, если есть токен в ведре пользователя (все его
+    команды) и в ведре пары пользователь+команда. Пока команда пользователя
+    выполняется, ее повторы не запускают обработчик: пользователь один раз
+    получает ответ, что запрос еще обрабатывается. Ограниченный по частоте
+    пользователь получает одно предупреждение на интервал ожидания, остальные
+    его запросы в этом интервале отбрасываются молча.
+    """
+
+    def __init__(self, user_buckets: TokenBuckets, command_buckets: TokenBuckets,
+                 clock: Callable[[], float] = time.monotonic):
+        self.user_buckets = user_buckets
+        self.command_buckets = command_buckets
+        self.clock = clock
+        # (пользователь, команда) -> отправлен ли уже ответ «еще обрабатываю»
+        self._in_flight: Dict[Tuple[int, str], bool] = {}
+        # Пользователь -> до какого момента не повторять предупреждение
+        self._warned: "OrderedDict[int, float]" = OrderedDict()
+        # Статистика для диагностики
+        self.throttled = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self.user_buckets) + len(self.command_buckets) + len(self._warned)
+
+    async def __call__(self, handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]], event: Any,
+                       data: Dict[str, Any]) -> Any:
+        user = getattr(event, "from_user", None)
+        command = command_of(event)
+        if user is None or command is None:
+            return await handler(event, data)
+
+        key = (user.id, command)
+        if key in self._in_flight:
+            self.coalesced += 1
+            if not self._in_flight[key]:
+                self._in_flight[key] = True
+                await event.answer("⏳ Еще обрабатываю предыдущий запрос, подождите.")
+            return None
+
+        # Сначала ведро команды: отклоненный им повтор не тратит общий лимит пользователя
+        wait = self.command_buckets.acquire(key)
+        if not wait:
+            wait = self.user_buckets.acquire(user.id)
+            if wait:
+                # Запрос отклонен общим лимитом: токен команды не должен пропасть
+                self.command_buckets.refund(key)
+        if wait:
+            self.throttled += 1
+            await self._warn(event, user.id, wait)
+            return None
+
+        self._in_flight[key] = False
+        try:
+            return await handler(event, data)
+        finally:
+            del self._in_flight[key]
+
+    async def _warn(self, event: Any, user_id: int, wait: float) -> None:
+        now = self.clock()
+        warned = self._warned
+        while warned:
+            first_user, until = next(iter(warned.items()))
+            if until > now and len(warned) < self.user_buckets.max_entries:
+                break
+            del warned[first_user]
+        if warned.get(user_id, 0.0) > now:
+            return
+        warned.pop(user_id, None)
+        warned[user_id] = now + wait
+        logger.info(f"Пользователь {user_id} ограничен по частоте запросов на {wait:.1f} с")
+        await event.answer(f"⏳ Слишком много запросов. Повторите через {math.ceil(wait)} с.")
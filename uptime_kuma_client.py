@@ -1,27 +1,47 @@
 import os
 import logging
-from typing import Optional, List, Dict, Any
-from uptime_kuma_api import UptimeKumaApi, MonitorType
-from dotenv import load_dotenv
+from typing import Optional, List, Dict, Any, Tuple, Union
 import asyncio
+from kuma_models import Monitor, MonitorKey, MonitorStatus, Incident, Heartbeat, MonitorRecordCache, build_heartbeat, make_monitor_key
 
 # Настройка логгера
 logger = logging.getLogger(__name__)
 
+# Класс API загружается при первом подключении: uptime_kuma_api тянет за собой
+# socketio и requests, что заметно замедляет импорт модуля
+UptimeKumaApi = None
+
+def _get_api_class():
+    """Возвращает класс UptimeKumaApi, импортируя его при первом обращении"""
+    global UptimeKumaApi
+    if UptimeKumaApi is None:
+        from uptime_kuma_api import UptimeKumaApi as api_class
+        UptimeKumaApi = api_class
+    return UptimeKumaApi
+
+# Кеши записей мониторов по экземпляру и URL сервера: живут дольше отдельных сессий клиента,
+# чтобы неизменившиеся мониторы не пересоздавались при каждом запросе
+_record_caches: Dict[Tuple[str, Optional[str]], MonitorRecordCache] = {}
+
 class UptimeKumaClient:
-    def __init__(self):
-        load_dotenv()
-        self.url = os.getenv("UPTIME_KUMA_URL")
-        self.username = os.getenv("UPTIME_KUMA_USERNAME")
-        self.password = os.getenv("UPTIME_KUMA_PASSWORD")
-        self.api: Optional[UptimeKumaApi] = None
+    def __init__(self, record_cache: Optional[MonitorRecordCache] = None, url: Optional[str] = None,
+                 username: Optional[str] = None, password: Optional[str] = None, instance: str = ""):
+        self.url = url or os.getenv("UPTIME_KUMA_URL")
+        self.username = username or os.getenv("UPTIME_KUMA_USERNAME")
+        self.password = password or os.getenv("UPTIME_KUMA_PASSWORD")
+        # Имя экземпляра Kuma: используется в ключах мониторов, если экземпляров несколько
+        self.instance = instance
+        self.api = None
+        if record_cache is None:
+            record_cache = _record_caches.setdefault((instance, self.url), MonitorRecordCache(instance))
+        self.record_cache = record_cache
         logger.info("UptimeKumaClient инициализирован")
 
     async def connect(self) -> None:
         """Установка соединения с Uptime Kuma"""
         try:
             logger.info(f"Подключение к Uptime Kuma: {self.url}")
-            self.api = UptimeKumaApi(self.url)
+            self.api = _get_api_class()(self.url)
             await asyncio.to_thread(self.api.login, self.username, self.password)
             logger.info("Успешное подключение к Uptime Kuma")
         except Exception as e:
@@ -48,7 +68,7 @@ class UptimeKumaClient:
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         await self.disconnect()
         
-    async def get_monitors(self) -> List[Dict[str, Any]]:
+    async def get_monitors(self) -> List[Monitor]:
         """Получение списка мониторов с их статусами"""
         if not self.api:
             logger.error("Попытка получить мониторы без активного соединения.")
@@ -58,23 +78,8 @@ class UptimeKumaClient:
             logger.info("Получение списка мониторов")
             monitors_data = await asyncio.to_thread(self.api.get_monitors)
             
-            result = []
-            for monitor in monitors_data:
-                status = 1
-                if not monitor.get("active", True) or monitor.get("status", 1) == 0:
-                    status = 0
-                if monitor.get("maintenance", False):
-                    status = 0
-                    
-                result.append({
-                    "id": str(monitor.get("id")),
-                    "name": monitor.get("name", "Unknown"),
-                    "status": status,
-                    "active": monitor.get("active", True),
-                    "url": monitor.get("url", ""),
-                    "type": monitor.get("type", "unknown"),
-                    "maintenance": monitor.get("maintenance", False)
-                })
+            # Неизменившиеся с прошлой загрузки мониторы переиспользуются из кеша
+            result = self.record_cache.build(monitors_data)
             
             logger.info(f"Получено {len(result)} мониторов")
             return result
@@ -82,33 +87,56 @@ class UptimeKumaClient:
             logger.error(f"Ошибка при получении списка мониторов: {str(e)}")
             raise ConnectionError(f"Ошибка при получении списка мониторов: {str(e)}")
     
-    async def get_monitor_by_id(self, monitor_id: str) -> Optional[Dict[str, Any]]:
+    async def get_monitor_by_id(self, monitor_id: Union[int, str]) -> Optional[Monitor]:
         """Получение информации о конкретном мониторе по его ID"""
         logger.info(f"Поиск монитора по ID: {monitor_id}")
+        try:
+            monitor_id = int(monitor_id)
+        except (TypeError, ValueError):
+            logger.warning(f"Некорректный ID монитора: {monitor_id}")
+            return None
         monitors = await self.get_monitors()
         
         for monitor in monitors:
-            if str(monitor.get("id")) == str(monitor_id):
+            if monitor.id == monitor_id:
                 logger.info(f"Найден монитор: {monitor.get('name')}")
                 return monitor
         
         logger.warning(f"Монитор с ID {monitor_id} не найден")
         return None
     
-    async def get_monitor_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+    async def get_monitor_by_name(self, name: str) -> Optional[Monitor]:
         """Получение информации о конкретном мониторе по его имени"""
         logger.info(f"Поиск монитора по имени: {name}")
         monitors = await self.get_monitors()
         
         for monitor in monitors:
-            if monitor.get("name") == name:
+            if monitor.name == name:
                 logger.info(f"Найден монитор: {name}")
                 return monitor
         
         logger.warning(f"Монитор с именем {name} не найден")
         return None
     
-    async def get_incidents(self) -> List[Dict[str, Any]]:
+    async def get_heartbeats(self) -> Dict[MonitorKey, List[Heartbeat]]:
+        """Получение последних проверок по каждому монитору"""
+        if not self.api:
+            logger.error("Попытка получить проверки без активного соединения.")
+            raise ConnectionError("Соединение с Uptime Kuma не установлено.")
+            
+        try:
+            heartbeats_data = await asyncio.to_thread(self.api.get_heartbeats)
+            instance = self.instance
+            result = {}
+            for monitor_id, beats in heartbeats_data.items():
+                key = make_monitor_key(instance, int(monitor_id))
+                result[key] = [build_heartbeat(raw, key) for raw in beats]
+            return result
+        except Exception as e:
+            logger.error(f"Ошибка при получении проверок: {str(e)}")
+            raise ConnectionError(f"Ошибка при получении проверок: {str(e)}")
+    
+    async def get_incidents(self) -> List[Incident]:
         """Получение списка инцидентов"""
         if not self.api:
             logger.error("Попытка получить инциденты без активного соединения.")
@@ -120,14 +148,14 @@ class UptimeKumaClient:
             
             result = []
             for incident in incidents_data:
-                result.append({
-                    "id": incident.get("id", ""),
-                    "title": incident.get("title", "Неизвестный инцидент"),
-                    "monitor_name": incident.get("monitor_name", ""),
-                    "status": incident.get("status", "unknown"),
-                    "started_at": incident.get("started_at", ""),
-                    "resolved_at": incident.get("resolved_at", "")
-                })
+                result.append(Incident(
+                    id=int(incident.get("id") or 0),
+                    title=incident.get("title", "Неизвестный инцидент"),
+                    monitor_name=incident.get("monitor_name", ""),
+                    status=incident.get("status", "unknown"),
+                    started_at=incident.get("started_at", ""),
+                    resolved_at=incident.get("resolved_at", "")
+                ))
             
             logger.info(f"Получено {len(result)} инцидентов")
             return result
@@ -135,22 +163,22 @@ class UptimeKumaClient:
             logger.warning(f"Не удалось получить инциденты напрямую: {str(e)}, создаем из мониторов")
             return await self._create_incidents_from_monitors()
     
-    async def _create_incidents_from_monitors(self) -> List[Dict[str, Any]]:
+    async def _create_incidents_from_monitors(self) -> List[Incident]:
         """Создание списка инцидентов на основе неработающих мониторов"""
         logger.info("Создание инцидентов из неработающих мониторов")
         monitors = await self.get_monitors()
         
         incidents = []
         for monitor in monitors:
-            if monitor.get("status") == 0 and monitor.get("active", True) and not monitor.get("maintenance", False):
-                incidents.append({
-                    "id": monitor.get("id"),
-                    "title": f"Проблема с {monitor.get('name')}",
-                    "monitor_name": monitor.get("name"),
-                    "status": "down",
-                    "started_at": "Недавно",
-                    "resolved_at": ""
-                })
+            if monitor.status == MonitorStatus.DOWN and monitor.active and not monitor.maintenance:
+                incidents.append(Incident(
+                    id=monitor.id,
+                    title=f"Проблема с {monitor.name}",
+                    monitor_name=monitor.name,
+                    status="down",
+                    started_at="Недавно",
+                    resolved_at=""
+                ))
         
         logger.info(f"Создано {len(incidents)} инцидентов из мониторов")
         return incidents
@@ -159,22 +187,31 @@ class UptimeKumaClient:
         """Получение сводки о статусе всех мониторов"""
         logger.info("Получение сводки о статусе мониторов")
         monitors = await self.get_monitors()
+        summary = summarize_monitors(monitors)
         
-        total = len(monitors)
-        up = sum(1 for m in monitors if m.get("status") == 1 and m.get("active", True))
-        down = sum(1 for m in monitors if m.get("status") == 0 and m.get("active", True) and not m.get("maintenance", False))
-        maintenance = sum(1 for m in monitors if m.get("maintenance", False) and m.get("active", True))
-        
-        active_monitors = sum(1 for m in monitors if m.get("active", True))
-        uptime = (up / active_monitors * 100) if active_monitors > 0 else 100
-        
-        summary = {
-            "total": total,
-            "up": up,
-            "down": down,
-            "maintenance": maintenance,
-            "uptime": round(uptime, 2)
-        }
-        
-        logger.info(f"Статус мониторов: всего {total}, работают {up}, не работают {down}, на обслуживании {maintenance}, uptime {uptime}%")
+        logger.info(f"Статус мониторов: всего {summary['total']}, работают {summary['up']}, не работают {summary['down']}, на обслуживании {summary['maintenance']}, uptime {summary['uptime']}%")
         return summary
+
+def summarize_monitors(monitors: List[Monitor]) -> Dict[str, Any]:
+    """Сводка о статусе мониторов за один проход по списку"""
+    up = down = maintenance = active_monitors = 0
+    for m in monitors:
+        if not m.active:
+            continue
+        active_monitors += 1
+        if m.maintenance:
+            maintenance += 1
+        if m.status == MonitorStatus.UP:
+            up += 1
+        elif m.status == MonitorStatus.DOWN and not m.maintenance:
+            down += 1
+    
+    uptime = (up / active_monitors * 100) if active_monitors > 0 else 100
+    
+    return {
+        "total": len(monitors),
+        "up": up,
+        "down": down,
+        "maintenance": maintenance,
+        "uptime": round(uptime, 2)
+    }